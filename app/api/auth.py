@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.core.deps import get_db, get_current_user
+from app.core.config import settings
+from app.core.deps import get_async_db, get_async_current_user
+from app.core.rate_limit import limit_by_ip, limit_by_phone
 from app.services.auth_service import AuthService
 from app.schemas.auth import (
     RegisterRequest, PhoneLoginRequest, PasswordLoginRequest,
@@ -15,16 +17,23 @@ from app.models.auth import User
 # 定义路由器时不要包含前缀，让主应用决定前缀
 router = APIRouter()
 
+# 按手机号限流，规则在启动时解析一次
+limit_login_phone = limit_by_phone("login", settings.RATE_LIMIT_LOGIN_PHONE)
+limit_sms_phone = limit_by_phone("sms", settings.RATE_LIMIT_SMS_PHONE)
+limit_reset_phone = limit_by_phone("reset", settings.RATE_LIMIT_RESET_PHONE)
+
 @router.post("/register", response_model=TokenResponse)
-def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """用户注册"""
-    user = AuthService.create_user(db, request)
+    user = await AuthService.create_user(db, request)
     return AuthService.create_access_token(user.id)
 
-@router.post("/login/phone", response_model=TokenResponse)
-def login_by_phone(request: PhoneLoginRequest, db: Session = Depends(get_db)):
+@router.post("/login/phone", response_model=TokenResponse,
+             dependencies=[Depends(limit_by_ip("login", settings.RATE_LIMIT_LOGIN_IP))])
+async def login_by_phone(request: PhoneLoginRequest, db: AsyncSession = Depends(get_async_db)):
     """手机验证码登录"""
-    user = AuthService.authenticate_user_by_code(db, request.phone, request.code)
+    await limit_login_phone(request.phone)
+    user = await AuthService.authenticate_user_by_code(db, request.phone, request.code)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,14 +42,16 @@ def login_by_phone(request: PhoneLoginRequest, db: Session = Depends(get_db)):
     
     # 更新最后登录时间
     user.last_login_time = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return AuthService.create_access_token(user.id)
 
-@router.post("/login/password", response_model=TokenResponse)
-def login_by_password(request: PasswordLoginRequest, db: Session = Depends(get_db)):
+@router.post("/login/password", response_model=TokenResponse,
+             dependencies=[Depends(limit_by_ip("login", settings.RATE_LIMIT_LOGIN_IP))])
+async def login_by_password(request: PasswordLoginRequest, db: AsyncSession = Depends(get_async_db)):
     """密码登录"""
-    user = AuthService.authenticate_user(db, request.phone, request.password)
+    await limit_login_phone(request.phone)
+    user = await AuthService.authenticate_user(db, request.phone, request.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,36 +60,37 @@ def login_by_password(request: PasswordLoginRequest, db: Session = Depends(get_d
     
     # 更新最后登录时间
     user.last_login_time = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return AuthService.create_access_token(user.id)
 
-@router.post("/sms/send")
-def send_sms_code(request: SendSmsRequest, db: Session = Depends(get_db)):
+@router.post("/sms/send", dependencies=[Depends(limit_by_ip("sms", settings.RATE_LIMIT_SMS_IP))])
+async def send_sms_code(request: SendSmsRequest, db: AsyncSession = Depends(get_async_db)):
     """发送短信验证码"""
-    code = AuthService.create_verification_code(db, request.phone, request.type)
-    # TODO: 实际发送短信的逻辑, 这里仅返回验证码
+    await limit_sms_phone(request.phone)
+    await AuthService.create_verification_code(db, request.phone, request.type)
     return {"message": "验证码已发送"}
 
 
 @router.post("/password/change")
-def change_password(
+async def change_password(
     request: ChangePasswordRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """修改密码"""
-    if not AuthService.change_password(db, current_user, request.old_password, request.new_password):
+    if not await AuthService.change_password(db, current_user, request.old_password, request.new_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="原密码错误"
         )
     return {"message": "密码修改成功"}
 
-@router.post("/password/reset")
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+@router.post("/password/reset", dependencies=[Depends(limit_by_ip("reset", settings.RATE_LIMIT_RESET_IP))])
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     """重置密码"""
-    if not AuthService.reset_password(db, request.phone, request.code, request.new_password):
+    await limit_reset_phone(request.phone)
+    if not await AuthService.reset_password(db, request.phone, request.code, request.new_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="验证码无效或手机号不存在"
@@ -86,13 +98,13 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     return {"message": "密码重置成功"}
 
 @router.post("/phone/change")
-def change_phone(
+async def change_phone(
     request: ChangePhoneRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """修改手机号"""
-    if not AuthService.change_phone(db, current_user, request.new_phone, request.code):
+    if not await AuthService.change_phone(db, current_user, request.new_phone, request.code):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="验证码无效或手机号已被使用"
@@ -100,24 +112,27 @@ def change_phone(
     return {"message": "手机号修改成功"}
 
 @router.get("/profile", response_model=UserProfileResponse)
-def get_profile(current_user: User = Depends(get_current_user)):
+async def get_profile(
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """获取用户资料"""
-    return current_user.profile
+    return await AuthService.get_user_profile(db, current_user)
 
 @router.put("/profile", response_model=UserProfileResponse)
-def update_profile(
+async def update_profile(
     profile: UserProfileCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新用户资料"""
-    return AuthService.update_user_profile(db, current_user, profile)
+    return await AuthService.update_user_profile(db, current_user, profile)
 
 @router.post("/device", response_model=UserDeviceResponse)
-def register_device(
+async def register_device(
     device: UserDeviceCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """注册设备"""
-    return AuthService.register_device(db, current_user, device)
+    return await AuthService.register_device(db, current_user, device)
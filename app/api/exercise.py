@@ -0,0 +1,76 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.deps import get_async_db, get_async_current_user
+from app.core.timeseries import resolve_range
+from app.services.exercise_service import ExerciseService
+from app.schemas.exercise import ExerciseRecordCreate, ExerciseRecordResponse, ExerciseTrendResponse, ExerciseVideoResponse
+from app.models.auth import User
+
+# 定义路由器时不要包含前缀，让主应用决定前缀
+router = APIRouter()
+
+@router.post("/records", response_model=ExerciseRecordResponse)
+async def create_record(
+    request: ExerciseRecordCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """记录运动"""
+    return await ExerciseService.create_record(db, current_user.id, request)
+
+@router.get("/records", response_model=List[ExerciseRecordResponse])
+async def list_records(
+    day: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取某天的运动记录，默认当天"""
+    return await ExerciseService.list_records(db, current_user.id, day or date.today())
+
+@router.delete("/records/{record_id}")
+async def delete_record(
+    record_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """删除运动记录"""
+    if not await ExerciseService.delete_record(db, current_user.id, record_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="运动记录不存在"
+        )
+    return {"message": "删除成功"}
+
+@router.get("/trends", response_model=ExerciseTrendResponse)
+async def get_exercise_trend(
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取按日/周/月汇总的运动时长趋势，默认截止今天"""
+    try:
+        period, start, end = resolve_range(period, date.today(), start, end)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return await ExerciseService.get_trend(db, current_user.id, period, start, end)
+
+@router.get("/videos/{video_id}", response_model=ExerciseVideoResponse)
+async def get_video(
+    video_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取运动视频（计入观看次数）"""
+    video = await ExerciseService.view_video(db, video_id)
+    if video is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="视频不存在")
+    return video
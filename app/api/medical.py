@@ -0,0 +1,93 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.deps import get_async_db, get_async_current_doctor, get_async_current_user
+from app.core.messaging import DOCTOR, USER, Participant, get_message_gateway
+from app.core.rate_limit import limit_by_ip
+from app.db.session import AsyncSessionLocal
+from app.services.auth_service import AuthService
+from app.services.medical_service import MedicalService
+from app.schemas.auth import TokenResponse
+from app.schemas.medical import ConversationList, DoctorLoginRequest, MessageHistory
+from app.models.auth import User
+from app.models.medical import Doctor
+
+# 定义路由器时不要包含前缀，让主应用决定前缀
+router = APIRouter()
+
+@router.websocket("/ws")
+async def messaging_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    医患实时消息（WebSocket），令牌通过token查询参数传递
+
+    客户端事件: {"type": "message", "to", "content", "message_type", "client_id"}、
+    {"type": "read", "conversation_id", "up_to"}、{"type": "ping"}；
+    服务端事件: message、ack、read（自己标记已读时带该会话剩余的unread）、error、pong。
+    """
+    # 认证完立即归还数据库连接，不在整个长连接期间占用
+    async with AsyncSessionLocal() as db:
+        participant = await MedicalService.socket_participant(db, token)
+    if participant is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await get_message_gateway().serve(websocket, participant)
+
+@router.get("/conversations", response_model=ConversationList)
+async def list_conversations(
+    before: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取会话列表（按最后消息倒序，带未读数），翻页时把next_before原样传回"""
+    return await MedicalService.list_conversations(db, current_user.id, before, limit)
+
+@router.get("/conversations/{conversation_id}/messages", response_model=MessageHistory)
+async def get_messages(
+    conversation_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取会话历史消息，翻页时把next_before原样传回"""
+    return await MedicalService.get_messages(db, Participant(USER, current_user.id), conversation_id, before, limit)
+
+@router.post("/doctor/login", response_model=TokenResponse,
+             dependencies=[Depends(limit_by_ip("login", settings.RATE_LIMIT_LOGIN_IP))])
+async def doctor_login(request: DoctorLoginRequest, db: AsyncSession = Depends(get_async_db)):
+    """医生账号登录，返回的令牌带role=doctor，用于医生端接口和WebSocket"""
+    doctor = await MedicalService.authenticate_doctor(db, request.username, request.password)
+    if doctor is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户名或密码错误"
+        )
+    return AuthService.create_access_token(doctor.id, role=DOCTOR)
+
+@router.get("/doctor/conversations", response_model=ConversationList)
+async def list_doctor_conversations(
+    before: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_doctor: Doctor = Depends(get_async_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """医生端会话列表（按最后消息倒序，带患者信息和未读数），翻页时把next_before原样传回"""
+    return await MedicalService.list_doctor_conversations(db, current_doctor.id, before, limit)
+
+@router.get("/doctor/conversations/{conversation_id}/messages", response_model=MessageHistory)
+async def get_doctor_messages(
+    conversation_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_doctor: Doctor = Depends(get_async_current_doctor),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """医生端会话历史消息，翻页时把next_before原样传回"""
+    return await MedicalService.get_messages(
+        db, Participant(DOCTOR, current_doctor.id), conversation_id, before, limit
+    )
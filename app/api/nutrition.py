@@ -0,0 +1,277 @@
+import copy
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.deps import get_async_db, get_async_current_user
+from app.core.food_catalog import get_food_catalog
+from app.core.config import settings
+from app.core.food_search import SCORE_NAME_PREFIX, get_food_search_index
+from app.core.recognition import get_recognition_pipeline
+from app.core.storage import get_storage
+from app.core.uploads import receive_image
+from app.core.timeseries import resolve_range
+from app.services.nutrition_service import NutritionService
+from app.schemas.nutrition import (
+    FoodItemResponse, FoodSearchResult, MealCreate, MealResponse, RecognitionJobResponse,
+    SupplementCreate, SupplementResponse, DailyNutritionResponse, NutritionTrendResponse,
+    FoodPreferenceUpdate, FoodPreferenceResponse, RecommendationResponse
+)
+from app.models.auth import User
+
+# 定义路由器时不要包含前缀，让主应用决定前缀
+router = APIRouter()
+
+@router.get("/foods/search", response_model=List[FoodSearchResult])
+async def search_foods(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按名称、拼音或首字母搜索食物（支持错字）"""
+    catalog = await get_food_catalog().get(db)
+    index = get_food_search_index()
+    # 目录刷新后增量更新索引
+    index.sync(catalog)
+    results = []
+    for hit in index.search(q, limit):
+        food = catalog.get(hit["id"])
+        if food is not None:
+            food["score"] = hit["score"]
+            results.append(food)
+    return results
+
+@router.get("/foods/{food_id}", response_model=FoodItemResponse)
+async def get_food(food_id: int, db: AsyncSession = Depends(get_async_db)):
+    """获取食物营养信息"""
+    catalog = await get_food_catalog().get(db)
+    food = catalog.get(food_id)
+    if food is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="食物不存在"
+        )
+    return food
+
+async def _match_foods(db: AsyncSession, job: dict) -> dict:
+    """把识别结果按名称匹配到食物库，匹配上的补充食物ID和蛋白质含量（返回副本，不修改缓存中的结果）"""
+    if not job.get("result"):
+        return job
+    # 存储只浅拷贝任务，result中的字典与缓存共享
+    job = dict(job, result=copy.deepcopy(job["result"]))
+    catalog = await get_food_catalog().get(db)
+    index = get_food_search_index()
+    index.sync(catalog)
+    for item in job["result"]:
+        hits = index.search(item["name"], 1)
+        if hits and hits[0]["score"] >= SCORE_NAME_PREFIX:
+            food = catalog.get(hits[0]["id"])
+            if food is not None:
+                item["food_item_id"] = food["id"]
+                item["protein_per_100g"] = food["protein_per_100g"]
+    return job
+
+@router.post("/recognitions", response_model=RecognitionJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_recognition(
+    request: Request,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    上传餐食照片识别食物，立即返回任务，结果通过GET /recognitions/{job_id}查询
+
+    请求体为图片原始数据或multipart/form-data，图片保存后的地址随任务返回，可用作餐食的image_url。
+    """
+    storage = get_storage()
+    upload = await receive_image(request, storage, "meals", settings.RECOGNITION_MAX_IMAGE_BYTES)
+    key = upload["key"]
+    job = await get_recognition_pipeline().submit(
+        current_user.id, lambda: storage.read(key), digest=upload["sha256"], image_url=upload["url"]
+    )
+    return await _match_foods(db, job)
+
+@router.get("/recognitions/{job_id}", response_model=RecognitionJobResponse)
+async def get_recognition(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="识别未完成时最多等待的秒数（长轮询）"),
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """查询图片识别任务"""
+    pipeline = get_recognition_pipeline()
+    if wait:
+        job = await pipeline.wait(job_id, min(wait, settings.RECOGNITION_MAX_WAIT))
+    else:
+        job = await pipeline.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="识别任务不存在"
+        )
+    return await _match_foods(db, job)
+
+@router.post("/meals", response_model=MealResponse)
+async def create_meal(
+    request: MealCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """记录餐食"""
+    return await NutritionService.create_meal(db, current_user.id, request)
+
+@router.get("/meals", response_model=List[MealResponse])
+async def list_meals(
+    day: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取某天的餐食记录，默认当天"""
+    return await NutritionService.list_meals(db, current_user.id, day or date.today())
+
+@router.get("/meals/{meal_id}", response_model=MealResponse)
+async def get_meal(
+    meal_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取餐食详情"""
+    meal = await NutritionService.get_meal(db, current_user.id, meal_id)
+    if meal is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="餐食记录不存在"
+        )
+    return meal
+
+@router.put("/meals/{meal_id}", response_model=MealResponse)
+async def update_meal(
+    meal_id: int,
+    request: MealCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """修改餐食记录"""
+    meal = await NutritionService.update_meal(db, current_user.id, meal_id, request)
+    if meal is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="餐食记录不存在"
+        )
+    return meal
+
+@router.delete("/meals/{meal_id}")
+async def delete_meal(
+    meal_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """删除餐食记录"""
+    if not await NutritionService.delete_meal(db, current_user.id, meal_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="餐食记录不存在"
+        )
+    return {"message": "删除成功"}
+
+@router.post("/supplements", response_model=SupplementResponse)
+async def create_supplement(
+    request: SupplementCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """记录蛋白补充剂"""
+    return await NutritionService.create_supplement(db, current_user.id, request)
+
+@router.get("/supplements", response_model=List[SupplementResponse])
+async def list_supplements(
+    day: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取某天的蛋白补充剂记录，默认当天"""
+    return await NutritionService.list_supplements(db, current_user.id, day or date.today())
+
+@router.put("/supplements/{supplement_id}", response_model=SupplementResponse)
+async def update_supplement(
+    supplement_id: int,
+    request: SupplementCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """修改蛋白补充剂记录"""
+    supplement = await NutritionService.update_supplement(db, current_user.id, supplement_id, request)
+    if supplement is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="补充剂记录不存在"
+        )
+    return supplement
+
+@router.delete("/supplements/{supplement_id}")
+async def delete_supplement(
+    supplement_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """删除蛋白补充剂记录"""
+    if not await NutritionService.delete_supplement(db, current_user.id, supplement_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="补充剂记录不存在"
+        )
+    return {"message": "删除成功"}
+
+@router.get("/daily", response_model=DailyNutritionResponse)
+async def get_daily_nutrition(
+    day: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取某天的营养摄入汇总，默认当天"""
+    return await NutritionService.get_daily_record(db, current_user.id, day or date.today())
+
+@router.get("/trends", response_model=NutritionTrendResponse)
+async def get_nutrition_trend(
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取按日/周/月汇总的蛋白质和热量趋势，默认截止今天"""
+    try:
+        period, start, end = resolve_range(period, date.today(), start, end)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return await NutritionService.get_trend(db, current_user.id, period, start, end)
+
+@router.get("/preferences", response_model=FoodPreferenceResponse)
+async def get_preferences(
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取食物偏好"""
+    return await NutritionService.get_preferences(db, current_user.id)
+
+@router.put("/preferences", response_model=FoodPreferenceResponse)
+async def update_preferences(
+    preference_in: FoodPreferenceUpdate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """设置食物偏好（不吃的类别/食物、偏好的类别），推荐补充食物时使用"""
+    return await NutritionService.update_preferences(db, current_user.id, preference_in)
+
+@router.get("/recommendations", response_model=RecommendationResponse)
+async def get_recommendation(
+    day: Optional[date] = None,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按某天（默认当天）的蛋白质缺口推荐补充食物"""
+    return await NutritionService.recommend(db, current_user.id, day or date.today())
@@ -0,0 +1,95 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.deps import get_async_db, get_async_current_user
+from app.core.feed import LATEST
+from app.core.leaderboard import BOARD_ALIASES
+from app.services.social_service import SocialService
+from app.schemas.social import (
+    CommentCreate, CommentResponse, FeedResponse, LeaderboardResponse, LikeResponse, PostCreate, PostDetail,
+    PostSummary, TopicResponse
+)
+from app.models.auth import User
+
+# 定义路由器时不要包含前缀，让主应用决定前缀
+router = APIRouter()
+
+@router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    period: str = Query("all", pattern="^(day|week|all)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取积分排行榜（日榜/周榜/总榜）和自己的名次"""
+    return await SocialService.get_leaderboard(db, BOARD_ALIASES[period], current_user.id, limit, offset)
+
+@router.get("/topics", response_model=List[TopicResponse])
+async def list_topics(db: AsyncSession = Depends(get_async_db)):
+    """获取话题列表"""
+    return await SocialService.list_topics(db)
+
+@router.post("/posts", response_model=PostSummary)
+async def create_post(
+    request: PostCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """发帖"""
+    return await SocialService.create_post(db, current_user.id, request)
+
+@router.get("/posts", response_model=FeedResponse)
+async def get_feed(
+    topic_id: Optional[int] = None,
+    sort: str = Query(LATEST, pattern="^(latest|hot)$"),
+    cursor: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取信息流（最新/最热），不传topic_id时为全站
+
+    翻页时把上一页返回的next_cursor原样传回，next_cursor为空表示没有更多。
+    """
+    return await SocialService.get_feed(db, topic_id, sort, cursor, limit, current_user.id)
+
+@router.get("/posts/{post_id}", response_model=PostDetail)
+async def get_post(
+    post_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """查看帖子详情和评论（计入浏览次数）"""
+    return await SocialService.view_post(db, post_id, current_user.id)
+
+@router.post("/posts/{post_id}/comments", response_model=CommentResponse)
+async def create_comment(
+    post_id: int,
+    request: CommentCreate,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """发表评论，传parent_id时为回复"""
+    return await SocialService.create_comment(db, current_user.id, post_id, request)
+
+@router.post("/posts/{post_id}/like", response_model=LikeResponse)
+async def like_post(
+    post_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """点赞帖子"""
+    return await SocialService.like_post(db, current_user.id, post_id)
+
+@router.delete("/posts/{post_id}/like", response_model=LikeResponse)
+async def unlike_post(
+    post_id: int,
+    current_user: User = Depends(get_async_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """取消点赞"""
+    return await SocialService.like_post(db, current_user.id, post_id, liked=False)
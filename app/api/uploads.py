@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Path, Request
+
+from app.core.config import settings
+from app.core.deps import get_async_current_user
+from app.core.storage import get_storage
+from app.core.uploads import receive_image
+from app.schemas.upload import ImageUploadResponse
+from app.models.auth import User
+
+# 定义路由器时不要包含前缀，让主应用决定前缀
+router = APIRouter()
+
+# 上传类别 -> 存储目录
+IMAGE_CATEGORIES = {
+    "meal": "meals",
+    "supplement": "supplements",
+    "post": "posts",
+}
+
+@router.post("/images/{category}", response_model=ImageUploadResponse)
+async def upload_image(
+    request: Request,
+    category: str = Path(..., pattern="^(meal|supplement|post)$"),
+    current_user: User = Depends(get_async_current_user)
+):
+    """
+    上传图片（餐食、蛋白补充剂、社区帖子）
+
+    请求体为图片原始数据或multipart/form-data，服务端边接收边写盘，返回的url用于对应记录的图片字段
+    """
+    return await receive_image(request, get_storage(), IMAGE_CATEGORIES[category], settings.MEDIA_MAX_IMAGE_BYTES)
@@ -0,0 +1,239 @@
+"""
+批处理模块 - 按用户ID键集分页切块，进程池并行处理，断点续跑并记录吞吐量
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from app.core.logger import get_logger
+
+logger = get_logger("health777.batch")
+
+# 处理函数: (本块的key列表, *参数) -> 各项计数
+ChunkProcessor = Callable[..., Dict[str, int]]
+# 取下一页key: (上一页最后一个key, 数量) -> 升序key列表
+KeyFetcher = Callable[[int, int], Sequence[int]]
+
+
+class Checkpoint:
+    """
+    批处理断点文件(JSON)
+
+    先写同目录下的临时文件再os.replace替换，进程在任意时刻崩溃都不会留下写了一半的断点。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"断点文件损坏，忽略: {self.path}")
+            return None
+
+    def save(self, state: Dict[str, Any]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class _InlineExecutor(Executor):
+    """在当前线程直接执行（仅测试）"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class BatchRunner:
+    """
+    分块批处理执行器
+
+    主进程按key（用户ID）键集分页取出每块的key，提交给进程池处理；每块由处理函数
+    批量读取、批量写入并单独提交事务。断点记录"之前所有块都已完成"的最后一个key，
+    崩溃后从断点继续，断点之后已完成的块会被重做，因此处理函数必须是幂等的。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: ChunkProcessor,
+        workers: int = 4,
+        chunk_size: int = 1000,
+        executor: str = "process",
+        checkpoint: Optional[Checkpoint] = None,
+        initializer: Optional[Callable[[], None]] = None,
+        progress_interval: float = 10.0
+    ):
+        """
+        参数:
+            name (str): 任务名称，写入断点用于校验
+            process (callable): 模块级函数（进程池需要可pickle）
+            workers (int): 进程/线程数
+            chunk_size (int): 每块的key数
+            executor (str): process-进程池, thread-线程池, inline-直接在当前线程执行(仅测试)
+            checkpoint (Checkpoint): 断点文件，None表示不记录断点
+            initializer (callable): 每个工作进程启动时执行
+            progress_interval (float): 输出进度日志的间隔(秒)
+        """
+        self.name = name
+        self.process = process
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor_type = executor
+        self.checkpoint = checkpoint
+        self.initializer = initializer
+        self.progress_interval = progress_interval
+
+    def _create_executor(self) -> Executor:
+        if self.executor_type == "process":
+            # 使用spawn，工作进程不继承主进程的数据库连接
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+        if self.executor_type == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"batch-{self.name}")
+        if self.executor_type == "inline":
+            return _InlineExecutor()
+        raise ValueError(f"不支持的批处理执行器类型: {self.executor_type}")
+
+    def _initial_state(self, args: List[Any], resume: bool) -> Dict[str, Any]:
+        state = self.checkpoint.load() if self.checkpoint and resume else None
+        if state and state.get("job") == self.name and state.get("args") == args:
+            return state
+        return {
+            "job": self.name,
+            "args": args,
+            "last_key": 0,
+            "chunks": 0,
+            "keys": 0,
+            "counts": {},
+            "elapsed": 0.0,
+            "max_chunk_seconds": 0.0,
+            "finished": False,
+        }
+
+    def run(self, fetch_keys: KeyFetcher, *args: Any, resume: bool = True) -> Dict[str, Any]:
+        """
+        执行批处理
+
+        参数:
+            fetch_keys (callable): 在主进程中取下一页key
+            args: 传给处理函数的额外参数，需可JSON序列化（写入断点用于判断是否同一批次）
+            resume (bool): 是否从断点继续，同一批次已完成时直接返回上次的结果
+
+        返回:
+            dict: 断点状态，包含keys-处理key数, chunks-块数, counts-各项计数合计,
+                  elapsed-累计耗时(秒), keys_per_second-吞吐量, max_chunk_seconds-最慢一块的耗时
+        """
+        state = self._initial_state(list(args), resume)
+        if state["finished"]:
+            logger.info(f"批处理已完成，跳过: {self.name} {state['args']}")
+            return state
+        if state["chunks"]:
+            logger.info(f"批处理从断点继续: {self.name} last_key={state['last_key']} keys={state['keys']}")
+
+        started = time.perf_counter()
+        elapsed_before = state["elapsed"]
+        last_progress = started
+        # 按提交顺序排队的(本块最后一个key, key数, 提交时间, future)
+        pending: Deque[Tuple[int, int, float, Future]] = deque()
+        cursor = state["last_key"]
+        exhausted = False
+        error: Optional[BaseException] = None
+
+        executor = self._create_executor()
+        try:
+            while pending or not exhausted:
+                # 保持最多workers*2块在处理中，主进程取key与工作进程处理重叠
+                while not exhausted and error is None and len(pending) < self.workers * 2:
+                    keys = list(fetch_keys(cursor, self.chunk_size))
+                    if not keys:
+                        exhausted = True
+                        break
+                    cursor = keys[-1]
+                    pending.append((cursor, len(keys), time.perf_counter(), executor.submit(self.process, keys, *args)))
+                if not pending:
+                    break
+
+                # 等最早提交的一块完成，断点只前进到连续完成的位置
+                last_key, count, submitted, future = pending.popleft()
+                try:
+                    counts = future.result()
+                except BaseException as e:
+                    error = error or e
+                    exhausted = True
+                    continue
+                if error is not None:
+                    continue
+                state["last_key"] = last_key
+                state["chunks"] += 1
+                state["keys"] += count
+                for key, value in (counts or {}).items():
+                    state["counts"][key] = state["counts"].get(key, 0) + value
+                state["max_chunk_seconds"] = max(state["max_chunk_seconds"], round(time.perf_counter() - submitted, 3))
+                self._update_metrics(state, elapsed_before + time.perf_counter() - started)
+                if self.checkpoint:
+                    self.checkpoint.save(state)
+
+                now = time.perf_counter()
+                if now - last_progress >= self.progress_interval:
+                    last_progress = now
+                    logger.info(
+                        f"批处理进度: {self.name} keys={state['keys']} last_key={state['last_key']} "
+                        f"{state['keys_per_second']}/s"
+                    )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=error is not None)
+
+        if error is not None:
+            logger.error(f"批处理中断: {self.name} last_key={state['last_key']} - {error}")
+            raise error
+        state["finished"] = True
+        self._update_metrics(state, elapsed_before + time.perf_counter() - started)
+        if self.checkpoint:
+            self.checkpoint.save(state)
+        logger.info(f"批处理完成: {self.name} {state['args']} {self.summary(state)}")
+        return state
+
+    @staticmethod
+    def _update_metrics(state: Dict[str, Any], elapsed: float) -> None:
+        state["elapsed"] = round(elapsed, 3)
+        state["keys_per_second"] = round(state["keys"] / elapsed, 1) if elapsed > 0 else 0.0
+        state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+
+    @staticmethod
+    def summary(state: Dict[str, Any]) -> Dict[str, Any]:
+        """断点状态中用于日志和监控的部分"""
+        return {
+            key: state.get(key)
+            for key in ("keys", "chunks", "counts", "elapsed", "keys_per_second", "max_chunk_seconds")
+        }
@@ -0,0 +1,140 @@
+"""
+验证码存储模块 - 带自动过期的验证码存储，校验与消费为一步原子操作
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class CodeStore:
+    """验证码存储接口"""
+
+    async def save(self, phone: str, type: int, code: str, ttl: int) -> None:
+        """保存验证码，同一手机号同一类型的旧验证码会被覆盖"""
+        raise NotImplementedError
+
+    async def consume(self, phone: str, type: int, code: str) -> bool:
+        """校验验证码，匹配则立即删除并返回True（原子操作）"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCodeStore(CodeStore):
+    """
+    进程内验证码存储
+
+    只在当前进程内有效，适用于单worker开发环境和测试；
+    多worker部署时验证码可能落在不同进程，应使用RedisCodeStore。
+    """
+
+    SWEEP_INTERVAL = 256  # 每保存多少次清理一次过期验证码
+
+    def __init__(self, timer: Callable[[], float] = time.monotonic):
+        self._timer = timer
+        self._codes: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._saves = 0
+
+    async def save(self, phone: str, type: int, code: str, ttl: int) -> None:
+        now = self._timer()
+        with self._lock:
+            self._codes[(phone, int(type))] = (code, now + ttl)
+            self._saves += 1
+            if self._saves % self.SWEEP_INTERVAL == 0:
+                self._sweep(now)
+
+    async def consume(self, phone: str, type: int, code: str) -> bool:
+        key = (phone, int(type))
+        with self._lock:
+            item = self._codes.get(key)
+            if item is None:
+                return False
+            saved_code, expire_at = item
+            if expire_at <= self._timer():
+                del self._codes[key]
+                return False
+            if saved_code != code:
+                return False
+            del self._codes[key]
+            return True
+
+    def _sweep(self, now: float) -> None:
+        expired = [key for key, (_, expire_at) in self._codes.items() if expire_at <= now]
+        for key in expired:
+            del self._codes[key]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+
+# 比较并删除：验证码匹配时删除key，整个过程在Redis中原子执行
+_CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+class RedisCodeStore(CodeStore):
+    """基于Redis协议的验证码存储，过期由Redis的EX负责，多worker共享"""
+
+    def __init__(self, client, prefix: str = "sms_code"):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            prefix (str): key前缀
+        """
+        self._client = client
+        self._prefix = prefix
+        self._consume_script = client.register_script(_CONSUME_SCRIPT)
+
+    def _key(self, phone: str, type: int) -> str:
+        return f"{self._prefix}:{int(type)}:{phone}"
+
+    async def save(self, phone: str, type: int, code: str, ttl: int) -> None:
+        await self._client.set(self._key(phone, type), code, ex=ttl)
+
+    async def consume(self, phone: str, type: int, code: str) -> bool:
+        result = await self._consume_script(keys=[self._key(phone, type)], args=[code])
+        return int(result) == 1
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+_code_store: Optional[CodeStore] = None
+
+
+def get_code_store() -> CodeStore:
+    """根据CODE_STORE_BACKEND配置获取验证码存储（进程内单例）"""
+    global _code_store
+    if _code_store is None:
+        backend = settings.CODE_STORE_BACKEND
+        if backend == "memory":
+            _code_store = MemoryCodeStore()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            _code_store = RedisCodeStore(aioredis.from_url(settings.REDIS_URL, decode_responses=True))
+        else:
+            raise ValueError(f"不支持的验证码存储类型: {backend}")
+    return _code_store
+
+
+def set_code_store(store: Optional[CodeStore]) -> None:
+    """替换验证码存储（测试用）"""
+    global _code_store
+    _code_store = store
+
+
+async def close_code_store() -> None:
+    """关闭验证码存储连接"""
+    global _code_store
+    if _code_store is not None:
+        await _code_store.close()
+        _code_store = None
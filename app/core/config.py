@@ -13,6 +13,12 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
     
+    # 密码哈希配置
+    BCRYPT_ROUNDS: int = 12  # 修改后旧密码会在用户下次登录时自动重新哈希
+    HASH_EXECUTOR: str = "process"  # process-独立进程池, thread-线程池, inline-当前线程(仅测试)
+    HASH_WORKERS: int = 2  # 每个worker进程并发执行的哈希数
+    HASH_MAX_PENDING: int = 64  # 排队上限，超出返回503
+    
     # 数据库配置
     MYSQL_HOST: str = "localhost"
     MYSQL_PORT: str = "3306"
@@ -20,6 +26,14 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str = "your-db-password-here"
     MYSQL_DATABASE: str = "health777"
     
+    # 数据库连接池配置（每个worker进程各自一套连接池）
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # 等待可用连接的超时时间(秒)
+    DB_POOL_RECYCLE: int = 3600  # 连接最长使用时间(秒)，需小于MySQL的wait_timeout
+    DB_POOL_PING_STRATEGY: str = "idle"  # always-每次检出都ping, idle-空闲超时后才ping, none-仅依赖recycle
+    DB_POOL_PING_IDLE_SECONDS: int = 30
+    
     # 短信服务配置
     SMS_ACCESS_KEY_ID: Optional[str] = ""
     SMS_ACCESS_KEY_SECRET: Optional[str] = ""
@@ -27,6 +41,124 @@ class Settings(BaseSettings):
     SMS_TEMPLATE_CODE: Optional[str] = "SMS_154950909"
     SMS_ENDPOINT: str = "dysmsapi.aliyuncs.com"
     SMS_REGION_ID: str = "cn-hangzhou"
+    SMS_QUEUE_SIZE: int = 1000  # 待发送短信队列容量
+    SMS_WORKERS: int = 4  # 每个进程的发送worker数
+    SMS_MAX_RETRIES: int = 3
+    SMS_RETRY_BACKOFF: float = 0.5  # 首次重试等待(秒)，指数增长
+    SMS_RETRY_BACKOFF_MAX: float = 10.0
+    SMS_SEND_TIMEOUT: float = 10.0
+    
+    # 验证码配置
+    SMS_CODE_EXPIRE_SECONDS: int = 300  # 验证码有效期(秒)
+    CODE_STORE_BACKEND: str = "redis"  # redis-多worker共享, memory-仅限单进程(开发/测试)
+    SMS_CODE_AUDIT_DB: bool = False  # 是否同时写入verification_codes表用于审计
+    
+    # Redis配置
+    REDIS_URL: str = "redis://localhost:6379/0"
+    
+    # 限流配置，规则格式为"次数/秒数"，多条规则用逗号分隔
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "redis"  # redis-多worker共享, memory-仅限当前进程
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # 部署在Nginx后时开启，使用X-Forwarded-For
+    RATE_LIMIT_SMS_PHONE: str = "1/60,10/86400"
+    RATE_LIMIT_SMS_IP: str = "20/3600"
+    RATE_LIMIT_LOGIN_PHONE: str = "10/300"
+    RATE_LIMIT_LOGIN_IP: str = "60/60"
+    RATE_LIMIT_RESET_PHONE: str = "5/3600"
+    RATE_LIMIT_RESET_IP: str = "20/3600"
+    
+    # 日志配置
+    LOG_ASYNC: bool = True  # 通过后台线程批量写日志
+    LOG_QUEUE_SIZE: int = 10000  # 日志缓冲区容量(条)
+    LOG_OVERFLOW_POLICY: str = "drop_new"  # 缓冲区满时: drop_new-丢弃新日志, drop_old-丢弃最旧日志, block-短暂阻塞
+    LOG_BLOCK_TIMEOUT: float = 0.1  # block策略最长等待时间(秒)
+    LOG_BATCH_SIZE: int = 256
+    LOG_FLUSH_INTERVAL: float = 0.5  # 最长刷新间隔(秒)
+    ACCESS_LOG_FORMAT: str = "json"  # json-每个请求一行JSON(便于统计延迟), text-原有文本格式
+    
+    # 缓存配置
+    PRINCIPAL_CACHE_TTL: int = 60  # 认证用户缓存时间(秒)
+    PRINCIPAL_CACHE_SIZE: int = 10000  # 每个worker缓存的最大用户数
+    
+    # 营养模块配置
+    FOOD_CATALOG_REFRESH_SECONDS: int = 60  # 食物目录版本检查间隔(秒)
+    NUTRITION_PROTEIN_TARGET: float = 60.0  # 默认每日蛋白质目标(g)
+    NUTRITION_CALORIES_TARGET: float = 1800.0  # 默认每日热量目标(kcal)
+    NUTRITION_RECONCILE_INTERVAL: int = 3600  # 每日汇总校对间隔(秒)，0表示不启用
+    NUTRITION_RECONCILE_DAYS: int = 2  # 每次校对最近几天的汇总
+    NUTRITION_RECOMMENDATION_BATCH_SIZE: int = 500  # 批量生成饮食建议时每页用户数
+
+    # 运动模块配置
+    EXERCISE_DAILY_TARGET: int = 1800  # 默认每日运动目标时长(秒)，周/月目标按天数累加
+
+    # 夜间批处理配置
+    NIGHTLY_BATCH_WORKERS: int = 4  # 批处理进程数
+    NIGHTLY_BATCH_CHUNK_SIZE: int = 2000  # 每块处理的用户数
+    NIGHTLY_BATCH_CHECKPOINT_DIR: str = "checkpoints"  # 断点文件目录
+    DAILY_PROTEIN_BONUS_POINTS: int = 5  # 蛋白质当日达标奖励积分
+    DAILY_EXERCISE_BONUS_POINTS: int = 5  # 运动当日达标奖励积分
+
+    # 积分排行榜配置
+    LEADERBOARD_BACKEND: str = "redis"  # redis-多worker共享, memory-仅限单进程(开发/测试)
+    LEADERBOARD_REBUILD_PAGE_SIZE: int = 5000  # 从数据库重建时每页读取的用户数
+
+    # 积分账本配置
+    POINTS_FLUSH_INTERVAL: float = 1.0  # 积分事件合并写库的最长间隔(秒)，即积分到账的最大延迟
+    POINTS_BATCH_SIZE: int = 500  # 每批写入的最大事件数，攒满时立即写入
+    POINTS_MAX_PENDING: int = 10000  # 缓冲事件数上限，超出时登记积分需等待写库
+    POINTS_MEAL_RECORD: int = 2  # 记录一餐饮食
+    POINTS_EXERCISE_RECORD: int = 5  # 完成一次运动
+    POINTS_SUPPLEMENT_RECORD: int = 1  # 记录一次蛋白补充剂
+    POINTS_COMMUNITY_ACTION: int = 1  # 社区发帖、评论等
+
+    # 社区配置
+    FEED_PAGE_SIZE: int = 20  # 信息流默认每页条数
+    FEED_CACHE_TTL: float = 10.0  # 信息流头部缓存时间(秒)，即其他worker新帖的最大可见延迟
+    FEED_CACHE_SIZE: int = 1000  # 每个worker最多缓存的信息流个数(话题×排序方式)
+    FEED_CACHE_HEAD_SIZE: int = 100  # 每个信息流缓存的条目数，前几页直接从内存返回
+    FEED_HOT_HALF_LIFE_HOURS: float = 12.0  # 热度半衰期(小时)
+    FEED_HOT_LIKE_WEIGHT: float = 1.0  # 热度中每个点赞的权重
+    FEED_HOT_COMMENT_WEIGHT: float = 2.0  # 每条评论的权重
+    FEED_HOT_VIEW_WEIGHT: float = 0.05  # 每次浏览的权重
+
+    # 计数器缓冲配置（浏览数、点赞数、话题帖子数）
+    COUNTER_BACKEND: str = "redis"  # redis-多worker共享且worker退出不丢失, memory-每个worker各自缓冲
+    COUNTER_FLUSH_INTERVAL: float = 5.0  # 合并写库间隔(秒)，也是memory模式下异常退出最多丢失的时长
+    COUNTER_MAX_PENDING: int = 10000  # 本worker累计多少次增量时提前写库
+    COUNTER_FLUSH_BATCH_SIZE: int = 500  # 每条UPDATE语句更新的最大行数
+
+    # 医患消息配置
+    IM_BACKEND: str = "redis"  # redis-多worker转发、在线状态和消息ID共享, memory-仅限单进程(开发/测试)
+    IM_BROKER_CHANNEL: str = "im:events"  # Redis发布订阅频道
+    IM_SEND_QUEUE_SIZE: int = 100  # 每个连接待发送的事件上限，写满时断开慢连接
+    IM_FLUSH_INTERVAL: float = 0.2  # 消息合并写库的最长间隔(秒)
+    IM_BATCH_SIZE: int = 500  # 每批写入的最大消息数，攒满时立即写入
+    IM_MAX_PENDING: int = 10000  # 未写库消息上限，超出且写库失败时拒绝发送(MessagingError)
+    IM_CONVERSATION_CACHE_SIZE: int = 10000  # 每个worker缓存的会话数
+    IM_INBOX_TTL: int = 7 * 86400  # 会话列表缓存无更新后的保留时间(秒)，过期后从数据库重新加载
+
+    # 食物图片识别配置
+    RECOGNIZER: str = "aliyun"  # aliyun-阿里云食物识别, fake-本地假识别器(开发/测试/压测)
+    RECOGNITION_FAKE_DELAY: float = 0.0  # 假识别器模拟的识别耗时(秒)
+    RECOGNITION_STORE_BACKEND: str = "redis"  # redis-多worker共享, memory-仅限单进程(开发/测试)
+    RECOGNITION_WORKERS: int = 4  # 每个进程同时调用识别服务的并发数
+    RECOGNITION_QUEUE_SIZE: int = 50  # 等待识别的图片数上限，超出返回503
+    RECOGNITION_TIMEOUT: float = 15.0  # 单次识别超时时间(秒)
+    RECOGNITION_JOB_TTL: int = 3600  # 识别任务保存时间(秒)
+    RECOGNITION_RESULT_TTL: int = 7 * 86400  # 相同图片的识别结果缓存时间(秒)
+    RECOGNITION_MAX_IMAGE_BYTES: int = 5 * 1024 * 1024  # 上传图片大小上限
+    RECOGNITION_MAX_WAIT: float = 20.0  # 长轮询最长等待时间(秒)
+
+    # 媒体上传配置
+    MEDIA_STORAGE_BACKEND: str = "local"  # local-本地目录(生产环境由Nginx提供访问)
+    MEDIA_ROOT: str = "media"  # 本地存储根目录
+    MEDIA_URL: str = "/media"  # 访问地址前缀
+    MEDIA_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024  # 上传图片大小上限
+    MEDIA_CHUNK_SIZE: int = 256 * 1024  # 每次写入磁盘的块大小，即每个上传的内存占用上限
+    MEDIA_THUMBNAIL_SIZE: int = 320  # 缩略图最长边(像素)
+    MEDIA_THUMBNAIL_EXECUTOR: str = "process"  # process-独立进程池, thread-线程池, inline-当前线程(仅测试)
+    MEDIA_THUMBNAIL_WORKERS: int = 2  # 每个worker进程并发生成的缩略图数
+    MEDIA_THUMBNAIL_MAX_PENDING: int = 100  # 排队上限，超出时跳过生成
     
     # 阿里云配置
     ALIYUN_ACCESS_KEY_ID: Optional[str] = None
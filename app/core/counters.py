@@ -0,0 +1,512 @@
+"""
+计数器缓冲模块 - 浏览数、点赞数、帖子数等冗余计数先在缓冲中累加，定时合并写库
+
+每次浏览/点赞都执行 UPDATE ... SET x = x + 1 会让热门帖子的行锁成为热点；
+这里把增量按(计数器, 行ID)累加，定时对每个计数器执行一条
+    UPDATE t SET x = x + CASE id WHEN ... END WHERE id IN (...)
+把N次单行更新合并成一次批量更新。读取时把尚未写库的增量合并到结果中。
+
+丢失上限:
+    memory - 增量在本worker内存中，进程异常退出最多丢失一个写入间隔内、
+             且不超过max_pending次的增量（累计达到max_pending次时提前写库）
+    redis  - 增量保存在Redis中，worker退出不丢失；写库与清除增量之间进程退出时，
+             下次会重复写入这一批（至多一批）
+
+重复写入: redis模式下写库锁过期后其他worker会接手同一批增量。写库事务提交前先确认仍持有锁
+并续期（hold），锁已失效则回滚事务、放弃本次写库；清除增量时比较锁的持有者（compare-and-delete），
+不会删掉其他worker接手的增量。续期后仍需在lock_ttl内完成提交，否则这一批可能被重复写入。
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, select, update
+
+from app.core.config import settings
+from app.core.feed import hot_score
+from app.core.logger import get_logger
+from app.models.exercise import ExerciseVideo
+from app.models.social import Post, Topic
+
+logger = get_logger("health777.counters")
+
+POST_VIEWS = "post_views"
+POST_LIKES = "post_likes"
+POST_COMMENTS = "post_comments"
+VIDEO_VIEWS = "video_views"
+TOPIC_POSTS = "topic_posts"
+
+# 计数器名 -> (模型, 计数列名)
+COUNTERS = {
+    POST_VIEWS: (Post, "view_count"),
+    POST_LIKES: (Post, "like_count"),
+    POST_COMMENTS: (Post, "comment_count"),
+    VIDEO_VIEWS: (ExerciseVideo, "view_count"),
+    TOPIC_POSTS: (Topic, "post_count"),
+}
+
+# 影响帖子热度的计数器，写库后重算这些帖子的hot_score
+HOT_COUNTERS = (POST_VIEWS, POST_LIKES, POST_COMMENTS)
+
+# {计数器名: {行ID: 增量}}
+Deltas = Dict[str, Dict[int, int]]
+
+
+class CounterStore:
+    """计数增量存储接口"""
+
+    async def incr(self, name: str, key: int, delta: int) -> None:
+        raise NotImplementedError
+
+    async def pending(self, name: str, keys: Iterable[int]) -> Dict[int, int]:
+        """读取尚未写库的增量（含正在写库的一批）"""
+        raise NotImplementedError
+
+    async def take(self) -> Deltas:
+        """取出待写库的增量；上次写库失败的一批会合并在内。返回空表示没有增量或其他worker正在写库"""
+        raise NotImplementedError
+
+    async def hold(self) -> bool:
+        """写库事务提交前调用：确认取出的增量仍归本worker并延长持有时间，返回False时应放弃本次写库"""
+        raise NotImplementedError
+
+    async def commit(self) -> None:
+        """写库成功，清除取出的增量"""
+        raise NotImplementedError
+
+    async def rollback(self) -> None:
+        """写库失败，取出的增量保留到下次重试"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCounterStore(CounterStore):
+    """进程内增量，每个worker各自写库"""
+
+    def __init__(self):
+        self._pending: Deltas = defaultdict(lambda: defaultdict(int))
+        self._inflight: Deltas = {}
+
+    async def incr(self, name: str, key: int, delta: int) -> None:
+        self._pending[name][key] += delta
+
+    async def pending(self, name: str, keys: Iterable[int]) -> Dict[int, int]:
+        pending = self._pending.get(name, {})
+        inflight = self._inflight.get(name, {})
+        result = {}
+        for key in keys:
+            delta = pending.get(key, 0) + inflight.get(key, 0)
+            if delta:
+                result[key] = delta
+        return result
+
+    async def take(self) -> Deltas:
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        for name, values in pending.items():
+            merged = self._inflight.setdefault(name, {})
+            for key, delta in values.items():
+                merged[key] = merged.get(key, 0) + delta
+        return {
+            name: {key: delta for key, delta in values.items() if delta}
+            for name, values in self._inflight.items()
+        }
+
+    async def hold(self) -> bool:
+        return True
+
+    async def commit(self) -> None:
+        self._inflight = {}
+
+    async def rollback(self) -> None:
+        pass
+
+
+# 比较并续期：锁仍由本worker持有时重置过期时间
+# KEYS: 锁  ARGV: 持有者, 过期时间(秒)
+_HOLD_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# 比较并删除：锁仍由本worker持有时删除取出的增量和锁
+# KEYS: 锁, 取出的inflight...  ARGV: 持有者
+_COMMIT_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', unpack(KEYS))
+return 1
+"""
+
+
+class RedisCounterStore(CounterStore):
+    """
+    基于Redis哈希的增量，多worker共享
+
+    增量HINCRBY到pending哈希；写库时持锁把pending RENAME为inflight（原子，不会丢失并发的增量），
+    写库成功后删除inflight。上次的inflight还在（写库失败或进程退出）时先重试它。
+    续期和删除都比较锁的持有者，锁过期被其他worker接手后本worker不再写库或删除。
+    """
+
+    def __init__(self, client, prefix: str = "counters", lock_ttl: int = 60):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            prefix (str): key前缀
+            lock_ttl (int): 写库锁的过期时间(秒)，持锁worker异常退出后由其他worker接手
+        """
+        self._client = client
+        self._prefix = prefix
+        self._lock_ttl = lock_ttl
+        self._token: Optional[str] = None
+        self._taken: List[str] = []
+        self._hold_script = client.register_script(_HOLD_SCRIPT)
+        self._commit_script = client.register_script(_COMMIT_SCRIPT)
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self._prefix}:{kind}:{name}"
+
+    async def incr(self, name: str, key: int, delta: int) -> None:
+        await self._client.hincrby(self._key("pending", name), key, delta)
+
+    async def pending(self, name: str, keys: Iterable[int]) -> Dict[int, int]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.hmget(self._key("pending", name), keys)
+            pipe.hmget(self._key("inflight", name), keys)
+            pending, inflight = await pipe.execute()
+        result = {}
+        for key, a, b in zip(keys, pending, inflight):
+            delta = int(a or 0) + int(b or 0)
+            if delta:
+                result[key] = delta
+        return result
+
+    async def take(self) -> Deltas:
+        token = uuid.uuid4().hex
+        if not await self._client.set(f"{self._prefix}:lock", token, nx=True, ex=self._lock_ttl):
+            return {}
+        self._token = token
+        self._taken = []
+        deltas: Deltas = {}
+        for name in COUNTERS:
+            inflight = self._key("inflight", name)
+            if not await self._client.exists(inflight):
+                pending = self._key("pending", name)
+                # 持锁期间只有本worker会改名，exists之后pending不会消失
+                if not await self._client.exists(pending):
+                    continue
+                await self._client.rename(pending, inflight)
+            values = await self._client.hgetall(inflight)
+            self._taken.append(inflight)
+            values = {int(key): int(delta) for key, delta in values.items() if int(delta)}
+            if values:
+                deltas[name] = values
+        if not deltas:
+            await self._release()
+        return deltas
+
+    async def hold(self) -> bool:
+        if self._token is None:
+            return False
+        return bool(await self._hold_script(keys=[f"{self._prefix}:lock"], args=[self._token, self._lock_ttl]))
+
+    async def commit(self) -> None:
+        if self._token is None:
+            return
+        if not await self._commit_script(keys=[f"{self._prefix}:lock", *self._taken], args=[self._token]):
+            logger.warning("计数器写库锁已被其他worker接手，未清除本次取出的增量")
+        self._taken = []
+        self._token = None
+
+    async def rollback(self) -> None:
+        self._taken = []
+        await self._release()
+
+    async def _release(self) -> None:
+        if self._token is None:
+            return
+        lock = f"{self._prefix}:lock"
+        if await self._client.get(lock) == self._token:
+            await self._client.delete(lock)
+        self._token = None
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class Counters:
+    """
+    计数器缓冲
+
+    incr只累加到存储中，后台协程每flush_interval秒（或本worker累计max_pending次增量时）
+    批量写库，写库后重算受影响帖子的热度分数。
+    """
+
+    def __init__(
+        self,
+        store: CounterStore,
+        session_factory: Callable[[], Any],
+        flush_interval: float = 5.0,
+        max_pending: int = 10000,
+        batch_size: int = 500
+    ):
+        """
+        参数:
+            store (CounterStore): 增量存储
+            session_factory: 异步会话工厂，如AsyncSessionLocal
+            flush_interval (float): 写库间隔(秒)
+            max_pending (int): 本worker累计多少次增量时提前写库
+            batch_size (int): 每条UPDATE语句更新的最大行数
+        """
+        self.store = store
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._unflushed = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.increments = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rows = 0
+        self.failures = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """启动后台写库协程"""
+        if self.running:
+            return
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop(), name="counters")
+        logger.info(f"计数器缓冲已启动: flush_interval={self.flush_interval}s")
+
+    async def stop(self) -> None:
+        """停止后台协程，并写入剩余增量"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"关闭时计数写库失败: {e}")
+
+    async def incr(self, name: str, key: int, delta: int = 1) -> bool:
+        """
+        累加计数，需在事件循环线程中调用
+
+        返回:
+            bool: 是否记录；未启动时返回False
+        """
+        if name not in COUNTERS:
+            raise KeyError(name)
+        if not self.running:
+            self._incr("dropped")
+            return False
+        await self.store.incr(name, key, delta)
+        self._incr("increments")
+        self._unflushed += 1
+        if self._unflushed >= self.max_pending:
+            self._wakeup.set()
+        return True
+
+    async def pending(self, name: str, keys: Iterable[int]) -> Dict[int, int]:
+        """读取尚未写库的增量"""
+        if not self.running:
+            return {}
+        return await self.store.pending(name, keys)
+
+    async def merge(self, items: List[Dict[str, Any]], fields: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        把尚未写库的增量合并到读取结果中（返回新的dict，不修改可能来自缓存的原对象）
+
+        参数:
+            items: 含id字段的条目
+            fields: {计数器名: 条目中的字段名}
+        """
+        if not items or not self.running:
+            return items
+        ids = [item["id"] for item in items]
+        pending = {name: await self.store.pending(name, ids) for name in fields}
+        if not any(pending.values()):
+            return items
+        merged = []
+        for item in items:
+            deltas = {field: pending[name].get(item["id"], 0) for name, field in fields.items()}
+            if any(deltas.values()):
+                item = dict(item)
+                for field, delta in deltas.items():
+                    item[field] = max(item[field] + delta, 0)
+            merged.append(item)
+        return merged
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:  # 增量保留在存储中，下个周期重试
+                logger.error(f"计数写库失败: {e}")
+
+    async def flush(self) -> int:
+        """
+        立即把增量写库
+
+        返回:
+            int: 更新的行数
+        """
+        if self._flush_lock is None:
+            return 0
+        async with self._flush_lock:
+            self._unflushed = 0
+            deltas = await self.store.take()
+            if not deltas:
+                return 0
+            start = time.perf_counter()
+            try:
+                rows = await self._write(deltas)
+            except Exception:
+                await self.store.rollback()
+                self._incr("failures")
+                raise
+            if rows is None:
+                await self.store.rollback()
+                self._incr("failures")
+                return 0
+            await self.store.commit()
+        with self._lock:
+            self.flushes += 1
+            self.rows += rows
+            self.last_flush_seconds = time.perf_counter() - start
+        return rows
+
+    async def _write(self, deltas: Deltas) -> Optional[int]:
+        """一个事务写入全部增量，每个计数器每batch_size行一条UPDATE；增量已被其他worker接手时回滚并返回None"""
+        rows = 0
+        async with self.session_factory() as db:
+            for name, values in deltas.items():
+                model, field = COUNTERS[name]
+                table = model.__table__
+                items = sorted(values.items())  # 按主键顺序加锁，避免多个worker间死锁
+                for i in range(0, len(items), self.batch_size):
+                    chunk = dict(items[i:i + self.batch_size])
+                    value = table.c[field] + case(chunk, value=table.c.id)
+                    await db.execute(
+                        update(table)
+                        .where(table.c.id.in_(list(chunk)))
+                        .values({field: case((value < 0, 0), else_=value)})
+                    )
+                    rows += len(chunk)
+            post_ids = sorted({key for name in HOT_COUNTERS for key in deltas.get(name, {})})
+            for i in range(0, len(post_ids), self.batch_size):
+                await self._refresh_hot_scores(db, post_ids[i:i + self.batch_size])
+            if not await self.store.hold():
+                # 写库超过了锁的有效期，这一批由接手的worker写入，提交会重复计数
+                await db.rollback()
+                logger.warning(f"计数器写库锁已过期，放弃本次写库({rows}行)")
+                return None
+            await db.commit()
+        return rows
+
+    @staticmethod
+    async def _refresh_hot_scores(db, post_ids: List[int]) -> None:
+        """按最新互动数重算帖子热度（一次读取、一条UPDATE）"""
+        result = await db.execute(
+            select(Post.id, Post.like_count, Post.comment_count, Post.view_count, Post.created_at)
+            .where(Post.id.in_(post_ids))
+        )
+        scores = {
+            post_id: hot_score(likes, comments, views, created_at)
+            for post_id, likes, comments, views, created_at in result.all()
+        }
+        if scores:
+            table = Post.__table__
+            await db.execute(
+                update(table).where(table.c.id.in_(list(scores))).values(hot_score=case(scores, value=table.c.id))
+            )
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回计数器统计"""
+        with self._lock:
+            return {
+                "increments": self.increments,
+                "dropped": self.dropped,
+                "unflushed": self._unflushed,
+                "flushes": self.flushes,
+                "rows": self.rows,
+                "failures": self.failures,
+                "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            }
+
+
+_counters: Optional[Counters] = None
+
+
+def get_counters() -> Counters:
+    """根据COUNTER_BACKEND配置获取计数器缓冲（进程内单例）"""
+    global _counters
+    if _counters is None:
+        from app.db.session import AsyncSessionLocal
+
+        backend = settings.COUNTER_BACKEND
+        if backend == "memory":
+            store: CounterStore = MemoryCounterStore()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            store = RedisCounterStore(aioredis.from_url(settings.REDIS_URL, decode_responses=True))
+        else:
+            raise ValueError(f"不支持的计数器存储类型: {backend}")
+        _counters = Counters(
+            store,
+            AsyncSessionLocal,
+            flush_interval=settings.COUNTER_FLUSH_INTERVAL,
+            max_pending=settings.COUNTER_MAX_PENDING,
+            batch_size=settings.COUNTER_FLUSH_BATCH_SIZE
+        )
+    return _counters
+
+
+def set_counters(counters: Optional[Counters]) -> None:
+    """替换计数器缓冲（测试用）"""
+    global _counters
+    _counters = counters
+
+
+async def close_counters() -> None:
+    """停止计数器缓冲并关闭存储连接"""
+    global _counters
+    if _counters is not None:
+        await _counters.stop()
+        await _counters.store.close()
+        _counters = None
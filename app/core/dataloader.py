@@ -0,0 +1,91 @@
+"""
+批量加载模块 - 把一次响应中分散的按key加载合并为一次批量查询，消除N+1查询
+
+用法（一个请求一组加载器，同一会话上的加载器共用一把锁）:
+    lock = asyncio.Lock()
+    images = DataLoader(load_images, default=list, lock=lock)
+    urls = await images.load_many(post_ids)   # 一条 WHERE post_id IN (...) 查询
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+
+class DataLoader:
+    """
+    按事件循环轮次合并的批量加载器
+
+    同一轮中调用load的key合并成一次batch_fn调用（超过max_batch_size时分多次）；
+    结果按key缓存在实例中，同一请求内重复加载不再查询。实例不应跨请求复用。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        default: Callable[[], Any] = lambda: None,
+        lock: Optional[asyncio.Lock] = None,
+        max_batch_size: int = 1000
+    ):
+        """
+        参数:
+            batch_fn: 接收去重后的key列表，返回{key: 结果}的async函数
+            default: 结果中没有的key使用的默认值工厂，如list
+            lock (asyncio.Lock): 与其他加载器共用的锁（AsyncSession不能并发执行查询）
+            max_batch_size (int): 单次batch_fn的最大key数
+        """
+        self.batch_fn = batch_fn
+        self.default = default
+        self.lock = lock or asyncio.Lock()
+        self.max_batch_size = max_batch_size
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self.batches = 0
+        self.keys = 0
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        """加载一个key，返回可await的结果"""
+        future = self._cache.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._cache[key] = future
+            if not self._queue:
+                asyncio.get_running_loop().call_soon(self._schedule)
+            self._queue.append(key)
+        return future
+
+    def load_many(self, keys: Iterable[Hashable]) -> "asyncio.Future":
+        """
+        加载多个key，返回可await的结果列表（与keys顺序一致）
+
+        调用时立即登记所有key，同一轮中其他加载的key会合并到同一批。
+        """
+        return asyncio.gather(*[self.load(key) for key in keys])
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        """预先放入已知的结果"""
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def _schedule(self) -> None:
+        keys, self._queue = self._queue, []
+        for i in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._dispatch(keys[i:i + self.max_batch_size]))
+
+    async def _dispatch(self, keys: List[Hashable]) -> None:
+        try:
+            async with self.lock:
+                results = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                # 失败的key不缓存，之后可以重新加载
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.keys += len(keys)
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(results[key] if key in results else self.default())
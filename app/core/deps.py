@@ -1,13 +1,25 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import jwt
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.security import oauth2_scheme, verify_token
-from app.db.session import SessionLocal
+from app.core.security import oauth2_scheme, verify_doctor_token, verify_token
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.models.auth import User
+from app.models.medical import Doctor
+
+# 认证用户缓存：按用户ID缓存列属性快照，每个worker独立一份
+# invalidate_principal只清除本worker的缓存，其他worker中的修改（包括禁用账号）
+# 最多在PRINCIPAL_CACHE_TTL秒后生效；需要更快生效时调小PRINCIPAL_CACHE_TTL
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL
+)
 
 def get_db() -> Generator:
     """获取数据库会话"""
@@ -17,29 +29,105 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    """获取当前登录用户"""
-    credentials_exception = HTTPException(
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def invalidate_principal(user_id: int) -> None:
+    """用户信息变更后清除认证缓存"""
+    principal_cache.invalidate(int(user_id))
+
+# 不进入快照的列：凭证必须读库校验（见AuthService.change_password），也不在内存中长期保留
+_SNAPSHOT_EXCLUDED = {"password_hash"}
+
+def _snapshot_user(user: User) -> dict:
+    """提取用户列属性快照（不含密码哈希）"""
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in sa_inspect(User).column_attrs if attr.key not in _SNAPSHOT_EXCLUDED
+    }
+
+def _detached_user(snapshot: dict) -> User:
+    """根据快照重建一个已分离(detached)的用户对象"""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的认证凭证",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _token_user_id(token: str) -> int:
+    """从令牌中解析用户ID"""
     user_id = verify_token(token)
     if not user_id:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    return int(user_id)
+
+def _ensure_active(user: User) -> User:
     if user.status == 0:  # 用户被禁用
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="用户已被禁用"
         )
-    
     return user
+
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    """获取当前登录用户"""
+    user_id = _token_user_id(token)
+
+    snapshot = principal_cache.get(user_id)
+    if snapshot is not None:
+        # 重新绑定到当前会话，不产生查询
+        user = db.merge(_detached_user(snapshot), load=False)
+    else:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise _credentials_exception()
+        principal_cache.set(user_id, _snapshot_user(user))
+
+    return _ensure_active(user)
+
+async def get_async_current_user(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    """获取当前登录用户（异步会话）"""
+    user_id = _token_user_id(token)
+
+    snapshot = principal_cache.get(user_id)
+    if snapshot is not None:
+        user = await db.merge(_detached_user(snapshot), load=False)
+    else:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+        if not user:
+            raise _credentials_exception()
+        principal_cache.set(user_id, _snapshot_user(user))
+
+    return _ensure_active(user)
+
+async def get_async_current_doctor(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> Doctor:
+    """获取当前登录医生（role=doctor的令牌，见MedicalService.authenticate_doctor）"""
+    doctor_id = verify_doctor_token(token)
+    if not doctor_id:
+        raise _credentials_exception()
+    doctor = await db.get(Doctor, int(doctor_id))
+    if doctor is None:
+        raise _credentials_exception()
+    if doctor.status != 1:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="医生账号已被禁用"
+        )
+    return doctor
@@ -0,0 +1,180 @@
+"""
+社区信息流模块 - 游标分页、热度分数和信息流头部缓存
+
+分页: 按复合键(排序值, 帖子ID)做键集分页，游标为上一页最后一条的键，
+翻到第几页都是一次索引范围扫描，不会像OFFSET那样越翻越慢。
+
+热度: hot_score = log2(1 + 互动量) + 发帖时间 / 半衰期。
+等价于"互动量按半衰期指数衰减"的排序：任意时刻比较两帖的 互动量 * 2^(-帖龄/半衰期)
+与比较hot_score结果相同，而hot_score只在互动量变化时才需要重算，不用定时衰减整张表。
+
+缓存: 每个worker缓存各(话题, 排序)信息流的前若干条，前几页直接从内存返回；
+本worker发帖时立即失效，其他worker发的帖最多延迟ttl秒可见。
+"""
+import base64
+import binascii
+import json
+import math
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+LATEST = "latest"
+HOT = "hot"
+FEED_SORTS = (LATEST, HOT)
+
+# 热度分数的时间零点，使分数保持在较小的数值范围
+HOT_EPOCH = datetime(2024, 1, 1)
+
+# (排序值, 帖子ID)，排序值为发帖时间的ISO字符串或热度分数
+FeedKey = Tuple[Any, int]
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析"""
+
+
+def engagement(like_count: int, comment_count: int, view_count: int) -> float:
+    """互动量：点赞、评论、浏览按权重合计"""
+    return (
+        like_count * settings.FEED_HOT_LIKE_WEIGHT
+        + comment_count * settings.FEED_HOT_COMMENT_WEIGHT
+        + view_count * settings.FEED_HOT_VIEW_WEIGHT
+    )
+
+
+def hot_score(like_count: int, comment_count: int, view_count: int, created_at: datetime) -> float:
+    """计算热度分数，互动量每翻一倍相当于晚发一个半衰期"""
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return round(
+        math.log2(1 + engagement(like_count, comment_count, view_count))
+        + age / (settings.FEED_HOT_HALF_LIFE_HOURS * 3600),
+        6
+    )
+
+
+def encode_cursor(key: FeedKey) -> str:
+    """把复合键编码为不透明的游标字符串"""
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> FeedKey:
+    """解析游标，返回可用于查询的复合键"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, post_id = json.loads(raw)
+        if sort == LATEST:
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, (int, float)):
+            raise TypeError(value)
+        if not isinstance(post_id, int):
+            raise TypeError(post_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError(cursor) from e
+    return value, post_id
+
+
+def feed_key(item: Dict[str, Any], sort: str) -> FeedKey:
+    """信息流条目的复合键（游标中的时间用ISO字符串保存）"""
+    if sort == LATEST:
+        return item["created_at"].isoformat(), item["id"]
+    return item["hot_score"], item["id"]
+
+
+def _position(value: Any, post_id: int) -> Tuple[float, int]:
+    """降序复合键转为升序可比较的数值，供二分查找"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = (value - HOT_EPOCH).total_seconds()
+    return -value, -post_id
+
+
+class FeedHead:
+    """某个(话题, 排序)信息流的前若干条（只读快照）"""
+
+    __slots__ = ("items", "positions", "complete", "pinned")
+
+    def __init__(
+        self, items: List[Dict[str, Any]], sort: str, complete: bool, pinned: Sequence[Dict[str, Any]] = ()
+    ):
+        """
+        参数:
+            items: 按排序键降序排列的条目
+            sort (str): 排序方式
+            complete (bool): 信息流是否已全部在items中（条目数少于缓存上限）
+            pinned: 置顶条目，随第一页返回
+        """
+        self.items = items
+        self.positions = [_position(*feed_key(item, sort)) for item in items]
+        self.complete = complete
+        self.pinned = list(pinned)
+
+    def page(self, after: Optional[FeedKey], limit: int) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """
+        从头部缓存中取一页
+
+        返回:
+            (条目列表, 是否还有下一页)；所需范围超出缓存时返回None，由调用方查库
+        """
+        start = 0 if after is None else bisect_right(self.positions, _position(*after))
+        end = start + limit
+        if end <= len(self.items):
+            return self.items[start:end], end < len(self.items) or not self.complete
+        if self.complete:
+            return self.items[start:], False
+        return None
+
+
+class FeedCache:
+    """信息流头部缓存，每个worker一份"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 10.0, head_size: int = 100):
+        """
+        参数:
+            maxsize (int): 最多缓存的信息流个数
+            ttl (float): 缓存时间(秒)，即其他worker新帖的最大可见延迟
+            head_size (int): 每个信息流缓存的条目数
+        """
+        self.head_size = head_size
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, topic_id: Optional[int], sort: str) -> Optional[FeedHead]:
+        return self._cache.get((topic_id, sort))
+
+    def set(self, topic_id: Optional[int], sort: str, head: FeedHead) -> None:
+        self._cache.set((topic_id, sort), head)
+
+    def invalidate(self, topic_id: Optional[int]) -> None:
+        """发帖/删帖后失效该话题和全站信息流"""
+        for sort in FEED_SORTS:
+            self._cache.invalidate((topic_id, sort))
+            self._cache.invalidate((None, sort))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+_feed_cache: Optional[FeedCache] = None
+
+
+def get_feed_cache() -> FeedCache:
+    """获取进程内的信息流缓存"""
+    global _feed_cache
+    if _feed_cache is None:
+        _feed_cache = FeedCache(
+            maxsize=settings.FEED_CACHE_SIZE,
+            ttl=settings.FEED_CACHE_TTL,
+            head_size=settings.FEED_CACHE_HEAD_SIZE
+        )
+    return _feed_cache
+
+
+def set_feed_cache(cache: Optional[FeedCache]) -> None:
+    """替换信息流缓存（测试用）"""
+    global _feed_cache
+    _feed_cache = cache
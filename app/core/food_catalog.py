@@ -0,0 +1,198 @@
+"""
+食物营养目录模块 - 每个worker常驻一份按ID排序的营养数组，批量计算餐食营养
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.models.nutrition import FoodItem
+
+logger = get_logger("health777.food_catalog")
+
+# 营养素列顺序，数值均为每100g含量，数据库中为NULL的按0处理
+NUTRIENTS = ("protein", "calories", "fat", "carbs", "fiber")
+_COLUMNS = [getattr(FoodItem, f"{name}_per_100g") for name in NUTRIENTS]
+
+
+class UnknownFoodError(KeyError):
+    """食物ID不在目录中"""
+
+    def __init__(self, food_ids: Sequence[int]):
+        super().__init__(food_ids)
+        self.food_ids = list(food_ids)
+
+
+class CatalogSnapshot:
+    """
+    目录快照（只读）
+
+    刷新时整体替换快照对象，读取方无需加锁。
+    """
+
+    __slots__ = ("ids", "values", "names", "categories", "version")
+
+    def __init__(self, rows: Iterable[Sequence[Any]], version: Any = None):
+        """
+        参数:
+            rows: (id, name, category, protein, calories, fat, carbs, fiber) 元组
+            version: 数据版本标识
+        """
+        rows = sorted(rows, key=lambda row: row[0])
+        self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        self.values = np.array(
+            [[float(v) if v is not None else 0.0 for v in row[3:8]] for row in rows],
+            dtype=np.float64
+        ).reshape(len(rows), len(NUTRIENTS))
+        self.names = [row[1] for row in rows]
+        self.categories = [row[2] for row in rows]
+        self.version = version
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, food_ids: Sequence[int]) -> np.ndarray:
+        """
+        二分查找食物ID在数组中的位置
+
+        异常:
+            UnknownFoodError: 存在目录中没有的ID
+        """
+        query = np.asarray(food_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, query)
+        pos_clipped = np.minimum(pos, max(len(self.ids) - 1, 0))
+        if len(self.ids) == 0:
+            found = np.zeros(len(query), dtype=bool)
+        else:
+            found = (pos < len(self.ids)) & (self.ids[pos_clipped] == query)
+        if not found.all():
+            raise UnknownFoodError(sorted(set(query[~found].tolist())))
+        return pos
+
+    def compute(self, food_ids: Sequence[int], grams: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计算每行食物的营养含量和合计
+
+        参数:
+            food_ids: 食物ID
+            grams: 对应的食用量(g)
+
+        返回:
+            (每行营养矩阵 shape=(n, 5), 合计 shape=(5,))，列顺序见NUTRIENTS
+        """
+        if len(food_ids) != len(grams):
+            raise ValueError("food_ids与grams长度不一致")
+        pos = self.positions(food_ids)
+        lines = self.values[pos] * (np.asarray(grams, dtype=np.float64)[:, None] / 100.0)
+        return lines, lines.sum(axis=0)
+
+    def get(self, food_id: int) -> Optional[Dict[str, Any]]:
+        """按ID获取单个食物"""
+        try:
+            index = int(self.positions([food_id])[0])
+        except UnknownFoodError:
+            return None
+        item = {"id": int(self.ids[index]), "name": self.names[index], "category": self.categories[index]}
+        item.update({f"{name}_per_100g": float(v) for name, v in zip(NUTRIENTS, self.values[index])})
+        return item
+
+
+class FoodCatalog:
+    """
+    食物营养目录
+
+    首次使用时整表加载；之后每隔refresh_interval秒用一条聚合查询(行数+最大更新时间)
+    检查版本，有变化才重新加载，即食物数据的修改最多refresh_interval秒后生效。
+    """
+
+    def __init__(self, refresh_interval: float = 60.0, timer: Callable[[], float] = time.monotonic):
+        """
+        参数:
+            refresh_interval (float): 版本检查间隔(秒)
+            timer (callable): 时钟函数，测试时可替换
+        """
+        self.refresh_interval = refresh_interval
+        self._timer = timer
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.loads = 0
+        self.version_checks = 0
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    def load(self, rows: Iterable[Sequence[Any]], version: Any = None) -> CatalogSnapshot:
+        """直接用给定数据构建目录（测试或批处理任务使用）"""
+        self._snapshot = CatalogSnapshot(rows, version)
+        self._checked_at = self._timer()
+        self.loads += 1
+        return self._snapshot
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and self._timer() - self._checked_at < self.refresh_interval
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        """
+        获取最新的目录快照，必要时检查版本并重新加载
+
+        参数:
+            db (AsyncSession): 数据库会话
+        """
+        if self._fresh():
+            return self._snapshot
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # 等锁期间可能已被其他请求刷新
+            if self._fresh():
+                return self._snapshot
+
+            version = await self._fetch_version(db)
+            if self._snapshot is None or version != self._snapshot.version:
+                result = await db.execute(
+                    select(FoodItem.id, FoodItem.name, FoodItem.category, *_COLUMNS)
+                )
+                self.load(result.all(), version)
+                logger.info(f"食物目录已加载: {len(self._snapshot)}条, 版本={version}")
+            else:
+                self._checked_at = self._timer()
+            return self._snapshot
+
+    async def _fetch_version(self, db: AsyncSession) -> Tuple[int, Any]:
+        self.version_checks += 1
+        result = await db.execute(select(func.count(FoodItem.id), func.max(FoodItem.updated_at)))
+        count, updated_at = result.one()
+        return int(count), updated_at
+
+    def stats(self) -> Dict[str, Any]:
+        """返回目录统计"""
+        return {
+            "size": len(self._snapshot) if self._snapshot is not None else 0,
+            "loads": self.loads,
+            "version_checks": self.version_checks,
+        }
+
+
+_catalog: Optional[FoodCatalog] = None
+
+
+def get_food_catalog() -> FoodCatalog:
+    """获取进程内的食物目录"""
+    global _catalog
+    if _catalog is None:
+        _catalog = FoodCatalog(refresh_interval=settings.FOOD_CATALOG_REFRESH_SECONDS)
+    return _catalog
+
+
+def set_food_catalog(catalog: Optional[FoodCatalog]) -> None:
+    """替换食物目录（测试用）"""
+    global _catalog
+    _catalog = catalog
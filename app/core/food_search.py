@@ -0,0 +1,263 @@
+"""
+食物搜索模块 - 食物名称的前缀、拼音、首字母和模糊搜索（进程内索引）
+"""
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.logger import get_logger
+
+logger = get_logger("health777.food_search")
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装pypinyin时只支持汉字搜索
+    lazy_pinyin = None
+    logger.warning("未安装pypinyin，食物搜索不支持拼音")
+
+# 匹配类型得分，同一食物取最高分
+SCORE_EXACT = 1.0
+SCORE_NAME_PREFIX = 0.9
+SCORE_PINYIN_PREFIX = 0.8
+SCORE_INITIALS_PREFIX = 0.7
+SCORE_SUBSTRING = 0.6
+SCORE_FUZZY = 0.5  # 乘以相似度
+
+# 模糊匹配的最低相似度(Dice系数)
+FUZZY_THRESHOLD = 0.5
+
+# 字母查询做子串和模糊匹配的最小长度
+MIN_FUZZY_LETTERS = 3
+
+# 前缀扫描的最大条目数，避免单字母查询遍历整个索引
+MAX_PREFIX_SCAN = 2000
+
+_KEY_NAME, _KEY_PINYIN, _KEY_INITIALS = 0, 1, 2
+_PREFIX_SCORES = {
+    _KEY_NAME: SCORE_NAME_PREFIX,
+    _KEY_PINYIN: SCORE_PINYIN_PREFIX,
+    _KEY_INITIALS: SCORE_INITIALS_PREFIX,
+}
+
+
+def normalize(text: str) -> str:
+    """统一全角半角和大小写，去掉空白"""
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def to_pinyin(text: str) -> Tuple[str, str]:
+    """
+    返回(全拼, 首字母)，未安装pypinyin时返回空字符串
+
+    非汉字部分原样保留，如 "ad钙奶" -> ("adgainai", "adgn")
+    """
+    if lazy_pinyin is None:
+        return "", ""
+    full = "".join(lazy_pinyin(text))
+    initials = "".join(lazy_pinyin(text, style=Style.FIRST_LETTER))
+    return full, initials
+
+
+def ngrams(text: str) -> Set[str]:
+    """生成二元组；单字文本返回其本身"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class FoodSearchIndex:
+    """
+    食物名称搜索索引
+
+    - 前缀: 名称、全拼、首字母三类key放在同一个有序列表中，二分定位后顺序扫描
+    - 子串和模糊: 名称和全拼的二元组倒排索引，按Dice相似度打分，可容忍错字和同音字
+    - 增量更新: 食物目录刷新时只对新增、删除和改名的食物更新索引
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._foods: Dict[int, Dict[str, Any]] = {}
+        self._keys: List[Tuple[str, int, int]] = []  # (key, key类型, food_id)，有序
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._chars: Dict[str, Set[int]] = defaultdict(set)  # 单个汉字 -> food_id
+        self._synced = None
+
+    def __len__(self):
+        return len(self._foods)
+
+    def __contains__(self, food_id):
+        return food_id in self._foods
+
+    def add(self, food_id: int, name: str, category: Optional[str] = None) -> None:
+        """添加或更新食物"""
+        with self._lock:
+            if food_id in self._foods:
+                self.remove(food_id)
+            norm = normalize(name)
+            full, initials = to_pinyin(norm)
+            entry = {
+                "name": name, "category": category, "norm": norm,
+                "pinyin": full, "initials": initials,
+                "name_grams": len(ngrams(norm)), "pinyin_grams": len(ngrams(full)),
+                "grams": ngrams(norm) | ngrams(full),
+            }
+            self._foods[food_id] = entry
+            for kind, key in ((_KEY_NAME, norm), (_KEY_PINYIN, full), (_KEY_INITIALS, initials)):
+                if key:
+                    bisect.insort(self._keys, (key, kind, food_id))
+            for gram in entry["grams"]:
+                self._grams[gram].add(food_id)
+            for char in set(norm):
+                self._chars[char].add(food_id)
+
+    def remove(self, food_id: int) -> None:
+        """删除食物"""
+        with self._lock:
+            entry = self._foods.pop(food_id, None)
+            if entry is None:
+                return
+            for kind, key in ((_KEY_NAME, entry["norm"]), (_KEY_PINYIN, entry["pinyin"]),
+                              (_KEY_INITIALS, entry["initials"])):
+                if key:
+                    index = bisect.bisect_left(self._keys, (key, kind, food_id))
+                    if index < len(self._keys) and self._keys[index] == (key, kind, food_id):
+                        del self._keys[index]
+            for gram in entry["grams"]:
+                self._discard(self._grams, gram, food_id)
+            for char in set(entry["norm"]):
+                self._discard(self._chars, char, food_id)
+
+    @staticmethod
+    def _discard(postings: Dict[str, Set[int]], key: str, food_id: int) -> None:
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(food_id)
+            if not ids:
+                del postings[key]
+
+    def sync(self, snapshot) -> Tuple[int, int]:
+        """
+        与食物目录快照同步，只处理有变化的食物
+
+        参数:
+            snapshot (CatalogSnapshot): 食物目录快照
+
+        返回:
+            (新增或更新数, 删除数)
+        """
+        if snapshot is self._synced:
+            return 0, 0
+        with self._lock:
+            if snapshot is self._synced:
+                return 0, 0
+            current = {int(food_id): (name, category)
+                       for food_id, name, category in zip(snapshot.ids, snapshot.names, snapshot.categories)}
+            removed = [food_id for food_id in self._foods if food_id not in current]
+            for food_id in removed:
+                self.remove(food_id)
+            changed = 0
+            for food_id, (name, category) in current.items():
+                entry = self._foods.get(food_id)
+                if entry is None or entry["name"] != name or entry["category"] != category:
+                    self.add(food_id, name, category)
+                    changed += 1
+            self._synced = snapshot
+        if changed or removed:
+            logger.info(f"食物搜索索引已更新: 新增/修改{changed}条, 删除{len(removed)}条")
+        return changed, len(removed)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        搜索食物
+
+        参数:
+            query (str): 名称、拼音或首字母，可包含错字
+            limit (int): 最多返回条数
+
+        返回:
+            list: [{"id", "name", "category", "score"}]，按得分从高到低
+        """
+        q = normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            scores: Dict[int, float] = {}
+
+            def hit(food_id: int, score: float) -> None:
+                if score > scores.get(food_id, 0.0):
+                    scores[food_id] = score
+
+            # 前缀：汉字查询同时按其拼音匹配，"鸡旦"也能找到"鸡蛋"
+            q_pinyin, _ = to_pinyin(q)
+            if q_pinyin == q:
+                q_pinyin = ""
+            for key, kind, food_id in self._scan_prefix(q):
+                hit(food_id, SCORE_EXACT if kind == _KEY_NAME and key == q else _PREFIX_SCORES[kind])
+            if q_pinyin:
+                # 同音字匹配，比直接前缀略低
+                for key, kind, food_id in self._scan_prefix(q_pinyin):
+                    hit(food_id, _PREFIX_SCORES[kind] - 0.05)
+
+            # 子串和模糊；少于3个字母的拼音跨音节匹配(如"ad"匹配"yadan")基本是噪音，只做前缀
+            if len(q) == 1:
+                for food_id in self._chars.get(q, ()):
+                    hit(food_id, SCORE_SUBSTRING)
+            elif not q.isascii() or len(q) >= MIN_FUZZY_LETTERS:
+                self._match_grams(q, hit)
+                if q_pinyin:
+                    self._match_grams(q_pinyin, hit, discount=0.05)
+
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], len(self._foods[kv[0]]["name"]), kv[0]))
+            return [
+                {
+                    "id": food_id,
+                    "name": self._foods[food_id]["name"],
+                    "category": self._foods[food_id]["category"],
+                    "score": round(score, 3),
+                }
+                for food_id, score in ranked[:limit]
+            ]
+
+    def _scan_prefix(self, prefix: str) -> Iterable[Tuple[str, int, int]]:
+        index = bisect.bisect_left(self._keys, (prefix,))
+        end = min(len(self._keys), index + MAX_PREFIX_SCAN)
+        while index < end and self._keys[index][0].startswith(prefix):
+            yield self._keys[index]
+            index += 1
+
+    def _match_grams(self, q: str, hit, discount: float = 0.0) -> None:
+        """按二元组命中数计算相似度；全部命中且确为子串时按子串计分"""
+        q_grams = ngrams(q)
+        counts: Dict[int, int] = defaultdict(int)
+        for gram in q_grams:
+            for food_id in self._grams.get(gram, ()):
+                counts[food_id] += 1
+        for food_id, common in counts.items():
+            entry = self._foods[food_id]
+            if common == len(q_grams) and (q in entry["norm"] or q in entry["pinyin"]):
+                hit(food_id, SCORE_SUBSTRING - discount)
+                continue
+            # 字母查询与拼音比较，汉字查询与名称比较
+            size = entry["pinyin_grams"] if q.isascii() and entry["pinyin_grams"] else entry["name_grams"]
+            dice = 2 * common / (len(q_grams) + size)
+            if dice >= FUZZY_THRESHOLD:
+                hit(food_id, SCORE_FUZZY * dice - discount)
+
+
+_index: Optional[FoodSearchIndex] = None
+
+
+def get_food_search_index() -> FoodSearchIndex:
+    """获取进程内的食物搜索索引"""
+    global _index
+    if _index is None:
+        _index = FoodSearchIndex()
+    return _index
+
+
+def set_food_search_index(index: Optional[FoodSearchIndex]) -> None:
+    """替换食物搜索索引（测试用）"""
+    global _index
+    _index = index
@@ -0,0 +1,181 @@
+"""
+密码哈希模块 - 在独立的进程池中执行bcrypt，限制并发并采集耗时指标
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.request_context import record_timing
+
+# 进程池中每个子进程按rounds缓存CryptContext
+_contexts: Dict[int, CryptContext] = {}
+
+
+def build_context(rounds: int) -> CryptContext:
+    """构建指定cost的bcrypt上下文，cost不同的旧哈希会被标记为需要更新"""
+    context = _contexts.get(rounds)
+    if context is None:
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        _contexts[rounds] = context
+    return context
+
+
+def _hash(password: str, rounds: int) -> str:
+    return build_context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    if not hashed:
+        return False, None
+    try:
+        return build_context(rounds).verify_and_update(password, hashed)
+    except ValueError:
+        # 非bcrypt格式的历史哈希（如示例数据中的md5）
+        return False, None
+
+
+class PasswordHasher:
+    """
+    异步密码哈希器
+
+    bcrypt放到独立进程执行，不占用请求线程和GIL；同时执行的哈希数
+    不超过worker数，排队数超过max_pending时直接返回503，避免登录洪峰
+    拖垮其他接口。
+    """
+
+    def __init__(self, rounds: int = 12, executor: str = "process", workers: int = 2, max_pending: int = 64):
+        """
+        参数:
+            rounds (int): bcrypt cost
+            executor (str): process-进程池, thread-线程池, inline-直接在事件循环中执行(仅测试)
+            workers (int): 并发执行的哈希数
+            max_pending (int): 允许排队的最大请求数
+        """
+        self.rounds = rounds
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.pending_peak = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.executor_type != "inline":
+            if self.executor_type == "process":
+                # 使用spawn，避免在已有线程的进程中fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            elif self.executor_type == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+            else:
+                raise ValueError(f"不支持的哈希执行器类型: {self.executor_type}")
+        return self._executor
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="服务繁忙，请稍后再试"
+                )
+            self.pending += 1
+            self.pending_peak = max(self.pending_peak, self.pending)
+
+        start = time.perf_counter()
+        try:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.workers)
+            async with self._semaphore:
+                executor = self._get_executor()
+                if executor is None:
+                    return func(*args)
+                return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            record_timing("hash", elapsed)
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.latency_total += elapsed
+                self.latency_max = max(self.latency_max, elapsed)
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """验证密码"""
+        ok, _ = await self._run(_verify_and_update, password, hashed, self.rounds)
+        return ok
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        验证密码，cost参数变化时同时返回按新参数计算的哈希
+
+        返回:
+            (是否正确, 新哈希或None)
+        """
+        ok, new_hash = await self._run(_verify_and_update, password, hashed, self.rounds)
+        if ok and new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return ok, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回哈希统计"""
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "pending": self.pending,
+                "pending_peak": self.pending_peak,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "latency_avg_ms": round(self.latency_total / self.completed * 1000, 3) if self.completed else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 3),
+            }
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """获取进程内的密码哈希器"""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            rounds=settings.BCRYPT_ROUNDS,
+            executor=settings.HASH_EXECUTOR,
+            workers=settings.HASH_WORKERS,
+            max_pending=settings.HASH_MAX_PENDING
+        )
+    return _hasher
+
+
+def set_password_hasher(hasher: Optional[PasswordHasher]) -> None:
+    """替换密码哈希器（测试用）"""
+    global _hasher
+    _hasher = hasher
@@ -0,0 +1,466 @@
+"""
+会话列表模块 - 为每个参与者维护会话顺序和未读消息，打开收件箱不查消息表
+
+每个参与者（用户或医生）维护:
+    顺序    会话ID -> 最后一条消息ID，按它倒序即按会话更新时间倒序（消息ID按发送顺序分配，且没有并列）
+    已读线  会话ID -> 已读到的消息ID
+    未读    每个会话中高于已读线的未读消息ID，未读数即其个数；另维护全部会话的未读总数
+所有更新都是单调的（取最大值、并集、按已读线过滤），所以发消息、标记已读和从数据库重建
+之间的先后顺序不影响结果。参与者第一次打开收件箱时从数据库合并一次（conversations和
+未读消息走索引），之后的列表只读缓存：一页是一次有序范围读取加每个会话一次计数。
+
+存储:
+    memory - 进程内，仅限单进程部署和测试
+    redis  - 多worker共享，更新由Lua脚本原子执行；key在IM_INBOX_TTL内无更新即过期，
+             过期后再打开收件箱时从数据库重新加载
+"""
+import json
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.models.medical import Conversation, Message
+
+logger = get_logger("health777.inbox")
+
+# 参与者类型（与app.core.messaging一致）
+USER = "user"
+DOCTOR = "doctor"
+
+# (会话ID, 最后消息ID, 未读数)
+InboxEntry = Tuple[int, int, int]
+
+
+def participant_key(participant_type: str, participant_id: int) -> str:
+    return f"{participant_type}:{participant_id}"
+
+
+class InboxStore:
+    """会话顺序和未读消息的存储接口"""
+
+    async def record(self, key: str, conversation_id: int, message_id: int, unread: bool) -> None:
+        """登记一条消息：推进会话顺序；unread为True时（接收方）高于已读线的消息计入未读"""
+        raise NotImplementedError
+
+    async def read(self, key: str, conversation_id: int, up_to: int) -> int:
+        """推进已读线，返回该会话剩余的未读数"""
+        raise NotImplementedError
+
+    async def page(self, key: str, before: Optional[int], limit: int) -> List[InboxEntry]:
+        """按最后消息ID倒序取一页会话"""
+        raise NotImplementedError
+
+    async def total_unread(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def is_loaded(self, key: str) -> bool:
+        """是否已从数据库合并过"""
+        raise NotImplementedError
+
+    async def set_loaded(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def set_last_message(self, conversation_id: int, message: Dict[str, Any]) -> None:
+        """缓存会话的最后一条消息（只保留ID更大的）"""
+        raise NotImplementedError
+
+    async def last_messages(self, conversation_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryInboxStore(InboxStore):
+    """进程内存储，仅限单进程部署和测试"""
+
+    def __init__(self):
+        self._order: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._read: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._unread: Dict[str, Dict[int, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        self._total: Dict[str, int] = defaultdict(int)
+        self._loaded: Set[str] = set()
+        self._last: Dict[int, Dict[str, Any]] = {}
+
+    async def record(self, key: str, conversation_id: int, message_id: int, unread: bool) -> None:
+        order = self._order[key]
+        if message_id > order.get(conversation_id, 0):
+            order[conversation_id] = message_id
+        if unread and message_id > self._read[key].get(conversation_id, 0):
+            ids = self._unread[key][conversation_id]
+            if message_id not in ids:
+                ids.add(message_id)
+                self._total[key] += 1
+
+    async def read(self, key: str, conversation_id: int, up_to: int) -> int:
+        read = self._read[key]
+        if up_to > read.get(conversation_id, 0):
+            read[conversation_id] = up_to
+        ids = self._unread[key].get(conversation_id)
+        if not ids:
+            return 0
+        removed = {message_id for message_id in ids if message_id <= up_to}
+        ids -= removed
+        self._total[key] -= len(removed)
+        return len(ids)
+
+    async def page(self, key: str, before: Optional[int], limit: int) -> List[InboxEntry]:
+        order = self._order.get(key, {})
+        entries = sorted(
+            ((last_id, conversation_id) for conversation_id, last_id in order.items()
+             if before is None or last_id < before),
+            reverse=True
+        )[:limit]
+        unread = self._unread.get(key, {})
+        return [
+            (conversation_id, last_id, len(unread.get(conversation_id, ())))
+            for last_id, conversation_id in entries
+        ]
+
+    async def total_unread(self, key: str) -> int:
+        return self._total.get(key, 0)
+
+    async def is_loaded(self, key: str) -> bool:
+        return key in self._loaded
+
+    async def set_loaded(self, key: str) -> None:
+        self._loaded.add(key)
+
+    async def set_last_message(self, conversation_id: int, message: Dict[str, Any]) -> None:
+        current = self._last.get(conversation_id)
+        if current is None or current["id"] < message["id"]:
+            self._last[conversation_id] = message
+
+    async def last_messages(self, conversation_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        return {
+            conversation_id: self._last[conversation_id]
+            for conversation_id in conversation_ids if conversation_id in self._last
+        }
+
+
+# KEYS: 顺序, 已读线, 该会话未读, 未读总数  ARGV: 会话ID, 消息ID, 是否计入未读, 过期时间(秒)
+_RECORD_SCRIPT = """
+local message_id = tonumber(ARGV[2])
+local current = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or '0')
+if message_id > current then
+    redis.call('ZADD', KEYS[1], message_id, ARGV[1])
+end
+if ARGV[3] == '1' then
+    local watermark = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+    if message_id > watermark and redis.call('ZADD', KEYS[3], message_id, ARGV[2]) == 1 then
+        redis.call('INCR', KEYS[4])
+    end
+end
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+return 1
+"""
+
+# KEYS: 顺序, 已读线, 该会话未读, 未读总数  ARGV: 会话ID, 已读到的消息ID, 过期时间(秒)
+_READ_SCRIPT = """
+local watermark = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > watermark then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+local removed = redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[2])
+if removed > 0 then
+    redis.call('DECRBY', KEYS[4], removed)
+end
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return redis.call('ZCARD', KEYS[3])
+"""
+
+# KEYS: 顺序, 已读线, 未读总数, 已加载标记  ARGV: 会话未读key前缀, 过期时间(秒)
+# 重新加载时部分会话的未读可能已过期，未读总数按现存的未读集合重新计算
+_LOADED_SCRIPT = """
+local total = 0
+for _, conversation_id in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    local unread = ARGV[1] .. conversation_id
+    total = total + redis.call('ZCARD', unread)
+    redis.call('EXPIRE', unread, ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('SET', KEYS[3], total, 'EX', ARGV[2])
+redis.call('SET', KEYS[4], 1, 'EX', ARGV[2])
+return total
+"""
+
+# KEYS: 会话的最后消息  ARGV: 消息ID, 消息JSON, 过期时间(秒)
+_LAST_MESSAGE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'id') or '0')
+if tonumber(ARGV[1]) <= current then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'id', ARGV[1], 'message', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisInboxStore(InboxStore):
+    """
+    Redis存储，多worker共享；会话顺序为有序集合，每个会话的未读消息ID为一个有序集合
+
+    所有key都带过期时间，每次更新时续期。已加载标记只在加载时设置、不续期，
+    因此它总是最先过期：之后再打开收件箱会从数据库重新合并，不活跃参与者的数据自然清除。
+    """
+
+    def __init__(self, client, prefix: str = "im:inbox", ttl: int = 7 * 86400):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            prefix (str): key前缀
+            ttl (int): key的过期时间(秒)
+        """
+        self._client = client
+        self._prefix = prefix
+        self._ttl = ttl
+        self._record_script = client.register_script(_RECORD_SCRIPT)
+        self._read_script = client.register_script(_READ_SCRIPT)
+        self._loaded_script = client.register_script(_LOADED_SCRIPT)
+        self._last_script = client.register_script(_LAST_MESSAGE_SCRIPT)
+
+    def _key(self, key: str, kind: str) -> str:
+        return f"{self._prefix}:{key}:{kind}"
+
+    def _unread_key(self, key: str, conversation_id: int) -> str:
+        return f"{self._prefix}:{key}:unread:{conversation_id}"
+
+    def _last_key(self, conversation_id: int) -> str:
+        return f"{self._prefix}:last:{conversation_id}"
+
+    async def record(self, key: str, conversation_id: int, message_id: int, unread: bool) -> None:
+        await self._record_script(
+            keys=[
+                self._key(key, "order"), self._key(key, "read"),
+                self._unread_key(key, conversation_id), self._key(key, "total")
+            ],
+            args=[conversation_id, message_id, 1 if unread else 0, self._ttl]
+        )
+
+    async def read(self, key: str, conversation_id: int, up_to: int) -> int:
+        return int(await self._read_script(
+            keys=[
+                self._key(key, "order"), self._key(key, "read"),
+                self._unread_key(key, conversation_id), self._key(key, "total")
+            ],
+            args=[conversation_id, up_to, self._ttl]
+        ))
+
+    async def page(self, key: str, before: Optional[int], limit: int) -> List[InboxEntry]:
+        rows = await self._client.zrevrangebyscore(
+            self._key(key, "order"), f"({before}" if before is not None else "+inf", "-inf",
+            start=0, num=limit, withscores=True
+        )
+        if not rows:
+            return []
+        async with self._client.pipeline(transaction=False) as pipe:
+            for conversation_id, _ in rows:
+                pipe.zcard(self._unread_key(key, int(conversation_id)))
+            counts = await pipe.execute()
+        return [
+            (int(conversation_id), int(last_id), int(count))
+            for (conversation_id, last_id), count in zip(rows, counts)
+        ]
+
+    async def total_unread(self, key: str) -> int:
+        return int(await self._client.get(self._key(key, "total")) or 0)
+
+    async def is_loaded(self, key: str) -> bool:
+        return bool(await self._client.exists(self._key(key, "loaded")))
+
+    async def set_loaded(self, key: str) -> None:
+        await self._loaded_script(
+            keys=[self._key(key, "order"), self._key(key, "read"), self._key(key, "total"), self._key(key, "loaded")],
+            args=[f"{self._prefix}:{key}:unread:", self._ttl]
+        )
+
+    async def set_last_message(self, conversation_id: int, message: Dict[str, Any]) -> None:
+        await self._last_script(
+            keys=[self._last_key(conversation_id)],
+            args=[message["id"], json.dumps(message, ensure_ascii=False, default=str), self._ttl]
+        )
+
+    async def last_messages(self, conversation_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        conversation_ids = list(conversation_ids)
+        if not conversation_ids:
+            return {}
+        async with self._client.pipeline(transaction=False) as pipe:
+            for conversation_id in conversation_ids:
+                pipe.hget(self._last_key(conversation_id), "message")
+            values = await pipe.execute()
+        return {
+            conversation_id: json.loads(value)
+            for conversation_id, value in zip(conversation_ids, values) if value is not None
+        }
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+def _preview(message: Dict[str, Any]) -> Dict[str, Any]:
+    """会话列表中展示的最后一条消息"""
+    created_at = message["created_at"]
+    return {
+        "id": message["id"],
+        "sender_type": message["sender_type"],
+        "content": message["content"][:100],
+        "message_type": message["message_type"],
+        "created_at": created_at if isinstance(created_at, str) else created_at.isoformat(),
+    }
+
+
+class Inbox:
+    """会话列表：发消息和标记已读时更新存储，读取时缺失的部分从数据库补齐"""
+
+    def __init__(self, store: InboxStore, session_factory: Callable):
+        """
+        参数:
+            store (InboxStore): 会话顺序和未读消息存储
+            session_factory: 异步会话工厂，用于首次加载和补齐最后消息
+        """
+        self.store = store
+        self.session_factory = session_factory
+        self.rebuilds = 0
+
+    async def record_message(self, message: Dict[str, Any]) -> None:
+        """登记一条新消息（messages表的一行）：双方的会话顺序，接收方的未读"""
+        conversation_id, message_id = message["conversation_id"], message["id"]
+        await self.store.record(
+            participant_key(message["sender_type"], message["sender_id"]), conversation_id, message_id, False
+        )
+        await self.store.record(
+            participant_key(message["receiver_type"], message["receiver_id"]), conversation_id, message_id, True
+        )
+        await self.store.set_last_message(conversation_id, _preview(message))
+
+    async def mark_read(self, participant_type: str, participant_id: int, conversation_id: int, up_to: int) -> int:
+        """标记已读，返回该会话剩余的未读数"""
+        return await self.store.read(participant_key(participant_type, participant_id), conversation_id, up_to)
+
+    async def list(
+        self, participant_type: str, participant_id: int, before: Optional[int] = None, limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        获取会话列表的一页，按最后消息倒序
+
+        返回:
+            {"items": [{"conversation_id", "last_message", "unread_count"}], "total_unread", "next_before"}
+        """
+        key = participant_key(participant_type, participant_id)
+        if not await self.store.is_loaded(key):
+            await self._load(participant_type, participant_id)
+
+        entries = await self.store.page(key, before, limit)
+        last_messages = await self.store.last_messages(conversation_id for conversation_id, _, _ in entries)
+        missing = [last_id for conversation_id, last_id, _ in entries if conversation_id not in last_messages]
+        if missing:
+            last_messages.update(await self._load_last_messages(missing))
+
+        items = [
+            {
+                "conversation_id": conversation_id,
+                "last_message": last_messages.get(conversation_id),
+                "unread_count": unread,
+            }
+            for conversation_id, _, unread in entries
+        ]
+        return {
+            "items": items,
+            "total_unread": await self.store.total_unread(key),
+            "next_before": entries[-1][1] if len(entries) == limit else None,
+        }
+
+    async def _load(self, participant_type: str, participant_id: int) -> None:
+        """
+        从数据库合并参与者的会话和未读消息（每个参与者一次）
+
+        数据库可能落后于缓存（消息和已读在写库缓冲中），合并只会推进顺序、补充未读，
+        已读线以下的消息不会被重新计为未读。
+        """
+        key = participant_key(participant_type, participant_id)
+        owner = Conversation.user_id if participant_type == USER else Conversation.doctor_id
+        async with self.session_factory() as db:
+            conversations = (await db.execute(
+                select(Conversation.id, Conversation.last_message_id)
+                .where(owner == participant_id, Conversation.status == 1)
+            )).all()
+            # idx_receiver (receiver_id, receiver_type, is_read)
+            unread = (await db.execute(
+                select(Message.conversation_id, Message.id).where(
+                    Message.receiver_id == participant_id,
+                    Message.receiver_type == participant_type,
+                    Message.is_read == 0
+                )
+            )).all()
+        for conversation_id, last_id in conversations:
+            if last_id:
+                await self.store.record(key, conversation_id, last_id, False)
+        for conversation_id, message_id in unread:
+            await self.store.record(key, conversation_id, message_id, True)
+        await self.store.set_loaded(key)
+        self.rebuilds += 1
+        logger.info(f"会话列表已从数据库加载: {key} {len(conversations)}个会话, {len(unread)}条未读")
+
+    async def _load_last_messages(self, message_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """按主键一次读取缓存中没有的最后消息，并放入缓存"""
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(
+                    Message.id, Message.conversation_id, Message.sender_type, Message.content,
+                    Message.message_type, Message.created_at
+                ).where(Message.id.in_(message_ids))
+            )).all()
+        result = {}
+        for row in rows:
+            preview = _preview(dict(row._mapping))
+            await self.store.set_last_message(row.conversation_id, preview)
+            result[row.conversation_id] = preview
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rebuilds": self.rebuilds}
+
+
+_inbox: Optional[Inbox] = None
+
+
+def get_inbox() -> Inbox:
+    """根据IM_BACKEND配置获取会话列表"""
+    global _inbox
+    if _inbox is None:
+        from app.db.session import AsyncSessionLocal
+
+        backend = settings.IM_BACKEND
+        if backend == "memory":
+            store = MemoryInboxStore()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            store = RedisInboxStore(
+                aioredis.from_url(settings.REDIS_URL, decode_responses=True), ttl=settings.IM_INBOX_TTL
+            )
+        else:
+            raise ValueError(f"不支持的会话列表存储类型: {backend}")
+        _inbox = Inbox(store, AsyncSessionLocal)
+    return _inbox
+
+
+def set_inbox(inbox: Optional[Inbox]) -> None:
+    """替换会话列表（测试用）"""
+    global _inbox
+    _inbox = inbox
+
+
+async def close_inbox() -> None:
+    """关闭会话列表存储连接"""
+    global _inbox
+    if _inbox is not None:
+        await _inbox.store.close()
+        _inbox = None
@@ -0,0 +1,417 @@
+"""
+积分排行榜模块 - 有序结构维护日榜/周榜/总榜，名次和前N名查询都是O(log n)
+
+user_points.total_points上没有索引，按积分排序求"我的名次"每次都要全表扫描；
+排行榜在积分变化时同步更新有序结构，需要时可从数据库重建。
+
+日榜/周榜按服务器本地日期划分；数据库中的created_at是UTC时间，
+两边换算统一使用local_day/local_midnight_utc。
+"""
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.timeseries import DAILY, WEEKLY, bucket_days, bucket_start
+
+ALL_TIME = "all"
+BOARD_PERIODS = (DAILY, WEEKLY, ALL_TIME)
+BOARD_ALIASES = {"day": DAILY, "week": WEEKLY, "all": ALL_TIME}
+
+# 周期榜在周期结束后多保留的时间(秒)，用于查看上一期名次
+BOARD_GRACE_SECONDS = 2 * 86400
+
+# (用户ID, 积分)
+Entry = Tuple[int, float]
+
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward: List[Optional["_Node"]] = [None] * level
+        self.span = [0] * level
+
+
+class SkipList:
+    """
+    带跨度的跳表（与Redis有序集合的实现相同）
+
+    每层指针记录跨过的节点数，插入、删除、按key求名次、按名次定位都是期望O(log n)。
+    key需可比较且唯一。
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self.head = _Node(None, self.MAX_LEVEL)
+        self.level = 1
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        update = [self.head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while x.forward[i] is not None and x.forward[i].key < key:
+                rank[i] += x.span[i]
+                x = x.forward[i]
+            update[i] = x
+
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.head
+                update[i].span[i] = self.length
+            self.level = level
+
+        node = _Node(key, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        self.length += 1
+
+    def remove(self, key) -> bool:
+        update = [self.head] * self.MAX_LEVEL
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and x.forward[i].key < key:
+                x = x.forward[i]
+            update[i] = x
+        x = x.forward[0]
+        if x is None or x.key != key:
+            return False
+        for i in range(self.level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """key的名次（从1开始），不存在时返回None"""
+        rank = 0
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and x.forward[i].key <= key:
+                rank += x.span[i]
+                x = x.forward[i]
+            if x is not self.head and x.key == key:
+                return rank
+        return None
+
+    def slice(self, offset: int, limit: int) -> List:
+        """按名次取一段key：跳到第offset+1名后顺序读取limit个"""
+        if offset >= self.length or limit <= 0:
+            return []
+        target = offset + 1
+        traversed = 0
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and traversed + x.span[i] <= target:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == target:
+                break
+        result = []
+        while x is not None and len(result) < limit:
+            result.append(x.key)
+            x = x.forward[0]
+        return result
+
+
+class LeaderboardStore:
+    """
+    排行榜存储接口
+
+    board为榜单名（如 all、daily:2024-03-01）；积分相同的用户名次先后由后端决定。
+    """
+
+    async def incr(self, board: str, deltas: Dict[int, float], ttl: Optional[int] = None) -> None:
+        """批量累加积分，ttl为榜单过期时间(秒)"""
+        raise NotImplementedError
+
+    async def replace(self, board: str, pages: AsyncIterable[Sequence[Entry]], ttl: Optional[int] = None) -> int:
+        """用分页数据整体替换榜单（重建时使用），返回条数"""
+        raise NotImplementedError
+
+    async def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        """返回(名次, 积分)，名次从1开始；不在榜上时返回None"""
+        raise NotImplementedError
+
+    async def top(self, board: str, offset: int = 0, limit: int = 10) -> List[Entry]:
+        raise NotImplementedError
+
+    async def size(self, board: str) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class _MemoryBoard:
+    __slots__ = ("entries", "scores", "expires_at")
+
+    def __init__(self):
+        self.entries = SkipList()
+        self.scores: Dict[int, float] = {}
+        self.expires_at: Optional[date] = None
+
+    def set(self, user_id: int, score: float) -> None:
+        old = self.scores.get(user_id)
+        if old is not None:
+            self.entries.remove((-old, user_id))
+        self.scores[user_id] = score
+        self.entries.insert((-score, user_id))
+
+
+class MemoryLeaderboardStore(LeaderboardStore):
+    """
+    进程内排行榜（跳表），仅限单进程部署（开发/测试）
+
+    多worker部署时各进程的榜单互不相通，应使用RedisLeaderboardStore。
+    """
+
+    def __init__(self, today=date.today):
+        self._boards: Dict[str, _MemoryBoard] = {}
+        self._today = today
+
+    def _board(self, board: str, create: bool = False) -> Optional[_MemoryBoard]:
+        entry = self._boards.get(board)
+        if entry is not None and entry.expires_at is not None and entry.expires_at < self._today():
+            del self._boards[board]
+            entry = None
+        if entry is None and create:
+            entry = self._boards[board] = _MemoryBoard()
+        return entry
+
+    def _expire(self, entry: _MemoryBoard, ttl: Optional[int]) -> None:
+        if ttl:
+            entry.expires_at = self._today() + timedelta(seconds=ttl)
+
+    async def incr(self, board: str, deltas: Dict[int, float], ttl: Optional[int] = None) -> None:
+        entry = self._board(board, create=True)
+        for user_id, delta in deltas.items():
+            entry.set(user_id, entry.scores.get(user_id, 0) + delta)
+        self._expire(entry, ttl)
+
+    async def replace(self, board: str, pages: AsyncIterable[Sequence[Entry]], ttl: Optional[int] = None) -> int:
+        # 先建好新榜单再替换，重建期间读到的仍是旧榜单
+        entry = _MemoryBoard()
+        async for page in pages:
+            for user_id, score in page:
+                entry.set(user_id, score)
+        self._expire(entry, ttl)
+        self._boards[board] = entry
+        return len(entry.scores)
+
+    async def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        entry = self._board(board)
+        score = entry.scores.get(user_id) if entry else None
+        if score is None:
+            return None
+        return entry.entries.rank((-score, user_id)), score
+
+    async def top(self, board: str, offset: int = 0, limit: int = 10) -> List[Entry]:
+        entry = self._board(board)
+        if entry is None:
+            return []
+        return [(user_id, -neg_score) for neg_score, user_id in entry.entries.slice(offset, limit)]
+
+    async def size(self, board: str) -> int:
+        entry = self._board(board)
+        return len(entry.scores) if entry else 0
+
+
+class RedisLeaderboardStore(LeaderboardStore):
+    """基于Redis有序集合的排行榜，多worker共享；ZREVRANK/ZREVRANGE都是O(log n)"""
+
+    def __init__(self, client, prefix: str = "leaderboard:"):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            prefix (str): key前缀
+        """
+        self._client = client
+        self._prefix = prefix
+
+    def _key(self, board: str) -> str:
+        return f"{self._prefix}{board}"
+
+    async def incr(self, board: str, deltas: Dict[int, float], ttl: Optional[int] = None) -> None:
+        if not deltas:
+            return
+        key = self._key(board)
+        async with self._client.pipeline(transaction=False) as pipe:
+            for user_id, delta in deltas.items():
+                pipe.zincrby(key, delta, user_id)
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def replace(self, board: str, pages: AsyncIterable[Sequence[Entry]], ttl: Optional[int] = None) -> int:
+        # 写入临时key后RENAME原子替换，重建期间读到的仍是旧榜单
+        key = self._key(board)
+        tmp_key = f"{key}:rebuild"
+        await self._client.delete(tmp_key)
+        count = 0
+        async for page in pages:
+            if page:
+                await self._client.zadd(tmp_key, {str(user_id): score for user_id, score in page})
+                count += len(page)
+        if count:
+            async with self._client.pipeline(transaction=True) as pipe:
+                pipe.rename(tmp_key, key)
+                if ttl:
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+        else:
+            await self._client.delete(key)
+        return count
+
+    async def rank(self, board: str, user_id: int) -> Optional[Tuple[int, float]]:
+        key = self._key(board)
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(key, user_id)
+            pipe.zscore(key, user_id)
+            rank, score = await pipe.execute()
+        if rank is None:
+            return None
+        return rank + 1, float(score)
+
+    async def top(self, board: str, offset: int = 0, limit: int = 10) -> List[Entry]:
+        if limit <= 0:
+            return []
+        rows = await self._client.zrevrange(self._key(board), offset, offset + limit - 1, withscores=True)
+        return [(int(user_id), float(score)) for user_id, score in rows]
+
+    async def size(self, board: str) -> int:
+        return await self._client.zcard(self._key(board))
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+def local_day(moment: datetime) -> date:
+    """数据库中的UTC时间（不带时区）所在的本地日期"""
+    return moment.replace(tzinfo=timezone.utc).astimezone().date()
+
+
+def local_midnight_utc(day: date) -> datetime:
+    """本地日期零点对应的UTC时间（不带时区，用于与created_at比较）"""
+    return datetime.combine(day, time.min).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def board_name(period: str, day: date) -> str:
+    """榜单名：总榜为all，日榜/周榜带周期起始日"""
+    if period == ALL_TIME:
+        return ALL_TIME
+    return f"{period}:{bucket_start(day, period).isoformat()}"
+
+
+def board_ttl(period: str, day: date) -> Optional[int]:
+    """周期榜的过期时间(秒)：周期剩余时长加保留时间，总榜不过期"""
+    if period == ALL_TIME:
+        return None
+    start = bucket_start(day, period)
+    remaining = (start + timedelta(days=bucket_days(start, period)) - day).days
+    return remaining * 86400 + BOARD_GRACE_SECONDS
+
+
+class Leaderboard:
+    """日榜/周榜/总榜的统一入口，积分变化时同时累加到三个榜单"""
+
+    def __init__(self, store: LeaderboardStore, today=date.today):
+        self.store = store
+        self._today = today
+
+    async def record(self, awards: Dict[int, float], day: Optional[date] = None) -> None:
+        """记录一批积分变化（用户ID -> 积分增量）"""
+        awards = {user_id: points for user_id, points in awards.items() if points}
+        if not awards:
+            return
+        day = day or self._today()
+        for period in BOARD_PERIODS:
+            await self.store.incr(board_name(period, day), awards, board_ttl(period, day))
+
+    async def top(self, period: str, limit: int = 10, offset: int = 0, day: Optional[date] = None) -> List[Dict]:
+        """前N名，返回[{rank, user_id, points}]"""
+        entries = await self.store.top(board_name(period, day or self._today()), offset, limit)
+        return [
+            {"rank": offset + index + 1, "user_id": user_id, "points": _points(score)}
+            for index, (user_id, score) in enumerate(entries)
+        ]
+
+    async def rank(self, period: str, user_id: int, day: Optional[date] = None) -> Optional[Dict]:
+        """用户的名次，不在榜上时返回None"""
+        result = await self.store.rank(board_name(period, day or self._today()), user_id)
+        if result is None:
+            return None
+        rank, score = result
+        return {"rank": rank, "user_id": user_id, "points": _points(score)}
+
+    async def rebuild(self, period: str, pages: AsyncIterable[Sequence[Entry]], day: Optional[date] = None) -> int:
+        """用数据库中的数据重建榜单，返回上榜人数"""
+        day = day or self._today()
+        return await self.store.replace(board_name(period, day), pages, board_ttl(period, day))
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+def _points(score: float):
+    return int(score) if float(score).is_integer() else score
+
+
+_leaderboard: Optional[Leaderboard] = None
+
+
+def get_leaderboard() -> Leaderboard:
+    """根据LEADERBOARD_BACKEND配置获取排行榜（进程内单例）"""
+    global _leaderboard
+    if _leaderboard is None:
+        backend = settings.LEADERBOARD_BACKEND
+        if backend == "memory":
+            store: LeaderboardStore = MemoryLeaderboardStore()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            store = RedisLeaderboardStore(aioredis.from_url(settings.REDIS_URL, decode_responses=True))
+        else:
+            raise ValueError(f"不支持的排行榜存储类型: {backend}")
+        _leaderboard = Leaderboard(store)
+    return _leaderboard
+
+
+def set_leaderboard(leaderboard: Optional[Leaderboard]) -> None:
+    """替换排行榜（测试用）"""
+    global _leaderboard
+    _leaderboard = leaderboard
+
+
+async def close_leaderboard() -> None:
+    """关闭排行榜存储连接"""
+    global _leaderboard
+    if _leaderboard is not None:
+        await _leaderboard.close()
+        _leaderboard = None
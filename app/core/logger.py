@@ -2,11 +2,19 @@
 日志系统模块 - 提供统一的日志记录功能
 """
 import os
+import atexit
+import copy
+import json
 import logging
 import logging.handlers
+import threading
+import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
+from app.core.config import settings
+
 # 日志级别映射
 LOG_LEVELS = {
     "debug": logging.DEBUG,
@@ -22,7 +30,206 @@ DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(linen
 # 日志存储目录
 LOG_DIR = Path("logs")
 
-def setup_logger(name, level="info", log_file=None, format_str=None, rotate=True, max_size_mb=10, backup_count=5):
+# 队列满时的处理策略
+OVERFLOW_POLICIES = ("drop_new", "drop_old", "block")
+
+
+class LogPipeline:
+    """
+    异步日志管道
+
+    请求路径上的日志调用只把记录放入有界缓冲区，由后台线程批量格式化并写入
+    控制台和文件，每批只flush一次，磁盘I/O不再计入请求耗时。
+    """
+
+    def __init__(self, capacity=10000, overflow_policy="drop_new", batch_size=256,
+                 flush_interval=0.5, block_timeout=0.1):
+        """
+        参数:
+            capacity (int): 缓冲区最大记录数
+            overflow_policy (str): 缓冲区满时的策略 drop_new-丢弃新记录, drop_old-丢弃最旧记录, block-阻塞等待
+            batch_size (int): 每批最多写入的记录数
+            flush_interval (float): 没有凑满一批时的最长等待时间(秒)
+            block_timeout (float): block策略下的最长等待时间(秒)，超时后丢弃
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的日志溢出策略: {overflow_policy}")
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+
+    def enqueue(self, handlers, record):
+        """放入一条记录，返回是否成功"""
+        with self._cond:
+            stopped = self._stopping
+            if not stopped and self._thread is None:
+                self._start()
+        if stopped:
+            # 管道关闭后（如退出阶段）的日志直接同步写出
+            self._write([(handlers, record)])
+            return True
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                if self.overflow_policy == "drop_old":
+                    self._buffer.popleft()
+                    self.dropped += 1
+                elif self.overflow_policy == "block" and not self._stopping:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._buffer) >= self.capacity:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            break
+                if len(self._buffer) >= self.capacity:
+                    self.dropped += 1
+                    return False
+            self._buffer.append((handlers, record))
+            self.enqueued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._buffer and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if not self._buffer and self._stopping:
+                    return
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+                # 唤醒block策略下等待的写入方
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        grouped = {}
+        for handlers, record in batch:
+            for handler in handlers:
+                grouped.setdefault(handler, []).append(record)
+        for handler, records in grouped.items():
+            try:
+                _write_batch(handler, records)
+            except Exception:
+                for record in records:
+                    handler.handleError(record)
+        self.written += len(batch)
+        self.batches += 1
+
+    def stop(self, timeout=5.0):
+        """停止后台线程，退出前写出剩余记录"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "buffered": len(self._buffer),
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+            }
+
+
+def _write_batch(handler, records):
+    """批量写入一个处理器：流处理器逐条写入缓冲，最后只flush一次"""
+    if not isinstance(handler, logging.StreamHandler):
+        for record in records:
+            handler.handle(record)
+        return
+
+    if handler.stream is not None and getattr(handler.stream, "closed", False):
+        # 退出阶段输出流可能已被关闭（如测试框架收回了stderr），跳过而不是逐条报错
+        return
+
+    rotating = isinstance(handler, logging.handlers.RotatingFileHandler)
+    handler.acquire()
+    try:
+        for record in records:
+            if record.levelno < handler.level or not handler.filter(record):
+                continue
+            msg = handler.format(record) + handler.terminator
+            if rotating:
+                if handler.stream is None:
+                    handler.stream = handler._open()
+                if handler.maxBytes > 0 and handler.stream.tell() + len(msg) >= handler.maxBytes:
+                    handler.doRollover()
+            handler.stream.write(msg)
+        handler.flush()
+    finally:
+        handler.release()
+
+
+class QueueingHandler(logging.Handler):
+    """只负责把记录放入日志管道，真正的输出由管道后台线程完成"""
+
+    def __init__(self, pipeline, handlers):
+        super().__init__()
+        self.pipeline = pipeline
+        self.targets = tuple(handlers)
+
+    def prepare(self, record):
+        # 在调用线程中合并参数，避免参数对象在写出前被修改
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.pipeline.enqueue(self.targets, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+_pipeline = None
+
+
+def get_log_pipeline():
+    """获取进程内共享的日志管道"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(
+            capacity=settings.LOG_QUEUE_SIZE,
+            overflow_policy=settings.LOG_OVERFLOW_POLICY,
+            batch_size=settings.LOG_BATCH_SIZE,
+            flush_interval=settings.LOG_FLUSH_INTERVAL,
+            block_timeout=settings.LOG_BLOCK_TIMEOUT
+        )
+    return _pipeline
+
+
+def shutdown_logging():
+    """关闭日志管道并写出剩余日志，应用退出时调用"""
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+atexit.register(shutdown_logging)
+
+
+def setup_logger(name, level="info", log_file=None, format_str=None, rotate=True, max_size_mb=10, backup_count=5,
+                 async_mode=None):
     """
     设置并返回一个配置好的日志记录器
 
@@ -34,10 +241,14 @@ def setup_logger(name, level="info", log_file=None, format_str=None, rotate=True
         rotate (bool): 是否启用日志轮转
         max_size_mb (int): 单个日志文件最大大小(MB)
         backup_count (int): 保留的日志文件数量
+        async_mode (bool, optional): 是否通过异步日志管道输出，为None时使用LOG_ASYNC配置
 
     返回:
         logging.Logger: 配置好的日志记录器
     """
+    if async_mode is None:
+        async_mode = settings.LOG_ASYNC
+
     # 创建日志记录器
     logger = logging.getLogger(name)
     
@@ -52,10 +263,12 @@ def setup_logger(name, level="info", log_file=None, format_str=None, rotate=True
     # 设置日志格式
     formatter = logging.Formatter(format_str or DEFAULT_FORMAT)
     
+    handlers = []
+
     # 添加控制台处理器
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # 如果指定了日志文件，添加文件处理器
     if log_file:
@@ -77,7 +290,14 @@ def setup_logger(name, level="info", log_file=None, format_str=None, rotate=True
             file_handler = logging.FileHandler(log_file, encoding='utf-8')
             
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    if async_mode:
+        # 请求路径只入队，由后台线程批量写出
+        logger.addHandler(QueueingHandler(get_log_pipeline(), handlers))
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
     return logger
 
@@ -110,6 +330,8 @@ app_logger = get_logger("health777.app", level="info")
 api_logger = get_logger("health777.api", level="info")
 db_logger = get_logger("health777.db", level="info")
 auth_logger = get_logger("health777.auth", level="info")
+# 访问日志：每个请求一行JSON，不再附加时间、级别等前缀，便于日志平台直接解析
+access_logger = get_logger("health777.access", level="info", format_str="%(message)s")
 
 
 def log_request(request, response=None, error=None):
@@ -147,4 +369,49 @@ def log_request(request, response=None, error=None):
     else:
         api_logger.info(f"请求信息: {log_data}")
 
-    return log_data
\ No newline at end of file
+    return log_data
+
+
+def log_access(request, status_code, duration, request_id=None, timings=None, response_bytes=None, error=None):
+    """
+    记录结构化访问日志，每个请求输出一行JSON
+
+    参数:
+        request: FastAPI请求对象
+        status_code (int): 响应状态码
+        duration (float): 请求耗时(秒)，应使用单调时钟计算
+        request_id (str, optional): 请求ID
+        timings (dict, optional): 各阶段耗时明细，如 {"db": 0.012, "db_count": 3}
+        response_bytes (int, optional): 响应体字节数
+        error: 异常信息(可选)
+
+    返回:
+        dict: 日志内容
+    """
+    # 使用路由模板而不是实际路径，便于按接口聚合延迟
+    route = request.scope.get("route")
+    log_data = {
+        "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+        "request_id": request_id,
+        "method": request.method,
+        "route": getattr(route, "path", None),
+        "path": request.url.path,
+        "status": status_code,
+        "duration_ms": round(duration * 1000, 3),
+        "response_bytes": response_bytes,
+        "client_ip": request.client.host if request.client else "unknown",
+    }
+
+    for name, value in (timings or {}).items():
+        if name.endswith("_count"):
+            log_data[name] = value
+        else:
+            log_data[f"{name}_ms"] = round(value * 1000, 3)
+
+    if error is not None:
+        log_data["error"] = str(error)
+        access_logger.error(json.dumps(log_data, ensure_ascii=False))
+    else:
+        access_logger.info(json.dumps(log_data, ensure_ascii=False))
+
+    return log_data
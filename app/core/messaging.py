@@ -0,0 +1,1032 @@
+"""
+医患消息网关 - WebSocket实时消息、在线状态、跨worker转发和批量写库
+
+连接: 每个WebSocket连接一个有界发送队列和一个发送协程。慢连接的队列写满时断开该连接
+      （客户端重连后按历史接口补齐），不会拖慢发送方和其他连接。
+转发: 事件发布到消息代理，每个worker订阅后投递给本worker上目标参与者的连接；
+      memory代理只在进程内转发（单进程部署和测试）。
+在线: 按参与者统计连接数（多worker时在Redis中汇总），医生第一个连接建立、
+      最后一个连接断开时更新doctors.online_status。
+写库: 消息ID在收到消息时分配，消息立即转发；消息、会话的last_message_id和未读数、
+      医生在线状态在缓冲区中合并，每隔flush_interval（或攒满batch_size条消息）
+      一个事务写入：一条多行INSERT + 每种会话变更一条CASE UPDATE，不随消息数增加往返次数。
+      写库失败时留在缓冲区重试；进程异常退出会丢失尚未写入的消息。
+会话列表: 发消息和标记已读时同步更新会话列表（app.core.inbox）的顺序和未读数。
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.inbox import Inbox
+from app.core.logger import get_logger
+from app.db.upsert import build_upsert
+from app.models.auth import User
+from app.models.medical import Conversation, Doctor, Message, UserDoctorRelation
+from app.schemas.medical import MessageRead, MessageSend
+
+logger = get_logger("health777.messaging")
+
+# 参与者类型（与messages.sender_type/receiver_type一致）
+USER = "user"
+DOCTOR = "doctor"
+
+# 消息类型
+MESSAGE_TEXT = 1
+MESSAGE_IMAGE = 2
+MESSAGE_VOICE = 3
+MESSAGE_VIDEO = 4
+
+# 慢连接被断开时的关闭码（1013: Try Again Later）
+CLOSE_SLOW_CONSUMER = 1013
+
+Event = Dict[str, Any]
+
+
+class Participant(NamedTuple):
+    """消息参与者：用户或医生"""
+    type: str
+    id: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.type}:{self.id}"
+
+
+class MessagingError(ValueError):
+    """客户端请求无法处理（以error事件返回给该连接）"""
+
+
+# ---------------------------------------------------------------- 消息代理
+
+class Broker:
+    """跨worker事件转发接口：每个事件投递给所有订阅者"""
+
+    async def publish(self, event: Event) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBroker(Broker):
+    """进程内转发，同一进程中的多个网关共享一个实例即可模拟多worker"""
+
+    def __init__(self):
+        self._handlers: List[Callable[[Event], Awaitable[None]]] = []
+
+    async def publish(self, event: Event) -> None:
+        for handler in list(self._handlers):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"消息事件处理失败: {e}")
+
+    async def subscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        self._handlers.append(handler)
+
+    async def unsubscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+
+class RedisBroker(Broker):
+    """基于Redis发布订阅的转发，所有worker订阅同一频道"""
+
+    def __init__(self, client, channel: str = "im:events"):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            channel (str): 发布订阅频道
+        """
+        self._client = client
+        self._channel = channel
+        self._handlers: List[Callable[[Event], Awaitable[None]]] = []
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, event: Event) -> None:
+        await self._client.publish(self._channel, json.dumps(event, ensure_ascii=False))
+
+    async def subscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        self._handlers.append(handler)
+        if self._task is None:
+            self._pubsub = self._client.pubsub()
+            await self._pubsub.subscribe(self._channel)
+            self._task = asyncio.create_task(self._listen(), name="im-broker")
+
+    async def unsubscribe(self, handler: Callable[[Event], Awaitable[None]]) -> None:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # 连接断开时稍后重试，redis客户端重连后自动重新订阅
+                logger.error(f"消息订阅读取失败: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            event = json.loads(message["data"])
+            for handler in list(self._handlers):
+                try:
+                    await handler(event)
+                except Exception as e:
+                    logger.error(f"消息事件处理失败: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        await self._client.close()
+
+
+# ---------------------------------------------------------------- 在线状态
+
+class PresenceStore:
+    """按参与者统计连接数"""
+
+    async def connect(self, key: str) -> int:
+        """登记一个连接，返回该参与者当前的连接数"""
+        raise NotImplementedError
+
+    async def disconnect(self, key: str) -> int:
+        """注销一个连接，返回该参与者剩余的连接数"""
+        raise NotImplementedError
+
+    async def online(self, keys: Iterable[str]) -> Set[str]:
+        """返回其中在线的参与者"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryPresence(PresenceStore):
+    """进程内连接数，仅限单进程部署和测试"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = defaultdict(int)
+
+    async def connect(self, key: str) -> int:
+        self._counts[key] += 1
+        return self._counts[key]
+
+    async def disconnect(self, key: str) -> int:
+        count = self._counts.get(key, 0) - 1
+        if count > 0:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+        return max(count, 0)
+
+    async def online(self, keys: Iterable[str]) -> Set[str]:
+        return {key for key in keys if self._counts.get(key)}
+
+
+# 减少连接数，减到0时删除key
+_DISCONNECT_SCRIPT = """
+local count = redis.call('DECR', KEYS[1])
+if count <= 0 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+return count
+"""
+
+
+class RedisPresence(PresenceStore):
+    """
+    Redis中汇总各worker的连接数
+
+    worker异常退出时其连接数不会被减掉，对应参与者会一直显示在线；
+    重启部署时应在全部worker启动前清理该前缀的key。
+    """
+
+    def __init__(self, client, prefix: str = "im:presence"):
+        self._client = client
+        self._prefix = prefix
+        self._disconnect_script = client.register_script(_DISCONNECT_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
+
+    async def connect(self, key: str) -> int:
+        return int(await self._client.incr(self._key(key)))
+
+    async def disconnect(self, key: str) -> int:
+        return int(await self._disconnect_script(keys=[self._key(key)]))
+
+    async def online(self, keys: Iterable[str]) -> Set[str]:
+        keys = list(keys)
+        if not keys:
+            return set()
+        counts = await self._client.mget([self._key(key) for key in keys])
+        return {key for key, count in zip(keys, counts) if count and int(count) > 0}
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+# ---------------------------------------------------------------- 消息ID
+
+class MessageIdAllocator:
+    """
+    分配递增的消息ID
+
+    消息在写库前就要转发给接收方，所以ID不能依赖AUTO_INCREMENT；
+    启动时用messages表中的最大ID播种，之后的ID都比它大。
+    """
+
+    async def seed(self, floor: int) -> None:
+        """保证之后分配的ID大于floor"""
+        raise NotImplementedError
+
+    async def next(self) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryIdAllocator(MessageIdAllocator):
+    """进程内计数，仅限单进程部署和测试"""
+
+    def __init__(self):
+        self._last = 0
+
+    async def seed(self, floor: int) -> None:
+        self._last = max(self._last, floor)
+
+    async def next(self) -> int:
+        self._last += 1
+        return self._last
+
+
+# 计数器小于floor时抬高到floor（Redis数据丢失后不会分配出重复ID）
+_SEED_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if current < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisIdAllocator(MessageIdAllocator):
+    """Redis INCR分配，多worker共享，ID全局递增"""
+
+    def __init__(self, client, key: str = "im:message_id"):
+        self._client = client
+        self._key = key
+        self._seed_script = client.register_script(_SEED_SCRIPT)
+
+    async def seed(self, floor: int) -> None:
+        await self._seed_script(keys=[self._key], args=[floor])
+
+    async def next(self) -> int:
+        return int(await self._client.incr(self._key))
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+# ---------------------------------------------------------------- 连接
+
+class Connection:
+    """一个WebSocket连接和它的发送队列"""
+
+    def __init__(self, websocket, participant: Participant, queue_size: int = 100):
+        """
+        参数:
+            websocket: 已accept的WebSocket（需支持send_json/receive_json/close）
+            participant (Participant): 连接所属的参与者
+            queue_size (int): 待发送事件上限，写满时视为慢连接并断开
+        """
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.participant = participant
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self.slow = False
+        self.sent = 0
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        """启动发送协程"""
+        self._writer = asyncio.create_task(self._run_writer())
+        return self._writer
+
+    def send(self, event: Event) -> bool:
+        """放入发送队列（不等待），连接已关闭或队列已满时返回False"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.slow = True
+            self.close()
+            return False
+
+    def close(self) -> None:
+        """丢弃未发送的事件并停止发送协程（包括阻塞在发送上的慢连接）"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+
+    async def _run_writer(self) -> None:
+        while True:
+            event = await self.queue.get()
+            await self.websocket.send_json(event)
+            self.sent += 1
+
+
+# ---------------------------------------------------------------- 批量写库
+
+class MessageWriter:
+    """
+    消息写库缓冲
+
+    一批中的会话变更按会话合并：last_message_id取最大ID，未读数按接收方累加；
+    已读按(会话, 阅读方)只保留最大的up_to；医生在线状态只保留最后一次。
+
+    已读线保存在会话上（last_read_id_user/doctor，只前进不后退）。多个worker时已读可能先于
+    它覆盖的消息写库，消息写入时按已读线直接记为已读，结果与写库先后无关；两者都先锁会话行，
+    同一会话的消息写入和已读串行执行。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        flush_interval: float = 0.2,
+        batch_size: int = 500,
+        max_pending: int = 10000
+    ):
+        """
+        参数:
+            session_factory: 异步会话工厂，如AsyncSessionLocal
+            flush_interval (float): 最长写入间隔(秒)
+            batch_size (int): 每批写入的最大消息数，攒满时立即写入
+            max_pending (int): 未写入消息数上限，超出且写入失败时add拒绝登记
+        """
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._messages: List[Dict[str, Any]] = []
+        self._reads: Dict[Tuple[int, str], Tuple[int, datetime]] = {}
+        self._online: Dict[int, int] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.written = 0
+        self.duplicates = 0
+        self.reads = 0
+        self.batches = 0
+        self.failures = 0
+        self.lag_max = 0.0
+        self._oldest: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._messages)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop(), name="im-writer")
+
+    async def stop(self) -> None:
+        """停止后台协程，并写入缓冲区中剩余的变更"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"关闭时写入消息失败，{len(self._messages)}条消息丢失: {e}")
+
+    async def add(self, message: Dict[str, Any]) -> None:
+        """
+        登记一条待写入的消息（messages表的一行）
+
+        缓冲区已满时立即写入一次；写入失败、缓冲区仍满则拒绝登记，抛出MessagingError，
+        消息既不写库也不转发，客户端重试不会产生重复消息。
+        """
+        if len(self._messages) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"消息缓冲区已满且写入失败: {e}")
+            if len(self._messages) >= self.max_pending:
+                raise MessagingError("服务繁忙，请稍后重试")
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._messages.append(message)
+        if len(self._messages) >= self.batch_size:
+            self._wake()
+
+    def mark_read(self, conversation_id: int, reader_type: str, up_to: int) -> None:
+        """登记已读：该会话中发给reader_type的、ID不大于up_to的消息全部已读"""
+        key = (conversation_id, reader_type)
+        previous = self._reads.get(key)
+        if previous is None or previous[0] < up_to:
+            self._reads[key] = (up_to, datetime.utcnow())
+        self._wake()
+
+    def set_online(self, doctor_id: int, online: bool) -> None:
+        """登记医生在线状态变化"""
+        self._online[doctor_id] = 1 if online else 0
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:  # 写库失败时留在缓冲区，下个周期重试
+                logger.error(f"消息写入失败，{len(self._messages)}条待重试: {e}")
+
+    async def flush(self) -> int:
+        """立即写入缓冲区中的全部变更，返回写入的消息数"""
+        if self._flush_lock is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            while self._messages or self._reads or self._online:
+                batch = self._messages[:self.batch_size]
+                # 已读和在线状态随第一批写入；已读必须在它之前的消息写入之后执行
+                rest = len(self._messages) > len(batch)
+                reads = {} if rest else dict(self._reads)
+                online = dict(self._online)
+                try:
+                    written += await self._write(batch, reads, online)
+                except Exception:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                del self._messages[:len(batch)]
+                for key, value in reads.items():
+                    if self._reads.get(key) == value:
+                        del self._reads[key]
+                for doctor_id, status in online.items():
+                    if self._online.get(doctor_id) == status:
+                        del self._online[doctor_id]
+            if not self._messages:
+                self._oldest = None
+        return written
+
+    async def _write(
+        self, batch: List[Dict[str, Any]], reads: Dict[Tuple[int, str], Tuple[int, datetime]], online: Dict[int, int]
+    ) -> int:
+        async with self.session_factory() as db:
+            if batch:
+                batch = await self._apply_watermarks(db, batch)
+            inserted = await self._insert_new(db, batch)
+            if inserted:
+                await self._update_conversations(db, inserted)
+            for (conversation_id, reader_type), (up_to, read_at) in reads.items():
+                await self._apply_read(db, conversation_id, reader_type, up_to, read_at)
+            if online:
+                table = Doctor.__table__
+                await db.execute(
+                    update(table)
+                    .where(table.c.id.in_(list(online)))
+                    .values(online_status=case(online, value=table.c.id))
+                )
+            await db.commit()
+
+        with self._lock:
+            if batch:
+                self.batches += 1
+                if self._oldest is not None:
+                    self.lag_max = max(self.lag_max, time.monotonic() - self._oldest)
+            self.written += len(inserted)
+            self.duplicates += len(batch) - len(inserted)
+            self.reads += len(reads)
+        return len(inserted)
+
+    @staticmethod
+    async def _apply_watermarks(db, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """锁住本批涉及的会话，已读线以内的消息按已读写入（已读先于消息写库时）"""
+        c = Conversation.__table__.c
+        rows = await db.execute(
+            select(c.id, c.last_read_id_user, c.last_read_id_doctor)
+            .where(c.id.in_({message["conversation_id"] for message in batch}))
+            .with_for_update()
+        )
+        watermarks = {row[0]: {USER: row[1], DOCTOR: row[2]} for row in rows}
+        now = datetime.utcnow()
+        result = []
+        for message in batch:
+            watermark = watermarks.get(message["conversation_id"], {}).get(message["receiver_type"], 0)
+            if not message["is_read"] and message["id"] <= watermark:
+                message = dict(message, is_read=1, read_time=now)
+            else:
+                # 多行INSERT要求各行的列一致
+                message = dict(message, read_time=message.get("read_time"))
+            result.append(message)
+        return result
+
+    @staticmethod
+    async def _insert_new(db, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """多行插入消息；上次写入已提交但未确认（重试）时跳过已存在的ID"""
+        if not batch:
+            return []
+        try:
+            await db.execute(insert(Message.__table__), batch)
+            return batch
+        except IntegrityError:
+            await db.rollback()
+        result = await db.execute(select(Message.id).where(Message.id.in_([row["id"] for row in batch])))
+        existing = set(result.scalars().all())
+        new = [row for row in batch if row["id"] not in existing]
+        if new:
+            await db.execute(insert(Message.__table__), new)
+        return new
+
+    @staticmethod
+    async def _update_conversations(db, messages: List[Dict[str, Any]]) -> None:
+        """一条UPDATE更新本批涉及的全部会话的最后消息、未读数和更新时间"""
+        last_id: Dict[int, int] = {}
+        last_at: Dict[int, datetime] = {}
+        unread_user: Dict[int, int] = defaultdict(int)
+        unread_doctor: Dict[int, int] = defaultdict(int)
+        for message in messages:
+            conversation_id = message["conversation_id"]
+            if message["id"] > last_id.get(conversation_id, 0):
+                last_id[conversation_id] = message["id"]
+                last_at[conversation_id] = message["created_at"]
+            if message["is_read"]:
+                continue
+            if message["receiver_type"] == USER:
+                unread_user[conversation_id] += 1
+            else:
+                unread_doctor[conversation_id] += 1
+
+        table = Conversation.__table__
+        c = table.c
+        new_id = case(last_id, value=c.id)
+        # 多个worker的批次可能乱序提交，最后消息只前进不后退
+        newer = or_(c.last_message_id.is_(None), c.last_message_id < new_id)
+        values = {
+            "last_message_id": case((newer, new_id), else_=c.last_message_id),
+            "updated_at": case((newer, case(last_at, value=c.id)), else_=c.updated_at),
+        }
+        if unread_user:
+            values["unread_count_user"] = c.unread_count_user + case(unread_user, value=c.id, else_=0)
+        if unread_doctor:
+            values["unread_count_doctor"] = c.unread_count_doctor + case(unread_doctor, value=c.id, else_=0)
+        await db.execute(update(table).where(c.id.in_(sorted(last_id))).values(**values))
+
+    @staticmethod
+    async def _apply_read(db, conversation_id: int, reader_type: str, up_to: int, read_at: datetime) -> None:
+        """推进已读线，标记已读，并把未读数重置为已读线之后的消息数（通常为0，只扫描会话末尾）"""
+        table = Conversation.__table__
+        column = table.c.last_read_id_user if reader_type == USER else table.c.last_read_id_doctor
+        # 先锁会话行，与其他worker写入该会话的消息串行
+        stored = (await db.execute(
+            select(column).where(table.c.id == conversation_id).with_for_update()
+        )).scalar()
+        watermark = max(stored or 0, up_to)
+        m = Message.__table__.c
+        await db.execute(
+            update(Message.__table__)
+            .where(
+                m.conversation_id == conversation_id, m.id <= watermark,
+                m.receiver_type == reader_type, m.is_read == 0
+            )
+            .values(is_read=1, read_time=read_at)
+        )
+        remaining = (
+            select(func.count())
+            .where(m.conversation_id == conversation_id, m.id > watermark, m.receiver_type == reader_type)
+            .scalar_subquery()
+        )
+        count = "unread_count_user" if reader_type == USER else "unread_count_doctor"
+        await db.execute(
+            update(table).where(table.c.id == conversation_id).values(**{column.key: watermark, count: remaining})
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "written": self.written,
+                "duplicates": self.duplicates,
+                "reads": self.reads,
+                "batches": self.batches,
+                "failures": self.failures,
+                "pending": len(self._messages),
+                "lag_max_ms": round(self.lag_max * 1000, 3),
+            }
+
+
+# ---------------------------------------------------------------- 网关
+
+class MessageGateway:
+    """每个worker一个网关，管理本worker上的连接"""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        broker: Broker,
+        presence: PresenceStore,
+        ids: MessageIdAllocator,
+        writer: MessageWriter,
+        queue_size: int = 100,
+        conversation_cache_size: int = 10000,
+        inbox: Optional[Inbox] = None
+    ):
+        """
+        参数:
+            session_factory: 异步会话工厂
+            broker (Broker): 跨worker转发事件的消息代理
+            presence (PresenceStore): 在线连接数存储
+            ids (MessageIdAllocator): 消息ID分配器
+            writer (MessageWriter): 批量写库缓冲
+            queue_size (int): 每个连接的发送队列上限
+            conversation_cache_size (int): 缓存的会话数（(用户, 医生)与会话ID的对应关系不会变）
+            inbox (Inbox): 会话列表，为空时不维护
+        """
+        self.session_factory = session_factory
+        self.broker = broker
+        self.presence = presence
+        self.ids = ids
+        self.writer = writer
+        self.inbox = inbox
+        self.queue_size = queue_size
+        self._connections: Dict[str, Dict[str, Connection]] = defaultdict(dict)
+        self._conversations = TTLCache(maxsize=conversation_cache_size, ttl=86400)
+        self._started = False
+        self._lock = threading.Lock()
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.slow_closed = 0
+
+    async def start(self) -> None:
+        """用已有的最大消息ID播种ID分配器，订阅消息代理，启动写库协程"""
+        if self._started:
+            return
+        async with self.session_factory() as db:
+            floor = (await db.execute(select(func.max(Message.id)))).scalar() or 0
+        await self.ids.seed(floor)
+        await self.broker.subscribe(self._dispatch)
+        await self.writer.start()
+        self._started = True
+        logger.info(f"消息网关已启动: max_message_id={floor}")
+
+    async def stop(self) -> None:
+        """断开本worker的全部连接，写完缓冲区中的消息"""
+        if not self._started:
+            return
+        self._started = False
+        await self.broker.unsubscribe(self._dispatch)
+        for connections in list(self._connections.values()):
+            for connection in list(connections.values()):
+                connection.close()
+        await self.writer.stop()
+
+    async def close(self) -> None:
+        """停止并关闭代理、在线状态和ID分配器的连接"""
+        await self.stop()
+        await self.broker.close()
+        await self.presence.close()
+        await self.ids.close()
+
+    # ------------------------------------------------------------ 连接管理
+
+    async def serve(self, websocket, participant: Participant) -> None:
+        """处理一个已accept的WebSocket连接，直到断开"""
+        connection = Connection(websocket, participant, self.queue_size)
+        await self._register(connection)
+        writer = connection.start()
+        reader = asyncio.create_task(self._read(connection))
+        try:
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            connection.close()
+            reader.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+            await self._unregister(connection)
+            if connection.slow:
+                with self._lock:
+                    self.slow_closed += 1
+                try:
+                    await websocket.close(code=CLOSE_SLOW_CONSUMER)
+                except Exception:
+                    pass
+
+    async def _register(self, connection: Connection) -> None:
+        participant = connection.participant
+        self._connections[participant.key][connection.id] = connection
+        count = await self.presence.connect(participant.key)
+        if participant.type == DOCTOR and count == 1:
+            self.writer.set_online(participant.id, True)
+
+    async def _unregister(self, connection: Connection) -> None:
+        participant = connection.participant
+        connections = self._connections.get(participant.key)
+        if connections is not None:
+            connections.pop(connection.id, None)
+            if not connections:
+                del self._connections[participant.key]
+        count = await self.presence.disconnect(participant.key)
+        if participant.type == DOCTOR and count == 0:
+            self.writer.set_online(participant.id, False)
+
+    async def _read(self, connection: Connection) -> None:
+        """读取客户端事件直到连接断开"""
+        while not connection.closed:
+            try:
+                data = await connection.websocket.receive_json()
+            except (ValueError, KeyError):
+                connection.send({"type": "error", "detail": "无效的消息格式"})
+                continue
+            except Exception:  # WebSocketDisconnect等，连接已断开
+                return
+            await self.handle(connection, data)
+
+    async def handle(self, connection: Connection, data: Any) -> None:
+        """处理一个客户端事件，出错时给该连接返回error事件"""
+        kind = data.get("type") if isinstance(data, dict) else None
+        client_id = data.get("client_id") if isinstance(data, dict) else None
+        try:
+            if kind == "message":
+                message = await self.send_message(
+                    connection.participant, MessageSend.model_validate(data), origin=connection.id
+                )
+                connection.send({"type": "ack", "client_id": client_id, "message": message})
+            elif kind == "read":
+                request = MessageRead.model_validate(data)
+                await self.mark_read(connection.participant, request.conversation_id, request.up_to)
+            elif kind == "ping":
+                connection.send({"type": "pong"})
+            else:
+                raise MessagingError("不支持的事件类型")
+        except ValidationError as e:
+            connection.send({"type": "error", "client_id": client_id, "detail": e.errors()[0]["msg"]})
+        except MessagingError as e:
+            connection.send({"type": "error", "client_id": client_id, "detail": str(e)})
+        except Exception as e:
+            logger.error(f"消息事件处理异常: {connection.participant.key} {kind}: {e}")
+            connection.send({"type": "error", "client_id": client_id, "detail": "服务暂不可用，请稍后重试"})
+
+    # ------------------------------------------------------------ 消息
+
+    async def send_message(
+        self, sender: Participant, request: MessageSend, origin: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        发送消息：分配ID、放入写库缓冲、转发给接收方和发送方的其他连接
+
+        返回:
+            消息内容（created_at为ISO字符串）
+        """
+        if sender.type == USER:
+            receiver = Participant(DOCTOR, request.to)
+            user_id, doctor_id = sender.id, request.to
+        else:
+            receiver = Participant(USER, request.to)
+            user_id, doctor_id = request.to, sender.id
+        conversation_id = await self._conversation_id(user_id, doctor_id)
+
+        now = datetime.utcnow().replace(microsecond=0)
+        row = {
+            "id": await self.ids.next(),
+            "conversation_id": conversation_id,
+            "sender_id": sender.id,
+            "sender_type": sender.type,
+            "receiver_id": receiver.id,
+            "receiver_type": receiver.type,
+            "content": request.content,
+            "message_type": request.message_type,
+            "media_url": request.media_url,
+            "media_duration": request.media_duration,
+            "is_read": 0,
+            "created_at": now,
+        }
+        await self.writer.add(row)
+        if self.inbox is not None:
+            await self.inbox.record_message(row)
+        with self._lock:
+            self.received += 1
+
+        message = dict(row, is_read=False, created_at=now.isoformat())
+        await self.broker.publish({
+            "targets": [receiver.key, sender.key],
+            "origin": origin,
+            "event": {"type": "message", "message": message},
+        })
+        return message
+
+    async def mark_read(self, reader: Participant, conversation_id: int, up_to: int) -> None:
+        """标记会话中收到的消息已读，并通知对方（已读回执）和自己的其他连接"""
+        user_id, doctor_id = await self._conversation_members(conversation_id)
+        if (reader.type == USER and reader.id != user_id) or (reader.type == DOCTOR and reader.id != doctor_id):
+            raise MessagingError("会话不存在")
+        self.writer.mark_read(conversation_id, reader.type, up_to)
+        event = {
+            "type": "read", "conversation_id": conversation_id,
+            "reader_type": reader.type, "reader_id": reader.id, "up_to": up_to,
+        }
+        if self.inbox is not None:
+            # 自己的其他连接据此更新未读角标
+            event["unread"] = await self.inbox.mark_read(reader.type, reader.id, conversation_id, up_to)
+        other = Participant(DOCTOR, doctor_id) if reader.type == USER else Participant(USER, user_id)
+        await self.broker.publish({
+            "targets": [other.key, reader.key],
+            "origin": None,
+            "event": event,
+        })
+
+    async def _dispatch(self, envelope: Event) -> None:
+        """消息代理回调：投递给本worker上目标参与者的连接（不阻塞）"""
+        origin = envelope.get("origin")
+        delivered = dropped = 0
+        for target in envelope["targets"]:
+            for connection in list(self._connections.get(target, {}).values()):
+                if connection.id == origin:
+                    continue
+                if connection.send(envelope["event"]):
+                    delivered += 1
+                else:
+                    dropped += 1
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += dropped
+
+    # ------------------------------------------------------------ 会话
+
+    async def _conversation_id(self, user_id: int, doctor_id: int) -> int:
+        """
+        获取或创建(用户, 医生)的会话，结果缓存（每对参与者每个worker只查一次库）
+
+        双方都必须正常，且在user_doctor_relations中有正常的医患关系；关系解除后，
+        已缓存的会话最多在缓存过期（一天）前还能发消息。
+        """
+        conversation_id = self._conversations.get(("pair", user_id, doctor_id))
+        if conversation_id is not None:
+            return conversation_id
+
+        async with self.session_factory() as db:
+            doctor_status = (await db.execute(select(Doctor.status).where(Doctor.id == doctor_id))).scalar()
+            if doctor_status != 1:
+                raise MessagingError("医生不存在")
+            user_status = (await db.execute(select(User.status).where(User.id == user_id))).scalar()
+            if user_status != 1:
+                raise MessagingError("用户不存在")
+            relation_status = (await db.execute(
+                select(UserDoctorRelation.status).where(
+                    UserDoctorRelation.user_id == user_id, UserDoctorRelation.doctor_id == doctor_id
+                )
+            )).scalar()
+            if relation_status != 1:
+                raise MessagingError("未建立医患关系")
+            now = datetime.utcnow()
+            await db.execute(build_upsert(
+                db.bind.dialect.name, Conversation.__table__,
+                {"user_id": user_id, "doctor_id": doctor_id, "status": 1, "unread_count_user": 0,
+                 "unread_count_doctor": 0, "created_at": now, "updated_at": now},
+                ["user_id", "doctor_id"]
+            ))
+            conversation_id = (await db.execute(
+                select(Conversation.id).where(Conversation.user_id == user_id, Conversation.doctor_id == doctor_id)
+            )).scalar()
+            await db.commit()
+        self._remember(conversation_id, user_id, doctor_id)
+        return conversation_id
+
+    async def _conversation_members(self, conversation_id: int) -> Tuple[int, int]:
+        members = self._conversations.get(("id", conversation_id))
+        if members is not None:
+            return members
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(Conversation.user_id, Conversation.doctor_id).where(Conversation.id == conversation_id)
+            )).first()
+        if row is None:
+            raise MessagingError("会话不存在")
+        self._remember(conversation_id, row[0], row[1])
+        return row[0], row[1]
+
+    def _remember(self, conversation_id: int, user_id: int, doctor_id: int) -> None:
+        self._conversations.set(("pair", user_id, doctor_id), conversation_id)
+        self._conversations.set(("id", conversation_id), (user_id, doctor_id))
+
+    def is_connected(self, participant: Participant) -> bool:
+        """参与者在本worker上是否有连接"""
+        return bool(self._connections.get(participant.key))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "connections": sum(len(connections) for connections in self._connections.values()),
+                "participants": len(self._connections),
+                "received": self.received,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "slow_closed": self.slow_closed,
+            }
+        stats["writer"] = self.writer.stats()
+        return stats
+
+
+_gateway: Optional[MessageGateway] = None
+
+
+def get_message_gateway() -> MessageGateway:
+    """根据IM_BACKEND配置获取本worker的消息网关"""
+    global _gateway
+    if _gateway is None:
+        from app.core.inbox import get_inbox
+        from app.db.session import AsyncSessionLocal
+
+        backend = settings.IM_BACKEND
+        if backend == "memory":
+            broker, presence, ids = MemoryBroker(), MemoryPresence(), MemoryIdAllocator()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+
+            def client():
+                return aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
+            # 订阅占用一个专用连接，与普通命令分开
+            broker = RedisBroker(client(), settings.IM_BROKER_CHANNEL)
+            presence, ids = RedisPresence(client()), RedisIdAllocator(client())
+        else:
+            raise ValueError(f"不支持的消息网关类型: {backend}")
+        writer = MessageWriter(
+            AsyncSessionLocal,
+            flush_interval=settings.IM_FLUSH_INTERVAL,
+            batch_size=settings.IM_BATCH_SIZE,
+            max_pending=settings.IM_MAX_PENDING
+        )
+        _gateway = MessageGateway(
+            AsyncSessionLocal, broker, presence, ids, writer,
+            queue_size=settings.IM_SEND_QUEUE_SIZE,
+            conversation_cache_size=settings.IM_CONVERSATION_CACHE_SIZE,
+            inbox=get_inbox()
+        )
+    return _gateway
+
+
+def set_message_gateway(gateway: Optional[MessageGateway]) -> None:
+    """替换消息网关（测试用）"""
+    global _gateway
+    _gateway = gateway
+
+
+async def close_message_gateway() -> None:
+    """断开连接、写完缓冲区并关闭外部连接"""
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
@@ -0,0 +1,126 @@
+"""
+监控指标模块 - 以Prometheus文本格式暴露请求、连接池和认证业务指标
+
+多worker部署时需设置环境变量PROMETHEUS_MULTIPROC_DIR（在导入prometheus_client之前），
+各worker把指标写入该目录下的共享内存文件，/metrics由任意一个worker汇总输出。
+"""
+import functools
+import os
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client import multiprocess
+
+MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# 请求耗时分桶(秒)，覆盖缓存命中到bcrypt登录的范围
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP请求数",
+    ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "正在处理的HTTP请求数",
+    ["method"], multiprocess_mode="livesum"
+)
+
+DB_POOL_EVENTS = Counter(
+    "db_pool_events_total", "连接池事件数(checkouts/connects/timeouts/invalidations等)",
+    ["engine", "event"]
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "等待可用连接的时间",
+    ["engine"], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "已检出的连接数",
+    ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "连接池容量(pool_size)",
+    ["engine"], multiprocess_mode="livesum"
+)
+
+AUTH_OPERATIONS = Counter(
+    "auth_operations_total", "认证业务操作结果",
+    ["operation", "outcome"]
+)
+
+# 未匹配任何路由的请求统一归类，避免扫描请求把标签基数撑爆
+UNMATCHED_ROUTE = "unmatched"
+
+
+def record_request(method: str, route: Optional[str], status: int, duration: float) -> None:
+    """记录一次HTTP请求"""
+    labels = (method, route or UNMATCHED_ROUTE, str(status))
+    HTTP_REQUESTS.labels(*labels).inc()
+    HTTP_LATENCY.labels(*labels).observe(duration)
+
+
+def track_outcome(operation: str):
+    """
+    统计认证业务操作结果的装饰器（用于async函数）
+
+    结果标签: success-成功, failure-返回None/False, http_<状态码>-业务拒绝, error-其他异常
+
+    用法:
+        @staticmethod
+        @track_outcome("login_password")
+        async def authenticate_user(...):
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                result = await func(*args, **kwargs)
+            except HTTPException as e:
+                AUTH_OPERATIONS.labels(operation, f"http_{e.status_code}").inc()
+                raise
+            except Exception:
+                AUTH_OPERATIONS.labels(operation, "error").inc()
+                raise
+            outcome = "failure" if result is None or result is False else "success"
+            AUTH_OPERATIONS.labels(operation, outcome).inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def multiprocess_dir() -> Optional[str]:
+    """多进程模式下的指标目录，未启用时返回None"""
+    return os.environ.get(MULTIPROC_ENV) or None
+
+
+def generate_metrics(path: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    生成Prometheus文本格式的指标
+
+    参数:
+        path (str, optional): 多进程指标目录，默认读取PROMETHEUS_MULTIPROC_DIR
+
+    返回:
+        (指标内容, Content-Type)
+    """
+    path = path or multiprocess_dir()
+    if path:
+        # 每次抓取都新建registry，从共享文件汇总所有worker的数据
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=path)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """worker退出时清理其livesum类指标文件，避免已退出进程的在途请求数残留"""
+    path = multiprocess_dir()
+    if path:
+        multiprocess.mark_process_dead(pid or os.getpid(), path)
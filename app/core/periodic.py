@@ -0,0 +1,96 @@
+"""
+定时任务模块 - 在每个worker的事件循环中周期性执行后台任务
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger("health777.periodic")
+
+
+class PeriodicTask:
+    """
+    周期性后台任务
+
+    每个worker各自运行一份，任务本身需要是幂等的；首次执行前随机延迟，
+    避免多个worker同时启动时集中执行。
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[Any]], jitter: float = 0.1):
+        """
+        参数:
+            name (str): 任务名称
+            interval (float): 执行间隔(秒)，小于等于0表示不启用
+            func (callable): 无参数的async函数
+            jitter (float): 间隔的随机浮动比例
+        """
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[float] = None
+        self.last_duration = 0.0
+        self.last_result: Any = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def start(self) -> None:
+        """启动后台任务"""
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop(), name=f"periodic-{self.name}")
+        logger.info(f"定时任务已启动: {self.name}, 间隔{self.interval}秒")
+
+    async def stop(self) -> None:
+        """停止后台任务"""
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def run_once(self) -> Any:
+        """立即执行一次，异常会记录日志后继续抛出"""
+        start = time.perf_counter()
+        try:
+            self.last_result = await self.func()
+            return self.last_result
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"定时任务执行失败: {self.name} - {e}")
+            raise
+        finally:
+            self.runs += 1
+            self.last_run = time.time()
+            self.last_duration = time.perf_counter() - start
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(random.uniform(0, self.interval * self.jitter))
+        while True:
+            try:
+                await self.run_once()
+            except Exception:  # 单次失败不影响后续执行
+                pass
+            await asyncio.sleep(self._delay())
+
+    def stats(self) -> Dict[str, Any]:
+        """返回任务统计"""
+        return {
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_duration_ms": round(self.last_duration * 1000, 3),
+            "last_result": self.last_result,
+        }
@@ -0,0 +1,429 @@
+"""
+积分账本模块 - 请求只负责登记积分事件，后台定时合并成批量写入
+
+每个事件对应一条point_records记录和一次user_points累加。逐条写入时每个事件两次写库，
+并且热点用户的user_points行会被反复加锁；这里把一段时间内的事件合并为：
+    1. 一条多行INSERT写入积分记录
+    2. 按用户汇总后一条多行upsert累加user_points
+两步在同一个事务中，提交后再同步到排行榜。
+
+幂等：同一(reference_type, reference_id, user_id)只发放一次。缓冲区内按该键去重，
+写库前批量查询已存在的记录，数据库上有唯一索引兜底（多个worker并发写同一事件时），
+接口重试、任务重做都不会重复发放。没有关联ID的事件不去重。
+
+撤销：记录被删除时revoke登记一条负积分事件（关联类型加REVOKE_SUFFIX），写库时按原事件实际发放的
+积分扣回。原事件还没写库（如在另一个worker的缓冲区中）时照样写入一条0积分的撤销记录，之后写入的
+原事件看到撤销记录就按0积分入账，与写库先后无关。否则"创建-删除"循环可以无限刷积分。
+两个worker同时写同一用户的发放和撤销时，先锁住该用户的user_points行，使两次写入串行。
+
+延迟：事件最多在缓冲区中停留flush_interval秒（攒满batch_size条时立即写入）；
+写库失败时事件留在缓冲区，下次重试。进程异常退出会丢失缓冲区中尚未写入的事件。
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.leaderboard import Leaderboard, get_leaderboard, local_day
+from app.core.logger import get_logger
+from app.db.upsert import build_insert_ignore, build_upsert
+from app.models.social import PointRecord, UserPoint
+
+logger = get_logger("health777.points")
+
+# 积分记录类型（与point_records.record_type一致）
+RECORD_DIET = 1
+RECORD_EXERCISE = 2
+RECORD_SUPPLEMENT = 3
+RECORD_COMMUNITY = 4
+RECORD_OTHER = 5
+
+# point_records上的唯一键
+REFERENCE_COLUMNS = ["reference_type", "reference_id", "user_id"]
+
+# 撤销事件的关联类型后缀，如"meal:revoke"
+REVOKE_SUFFIX = ":revoke"
+
+
+def revoke_key(key: Tuple[str, int, int]) -> Tuple[str, int, int]:
+    """事件对应的撤销事件的去重键"""
+    return key[0] + REVOKE_SUFFIX, key[1], key[2]
+
+
+class PointAward:
+    __slots__ = ("user_id", "points", "record_type", "description", "reference_type", "reference_id",
+                 "revokes", "created_at", "enqueued_at")
+
+    def __init__(
+        self,
+        user_id: int,
+        points: int,
+        record_type: int,
+        description: str,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        revokes: Optional[Tuple[str, int, int]] = None
+    ):
+        self.user_id = user_id
+        self.points = points
+        self.record_type = record_type
+        self.description = description
+        self.reference_type = reference_type
+        self.reference_id = reference_id
+        # 撤销事件：被撤销事件的去重键，积分在写库时按原事件确定
+        self.revokes = revokes
+        self.created_at = datetime.utcnow()
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def key(self) -> Optional[Tuple[str, int, int]]:
+        """去重键，没有关联ID时为None"""
+        if self.reference_type is None or self.reference_id is None:
+            return None
+        return self.reference_type, self.reference_id, self.user_id
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "points": self.points,
+            "record_type": self.record_type,
+            "description": self.description,
+            "reference_id": self.reference_id,
+            "reference_type": self.reference_type,
+            "created_at": self.created_at,
+        }
+
+
+class PointsLedger:
+    """
+    积分账本
+
+    award登记事件后立即返回；后台协程每flush_interval秒（或攒满batch_size条时）批量写库。
+    缓冲的事件超过max_pending条时，award会等待当前这批写完再返回（背压），不会丢弃事件；
+    写库失败时只记录日志，不向调用方抛出。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        leaderboard: Optional[Leaderboard] = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_pending: int = 10000
+    ):
+        """
+        参数:
+            session_factory: 异步会话工厂，如AsyncSessionLocal
+            leaderboard (Leaderboard): 写库后同步的排行榜，为None时不同步
+            flush_interval (float): 最长写入间隔(秒)，即积分到账的最大延迟
+            batch_size (int): 每批写入的最大事件数
+            max_pending (int): 缓冲事件数上限，超出时award等待写入
+        """
+        self.session_factory = session_factory
+        self.leaderboard = leaderboard
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: List[PointAward] = []
+        self._pending_keys = set()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.written = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.failures = 0
+        self.lag_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """启动后台写入协程"""
+        if self.running:
+            return
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop(), name="points-ledger")
+        logger.info(f"积分账本已启动: flush_interval={self.flush_interval}s, batch_size={self.batch_size}")
+
+    async def stop(self) -> None:
+        """停止后台协程，并写入缓冲区中剩余的事件"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"关闭时写入积分失败，{len(self._pending)}条积分事件丢失: {e}")
+
+    async def award(
+        self,
+        user_id: int,
+        points: int,
+        record_type: int,
+        description: str,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None
+    ) -> bool:
+        """
+        登记一次积分发放（不等待写库），需在事件循环线程中调用
+
+        返回:
+            bool: 是否登记成功；未启动、积分为0或同一事件已在缓冲区中时返回False
+        """
+        if not self.running:
+            self._incr("dropped")
+            return False
+        if not points:
+            return False
+        return await self._submit(
+            PointAward(user_id, points, record_type, description, reference_type, reference_id)
+        )
+
+    async def revoke(
+        self, user_id: int, record_type: int, description: str, reference_type: str, reference_id: int
+    ) -> bool:
+        """
+        撤销(reference_type, reference_id, user_id)发放的积分（关联记录被删除时调用）
+
+        登记一条负积分事件，写库时扣回原事件实际发放的积分；原事件还没写库时记0积分，
+        原事件之后写入时按0积分入账。同一事件只撤销一次。
+        """
+        if not self.running:
+            self._incr("dropped")
+            return False
+        award = PointAward(
+            user_id, 0, record_type, description, reference_type + REVOKE_SUFFIX, reference_id,
+            revokes=(reference_type, reference_id, user_id)
+        )
+        return await self._submit(award)
+
+    async def _submit(self, award: PointAward) -> bool:
+        key = award.key
+        if key is not None:
+            if key in self._pending_keys:
+                self._incr("deduplicated")
+                return False
+            self._pending_keys.add(key)
+        self._pending.append(award)
+        self._incr("submitted")
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        if len(self._pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                # 调用方的记录已提交，不能因积分写库失败报错；事件留在缓冲区由后台协程重试
+                logger.error(f"积分缓冲区已满且写入失败，{len(self._pending)}条待重试: {e}")
+        return True
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:  # 写库失败时事件留在缓冲区，下个周期重试
+                logger.error(f"积分写入失败，{len(self._pending)}条待重试: {e}")
+
+    async def flush(self) -> int:
+        """
+        立即写入缓冲区中的全部事件
+
+        返回:
+            int: 实际发放的事件数（不含数据库中已存在的重复事件）
+        """
+        if self._flush_lock is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                try:
+                    written += await self._write(batch)
+                except Exception:
+                    self._incr("failures")
+                    raise
+                del self._pending[:len(batch)]
+                for award in batch:
+                    self._pending_keys.discard(award.key)
+        return written
+
+    async def _write(self, batch: List[PointAward]) -> int:
+        """一个事务写入一批事件，返回实际发放数"""
+        async with self.session_factory() as db:
+            awarded = await self._insert_new(db, batch)
+            totals: Dict[int, int] = defaultdict(int)
+            for award in awarded:
+                if award.points:
+                    totals[award.user_id] += award.points
+            if totals:
+                now = datetime.utcnow()
+                c = UserPoint.__table__.c
+                await db.execute(build_upsert(
+                    db.bind.dialect.name, UserPoint.__table__,
+                    [
+                        {"user_id": user_id, "total_points": points, "available_points": points,
+                         "created_at": now, "updated_at": now}
+                        for user_id, points in totals.items()
+                    ],
+                    ["user_id"],
+                    lambda inserted: [
+                        ("total_points", c.total_points + inserted.total_points),
+                        ("available_points", c.available_points + inserted.available_points),
+                        ("updated_at", inserted.updated_at),
+                    ]
+                ))
+            await db.commit()
+
+        lag = time.monotonic() - batch[0].enqueued_at
+        with self._lock:
+            self.batches += 1
+            self.written += len(awarded)
+            self.duplicates += len(batch) - len(awarded)
+            self.lag_max = max(self.lag_max, lag)
+
+        if self.leaderboard is not None and totals:
+            # 按事件发生时间（而不是写入时间）所在的本地日期记入日榜/周榜，与从数据库重建的结果一致
+            by_day: Dict[date, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+            for award in awarded:
+                if award.points:
+                    by_day[local_day(award.created_at)][award.user_id] += award.points
+            try:
+                for day, day_totals in by_day.items():
+                    await self.leaderboard.record(dict(day_totals), day)
+            except Exception as e:  # 排行榜可由夜间任务从数据库重建
+                logger.warning(f"积分同步到排行榜失败: {e}")
+        return len(awarded)
+
+    @staticmethod
+    async def _insert_new(db, batch: List[PointAward]) -> List[PointAward]:
+        """插入数据库中还不存在的积分记录，返回实际插入的事件"""
+        keys = {award.key for award in batch if award.key is not None}
+        # 撤销事件查原事件，发放事件查是否已被撤销
+        keys |= {award.revokes for award in batch if award.revokes is not None}
+        keys |= {revoke_key(award.key) for award in batch if award.key is not None and award.revokes is None}
+        # 已存在的事件 -> 发放的积分（撤销事件按原事件的积分扣回）
+        existing: Dict[Tuple[str, int, int], int] = {}
+        if keys:
+            # 同一用户的发放和撤销可能由不同worker同时写入：锁住这些用户的积分行，后写的一方等待
+            # 先写的提交后再查询，能看到对方的记录（尚无积分行的用户由插入user_points时的锁冲突回滚重试）
+            await db.execute(
+                select(UserPoint.user_id)
+                .where(UserPoint.user_id.in_({key[2] for key in keys}))
+                .with_for_update()
+            )
+            result = await db.execute(
+                select(
+                    PointRecord.reference_type, PointRecord.reference_id, PointRecord.user_id, PointRecord.points
+                ).where(
+                    PointRecord.reference_type.in_({key[0] for key in keys}),
+                    PointRecord.reference_id.in_({key[1] for key in keys}),
+                    PointRecord.user_id.in_({key[2] for key in keys})
+                )
+            )
+            existing = {(row[0], row[1], row[2]): row[3] for row in result}
+
+        new = []
+        for award in batch:
+            if award.key is not None and award.key in existing:
+                continue
+            if award.revokes is not None:
+                # 原事件可能在同一批中，按顺序处理；还没写库时记0积分，由原事件写入时抵消
+                award.points = -max(existing.get(award.revokes, 0), 0)
+            elif award.key is not None and revoke_key(award.key) in existing:
+                # 记录已被删除（撤销先于发放写库）：按0积分入账
+                award.points = 0
+            new.append(award)
+            if award.key is not None:
+                existing[award.key] = award.points
+        if not new:
+            return new
+
+        try:
+            # 使用Core插入：ORM批量插入会按是否为NULL拆分成多条INSERT(没有关联ID的事件)
+            await db.execute(insert(PointRecord.__table__), [award.row() for award in new])
+            return new
+        except IntegrityError:
+            # 其他worker刚写入了同一事件：回滚后逐条插入，冲突的忽略
+            await db.rollback()
+
+        inserted = []
+        dialect = db.bind.dialect.name
+        for award in new:
+            if award.key is None:
+                await db.execute(insert(PointRecord.__table__), [award.row()])
+                inserted.append(award)
+                continue
+            # INSERT IGNORE的rowcount只计实际插入的行（ON DUPLICATE KEY UPDATE在MySQL上冲突也返回1）
+            result = await db.execute(
+                build_insert_ignore(dialect, PointRecord.__table__, award.row(), REFERENCE_COLUMNS)
+            )
+            if result.rowcount == 1:
+                inserted.append(award)
+        return inserted
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回账本统计"""
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "dropped": self.dropped,
+                "written": self.written,
+                "duplicates": self.duplicates,
+                "batches": self.batches,
+                "failures": self.failures,
+                "pending": len(self._pending),
+                "lag_max_ms": round(self.lag_max * 1000, 3),
+            }
+
+
+_ledger: Optional[PointsLedger] = None
+
+
+def get_points_ledger() -> PointsLedger:
+    """获取进程内的积分账本"""
+    global _ledger
+    if _ledger is None:
+        from app.db.session import AsyncSessionLocal
+
+        _ledger = PointsLedger(
+            AsyncSessionLocal,
+            leaderboard=get_leaderboard(),
+            flush_interval=settings.POINTS_FLUSH_INTERVAL,
+            batch_size=settings.POINTS_BATCH_SIZE,
+            max_pending=settings.POINTS_MAX_PENDING
+        )
+    return _ledger
+
+
+def set_points_ledger(ledger: Optional[PointsLedger]) -> None:
+    """替换积分账本（测试用）"""
+    global _ledger
+    _ledger = ledger
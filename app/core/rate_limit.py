@@ -0,0 +1,263 @@
+"""
+限流模块 - 令牌桶限流，支持进程内和Redis共享两种后端
+"""
+import math
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger("health777.rate_limit")
+
+
+class RateLimitRule:
+    """限流规则：period秒内最多limit次，按令牌桶平滑补充"""
+
+    __slots__ = ("limit", "period")
+
+    def __init__(self, limit: int, period: float):
+        if limit <= 0 or period <= 0:
+            raise ValueError("限流规则的次数和周期必须大于0")
+        self.limit = limit
+        self.period = period
+
+    @property
+    def rate(self) -> float:
+        """每秒补充的令牌数"""
+        return self.limit / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> List["RateLimitRule"]:
+        """
+        解析规则字符串，如 "1/60,10/86400" 表示每分钟1次且每天10次
+
+        参数:
+            spec (str): 逗号分隔的"次数/秒数"
+        """
+        rules = []
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            limit, period = part.split("/")
+            rules.append(cls(int(limit), float(period)))
+        return rules
+
+    def __repr__(self):
+        return f"<RateLimitRule {self.limit}/{self.period:g}s>"
+
+
+class RateLimitBackend:
+    """限流后端接口"""
+
+    async def hit(self, key: str, rules: Sequence[RateLimitRule]) -> Tuple[bool, float]:
+        """
+        消耗一个令牌；所有规则都允许时才扣减
+
+        返回:
+            (是否允许, 需要等待的秒数)
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """进程内令牌桶，只限制当前worker，适用于单进程部署和测试"""
+
+    SWEEP_INTERVAL = 1024
+
+    def __init__(self, timer: Callable[[], float] = time.monotonic):
+        self._timer = timer
+        self._buckets = {}  # key -> (tokens, updated_at, period)
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    async def hit(self, key: str, rules: Sequence[RateLimitRule]) -> Tuple[bool, float]:
+        now = self._timer()
+        with self._lock:
+            states = []
+            retry_after = 0.0
+            for index, rule in enumerate(rules):
+                bucket_key = f"{key}:{index}"
+                tokens, updated_at, _ = self._buckets.get(bucket_key, (rule.limit, now, rule.period))
+                tokens = min(rule.limit, tokens + (now - updated_at) * rule.rate)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rule.rate)
+                states.append((bucket_key, tokens, rule.period))
+
+            allowed = retry_after == 0.0
+            for bucket_key, tokens, period in states:
+                self._buckets[bucket_key] = (tokens - 1 if allowed else tokens, now, period)
+
+            self._hits += 1
+            if self._hits % self.SWEEP_INTERVAL == 0:
+                self._sweep(now)
+            return allowed, retry_after
+
+    def _sweep(self, now: float) -> None:
+        # 超过一个周期未访问的桶已经补满，可以直接删除
+        idle = [k for k, (_, updated_at, period) in self._buckets.items() if now - updated_at > period]
+        for k in idle:
+            del self._buckets[k]
+
+
+# 多规则令牌桶：先计算全部规则，全部允许才扣减
+# KEYS: 每条规则对应一个桶; ARGV: now_ms, 然后每条规则的 limit, period_ms
+_TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local rate = limit / period
+    local state = redis.call('HMGET', key, 't', 'u')
+    local t = tonumber(state[1]) or limit
+    local u = tonumber(state[2]) or now
+    t = math.min(limit, t + math.max(0, now - u) * rate)
+    if t < 1 then
+        wait = math.max(wait, (1 - t) / rate)
+    end
+    tokens[i] = t
+end
+local allowed = wait == 0
+for i, key in ipairs(KEYS) do
+    local t = tokens[i]
+    if allowed then t = t - 1 end
+    redis.call('HSET', key, 't', tostring(t), 'u', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(tonumber(ARGV[i * 2 + 1])))
+end
+if allowed then return {1, 0} end
+return {0, tostring(wait)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """基于Redis的令牌桶，多worker共享限流状态"""
+
+    def __init__(self, client, prefix: str = "rate_limit", timer: Callable[[], float] = time.time):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端
+            prefix (str): key前缀
+            timer (callable): 时钟函数(秒)，各worker需使用同一时钟源
+        """
+        self._client = client
+        self._prefix = prefix
+        self._timer = timer
+        self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, rules: Sequence[RateLimitRule]) -> Tuple[bool, float]:
+        keys = [f"{self._prefix}:{key}:{index}" for index in range(len(rules))]
+        args = [int(self._timer() * 1000)]
+        for rule in rules:
+            args.extend([rule.limit, int(rule.period * 1000)])
+        allowed, wait_ms = await self._script(keys=keys, args=args)
+        return int(allowed) == 1, float(wait_ms) / 1000
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class RateLimiter:
+    """限流器：超限时抛出429并带上Retry-After"""
+
+    def __init__(self, backend: RateLimitBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+
+    async def check(self, key: str, rules: Sequence[RateLimitRule]) -> None:
+        if not self.enabled or not rules:
+            return
+        try:
+            allowed, retry_after = await self.backend.hit(key, rules)
+        except Exception as e:
+            # 限流存储不可用时放行，避免影响正常登录
+            logger.error(f"限流检查失败，已放行: {key} - {e}")
+            return
+        if not allowed:
+            logger.warning(f"触发限流: {key}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """根据RATE_LIMIT_BACKEND配置获取限流器（进程内单例）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        backend = settings.RATE_LIMIT_BACKEND
+        if backend == "memory":
+            limiter_backend = MemoryRateLimitBackend()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            limiter_backend = RedisRateLimitBackend(aioredis.from_url(settings.REDIS_URL))
+        else:
+            raise ValueError(f"不支持的限流存储类型: {backend}")
+        _rate_limiter = RateLimiter(limiter_backend, enabled=settings.RATE_LIMIT_ENABLED)
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """替换限流器（测试用）"""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+async def close_rate_limiter() -> None:
+    """关闭限流存储连接"""
+    global _rate_limiter
+    if _rate_limiter is not None:
+        await _rate_limiter.backend.close()
+        _rate_limiter = None
+
+
+def get_client_ip(request: Request) -> str:
+    """获取客户端IP，部署在反向代理后时可信任X-Forwarded-For"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_phone(scope: str, spec: str):
+    """
+    生成按手机号限流的检查函数（手机号在请求体中，需在接口内调用）
+
+    用法:
+        limit_sms_phone = limit_by_phone("sms", settings.RATE_LIMIT_SMS_PHONE)
+        await limit_sms_phone(request.phone)
+    """
+    rules = RateLimitRule.parse(spec)
+
+    async def check(phone: str) -> None:
+        await get_rate_limiter().check(f"{scope}:phone:{phone}", rules)
+
+    return check
+
+
+def limit_by_ip(scope: str, spec: str):
+    """
+    生成按客户端IP限流的依赖
+
+    用法:
+        @router.post("/sms/send", dependencies=[Depends(limit_by_ip("sms", settings.RATE_LIMIT_SMS_IP))])
+    """
+    rules = RateLimitRule.parse(spec)
+
+    async def dependency(request: Request) -> None:
+        await get_rate_limiter().check(f"{scope}:ip:{get_client_ip(request)}", rules)
+
+    return dependency
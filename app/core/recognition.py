@@ -0,0 +1,462 @@
+"""
+食物图片识别模块 - 上传请求只负责提交任务，后台worker调用识别服务，结果按图片内容哈希缓存
+"""
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from fastapi import HTTPException, status
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger("health777.recognition")
+
+# 任务状态
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+# 图片内容，或在worker中读取图片内容的async函数（排队期间不占内存）
+ImageSource = Union[bytes, Callable[[], Awaitable[bytes]]]
+
+
+class Recognizer:
+    """
+    图片识别接口
+
+    recognize返回候选食物列表 [{"name", "confidence", "calories_per_100g"}]，按置信度降序；
+    抛出异常表示识别失败，任务标记为failed，不缓存结果。
+    """
+
+    async def recognize(self, image: bytes) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeRecognizer(Recognizer):
+    """
+    本地假识别器，用于开发、测试和压测
+
+    按图片哈希从固定的食物列表中确定性地选出候选，可设置延迟模拟识别服务耗时。
+    """
+
+    FOODS = ("鸡胸肉", "鸡蛋", "牛奶", "米饭", "西兰花", "豆腐", "三文鱼", "牛肉", "苹果", "燕麦")
+
+    def __init__(self, delay: float = 0.0, top_k: int = 3):
+        self.delay = delay
+        self.top_k = top_k
+        self.calls = 0
+
+    async def recognize(self, image: bytes) -> List[Dict[str, Any]]:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        seed = hashlib.sha256(image).digest()
+        results = []
+        for rank in range(self.top_k):
+            name = self.FOODS[(seed[rank] + rank) % len(self.FOODS)]
+            if any(item["name"] == name for item in results):
+                continue
+            results.append({
+                "name": name,
+                "confidence": round(0.9 - rank * 0.2 - seed[rank] / 2550, 4),
+                "calories_per_100g": None,
+            })
+        return results
+
+
+class AliyunRecognizer(Recognizer):
+    """阿里云视觉智能开放平台的食物识别(RecognizeFood)，客户端在进程内复用"""
+
+    ENDPOINT = "imagerecog.cn-shanghai.aliyuncs.com"
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from alibabacloud_imagerecog20190930.client import Client
+            from alibabacloud_tea_openapi import models as open_api_models
+
+            self._client = Client(open_api_models.Config(
+                access_key_id=settings.ALIYUN_ACCESS_KEY_ID,
+                access_key_secret=settings.ALIYUN_ACCESS_KEY_SECRET,
+                endpoint=self.ENDPOINT
+            ))
+        return self._client
+
+    async def recognize(self, image: bytes) -> List[Dict[str, Any]]:
+        if not (settings.ALIYUN_ACCESS_KEY_ID and settings.ALIYUN_ACCESS_KEY_SECRET):
+            raise RuntimeError("阿里云访问密钥未配置")
+
+        from alibabacloud_imagerecog20190930 import models as imagerecog_models
+        from alibabacloud_tea_util import models as util_models
+
+        request = imagerecog_models.RecognizeFoodAdvanceRequest(image_urlobject=io.BytesIO(image))
+        response = await self._get_client().recognize_food_advance_async(request, util_models.RuntimeOptions())
+        results = response.body.data.top_five_results or []
+        return [
+            {
+                "name": item.category,
+                "confidence": float(item.score),
+                "calories_per_100g": float(item.calorie) if item.calorie is not None else None,
+            }
+            for item in results
+        ]
+
+
+class RecognitionStore:
+    """识别任务和结果存储接口"""
+
+    async def save_job(self, job: Dict[str, Any], ttl: int) -> None:
+        raise NotImplementedError
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def save_result(self, digest: str, result: List[Dict[str, Any]], ttl: int) -> None:
+        raise NotImplementedError
+
+    async def get_result(self, digest: str) -> Optional[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRecognitionStore(RecognitionStore):
+    """
+    进程内识别存储
+
+    只在当前进程内有效，适用于单worker开发环境和测试；
+    多worker部署时轮询可能落在其他进程，应使用RedisRecognitionStore。
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.jobs = TTLCache(maxsize=maxsize)
+        self.results = TTLCache(maxsize=maxsize)
+
+    async def save_job(self, job: Dict[str, Any], ttl: int) -> None:
+        self.jobs.set(job["id"], dict(job), ttl=ttl)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def save_result(self, digest: str, result: List[Dict[str, Any]], ttl: int) -> None:
+        self.results.set(digest, result, ttl=ttl)
+
+    async def get_result(self, digest: str) -> Optional[List[Dict[str, Any]]]:
+        return self.results.get(digest)
+
+
+class RedisRecognitionStore(RecognitionStore):
+    """基于Redis的识别存储，任务和结果以JSON保存，过期由Redis的EX负责，多worker共享"""
+
+    def __init__(self, client, prefix: str = "recognition"):
+        """
+        参数:
+            client: redis.asyncio.Redis兼容的客户端（需decode_responses=True）
+            prefix (str): key前缀
+        """
+        self._client = client
+        self._prefix = prefix
+
+    async def save_job(self, job: Dict[str, Any], ttl: int) -> None:
+        await self._client.set(f"{self._prefix}:job:{job['id']}", json.dumps(job, ensure_ascii=False), ex=ttl)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        value = await self._client.get(f"{self._prefix}:job:{job_id}")
+        return json.loads(value) if value is not None else None
+
+    async def save_result(self, digest: str, result: List[Dict[str, Any]], ttl: int) -> None:
+        await self._client.set(f"{self._prefix}:result:{digest}", json.dumps(result, ensure_ascii=False), ex=ttl)
+
+    async def get_result(self, digest: str) -> Optional[List[Dict[str, Any]]]:
+        value = await self._client.get(f"{self._prefix}:result:{digest}")
+        return json.loads(value) if value is not None else None
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class RecognitionPipeline:
+    """
+    图片识别任务调度器
+
+    submit先按图片sha256查结果缓存，命中则任务直接完成；同一张图片正在识别时
+    新任务挂在已有识别上，不重复调用识别服务；否则进入有界队列，由后台worker识别。
+    队列满时返回503，而不是让上传请求等待。
+    """
+
+    def __init__(
+        self,
+        recognizer: Recognizer,
+        store: RecognitionStore,
+        queue_size: int = 50,
+        workers: int = 4,
+        timeout: float = 15.0,
+        job_ttl: int = 3600,
+        result_ttl: int = 7 * 86400,
+        poll_interval: float = 0.5
+    ):
+        """
+        参数:
+            recognizer (Recognizer): 识别服务
+            store (RecognitionStore): 任务和结果存储
+            queue_size (int): 等待识别的图片数上限
+            workers (int): 后台worker数量，即同时调用识别服务的并发数
+            timeout (float): 单次识别超时时间(秒)
+            job_ttl (int): 任务保存时间(秒)
+            result_ttl (int): 识别结果缓存时间(秒)
+            poll_interval (float): 等待其他进程的任务时查询存储的间隔(秒)
+        """
+        self.recognizer = recognizer
+        self.store = store
+        self.queue_size = queue_size
+        self.workers = workers
+        self.timeout = timeout
+        self.job_ttl = job_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        # 正在识别的图片: digest -> 等待该结果的任务列表
+        self._inflight: Dict[str, List[Dict[str, Any]]] = {}
+        # 本进程提交的未完成任务的完成通知
+        self._events: Dict[str, asyncio.Event] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.cache_hits = 0
+        self.deduplicated = 0
+        self.recognized = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """启动后台worker"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"recognition-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"图片识别队列已启动: workers={self.workers}, queue_size={self.queue_size}")
+
+    async def stop(self) -> None:
+        """停止worker，未完成的任务标记为失败"""
+        if not self.running:
+            return
+        # wait_for在识别刚好完成时可能吞掉取消，worker靠该标志退出循环
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for digest in list(self._inflight):
+            await self._finish(digest, None, "服务重启，请重新上传")
+        self._queue = None
+        await self.recognizer.close()
+        await self.store.close()
+
+    async def submit(
+        self, user_id: int, image: ImageSource, digest: Optional[str] = None, image_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        提交识别任务（不等待识别结果）
+
+        参数:
+            user_id (int): 用户ID
+            image: 图片内容，或读取图片内容的async函数
+            digest (str): 图片sha256，image为函数时必须传入
+            image_url (str): 图片已保存时的访问地址，随任务返回
+
+        返回:
+            dict: 任务，命中缓存时status已为done
+        """
+        if digest is None:
+            if callable(image):
+                raise ValueError("image为读取函数时必须传入digest")
+            digest = hashlib.sha256(image).hexdigest()
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "digest": digest,
+            "image_url": image_url,
+            "status": PENDING,
+            "cached": False,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+
+        cached = await self.store.get_result(digest)
+        if cached is not None:
+            job.update(status=DONE, cached=True, result=cached, finished_at=job["created_at"])
+            await self.store.save_job(job, self.job_ttl)
+            self._incr("cache_hits")
+            return job
+
+        waiters = self._inflight.get(digest)
+        if waiters is not None:
+            waiters.append(job)
+            self._incr("deduplicated")
+        else:
+            if self._queue is None:
+                self._incr("rejected")
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="图片识别服务未启动")
+            try:
+                self._queue.put_nowait((digest, image, time.monotonic()))
+            except asyncio.QueueFull:
+                self._incr("rejected")
+                logger.warning(f"图片识别队列已满，拒绝任务: user={user_id}")
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="识别任务繁忙，请稍后重试")
+            self._inflight[digest] = [job]
+        self._events[job["id"]] = asyncio.Event()
+        await self.store.save_job(job, self.job_ttl)
+        self._incr("submitted")
+        # 返回副本，worker完成时修改的是_inflight中的任务
+        return dict(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务"""
+        return await self.store.get_job(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        等待任务完成（长轮询），超时返回当前状态
+
+        本进程提交的任务通过事件通知，其他进程的任务按poll_interval查询存储。
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.store.get_job(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] != PENDING or remaining <= 0:
+                return job
+            event = self._events.get(job_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                else:
+                    await asyncio.sleep(min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            digest, image, enqueued_at = await self._queue.get()
+            try:
+                if callable(image):
+                    image = await image()
+                result = await asyncio.wait_for(self.recognizer.recognize(image), timeout=self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._incr("failed")
+                logger.error(f"图片识别失败: {digest[:12]} - {e!r}")
+                await self._finish(digest, None, "识别失败，请重试或手动添加食物")
+            else:
+                latency = time.monotonic() - enqueued_at
+                with self._lock:
+                    self.recognized += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                try:
+                    await self.store.save_result(digest, result, self.result_ttl)
+                except Exception as e:  # 缓存写失败不影响本次结果
+                    logger.error(f"识别结果缓存失败: {digest[:12]} - {e}")
+                await self._finish(digest, result, None)
+            finally:
+                self._queue.task_done()
+
+    async def _finish(self, digest: str, result: Optional[List[Dict[str, Any]]], error: Optional[str]) -> None:
+        """完成等待同一张图片的所有任务并通知等待方"""
+        now = time.time()
+        for job in self._inflight.pop(digest, []):
+            job.update(status=DONE if error is None else FAILED, result=result, error=error, finished_at=now)
+            try:
+                await self.store.save_job(job, self.job_ttl)
+            except Exception as e:
+                logger.error(f"识别任务保存失败: {job['id']} - {e}")
+            event = self._events.pop(job["id"], None)
+            if event is not None:
+                event.set()
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回识别统计"""
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "cache_hits": self.cache_hits,
+                "deduplicated": self.deduplicated,
+                "recognized": self.recognized,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "inflight": len(self._inflight),
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "latency_avg_ms": round(self.latency_total / self.recognized * 1000, 3) if self.recognized else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 3),
+            }
+
+
+_pipeline: Optional[RecognitionPipeline] = None
+
+
+def get_recognition_pipeline() -> RecognitionPipeline:
+    """根据RECOGNIZER和RECOGNITION_STORE_BACKEND配置获取识别调度器（进程内单例）"""
+    global _pipeline
+    if _pipeline is None:
+        if settings.RECOGNIZER == "aliyun":
+            recognizer: Recognizer = AliyunRecognizer()
+        elif settings.RECOGNIZER == "fake":
+            recognizer = FakeRecognizer(delay=settings.RECOGNITION_FAKE_DELAY)
+        else:
+            raise ValueError(f"不支持的识别服务类型: {settings.RECOGNIZER}")
+
+        backend = settings.RECOGNITION_STORE_BACKEND
+        if backend == "memory":
+            store: RecognitionStore = MemoryRecognitionStore()
+        elif backend == "redis":
+            import redis.asyncio as aioredis
+            store = RedisRecognitionStore(aioredis.from_url(settings.REDIS_URL, decode_responses=True))
+        else:
+            raise ValueError(f"不支持的识别存储类型: {backend}")
+
+        _pipeline = RecognitionPipeline(
+            recognizer,
+            store,
+            queue_size=settings.RECOGNITION_QUEUE_SIZE,
+            workers=settings.RECOGNITION_WORKERS,
+            timeout=settings.RECOGNITION_TIMEOUT,
+            job_ttl=settings.RECOGNITION_JOB_TTL,
+            result_ttl=settings.RECOGNITION_RESULT_TTL
+        )
+    return _pipeline
+
+
+def set_recognition_pipeline(pipeline: Optional[RecognitionPipeline]) -> None:
+    """替换识别调度器（测试用）"""
+    global _pipeline
+    _pipeline = pipeline
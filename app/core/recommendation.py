@@ -0,0 +1,255 @@
+"""
+蛋白质补充推荐模块 - 按类别预排好蛋白质密度，用有界背包求"补足X克蛋白质"的组合，结果按(缺口档位, 偏好)缓存
+"""
+import math
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache
+from app.core.food_catalog import CatalogSnapshot
+
+# 每份的克数，推荐量按份计
+PORTION_GRAMS = 50
+# 单种食物最多推荐的份数
+MAX_PORTIONS = 4
+# 每类只取蛋白质密度最高的前几种作为候选
+TOP_PER_CATEGORY = 5
+# 每100g蛋白质低于该值的食物不作为候选
+MIN_PROTEIN_PER_100G = 5.0
+# 每多选一种食物折算的热量(kcal)，让组合尽量少而精
+FOOD_PENALTY_KCAL = 40.0
+# 偏好类别的热量折扣，热量相近时优先选偏好类别
+PREFERRED_DISCOUNT = 0.8
+# 缺口按档位向上取整后求解，同一档位的用户共用结果
+GAP_BUCKET_GRAMS = 5
+# 超过该缺口时改用贪心（背包状态数与缺口成正比）
+MAX_DP_GAP = 150
+# 每种推荐食物附带的可替换食材数
+ALTERNATIVES = 2
+
+
+class Preferences:
+    """用户食物偏好（不可变，可作为缓存key）"""
+
+    __slots__ = ("excluded_categories", "excluded_foods", "preferred_categories")
+
+    def __init__(
+        self,
+        excluded_categories: Iterable[str] = (),
+        excluded_foods: Iterable[int] = (),
+        preferred_categories: Iterable[str] = ()
+    ):
+        self.excluded_categories: FrozenSet[str] = frozenset(excluded_categories)
+        self.excluded_foods: FrozenSet[int] = frozenset(int(food_id) for food_id in excluded_foods)
+        self.preferred_categories: FrozenSet[str] = frozenset(preferred_categories) - self.excluded_categories
+
+    @property
+    def key(self) -> Tuple[FrozenSet[str], FrozenSet[int], FrozenSet[str]]:
+        return self.excluded_categories, self.excluded_foods, self.preferred_categories
+
+    def __eq__(self, other):
+        return isinstance(other, Preferences) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+NO_PREFERENCES = Preferences()
+
+
+def gap_bucket(gap: float) -> int:
+    """把蛋白质缺口向上取整到档位，保证推荐量不少于实际缺口"""
+    if gap <= 0:
+        return 0
+    return int(math.ceil(gap / GAP_BUCKET_GRAMS) * GAP_BUCKET_GRAMS)
+
+
+class RecommendationEngine:
+    """
+    蛋白质补充推荐引擎
+
+    基于一份目录快照构建：按类别把蛋白质含量达标的食物按密度（每100g蛋白质，
+    同密度时热量低者优先）排序。推荐时只在各类别的前TOP_PER_CATEGORY种中求解，
+    结果按(缺口档位, 偏好)缓存，批量生成时相同情况的用户只计算一次。
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, cache_size: int = 4096):
+        self.snapshot = snapshot
+        protein = snapshot.values[:, 0]
+        calories = snapshot.values[:, 1]
+        rankings: Dict[str, List[int]] = {}
+        for pos in range(len(snapshot)):
+            if protein[pos] >= MIN_PROTEIN_PER_100G:
+                rankings.setdefault(snapshot.categories[pos], []).append(pos)
+        for positions in rankings.values():
+            positions.sort(key=lambda pos: (-protein[pos], calories[pos]))
+        self.rankings = rankings
+        self._cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+        self._lock = threading.Lock()
+        self.solves = 0
+
+    def candidates(self, preferences: Preferences) -> List[int]:
+        """按偏好过滤后每类取前TOP_PER_CATEGORY种，返回目录位置"""
+        result = []
+        for category, positions in self.rankings.items():
+            if category in preferences.excluded_categories:
+                continue
+            allowed = [pos for pos in positions if int(self.snapshot.ids[pos]) not in preferences.excluded_foods]
+            result.extend(allowed[:TOP_PER_CATEGORY])
+        return result
+
+    def recommend(self, gap: float, preferences: Preferences = NO_PREFERENCES) -> Dict[str, Any]:
+        """
+        推荐补足蛋白质缺口的食物组合
+
+        返回:
+            dict: gap-求解用的缺口档位, items-[{food_item_id, name, category, grams, protein, calories,
+                  alternatives}], total_protein, total_calories
+        """
+        bucket = gap_bucket(gap)
+        key = (bucket, preferences.key)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._solve(bucket, preferences)
+            self._cache.set(key, result)
+        return result
+
+    def _solve(self, target: int, preferences: Preferences) -> Dict[str, Any]:
+        with self._lock:
+            self.solves += 1
+        candidates = self.candidates(preferences) if target else []
+        if target <= MAX_DP_GAP:
+            choice = self._knapsack(candidates, target, preferences)
+        else:
+            choice = self._greedy(candidates, target)
+
+        chosen = {pos for pos, _ in choice}
+        items = []
+        for pos, portions in sorted(choice, key=lambda item: -self.snapshot.values[item[0], 0] * item[1]):
+            grams = portions * PORTION_GRAMS
+            item = self._item(pos, grams)
+            item["alternatives"] = self._alternatives(pos, item["protein"], chosen, preferences)
+            items.append(item)
+        return {
+            "gap": target,
+            "items": items,
+            "total_protein": round(sum(item["protein"] for item in items), 1),
+            "total_calories": round(sum(item["calories"] for item in items), 1),
+        }
+
+    def _knapsack(self, candidates: Sequence[int], target: int, preferences: Preferences) -> List[Tuple[int, int]]:
+        """
+        分组背包：每种食物为一组，可选0~MAX_PORTIONS份，求蛋白质不少于target时"热量+种类惩罚"最小的组合
+
+        蛋白质按整克向下取整计入，实际总量不会低于target。
+        """
+        inf = float("inf")
+        best = [0.0] + [inf] * target
+        # 每组更新过的状态: stage -> {蛋白质: (份数, 上一状态)}
+        steps: List[Dict[int, Tuple[int, int]]] = []
+        values = self.snapshot.values
+        for pos in candidates:
+            protein = values[pos, 0] * PORTION_GRAMS / 100
+            cost = values[pos, 1] * PORTION_GRAMS / 100
+            if self.snapshot.categories[pos] in preferences.preferred_categories:
+                cost *= PREFERRED_DISCOUNT
+            new = list(best)
+            step: Dict[int, Tuple[int, int]] = {}
+            for t in range(target + 1):
+                if best[t] == inf:
+                    continue
+                for portions in range(1, MAX_PORTIONS + 1):
+                    nt = min(target, t + int(protein * portions))
+                    value = best[t] + cost * portions + FOOD_PENALTY_KCAL
+                    if value < new[nt] - 1e-9:
+                        new[nt] = value
+                        step[nt] = (portions, t)
+            best = new
+            steps.append(step)
+
+        if best[target] == inf:
+            return self._greedy(candidates, target)
+        choice = []
+        t = target
+        for index in range(len(candidates) - 1, -1, -1):
+            if t in steps[index]:
+                portions, t = steps[index][t]
+                choice.append((candidates[index], portions))
+        return choice
+
+    def _greedy(self, candidates: Sequence[int], target: float) -> List[Tuple[int, int]]:
+        """按蛋白质密度依次取最多份数，直到补足缺口"""
+        values = self.snapshot.values
+        choice = []
+        remaining = target
+        for pos in sorted(candidates, key=lambda pos: (-values[pos, 0], values[pos, 1])):
+            if remaining <= 0:
+                break
+            per_portion = values[pos, 0] * PORTION_GRAMS / 100
+            portions = min(MAX_PORTIONS, int(math.ceil(remaining / per_portion)))
+            choice.append((pos, portions))
+            remaining -= per_portion * portions
+        return choice
+
+    def _alternatives(self, pos: int, protein: float, chosen: set, preferences: Preferences) -> List[Dict[str, Any]]:
+        """同类别中可替换的食材，给出提供相同蛋白质所需的克数（取整到10g）"""
+        category = self.snapshot.categories[pos]
+        result = []
+        for other in self.rankings.get(category, []):
+            if len(result) >= ALTERNATIVES:
+                break
+            if other in chosen or int(self.snapshot.ids[other]) in preferences.excluded_foods:
+                continue
+            grams = int(math.ceil(protein / self.snapshot.values[other, 0] * 100 / 10) * 10)
+            result.append(self._item(other, grams))
+        return result
+
+    def _item(self, pos: int, grams: int) -> Dict[str, Any]:
+        protein, calories = self.snapshot.values[pos, 0], self.snapshot.values[pos, 1]
+        return {
+            "food_item_id": int(self.snapshot.ids[pos]),
+            "name": self.snapshot.names[pos],
+            "category": self.snapshot.categories[pos],
+            "grams": grams,
+            "protein": round(float(protein) * grams / 100, 1),
+            "calories": round(float(calories) * grams / 100, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """返回求解和缓存统计"""
+        return {"solves": self.solves, "cache": self._cache.stats(), "categories": len(self.rankings)}
+
+
+def render_content(result: Dict[str, Any], gap: float) -> str:
+    """生成写入diet_recommendations.recommendation_content的建议文字"""
+    if gap <= 0:
+        return "今日蛋白质摄入已达标，请继续保持均衡饮食。"
+    if not result["items"]:
+        return f"今日蛋白质还差约{round(gap)}g，建议适量增加蛋、奶、豆制品或肉类。"
+    parts = [f"{item['name']}{item['grams']}g（约{item['protein']}g蛋白质）" for item in result["items"]]
+    lines = [f"今日蛋白质还差约{round(gap)}g，建议补充：" + "、".join(parts) + "。"]
+    swaps = [
+        f"{item['name']}可换成" + "或".join(f"{alt['name']}{alt['grams']}g" for alt in item["alternatives"])
+        for item in result["items"] if item["alternatives"]
+    ]
+    if swaps:
+        lines.append("可替换：" + "；".join(swaps) + "。")
+    return "".join(lines)
+
+
+_engine: Optional[RecommendationEngine] = None
+
+
+def get_recommendation_engine(snapshot: CatalogSnapshot) -> RecommendationEngine:
+    """获取基于指定目录快照的推荐引擎，快照更新后自动重建（缓存随之失效）"""
+    global _engine
+    engine = _engine
+    if engine is None or engine.snapshot is not snapshot:
+        engine = _engine = RecommendationEngine(snapshot)
+    return engine
+
+
+def set_recommendation_engine(engine: Optional[RecommendationEngine]) -> None:
+    """替换推荐引擎（测试用）"""
+    global _engine
+    _engine = engine
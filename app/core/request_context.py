@@ -0,0 +1,71 @@
+"""
+请求上下文模块 - 保存当前请求ID和各阶段耗时(数据库、密码哈希、短信等)
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+# 当前请求的ID和耗时明细；线程池和SQLAlchemy异步greenlet都会继承上下文，
+# 因为保存的是同一个dict对象，子任务中的累加对中间件可见
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def begin_request(request_id: str) -> Dict[str, float]:
+    """开始记录一个请求，返回该请求的耗时字典"""
+    timings: Dict[str, float] = {}
+    _request_id.set(request_id)
+    _timings.set(timings)
+    return timings
+
+
+def get_request_id() -> Optional[str]:
+    """获取当前请求ID"""
+    return _request_id.get()
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """累加当前请求某一阶段的耗时，不在请求中时忽略"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+        count_key = f"{name}_count"
+        timings[count_key] = timings.get(count_key, 0) + 1
+
+
+@contextmanager
+def timed(name: str):
+    """统计代码块耗时并计入当前请求"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def install_db_timing(engine) -> None:
+    """
+    为引擎注册SQL执行耗时统计
+
+    参数:
+        engine: 同步Engine（异步引擎传入async_engine.sync_engine）
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if starts:
+            record_timing("db", time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts:
+            record_timing("db", time.perf_counter() - starts.pop())
@@ -11,11 +11,12 @@ from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
 
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 # OAuth2 配置
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login/password")
 
+# 以下为同步版本，请求处理中请使用app.core.hashing中的异步哈希器
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -28,17 +29,30 @@ def create_salt() -> str:
     """生成随机盐值"""
     return hashlib.sha256(os.urandom(60)).hexdigest()
 
-def verify_token(token: str) -> Optional[str]:
-    """验证JWT令牌"""
+def decode_token(token: str) -> Optional[dict]:
+    """验证JWT令牌并返回载荷，无效或缺少sub时返回None"""
     try:
         payload = jwt.decode(
             token,
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_doctor_token(token: str) -> Optional[str]:
+    """验证医生JWT令牌（role=doctor），返回医生ID"""
+    payload = decode_token(token)
+    if payload is None or payload.get("role") != "doctor":
+        return None
+    return payload["sub"]
+
+def verify_token(token: str) -> Optional[str]:
+    """验证用户JWT令牌，返回用户ID（带role=doctor的医生令牌不能当作用户令牌）"""
+    payload = decode_token(token)
+    if payload is None or payload.get("role", "user") != "user":
+        return None
+    return payload["sub"]
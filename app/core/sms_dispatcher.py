@@ -0,0 +1,239 @@
+"""
+短信发送队列模块 - 请求线程只负责入队，后台worker负责发送、重试和统计
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger("health777.sms")
+
+
+class SMSTransport:
+    """
+    短信网关接口
+
+    send返回True表示发送成功，返回False表示网关明确拒绝(不重试)，
+    抛出异常表示临时故障(网络错误、超时等)，由调度器退避重试。
+    """
+
+    async def send(self, phone: str, code: str, sms_type: int) -> bool:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class AliyunSMSTransport(SMSTransport):
+    """阿里云短信网关，复用SMSService的进程内共享客户端"""
+
+    async def send(self, phone: str, code: str, sms_type: int) -> bool:
+        from app.core.sms_service import SMSService
+
+        if not SMSService.is_configured():
+            logger.warning("短信服务未配置，跳过发送")
+            return False
+
+        client = SMSService.get_client()
+        response = await client.send_sms_async(SMSService.build_request(phone, code))
+        if response.body.code != "OK":
+            logger.error(f"短信网关拒绝发送: {response.body.code} {response.body.message}")
+            return False
+        return True
+
+
+class SMSMessage:
+    __slots__ = ("phone", "code", "sms_type", "enqueued_at", "attempts")
+
+    def __init__(self, phone: str, code: str, sms_type: int):
+        self.phone = phone
+        self.code = code
+        self.sms_type = sms_type
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class SMSDispatcher:
+    """
+    短信发送调度器
+
+    有界内存队列 + 若干后台worker协程；队列满时submit直接返回False，
+    由调用方决定如何提示用户，而不是阻塞请求。
+    """
+
+    def __init__(
+        self,
+        transport: SMSTransport,
+        queue_size: int = 1000,
+        workers: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+        send_timeout: float = 10.0
+    ):
+        """
+        参数:
+            transport (SMSTransport): 短信网关
+            queue_size (int): 队列容量
+            workers (int): 后台worker数量
+            max_retries (int): 临时故障最多重试次数
+            backoff_base (float): 首次重试等待时间(秒)，之后指数增长
+            backoff_max (float): 单次重试最长等待时间(秒)
+            send_timeout (float): 单次发送超时时间(秒)
+        """
+        self.transport = transport
+        self.queue_size = queue_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.send_timeout = send_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.sent = 0
+        self.rejected = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """启动后台worker"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"sms-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"短信发送队列已启动: workers={self.workers}, queue_size={self.queue_size}")
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """停止worker，先尽量发送完队列中剩余的短信"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"关闭时仍有{self._queue.qsize()}条短信未发送")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.transport.close()
+
+    def submit(self, phone: str, code: str, sms_type: int) -> bool:
+        """
+        提交短信发送任务（不等待发送结果），需在事件循环线程中调用
+
+        返回:
+            bool: 是否成功入队，队列已满或未启动时返回False
+        """
+        if self._queue is None:
+            self._incr("dropped")
+            return False
+        try:
+            self._queue.put_nowait(SMSMessage(phone, code, sms_type))
+        except asyncio.QueueFull:
+            self._incr("dropped")
+            logger.warning(f"短信队列已满，丢弃发送请求: {phone}")
+            return False
+        self._incr("submitted")
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:  # worker不能因为单条消息退出
+                logger.error(f"短信发送异常: {message.phone} - {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: SMSMessage) -> None:
+        while True:
+            message.attempts += 1
+            try:
+                ok = await asyncio.wait_for(
+                    self.transport.send(message.phone, message.code, message.sms_type),
+                    timeout=self.send_timeout
+                )
+            except Exception as e:
+                if message.attempts > self.max_retries:
+                    self._incr("failed")
+                    logger.error(f"短信发送失败(已重试{self.max_retries}次): {message.phone} - {e}")
+                    return
+                self._incr("retries")
+                await asyncio.sleep(self._backoff(message.attempts))
+                continue
+
+            if ok:
+                latency = time.monotonic() - message.enqueued_at
+                with self._lock:
+                    self.sent += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+            else:
+                self._incr("rejected")
+            return
+
+    def _backoff(self, attempt: int) -> float:
+        """指数退避，加入随机抖动避免多条消息同时重试"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回发送统计"""
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "sent": self.sent,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "retries": self.retries,
+                "dropped": self.dropped,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "latency_avg_ms": round(self.latency_total / self.sent * 1000, 3) if self.sent else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 3),
+            }
+
+
+_dispatcher: Optional[SMSDispatcher] = None
+
+
+def get_sms_dispatcher() -> SMSDispatcher:
+    """获取进程内的短信调度器"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = SMSDispatcher(
+            AliyunSMSTransport(),
+            queue_size=settings.SMS_QUEUE_SIZE,
+            workers=settings.SMS_WORKERS,
+            max_retries=settings.SMS_MAX_RETRIES,
+            backoff_base=settings.SMS_RETRY_BACKOFF,
+            backoff_max=settings.SMS_RETRY_BACKOFF_MAX,
+            send_timeout=settings.SMS_SEND_TIMEOUT
+        )
+    return _dispatcher
+
+
+def set_sms_dispatcher(dispatcher: Optional[SMSDispatcher]) -> None:
+    """替换短信调度器（测试用）"""
+    global _dispatcher
+    _dispatcher = dispatcher
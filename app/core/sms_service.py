@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
+import json
 import random
+import threading
 
 from alibabacloud_dysmsapi20170525.client import Client
 from alibabacloud_dysmsapi20170525 import models as dysms_models
@@ -9,18 +11,52 @@ from app.core.config import settings
 from app.core.logger import get_logger
 logger = get_logger("test.sms_service")
 
+# 短信客户端在进程内复用，避免每次发送都重新创建
+_client = None
+_client_lock = threading.Lock()
+
 class SMSService:
+    @staticmethod
+    def is_configured() -> bool:
+        """短信服务是否已配置"""
+        return all([settings.SMS_ACCESS_KEY_ID, settings.SMS_ACCESS_KEY_SECRET,
+                    settings.SMS_SIGN_NAME, settings.SMS_TEMPLATE_CODE])
+
+    @staticmethod
+    def get_client() -> Client:
+        """获取进程内共享的短信客户端"""
+        global _client
+        if _client is None:
+            with _client_lock:
+                if _client is None:
+                    config = open_api_models.Config(
+                        access_key_id=settings.SMS_ACCESS_KEY_ID,
+                        access_key_secret=settings.SMS_ACCESS_KEY_SECRET,
+                        endpoint=settings.SMS_ENDPOINT,
+                        # region_id=settings.SMS_REGION_ID
+                    )
+                    _client = Client(config)
+        return _client
+
+    @staticmethod
+    def build_request(phone: str, code: str) -> dysms_models.SendSmsRequest:
+        """构造短信发送请求"""
+        # 短信模板参数
+        template_param = {"code": code}
+        return dysms_models.SendSmsRequest(
+            phone_numbers=phone,
+            sign_name=settings.SMS_SIGN_NAME,
+            template_code=settings.SMS_TEMPLATE_CODE,
+            template_param=json.dumps(template_param)
+        )
+
     @staticmethod
     def send_sms(phone: str, code: str, sms_type: int) -> bool:
         """发送短信验证码"""
 
-        if not all([settings.SMS_ACCESS_KEY_ID, settings.SMS_ACCESS_KEY_SECRET,
-                   settings.SMS_SIGN_NAME, settings.SMS_TEMPLATE_CODE]):
+        if not SMSService.is_configured():
             return False
-  
-        # 短信模板参数
-        template_param = {"code": code}
-        
+
         # 短信类型映射
         sms_type_map = {
             1: "注册验证",
@@ -28,31 +64,16 @@ class SMSService:
             3: "修改密码",
             4: "修改手机号"
         }
-        
-        config = open_api_models.Config(
-            access_key_id=settings.SMS_ACCESS_KEY_ID,
-            access_key_secret=settings.SMS_ACCESS_KEY_SECRET,
-            endpoint=settings.SMS_ENDPOINT,
-            # region_id=settings.SMS_REGION_ID
-        )
-        
+
         try:
-            client = Client(config)
-            send_request = dysms_models.SendSmsRequest(
-                phone_numbers=phone,
-                sign_name=settings.SMS_SIGN_NAME,
-                template_code=settings.SMS_TEMPLATE_CODE,
-                template_param=str(template_param)
-            )
-            
-            response = client.send_sms(send_request)
+            response = SMSService.get_client().send_sms(SMSService.build_request(phone, code))
             logger.error(response)
             return response.body.code == "OK"
         except Exception as e:
-            
+
             return False
 
     @staticmethod
     def generate_code() -> str:
         """生成6位随机验证码"""
-        return ''.join(random.choices('0123456789', k=6))
\ No newline at end of file
+        return ''.join(random.choices('0123456789', k=6))
@@ -0,0 +1,111 @@
+"""
+文件存储模块 - 上传文件按内容寻址保存，目前提供本地目录存储
+"""
+import asyncio
+import os
+from typing import Optional
+
+from app.core.config import settings
+
+
+class Storage:
+    """
+    文件存储接口
+
+    key为相对路径（如 meals/ab/abcdef....jpg），内容相同的文件key相同，用于去重。
+    """
+
+    async def save(self, src_path: str, key: str) -> None:
+        """保存本地临时文件，保存后src_path不再可用"""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """文件在本机的路径，对象存储等远程后端返回None"""
+        return None
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    @property
+    def tmp_dir(self) -> Optional[str]:
+        """上传时写临时文件的目录，与存储同一文件系统时可直接rename"""
+        return None
+
+
+class LocalStorage(Storage):
+    """
+    本地目录存储
+
+    文件写在root下，由Nginx（或开发环境的StaticFiles）按base_url提供访问；
+    临时文件放在root/.tmp，保存时os.replace原子移动，不复制数据。
+    """
+
+    def __init__(self, root: str, base_url: str = "/media"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self._tmp_dir = os.path.join(self.root, ".tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    @property
+    def tmp_dir(self) -> str:
+        return self._tmp_dir
+
+    def local_path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"非法的文件key: {key}")
+        return path
+
+    def _save(self, src_path: str, key: str) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+
+    async def save(self, src_path: str, key: str) -> None:
+        await asyncio.to_thread(self._save, src_path, key)
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    async def read(self, key: str) -> bytes:
+        with open(self.local_path(key), "rb") as f:
+            return await asyncio.to_thread(f.read)
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+_storage: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    """根据MEDIA_STORAGE_BACKEND配置获取文件存储（进程内单例）"""
+    global _storage
+    if _storage is None:
+        backend = settings.MEDIA_STORAGE_BACKEND
+        if backend == "local":
+            _storage = LocalStorage(settings.MEDIA_ROOT, settings.MEDIA_URL)
+        else:
+            raise ValueError(f"不支持的文件存储类型: {backend}")
+    return _storage
+
+
+def set_storage(storage: Optional[Storage]) -> None:
+    """替换文件存储（测试用）"""
+    global _storage
+    _storage = storage
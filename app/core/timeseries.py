@@ -0,0 +1,116 @@
+"""
+时间序列模块 - 日/周/月统计桶的日期计算和图表数据的列式输出
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# 统计周期，与exercise_statistics.statistic_type取值一致
+DAILY, WEEKLY, MONTHLY = "daily", "weekly", "monthly"
+PERIODS = (DAILY, WEEKLY, MONTHLY)
+
+# 接口参数到统计周期的映射
+PERIOD_ALIASES = {"day": DAILY, "week": WEEKLY, "month": MONTHLY}
+
+# 未指定范围时默认返回的桶数
+DEFAULT_BUCKETS = {DAILY: 30, WEEKLY: 12, MONTHLY: 12}
+
+# 单次最多返回的桶数
+MAX_BUCKETS = 400
+
+
+def bucket_start(day: date, period: str) -> date:
+    """日期所在统计桶的起始日：周从周一开始，月从1号开始"""
+    if period == DAILY:
+        return day
+    if period == WEEKLY:
+        return day - timedelta(days=day.weekday())
+    if period == MONTHLY:
+        return day.replace(day=1)
+    raise ValueError(f"不支持的统计周期: {period}")
+
+
+def next_bucket(start: date, period: str) -> date:
+    """下一个统计桶的起始日"""
+    if period == DAILY:
+        return start + timedelta(days=1)
+    if period == WEEKLY:
+        return start + timedelta(days=7)
+    if period == MONTHLY:
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    raise ValueError(f"不支持的统计周期: {period}")
+
+
+def bucket_days(start: date, period: str) -> int:
+    """统计桶包含的天数"""
+    return (next_bucket(start, period) - start).days
+
+
+def bucket_starts(start: date, end: date, period: str) -> List[date]:
+    """[start, end]范围内所有统计桶的起始日，超过MAX_BUCKETS个时截断"""
+    starts = []
+    current = bucket_start(start, period)
+    while current <= end:
+        starts.append(current)
+        if len(starts) > MAX_BUCKETS:
+            break
+        current = next_bucket(current, period)
+    return starts
+
+
+def default_range(period: str, today: date, start: Optional[date] = None,
+                  end: Optional[date] = None) -> Tuple[date, date]:
+    """补全查询范围：默认截止今天，起始为往前DEFAULT_BUCKETS个桶"""
+    end = end or today
+    if start is None:
+        start = bucket_start(end, period)
+        for _ in range(DEFAULT_BUCKETS[period] - 1):
+            start = bucket_start(start - timedelta(days=1), period)
+    return bucket_start(start, period), end
+
+
+def resolve_range(period: str, today: date, start: Optional[date] = None,
+                  end: Optional[date] = None) -> Tuple[str, date, date]:
+    """
+    解析趋势图的查询参数
+
+    参数:
+        period (str): day/week/month 或 daily/weekly/monthly
+
+    返回:
+        (统计周期, 对齐后的起始日, 截止日)；参数无效时抛出ValueError
+    """
+    period = PERIOD_ALIASES.get(period, period)
+    if period not in PERIODS:
+        raise ValueError(f"不支持的统计周期: {period}")
+    start, end = default_range(period, today, start, end)
+    if start > end:
+        raise ValueError("起始日期不能晚于截止日期")
+    if len(bucket_starts(start, end, period)) > MAX_BUCKETS:
+        raise ValueError(f"统计范围过大，最多{MAX_BUCKETS}个数据点")
+    return period, start, end
+
+
+def columnar(starts: Sequence[date], rows: Mapping[date, Sequence[Any]], fields: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    把按桶起始日索引的数据转为列式数组，缺失的桶补0
+
+    参数:
+        starts: 桶起始日列表（决定输出顺序）
+        rows: {桶起始日: 与fields对应的数值}
+        fields: 字段名
+
+    返回:
+        dict: {"dates": [...], 字段名: [...]}
+    """
+    data: Dict[str, List[Any]] = {"dates": [day.isoformat() for day in starts]}
+    zeros = [0] * len(fields)
+    for index, name in enumerate(fields):
+        data[name] = [_number(rows.get(day, zeros)[index]) for day in starts]
+    return data
+
+
+def _number(value: Any) -> Any:
+    # DECIMAL转为float，便于JSON输出
+    if value is None:
+        return 0
+    return value if isinstance(value, int) else float(value)
@@ -0,0 +1,392 @@
+"""
+图片上传模块 - 请求体按块写入临时文件并同时计算sha256，超限立即中止；缩略图在后台进程池生成
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.request_context import timed
+from app.core.storage import Storage
+
+logger = get_logger("health777.uploads")
+
+# multipart请求中除文件内容外的边界、头部等开销上限
+MULTIPART_OVERHEAD = 16 * 1024
+# multipart每个字段的头部大小上限（头部在内存中拼接，不能随请求体无限增长）
+MAX_PART_HEADER_BYTES = 8 * 1024
+
+# 文件头魔数 -> (扩展名, content-type)
+IMAGE_SIGNATURES: List[Tuple[bytes, str, str]] = [
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+]
+HEAD_SIZE = 12
+
+
+def detect_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """根据文件头判断图片类型，不信任客户端声明的content-type"""
+    for signature, ext, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext, content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return None
+
+
+class _SpoolFile:
+    """边接收边写入的临时文件，内存中最多缓存chunk_size字节"""
+
+    def __init__(self, tmp_dir: Optional[str], max_bytes: int, chunk_size: int):
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, suffix=".upload")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.head = b""
+        self.image_type: Optional[Tuple[str, str]] = None
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="图片过大")
+        if self.image_type is None and len(self.head) < HEAD_SIZE:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+            if len(self.head) >= HEAD_SIZE:
+                self._check_type()
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            await self._flush()
+
+    def _check_type(self) -> None:
+        self.image_type = detect_image_type(self.head)
+        if self.image_type is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="仅支持JPEG、PNG、GIF、WebP图片")
+
+    async def _flush(self) -> None:
+        if not self._buffer:
+            return
+        data, self._buffer = self._buffer, bytearray()
+        await asyncio.to_thread(self._write_chunk, data)
+
+    def _write_chunk(self, data: bytearray) -> None:
+        # hashlib处理大块数据时释放GIL，与写文件一起放到线程中
+        self._hash.update(data)
+        self._file.write(data)
+
+    async def close(self) -> None:
+        """写完剩余数据并关闭文件"""
+        await self._flush()
+        self._file.close()
+        if self.size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="图片为空")
+        if self.image_type is None:
+            self._check_type()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def discard(self) -> None:
+        """关闭并删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _MultipartFileReader:
+    """从multipart/form-data请求体中流式取出第一个文件字段的内容"""
+
+    def __init__(self, boundary: bytes):
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._chunks: List[bytes] = []
+        self._header_bytes = 0
+        self._in_file = False
+        self.found = False
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """解析一块请求体，返回其中属于文件字段的数据"""
+        self.parser.write(chunk)
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._header_bytes = 0
+
+    def _count_header(self, size: int) -> None:
+        self._header_bytes += size
+        if self._header_bytes > MAX_PART_HEADER_BYTES:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="multipart头部过大")
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._count_header(end - start)
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._count_header(end - start)
+        self._value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"filename" in options and not self.found:
+            self._in_file = self.found = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._chunks.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        self._in_file = False
+
+
+async def receive_image(
+    request: Request,
+    storage: Storage,
+    category: str,
+    max_bytes: int,
+    chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    流式接收图片并保存
+
+    请求体可以是图片原始数据（Content-Type为image/*等），也可以是multipart/form-data
+    （取第一个文件字段）。Content-Length超限时不读请求体直接返回413；数据边接收边写入
+    临时文件并计算sha256，内存占用与图片大小无关。文件按内容寻址保存，相同图片只存一份。
+
+    参数:
+        category (str): 存储目录，如meals、supplements、posts
+        max_bytes (int): 图片大小上限
+
+    返回:
+        dict: key, url, thumbnail_url, sha256, size, content_type, deduplicated
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="图片过大")
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    reader = None
+    if content_type == b"multipart/form-data":
+        if not options.get(b"boundary"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="缺少multipart边界")
+        reader = _MultipartFileReader(options[b"boundary"])
+
+    with timed("upload"):
+        spool = _SpoolFile(storage.tmp_dir, max_bytes, chunk_size or settings.MEDIA_CHUNK_SIZE)
+        try:
+            async for chunk in request.stream():
+                if reader is None:
+                    await spool.write(chunk)
+                else:
+                    for data in reader.feed(chunk):
+                        await spool.write(data)
+            if reader is not None and not reader.found:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="未找到上传的图片")
+            await spool.close()
+        except BaseException:
+            spool.discard()
+            raise
+
+        sha256 = spool.sha256
+        ext, image_content_type = spool.image_type
+        key = f"{category}/{sha256[:2]}/{sha256}.{ext}"
+        deduplicated = await storage.exists(key)
+        if deduplicated:
+            spool.discard()
+        else:
+            try:
+                await storage.save(spool.path, key)
+            except BaseException:
+                spool.discard()
+                raise
+
+    thumbnail_key = f"{category}/{sha256[:2]}/{sha256}_thumb.jpg"
+    get_thumbnailer().submit(storage, key, thumbnail_key)
+    return {
+        "key": key,
+        "url": storage.url(key),
+        "thumbnail_url": storage.url(thumbnail_key),
+        "sha256": sha256,
+        "size": spool.size,
+        "content_type": image_content_type,
+        "deduplicated": deduplicated,
+    }
+
+
+def make_thumbnail(src_path: str, dst_path: str, size: int) -> Tuple[int, int]:
+    """生成JPEG缩略图（在进程池中执行），返回缩略图尺寸"""
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as image:
+        # JPEG按目标尺寸降采样解码，大图不需要完整解码到内存
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(dst_path, "JPEG", quality=80, optimize=True)
+        return image.size
+
+
+class Thumbnailer:
+    """
+    后台缩略图生成器
+
+    上传请求只负责提交，不等待生成结果；排队的任务超过max_pending时直接跳过
+    （缩略图缺失时客户端回退到原图），避免上传高峰占满进程池。
+    """
+
+    def __init__(self, size: int = 320, executor: str = "process", workers: int = 2, max_pending: int = 100):
+        """
+        参数:
+            size (int): 缩略图最长边(像素)
+            executor (str): process-进程池, thread-线程池, inline-直接在事件循环中执行(仅测试)
+            workers (int): 进程/线程数
+            max_pending (int): 允许排队的最大任务数
+        """
+        self.size = size
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.existing = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.executor_type != "inline":
+            if self.executor_type == "process":
+                # 使用spawn，避免在已有线程的进程中fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            elif self.executor_type == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnail")
+            else:
+                raise ValueError(f"不支持的缩略图执行器类型: {self.executor_type}")
+        return self._executor
+
+    def submit(self, storage: Storage, key: str, thumbnail_key: str) -> bool:
+        """
+        提交缩略图任务，需在事件循环线程中调用
+
+        返回:
+            bool: 是否已提交，排队已满或存储不在本机时返回False
+        """
+        src_path = storage.local_path(key)
+        if src_path is None or len(self._tasks) >= self.max_pending:
+            self._incr("skipped")
+            return False
+        task = asyncio.create_task(self._generate(storage, src_path, thumbnail_key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _generate(self, storage: Storage, src_path: str, thumbnail_key: str) -> None:
+        if await storage.exists(thumbnail_key):
+            self._incr("existing")
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=storage.tmp_dir, suffix=".jpg")
+        os.close(fd)
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                make_thumbnail(src_path, tmp_path, self.size)
+            else:
+                await asyncio.get_running_loop().run_in_executor(executor, make_thumbnail, src_path, tmp_path, self.size)
+            await storage.save(tmp_path, thumbnail_key)
+            self._incr("generated")
+        except Exception as e:
+            self._incr("failed")
+            logger.error(f"缩略图生成失败: {thumbnail_key} - {e}")
+        finally:
+            # 失败或任务被取消（关闭时）都要删除临时文件；保存成功时文件已被移走
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    async def join(self, timeout: Optional[float] = None) -> None:
+        """等待已提交的任务完成"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """等待剩余任务后关闭进程池"""
+        await self.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缩略图统计"""
+        with self._lock:
+            return {
+                "pending": len(self._tasks),
+                "generated": self.generated,
+                "existing": self.existing,
+                "skipped": self.skipped,
+                "failed": self.failed,
+            }
+
+
+_thumbnailer: Optional[Thumbnailer] = None
+
+
+def get_thumbnailer() -> Thumbnailer:
+    """获取进程内的缩略图生成器"""
+    global _thumbnailer
+    if _thumbnailer is None:
+        _thumbnailer = Thumbnailer(
+            size=settings.MEDIA_THUMBNAIL_SIZE,
+            executor=settings.MEDIA_THUMBNAIL_EXECUTOR,
+            workers=settings.MEDIA_THUMBNAIL_WORKERS,
+            max_pending=settings.MEDIA_THUMBNAIL_MAX_PENDING
+        )
+    return _thumbnailer
+
+
+def set_thumbnailer(thumbnailer: Optional[Thumbnailer]) -> None:
+    """替换缩略图生成器（测试用）"""
+    global _thumbnailer
+    _thumbnailer = thumbnailer
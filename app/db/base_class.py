@@ -1,3 +1,4 @@
-class Base:
-    """Base class for all models."""
-    pass
\ No newline at end of file
+from sqlalchemy.orm import declarative_base
+
+# 所有模型的基类
+Base = declarative_base()
@@ -0,0 +1,188 @@
+"""
+数据库连接池模块 - 连接池参数配置与运行指标采集
+"""
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_EVENTS, DB_POOL_SIZE, DB_POOL_WAIT
+
+PING_STRATEGIES = ("always", "idle", "none")
+
+
+class PoolStats:
+    """单个引擎连接池的累计指标（每个worker进程独立）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.overflow_events = 0
+        self.overflow_peak = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        """记录一次检出等待时间"""
+        DB_POOL_WAIT.labels(self.name).observe(seconds)
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            if seconds > self.wait_max:
+                self.wait_max = seconds
+
+    def incr(self, name: str, value: int = 1) -> None:
+        # 同时写入Prometheus指标，多worker时由/metrics汇总
+        DB_POOL_EVENTS.labels(self.name, name).inc(value)
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前指标快照"""
+        # engine.dispose()会替换连接池对象，每次从引擎取当前连接池
+        pool = self.engine.pool if self.engine is not None else None
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "overflow_events": self.overflow_events,
+                "overflow_peak": self.overflow_peak,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "wait_avg_ms": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+        if pool is not None:
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        return data
+
+
+class _TimedCheckoutMixin:
+    """统计连接检出等待时间和超时次数"""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.incr("timeouts")
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+
+def make_pool_class(stats: PoolStats, async_mode: bool = False) -> type:
+    """
+    生成带统计功能的连接池类
+
+    统计对象放在类属性上，engine.dispose()重建连接池时仍然沿用同一份统计。
+    """
+    base = AsyncAdaptedQueuePool if async_mode else QueuePool
+    return type(f"Instrumented{base.__name__}", (_TimedCheckoutMixin, base), {"stats": stats})
+
+
+def pool_options(stats: PoolStats, async_mode: bool = False) -> Dict[str, Any]:
+    """
+    根据配置生成create_engine的连接池参数
+
+    参数:
+        stats (PoolStats): 指标对象
+        async_mode (bool): 是否用于异步引擎
+
+    返回:
+        dict: 可直接传给create_engine/create_async_engine的关键字参数
+    """
+    strategy = settings.DB_POOL_PING_STRATEGY
+    if strategy not in PING_STRATEGIES:
+        raise ValueError(f"DB_POOL_PING_STRATEGY必须是{PING_STRATEGIES}之一: {strategy}")
+    return {
+        "poolclass": make_pool_class(stats, async_mode),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": strategy == "always",
+    }
+
+
+def instrument_engine(engine, stats: PoolStats) -> None:
+    """
+    为引擎注册连接池事件：连接数、溢出、失效，以及idle策略下的按需ping
+
+    参数:
+        engine: 同步Engine（异步引擎传入async_engine.sync_engine）
+        stats (PoolStats): 指标对象
+    """
+    stats.engine = engine
+    checked_out = DB_POOL_CHECKED_OUT.labels(stats.name)
+    DB_POOL_SIZE.labels(stats.name).set(engine.pool.size())
+    idle_seconds = settings.DB_POOL_PING_IDLE_SECONDS
+    ping_idle = settings.DB_POOL_PING_STRATEGY == "idle"
+    dialect = engine.dialect
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.incr("connects")
+        # 新建连接时overflow()>0说明这是超出pool_size的溢出连接
+        overflow = engine.pool.overflow()
+        if overflow > 0:
+            stats.incr("overflow_events")
+            if overflow > stats.overflow_peak:
+                stats.overflow_peak = overflow
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.incr("checkouts")
+        last_used = connection_record.info.get("last_checkin")
+        if ping_idle and last_used is not None and time.monotonic() - last_used >= idle_seconds:
+            # 连接空闲较久才ping，热连接不额外增加往返
+            stats.incr("pings")
+            try:
+                dialect.do_ping(dbapi_connection)
+            except Exception as e:
+                stats.incr("ping_failures")
+                # 抛出DisconnectionError后连接池会丢弃该连接并重新获取
+                raise exc.DisconnectionError(str(e)) from e
+        # 只统计真正交给调用方的连接，ping失败重试的不计入；
+        # 标记放在record_info上，连接中途失效重连后仍能在归还时扣减
+        connection_record.record_info["checked_out"] = True
+        checked_out.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.incr("checkins")
+        connection_record.info["last_checkin"] = time.monotonic()
+        if connection_record.record_info.pop("checked_out", False):
+            checked_out.dec()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.incr("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        stats.incr("soft_invalidations")
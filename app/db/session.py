@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 
 from app.core.config import settings
+from app.core.request_context import install_db_timing
+from app.db.pool import PoolStats, instrument_engine, pool_options
 
 # 构建数据库URL
 SQLALCHEMY_DATABASE_URL = (
@@ -10,15 +13,52 @@ SQLALCHEMY_DATABASE_URL = (
     f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}"
 )
 
+# 异步数据库URL（aiomysql驱动）
+ASYNC_SQLALCHEMY_DATABASE_URL = (
+    f"mysql+aiomysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}"
+    f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}"
+)
+
+# 连接池指标
+pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
+
 # 创建数据库引擎
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # 自动处理断开的连接
-    echo=False  # 设置为True可以查看SQL语句
+    echo=False,  # 设置为True可以查看SQL语句
+    **pool_options(pool_stats)
 )
+instrument_engine(engine, pool_stats)
+install_db_timing(engine)
 
 # 创建数据库会话类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎，供async路由使用
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    echo=False,
+    **pool_options(async_pool_stats, async_mode=True)
+)
+instrument_engine(async_engine.sync_engine, async_pool_stats)
+install_db_timing(async_engine.sync_engine)
+
+# 创建异步数据库会话类
+# expire_on_commit=False: 提交后访问属性不会触发隐式查询（异步会话中不允许）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+def get_pool_stats() -> dict:
+    """获取当前worker的连接池指标"""
+    return {
+        "sync": pool_stats.snapshot(),
+        "async": async_pool_stats.snapshot()
+    }
+
 # 创建基本模型类
 Base = declarative_base()
@@ -0,0 +1,61 @@
+"""
+数据库upsert模块 - 生成INSERT ... ON DUPLICATE KEY UPDATE（MySQL）或ON CONFLICT（SQLite测试库）语句
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, sqlite
+
+
+def build_upsert(
+    dialect_name: str,
+    table: Table,
+    values: Any,
+    conflict_columns: Sequence[str],
+    update: Optional[Callable[[Any], List[Tuple[str, Any]]]] = None
+):
+    """
+    生成upsert语句
+
+    参数:
+        dialect_name (str): 方言名称，一般传 db.bind.dialect.name
+        table (Table): 目标表
+        values: 单行dict或多行list，直接传给insert().values()
+        conflict_columns: 唯一键列名（SQLite需要，MySQL由唯一索引决定）
+        update (callable): 接收"待插入行"命名空间，返回有序的 [(列名, 表达式)]；
+            为None时冲突则忽略。表达式中 table.c.x 表示已有行的值。
+
+    注意:
+        MySQL驱动总是开启CLIENT_FOUND_ROWS，冲突时rowcount也是1，不能据此判断是否插入了新行，
+        需要判断时使用build_insert_ignore。
+        MySQL按顺序执行赋值，后面的表达式会读到前面已更新的列值；SQLite始终读旧值。
+        需要同时引用旧值的列应排在前面，两种数据库结果才一致。
+    """
+    if dialect_name == "mysql":
+        stmt = mysql.insert(table).values(values)
+        if update is None:
+            # 赋值为自身等价于INSERT IGNORE，但不会吞掉其他错误
+            column = table.c[conflict_columns[0]]
+            return stmt.on_duplicate_key_update([(column.name, column)])
+        return stmt.on_duplicate_key_update(update(stmt.inserted))
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table).values(values)
+        if update is None:
+            return stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+        set_: Dict[str, Any] = dict(update(stmt.excluded))
+        return stmt.on_conflict_do_update(index_elements=list(conflict_columns), set_=set_)
+    raise ValueError(f"不支持的数据库方言: {dialect_name}")
+
+
+def build_insert_ignore(dialect_name: str, table: Table, values: Any, conflict_columns: Sequence[str]):
+    """
+    生成冲突则忽略的插入语句，执行结果的rowcount为实际插入的行数（两种数据库一致）
+
+    MySQL使用INSERT IGNORE：冲突行的影响行数为0，但类型截断等错误也会降级为警告，
+    只用于需要区分新行和已有行的场景。
+    """
+    if dialect_name == "mysql":
+        return mysql.insert(table).values(values).prefix_with("IGNORE")
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).values(values).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    raise ValueError(f"不支持的数据库方言: {dialect_name}")
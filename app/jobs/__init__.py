@@ -0,0 +1 @@
+# 批处理任务
@@ -0,0 +1,42 @@
+"""
+排行榜重建入口 - 从数据库重建日榜/周榜/总榜
+
+用法:
+    python -m app.jobs.leaderboard                              # 重建今天所在的日榜、周榜和总榜
+    python -m app.jobs.leaderboard --period all                 # 只重建总榜
+    python -m app.jobs.leaderboard --period day --date 2024-03-01
+"""
+import argparse
+import asyncio
+import json
+from datetime import date
+from typing import Dict, Optional, Sequence
+
+from app.core.leaderboard import BOARD_ALIASES, BOARD_PERIODS, close_leaderboard
+
+
+async def rebuild(day: Optional[date] = None, periods: Sequence[str] = BOARD_PERIODS) -> Dict[str, int]:
+    from app.db.session import AsyncSessionLocal
+    from app.services.social_service import SocialService
+
+    try:
+        async with AsyncSessionLocal() as db:
+            return await SocialService.rebuild_leaderboards(db, day, periods)
+    finally:
+        await close_leaderboard()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    parser = argparse.ArgumentParser(description="从数据库重建积分排行榜")
+    parser.add_argument("--period", choices=sorted(BOARD_ALIASES), default=None, help="只重建指定榜单，默认全部")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="日榜/周榜所在日期，默认今天")
+    args = parser.parse_args(argv)
+    periods = [BOARD_ALIASES[args.period]] if args.period else BOARD_PERIODS
+
+    result = asyncio.run(rebuild(args.date, periods))
+    print(json.dumps(result, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+夜间批处理入口 - 生成每日小结（任务完成、营养、运动、达标积分）和饮食建议，并重建排行榜
+
+用法:
+    python -m app.jobs.nightly                   # 处理昨天
+    python -m app.jobs.nightly --date 2024-03-01 # 处理指定日期
+    python -m app.jobs.nightly --restart         # 忽略断点从头执行
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from app.core.batch import BatchRunner, Checkpoint
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.jobs import leaderboard
+
+logger = get_logger("health777.nightly")
+
+DAILY_SUMMARY_JOB = "daily_summary"
+
+
+def fetch_user_ids(after: int, limit: int) -> List[int]:
+    """键集分页取正常用户的ID（主键范围扫描，与页数无关）"""
+    from app.db.session import SessionLocal
+    from app.models.auth import User
+
+    with SessionLocal() as db:
+        return list(db.execute(
+            select(User.id).where(User.status == 1, User.id > after).order_by(User.id).limit(limit)
+        ).scalars())
+
+
+def summarize_chunk(user_ids: Sequence[int], day: str) -> Dict[str, int]:
+    """在工作进程中处理一块用户"""
+    from app.db.session import SessionLocal
+    from app.services.daily_summary_service import DailySummaryService
+
+    with SessionLocal() as db:
+        return DailySummaryService.summarize_users(db, date.fromisoformat(day), user_ids)
+
+
+def run_daily_summary(day: date, restart: bool = False, executor: str = "process") -> Dict[str, Any]:
+    """执行某天的每日小结批处理，默认从断点继续"""
+    runner = BatchRunner(
+        DAILY_SUMMARY_JOB,
+        summarize_chunk,
+        workers=settings.NIGHTLY_BATCH_WORKERS,
+        chunk_size=settings.NIGHTLY_BATCH_CHUNK_SIZE,
+        executor=executor,
+        checkpoint=Checkpoint(os.path.join(settings.NIGHTLY_BATCH_CHECKPOINT_DIR, f"{DAILY_SUMMARY_JOB}.json"))
+    )
+    return runner.run(fetch_user_ids, day.isoformat(), resume=not restart)
+
+
+async def run_async_jobs(day: date) -> Dict[str, Any]:
+    """
+    生成某天的饮食建议（分页重写，本身可重复执行），然后重建排行榜
+
+    达标奖励由批处理直接写库，写完后重建当前的日榜/周榜和总榜。
+    两项在同一个事件循环中执行，共用异步连接池。
+    """
+    from app.db.session import AsyncSessionLocal
+    from app.services.nutrition_service import NutritionService
+
+    async with AsyncSessionLocal() as db:
+        recommendations = await NutritionService.generate_daily_recommendations(db, day)
+    return {"recommendations": recommendations, "leaderboards": await leaderboard.rebuild()}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="夜间批处理")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="处理日期，默认昨天")
+    parser.add_argument("--restart", action="store_true", help="忽略断点从头执行")
+    args = parser.parse_args(argv)
+    day = args.date or date.today() - timedelta(days=1)
+
+    result = {
+        "date": day.isoformat(),
+        DAILY_SUMMARY_JOB: BatchRunner.summary(run_daily_summary(day, args.restart)),
+    }
+    result.update(asyncio.run(run_async_jobs(day)))
+    print(json.dumps(result, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String(20), unique=True, index=True, nullable=False, comment="手机号")
     password_hash = Column(String(128), nullable=True, comment="密码哈希")
+    status = Column(Integer, default=1, nullable=False, comment="用户状态: 0-禁用, 1-正常")
     is_active = Column(Boolean, default=True, comment="是否激活")
     is_superuser = Column(Boolean, default=False, comment="是否是超级管理员")
     register_time = Column(DateTime, default=datetime.utcnow, comment="注册时间")
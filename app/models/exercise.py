@@ -1 +1,80 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, Text, ForeignKey, UniqueConstraint
 
+from app.db.base_class import Base
+
+class ExerciseVideo(Base):
+    """运动视频资源表"""
+    __tablename__ = "exercise_videos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(100), nullable=False, comment="视频标题")
+    description = Column(Text, nullable=True, comment="视频描述")
+    difficulty_level = Column(Integer, nullable=False, index=True, comment="难度级别: 1-初级, 2-中级, 3-高级")
+    duration = Column(Integer, nullable=False, comment="视频时长(秒)")
+    video_url = Column(String(255), nullable=False, comment="视频URL")
+    thumbnail_url = Column(String(255), nullable=True, comment="缩略图URL")
+    category = Column(String(50), nullable=False, index=True, comment="分类")
+    tags = Column(String(255), nullable=True, comment="标签")
+    view_count = Column(Integer, default=0, nullable=False, comment="观看次数")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<ExerciseVideo {self.title}>"
+
+class ExerciseRecord(Base):
+    """用户运动记录表"""
+    __tablename__ = "exercise_records"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    exercise_date = Column(Date, nullable=False, comment="运动日期")
+    exercise_type = Column(String(50), nullable=False, index=True, comment="运动类型")
+    start_time = Column(DateTime, nullable=False, comment="开始时间")
+    end_time = Column(DateTime, nullable=False, comment="结束时间")
+    duration = Column(Integer, nullable=False, comment="运动时长(秒)")
+    video_id = Column(Integer, ForeignKey("exercise_videos.id"), nullable=True, index=True, comment="关联视频ID")
+    completion_rate = Column(DECIMAL(5, 2), nullable=True, comment="完成率(%)")
+    notes = Column(Text, nullable=True, comment="备注")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<ExerciseRecord user={self.user_id} {self.exercise_type} {self.duration}s>"
+
+class ExerciseStatistic(Base):
+    """运动统计表（日/周/月汇总）"""
+    __tablename__ = "exercise_statistics"
+    __table_args__ = (UniqueConstraint("user_id", "statistic_date", "statistic_type", name="idx_user_date_type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    statistic_date = Column(Date, nullable=False, comment="统计日期(周期起始日)")
+    statistic_type = Column(String(20), nullable=False, comment="统计类型: daily, weekly, monthly")
+    total_duration = Column(Integer, default=0, nullable=False, comment="总运动时长(秒)")
+    exercise_days = Column(Integer, default=0, nullable=False, comment="运动天数")
+    target_duration = Column(Integer, nullable=False, comment="目标时长(秒)")
+    achievement_rate = Column(DECIMAL(5, 2), default=0, nullable=False, comment="达标率(%)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<ExerciseStatistic user={self.user_id} {self.statistic_type} {self.statistic_date}>"
+
+class VideoWatchRecord(Base):
+    """用户视频观看记录表"""
+    __tablename__ = "video_watch_records"
+    __table_args__ = (UniqueConstraint("user_id", "video_id", name="idx_user_video"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    video_id = Column(Integer, ForeignKey("exercise_videos.id"), nullable=False, comment="视频ID")
+    watch_date = Column(Date, nullable=False, index=True, comment="观看日期")
+    watch_duration = Column(Integer, nullable=False, comment="观看时长(秒)")
+    completion_rate = Column(DECIMAL(5, 2), nullable=False, comment="完成率(%)")
+    last_position = Column(Integer, default=0, nullable=False, comment="上次观看位置(秒)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<VideoWatchRecord user={self.user_id} video={self.video_id}>"
@@ -0,0 +1,108 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text, UniqueConstraint
+
+from app.db.base_class import Base
+
+class Doctor(Base):
+    """医生信息表"""
+    __tablename__ = "doctors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, index=True, comment="医生姓名")
+    title = Column(String(50), nullable=False, comment="职称")
+    department = Column(String(50), nullable=False, index=True, comment="科室")
+    hospital = Column(String(100), nullable=False, index=True, comment="医院")
+    introduction = Column(Text, nullable=True, comment="简介")
+    avatar_url = Column(String(255), nullable=True, comment="头像URL")
+    phone = Column(String(20), nullable=True, comment="联系电话")
+    email = Column(String(100), nullable=True, comment="邮箱")
+    status = Column(Integer, default=1, nullable=False, index=True, comment="状态: 0-禁用, 1-正常")
+    online_status = Column(Integer, default=0, nullable=False, index=True, comment="在线状态: 0-离线, 1-在线")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Doctor {self.name}>"
+
+class DoctorAccount(Base):
+    """医生账号表"""
+    __tablename__ = "doctor_accounts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), unique=True, nullable=False, comment="医生ID")
+    username = Column(String(50), unique=True, nullable=False, comment="用户名")
+    password_hash = Column(String(128), nullable=False, comment="密码哈希")
+    # bcrypt哈希自带盐，该列只为兼容表结构
+    salt = Column(String(64), default="", nullable=False, comment="密码盐")
+    last_login_time = Column(DateTime, nullable=True, index=True, comment="最后登录时间")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<DoctorAccount {self.username}>"
+
+class UserDoctorRelation(Base):
+    """用户-医生关系表"""
+    __tablename__ = "user_doctor_relations"
+    __table_args__ = (UniqueConstraint("user_id", "doctor_id", name="idx_user_doctor"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, comment="医生ID")
+    relation_type = Column(Integer, nullable=False, index=True, comment="关系类型: 1-主治医生, 2-咨询医生")
+    status = Column(Integer, default=1, nullable=False, index=True, comment="状态: 0-解除, 1-正常")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<UserDoctorRelation user={self.user_id} doctor={self.doctor_id}>"
+
+class Conversation(Base):
+    """会话表"""
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "doctor_id", name="idx_user_doctor"),
+        Index("idx_doctor_id", "doctor_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, comment="医生ID")
+    last_message_id = Column(Integer, nullable=True, index=True, comment="最后消息ID")
+    unread_count_user = Column(Integer, default=0, nullable=False, comment="用户未读数")
+    unread_count_doctor = Column(Integer, default=0, nullable=False, comment="医生未读数")
+    last_read_id_user = Column(Integer, default=0, nullable=False, comment="用户已读到的消息ID")
+    last_read_id_doctor = Column(Integer, default=0, nullable=False, comment="医生已读到的消息ID")
+    status = Column(Integer, default=1, nullable=False, index=True, comment="状态: 0-关闭, 1-正常")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Conversation user={self.user_id} doctor={self.doctor_id}>"
+
+class Message(Base):
+    """消息表"""
+    __tablename__ = "messages"
+    __table_args__ = (
+        # 会话内按消息ID有序读取历史、统计未读
+        Index("idx_conversation_id", "conversation_id", "id"),
+        # 加载会话列表时读取接收者的未读消息
+        Index("idx_receiver", "receiver_id", "receiver_type", "is_read"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False, comment="消息ID(由app.core.messaging分配)")
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, comment="会话ID")
+    sender_id = Column(Integer, nullable=False, comment="发送者ID")
+    sender_type = Column(String(10), nullable=False, comment="发送者类型: user, doctor")
+    receiver_id = Column(Integer, nullable=False, comment="接收者ID")
+    receiver_type = Column(String(10), nullable=False, comment="接收者类型: user, doctor")
+    content = Column(Text, nullable=False, comment="消息内容")
+    message_type = Column(Integer, nullable=False, index=True, comment="消息类型: 1-文本, 2-图片, 3-语音, 4-视频")
+    media_url = Column(String(255), nullable=True, comment="媒体URL")
+    media_duration = Column(Integer, nullable=True, comment="媒体时长(秒)")
+    is_read = Column(Integer, default=0, nullable=False, comment="是否已读: 0-未读, 1-已读")
+    read_time = Column(DateTime, nullable=True, comment="阅读时间")
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, comment="创建时间")
+
+    def __repr__(self):
+        return f"<Message {self.id} conversation={self.conversation_id}>"
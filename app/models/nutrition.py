@@ -1 +1,147 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, Text, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
 
+from app.db.base_class import Base
+
+class FoodItem(Base):
+    """食物项目表"""
+    __tablename__ = "food_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, index=True, comment="食物名称")
+    category = Column(String(50), nullable=False, index=True, comment="食物类别")
+    protein_per_100g = Column(DECIMAL(6, 2), nullable=False, comment="每100g蛋白质含量(g)")
+    calories_per_100g = Column(DECIMAL(6, 2), nullable=False, comment="每100g热量(kcal)")
+    fat_per_100g = Column(DECIMAL(6, 2), nullable=True, comment="每100g脂肪含量(g)")
+    carbs_per_100g = Column(DECIMAL(6, 2), nullable=True, comment="每100g碳水化合物含量(g)")
+    fiber_per_100g = Column(DECIMAL(6, 2), nullable=True, comment="每100g纤维含量(g)")
+    image_url = Column(String(255), nullable=True, comment="食物图片URL")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<FoodItem {self.name}>"
+
+class Meal(Base):
+    """用户餐食记录表"""
+    __tablename__ = "meals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    meal_type = Column(Integer, nullable=False, comment="餐食类型: 1-早餐, 2-午餐, 3-晚餐, 4-加餐")
+    meal_time = Column(DateTime, nullable=False, comment="用餐时间")
+    image_url = Column(String(255), nullable=True, comment="餐食图片URL")
+    ai_recognized = Column(Integer, default=0, nullable=False, comment="是否AI识别: 0-否, 1-是")
+    total_protein = Column(DECIMAL(6, 2), nullable=True, comment="总蛋白质含量(g)")
+    total_calories = Column(DECIMAL(6, 2), nullable=True, comment="总热量(kcal)")
+    notes = Column(Text, nullable=True, comment="备注")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    # 关联
+    items = relationship("MealFoodItem", back_populates="meal", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<Meal {self.id} user={self.user_id}>"
+
+class MealFoodItem(Base):
+    """餐食食物明细表"""
+    __tablename__ = "meal_food_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False, index=True, comment="餐食ID")
+    food_item_id = Column(Integer, ForeignKey("food_items.id"), nullable=True, index=True, comment="食物ID")
+    food_name = Column(String(100), nullable=False, comment="食物名称")
+    quantity = Column(DECIMAL(6, 2), nullable=False, comment="食用量(g)")
+    protein = Column(DECIMAL(6, 2), nullable=False, comment="蛋白质含量(g)")
+    calories = Column(DECIMAL(6, 2), nullable=False, comment="热量(kcal)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    # 关联
+    meal = relationship("Meal", back_populates="items")
+
+    def __repr__(self):
+        return f"<MealFoodItem {self.food_name} {self.quantity}g>"
+
+class NutritionRecord(Base):
+    """营养摄入记录表（每个用户每天一条）"""
+    __tablename__ = "nutrition_records"
+    __table_args__ = (UniqueConstraint("user_id", "record_date", name="idx_user_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    record_date = Column(Date, nullable=False, comment="记录日期")
+    total_protein = Column(DECIMAL(6, 2), default=0, nullable=False, comment="总蛋白质摄入量(g)")
+    total_calories = Column(DECIMAL(6, 2), default=0, nullable=False, comment="总热量摄入量(kcal)")
+    protein_target = Column(DECIMAL(6, 2), nullable=False, comment="蛋白质目标摄入量(g)")
+    calories_target = Column(DECIMAL(6, 2), nullable=False, comment="热量目标摄入量(kcal)")
+    achievement_rate = Column(DECIMAL(5, 2), default=0, nullable=False, comment="达标率(%)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<NutritionRecord user={self.user_id} {self.record_date}>"
+
+class NutritionStatistic(Base):
+    """营养统计表（周/月汇总）"""
+    __tablename__ = "nutrition_statistics"
+    __table_args__ = (UniqueConstraint("user_id", "statistic_type", "statistic_date", name="idx_user_type_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    statistic_date = Column(Date, nullable=False, comment="统计周期起始日期(周一/每月1号)")
+    statistic_type = Column(String(20), nullable=False, comment="统计类型: weekly, monthly")
+    total_protein = Column(DECIMAL(10, 2), default=0, nullable=False, comment="总蛋白质摄入量(g)")
+    total_calories = Column(DECIMAL(10, 2), default=0, nullable=False, comment="总热量摄入量(kcal)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<NutritionStatistic user={self.user_id} {self.statistic_type} {self.statistic_date}>"
+
+class ProteinSupplement(Base):
+    """乳清蛋白摄入记录表"""
+    __tablename__ = "protein_supplements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    supplement_time = Column(DateTime, nullable=False, comment="摄入时间")
+    supplement_type = Column(String(50), nullable=False, comment="补充剂类型")
+    protein_amount = Column(DECIMAL(6, 2), nullable=False, comment="蛋白质含量(g)")
+    image_url = Column(String(255), nullable=True, comment="图片URL")
+    notes = Column(Text, nullable=True, comment="备注")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<ProteinSupplement {self.supplement_type} {self.protein_amount}g>"
+
+class DietRecommendation(Base):
+    """饮食建议表"""
+    __tablename__ = "diet_recommendations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    recommendation_date = Column(Date, nullable=False, comment="建议日期")
+    protein_gap = Column(DECIMAL(6, 2), nullable=False, comment="蛋白质缺口(g)")
+    recommendation_content = Column(Text, nullable=False, comment="建议内容")
+    is_read = Column(Integer, default=0, nullable=False, comment="是否已读: 0-未读, 1-已读")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<DietRecommendation user={self.user_id} {self.recommendation_date}>"
+
+class UserFoodPreference(Base):
+    """用户食物偏好表（推荐补充食物时使用）"""
+    __tablename__ = "user_food_preferences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, comment="用户ID")
+    excluded_categories = Column(String(255), nullable=True, comment="不吃的食物类别，逗号分隔")
+    excluded_foods = Column(String(1000), nullable=True, comment="不吃的食物ID，逗号分隔")
+    preferred_categories = Column(String(255), nullable=True, comment="偏好的食物类别，逗号分隔")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<UserFoodPreference user={self.user_id}>"
@@ -1 +1,60 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Date, Time, Text, ForeignKey, Index
 
+from app.db.base_class import Base
+
+class Task(Base):
+    """任务表"""
+    __tablename__ = "tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True, comment="用户ID")
+    task_type = Column(String(50), nullable=False, index=True, comment="任务类型: meal_record, exercise, protein_intake, social")
+    task_name = Column(String(100), nullable=False, comment="任务名称")
+    description = Column(Text, nullable=True, comment="任务描述")
+    points = Column(Integer, default=0, nullable=False, comment="完成奖励积分")
+    start_date = Column(Date, nullable=False, comment="开始日期")
+    end_date = Column(Date, nullable=True, comment="结束日期")
+    is_recurring = Column(Integer, default=0, nullable=False, comment="是否循环: 0-否, 1-是")
+    recurrence_pattern = Column(String(50), nullable=True, comment="循环模式: daily, weekly, monthly")
+    status = Column(Integer, default=0, nullable=False, index=True, comment="状态: 0-未完成, 1-已完成, 2-已过期")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Task {self.task_name} user={self.user_id}>"
+
+class TaskCompletion(Base):
+    """任务完成记录表"""
+    __tablename__ = "task_completions"
+    __table_args__ = (Index("idx_user_date", "user_id", "completion_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True, comment="任务ID")
+    completion_date = Column(Date, nullable=False, index=True, comment="完成日期")
+    completion_time = Column(Time, nullable=False, comment="完成时间")
+    points_earned = Column(Integer, default=0, nullable=False, comment="获得积分")
+    notes = Column(Text, nullable=True, comment="备注")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<TaskCompletion task={self.task_id} {self.completion_date}>"
+
+class Notification(Base):
+    """通知表"""
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True, comment="用户ID")
+    title = Column(String(100), nullable=False, comment="通知标题")
+    content = Column(Text, nullable=False, comment="通知内容")
+    notification_type = Column(String(50), nullable=False, index=True, comment="通知类型: reminder, achievement, task, system")
+    reference_id = Column(Integer, nullable=True, comment="关联ID")
+    reference_type = Column(String(50), nullable=True, comment="关联类型")
+    is_read = Column(Integer, default=0, nullable=False, comment="是否已读: 0-未读, 1-已读")
+    read_time = Column(DateTime, nullable=True, comment="阅读时间")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<Notification {self.notification_type} user={self.user_id}>"
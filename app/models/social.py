@@ -1 +1,129 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Double, ForeignKey, Index, Text, UniqueConstraint
 
+from app.db.base_class import Base
+
+class UserPoint(Base):
+    """用户积分表"""
+    __tablename__ = "user_points"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, comment="用户ID")
+    total_points = Column(Integer, default=0, nullable=False, comment="总积分")
+    available_points = Column(Integer, default=0, nullable=False, comment="可用积分")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<UserPoint user={self.user_id} {self.total_points}>"
+
+class PointRecord(Base):
+    """积分记录表"""
+    __tablename__ = "point_records"
+    __table_args__ = (UniqueConstraint("reference_type", "reference_id", "user_id", name="idx_reference"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True, comment="用户ID")
+    points = Column(Integer, nullable=False, comment="积分变动")
+    record_type = Column(Integer, nullable=False, index=True, comment="记录类型: 1-饮食记录, 2-运动完成, 3-乳清蛋白摄入, 4-社区活动, 5-其他")
+    description = Column(String(255), nullable=False, comment="描述")
+    reference_id = Column(Integer, nullable=True, comment="关联ID")
+    reference_type = Column(String(50), nullable=True, comment="关联类型")
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, comment="创建时间")
+
+    def __repr__(self):
+        return f"<PointRecord user={self.user_id} {self.points}>"
+
+class Topic(Base):
+    """社区话题表"""
+    __tablename__ = "topics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, unique=True, comment="话题名称")
+    description = Column(Text, nullable=True, comment="话题描述")
+    icon_url = Column(String(255), nullable=True, comment="图标URL")
+    post_count = Column(Integer, default=0, nullable=False, index=True, comment="帖子数量")
+    status = Column(Integer, default=1, nullable=False, index=True, comment="状态: 0-禁用, 1-正常")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Topic {self.name}>"
+
+class Post(Base):
+    """社区帖子表"""
+    __tablename__ = "posts"
+    # 信息流按(话题, 状态)等值过滤后按复合键倒序分页，排序键末尾带上主键保证唯一
+    __table_args__ = (
+        Index("idx_topic_status_created", "topic_id", "status", "created_at", "id"),
+        Index("idx_topic_status_hot", "topic_id", "status", "hot_score", "id"),
+        Index("idx_status_created", "status", "created_at", "id"),
+        Index("idx_status_hot", "status", "hot_score", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True, comment="用户ID")
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=True, comment="话题ID")
+    title = Column(String(100), nullable=False, comment="标题")
+    content = Column(Text, nullable=False, comment="内容")
+    view_count = Column(Integer, default=0, nullable=False, comment="浏览次数")
+    like_count = Column(Integer, default=0, nullable=False, comment="点赞次数")
+    comment_count = Column(Integer, default=0, nullable=False, comment="评论次数")
+    hot_score = Column(Double, default=0, nullable=False, comment="热度分数(互动量按时间衰减，见app.core.feed)")
+    status = Column(Integer, default=1, nullable=False, comment="状态: 0-删除, 1-正常, 2-置顶")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Post {self.id} {self.title}>"
+
+class PostImage(Base):
+    """帖子图片表"""
+    __tablename__ = "post_images"
+    # 按帖子批量读取图片时直接按(帖子, 顺序)有序扫描
+    __table_args__ = (Index("idx_post_sort", "post_id", "sort_order"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, comment="帖子ID")
+    image_url = Column(String(255), nullable=False, comment="图片URL")
+    sort_order = Column(Integer, default=0, nullable=False, comment="排序顺序")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<PostImage post={self.post_id} {self.sort_order}>"
+
+class Comment(Base):
+    """评论表"""
+    __tablename__ = "comments"
+    # 按帖子批量读取正常评论，按发表时间有序扫描
+    __table_args__ = (Index("idx_post_status_created", "post_id", "status", "created_at", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, comment="帖子ID")
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True, comment="用户ID")
+    parent_id = Column(Integer, nullable=True, index=True, comment="父评论ID")
+    content = Column(Text, nullable=False, comment="评论内容")
+    like_count = Column(Integer, default=0, nullable=False, comment="点赞次数")
+    status = Column(Integer, default=1, nullable=False, comment="状态: 0-删除, 1-正常")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    def __repr__(self):
+        return f"<Comment {self.id} post={self.post_id}>"
+
+class Like(Base):
+    """点赞表"""
+    __tablename__ = "likes"
+    __table_args__ = (
+        UniqueConstraint("user_id", "target_id", "target_type", name="idx_user_target"),
+        Index("idx_target_id_type", "target_id", "target_type"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="用户ID")
+    target_id = Column(Integer, nullable=False, comment="目标ID")
+    target_type = Column(String(20), nullable=False, comment="目标类型: post, comment")
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, comment="创建时间")
+
+    def __repr__(self):
+        return f"<Like user={self.user_id} {self.target_type}={self.target_id}>"
@@ -1 +1,56 @@
+from datetime import date, datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
 
+# 运动记录相关Schema
+class ExerciseRecordCreate(BaseModel):
+    exercise_type: str = Field(..., max_length=50)
+    start_time: datetime
+    end_time: datetime
+    video_id: Optional[int] = None
+    completion_rate: Optional[float] = Field(None, ge=0, le=100)
+    notes: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_time(self):
+        if self.end_time <= self.start_time:
+            raise ValueError("结束时间必须晚于开始时间")
+        if (self.end_time - self.start_time).total_seconds() > 86400:
+            raise ValueError("单次运动时长不能超过24小时")
+        return self
+
+class ExerciseRecordResponse(BaseModel):
+    id: int
+    user_id: int
+    exercise_date: date
+    exercise_type: str
+    start_time: datetime
+    end_time: datetime
+    duration: int
+    video_id: Optional[int]
+    completion_rate: Optional[float]
+    notes: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+# 运动视频Schema
+class ExerciseVideoResponse(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    difficulty_level: int
+    duration: int
+    video_url: str
+    thumbnail_url: Optional[str] = None
+    category: str
+    tags: Optional[str] = None
+    view_count: int
+
+# 趋势图Schema（列式数组，下标对应dates）
+class ExerciseTrendResponse(BaseModel):
+    period: str
+    dates: List[str]
+    duration: List[int]
+    exercise_days: List[int]
+    achievement_rate: List[float]
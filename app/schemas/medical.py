@@ -1 +1,93 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
 
+# 医患消息Schema
+class MessageSend(BaseModel):
+    """WebSocket发送消息: {"type": "message", ...}"""
+    # 接收方ID：用户发给医生时为医生ID，医生发给用户时为用户ID
+    to: int
+    content: str = Field("", max_length=2000)
+    message_type: int = Field(1, ge=1, le=4)
+    media_url: Optional[str] = Field(None, max_length=255)
+    media_duration: Optional[int] = Field(None, ge=0)
+    # 客户端生成的消息标识，随ack原样返回
+    client_id: Optional[str] = Field(None, max_length=64)
+
+    @model_validator(mode="after")
+    def check_body(self) -> "MessageSend":
+        if self.message_type == 1 and not self.content.strip():
+            raise ValueError("文本消息内容不能为空")
+        if self.message_type != 1 and not self.media_url:
+            raise ValueError("媒体消息需要media_url")
+        return self
+
+class MessageRead(BaseModel):
+    """WebSocket标记已读: {"type": "read", ...}，up_to及之前的消息全部已读"""
+    conversation_id: int
+    up_to: int
+
+class MessageResponse(BaseModel):
+    id: int
+    conversation_id: int
+    sender_id: int
+    sender_type: str
+    receiver_id: int
+    receiver_type: str
+    content: str
+    message_type: int
+    media_url: Optional[str] = None
+    media_duration: Optional[int] = None
+    is_read: bool = False
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class MessageHistory(BaseModel):
+    items: List[MessageResponse]
+    # 更早消息的游标（传给before），为空表示没有更多
+    next_before: Optional[int] = None
+
+class DoctorBrief(BaseModel):
+    id: int
+    name: str
+    title: str
+    department: str
+    avatar_url: Optional[str] = None
+    online_status: int = 0
+
+    class Config:
+        from_attributes = True
+
+class PatientBrief(BaseModel):
+    id: int
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+
+class LastMessage(BaseModel):
+    id: int
+    sender_type: str
+    # 前100个字符
+    content: str
+    message_type: int
+    created_at: datetime
+
+class ConversationSummary(BaseModel):
+    conversation_id: int
+    # 用户的会话列表带医生信息，医生的会话列表带患者信息
+    doctor: Optional[DoctorBrief] = None
+    patient: Optional[PatientBrief] = None
+    last_message: Optional[LastMessage] = None
+    unread_count: int = 0
+
+class ConversationList(BaseModel):
+    items: List[ConversationSummary]
+    # 全部会话的未读总数
+    total_unread: int = 0
+    # 下一页的游标（传给before），为空表示没有更多
+    next_before: Optional[int] = None
+
+class DoctorLoginRequest(BaseModel):
+    username: str = Field(..., min_length=1, max_length=50)
+    password: str = Field(..., min_length=6, max_length=20)
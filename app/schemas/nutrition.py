@@ -1 +1,164 @@
+from datetime import date, datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
 
+# 食物相关Schema
+class FoodItemResponse(BaseModel):
+    id: int
+    name: str
+    category: str
+    protein_per_100g: float
+    calories_per_100g: float
+    fat_per_100g: Optional[float] = None
+    carbs_per_100g: Optional[float] = None
+    fiber_per_100g: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class FoodSearchResult(BaseModel):
+    id: int
+    name: str
+    category: str
+    protein_per_100g: float
+    calories_per_100g: float
+    score: float
+
+# 图片识别相关Schema
+class RecognizedFood(BaseModel):
+    name: str
+    confidence: float
+    calories_per_100g: Optional[float] = None
+    # 与食物库匹配上时填写，可直接用于记录餐食
+    food_item_id: Optional[int] = None
+    protein_per_100g: Optional[float] = None
+
+class RecognitionJobResponse(BaseModel):
+    id: str
+    status: str  # pending-识别中, done-已完成, failed-失败
+    cached: bool
+    image_url: Optional[str] = None
+    result: Optional[List[RecognizedFood]] = None
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+
+# 餐食相关Schema
+class MealFoodItemCreate(BaseModel):
+    food_item_id: Optional[int] = None
+    food_name: Optional[str] = Field(None, max_length=100)
+    quantity: float = Field(..., gt=0, le=5000)  # 食用量(g)
+    # 不在食物库中的食物需手动填写营养含量
+    protein: Optional[float] = Field(None, ge=0)
+    calories: Optional[float] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def check_source(self):
+        if self.food_item_id is None and (self.food_name is None or self.protein is None or self.calories is None):
+            raise ValueError("未指定食物ID时需要填写食物名称、蛋白质和热量")
+        return self
+
+class MealCreate(BaseModel):
+    meal_type: int = Field(..., ge=1, le=4)  # 1-早餐, 2-午餐, 3-晚餐, 4-加餐
+    meal_time: datetime
+    image_url: Optional[str] = None
+    ai_recognized: bool = False
+    notes: Optional[str] = None
+    items: List[MealFoodItemCreate] = Field(..., min_length=1, max_length=100)
+
+class MealFoodItemResponse(BaseModel):
+    id: int
+    food_item_id: Optional[int]
+    food_name: str
+    quantity: float
+    protein: float
+    calories: float
+
+    class Config:
+        from_attributes = True
+
+class MealResponse(BaseModel):
+    id: int
+    user_id: int
+    meal_type: int
+    meal_time: datetime
+    image_url: Optional[str]
+    ai_recognized: bool
+    total_protein: Optional[float]
+    total_calories: Optional[float]
+    notes: Optional[str]
+    items: List[MealFoodItemResponse] = []
+
+    class Config:
+        from_attributes = True
+
+# 蛋白补充剂相关Schema
+class SupplementCreate(BaseModel):
+    supplement_time: datetime
+    supplement_type: str = Field(..., max_length=50)
+    protein_amount: float = Field(..., gt=0, le=200)  # 蛋白质含量(g)
+    image_url: Optional[str] = None
+    notes: Optional[str] = None
+
+class SupplementResponse(SupplementCreate):
+    id: int
+    user_id: int
+
+    class Config:
+        from_attributes = True
+
+# 每日营养汇总Schema
+class DailyNutritionResponse(BaseModel):
+    record_date: date
+    total_protein: float
+    total_calories: float
+    protein_target: float
+    calories_target: float
+    achievement_rate: float
+
+# 趋势图Schema（列式数组，下标对应dates）
+class NutritionTrendResponse(BaseModel):
+    period: str
+    dates: List[str]
+    protein: List[float]
+    calories: List[float]
+    protein_target: float
+
+# 食物偏好Schema
+class FoodPreferenceUpdate(BaseModel):
+    excluded_categories: List[str] = Field([], max_length=20)
+    excluded_foods: List[int] = Field([], max_length=100)
+    preferred_categories: List[str] = Field([], max_length=20)
+
+    @field_validator("excluded_categories", "preferred_categories")
+    @classmethod
+    def check_categories(cls, value: List[str]) -> List[str]:
+        categories = []
+        for category in value:
+            category = category.strip()
+            if not category or "," in category or len(category) > 50:
+                raise ValueError("食物类别不能为空、不能包含逗号且不超过50个字符")
+            if category not in categories:
+                categories.append(category)
+        return categories
+
+class FoodPreferenceResponse(FoodPreferenceUpdate):
+    pass
+
+# 蛋白质补充推荐Schema
+class RecommendedFood(BaseModel):
+    food_item_id: int
+    name: str
+    category: str
+    grams: int
+    protein: float
+    calories: float
+    alternatives: List["RecommendedFood"] = []
+
+class RecommendationResponse(BaseModel):
+    record_date: date
+    protein_gap: float
+    items: List[RecommendedFood]
+    total_protein: float
+    total_calories: float
+    content: str
@@ -1 +1,92 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
 
+# 积分排行榜Schema
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+    points: float
+
+class LeaderboardResponse(BaseModel):
+    period: str
+    items: List[LeaderboardEntry]
+    me: Optional[LeaderboardEntry] = None
+
+# 社区Schema
+class TopicResponse(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    icon_url: Optional[str] = None
+    post_count: int
+
+    class Config:
+        from_attributes = True
+
+class PostCreate(BaseModel):
+    topic_id: Optional[int] = None
+    title: str = Field(..., min_length=1, max_length=100)
+    content: str = Field(..., min_length=1, max_length=5000)
+    images: List[str] = Field(default_factory=list, max_length=9)
+
+    @field_validator("images")
+    @classmethod
+    def check_images(cls, value: List[str]) -> List[str]:
+        if any(not url or len(url) > 255 for url in value):
+            raise ValueError("图片URL不能为空且不超过255个字符")
+        return value
+
+class AuthorInfo(BaseModel):
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+
+class PostSummary(BaseModel):
+    id: int
+    user_id: int
+    author: Optional[AuthorInfo] = None
+    topic_id: Optional[int] = None
+    title: str
+    content: str
+    view_count: int
+    like_count: int
+    comment_count: int
+    images: List[str] = []
+    # 当前用户是否已点赞
+    liked: bool = False
+    pinned: bool = False
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class CommentCreate(BaseModel):
+    content: str = Field(..., min_length=1, max_length=1000)
+    # 回复的评论ID，为空时为一级评论
+    parent_id: Optional[int] = None
+
+class CommentResponse(BaseModel):
+    id: int
+    user_id: int
+    author: Optional[AuthorInfo] = None
+    parent_id: Optional[int] = None
+    content: str
+    like_count: int
+    liked: bool = False
+    created_at: datetime
+    replies: List["CommentResponse"] = []
+
+class PostDetail(PostSummary):
+    comments: List[CommentResponse] = []
+
+class FeedResponse(BaseModel):
+    items: List[PostSummary]
+    # 置顶帖只在第一页返回
+    pinned: List[PostSummary] = []
+    next_cursor: Optional[str] = None
+
+class LikeResponse(BaseModel):
+    liked: bool
+    like_count: int
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+# 图片上传Schema
+class ImageUploadResponse(BaseModel):
+    url: str
+    thumbnail_url: str  # 缩略图在后台生成，生成前访问会404，客户端可先显示原图
+    sha256: str
+    size: int
+    content_type: str
+    deduplicated: bool  # 相同内容的图片已存在，未重复保存
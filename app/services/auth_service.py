@@ -4,7 +4,8 @@ import hashlib
 import os
 from typing import Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 from fastapi import HTTPException, status
 
@@ -14,179 +15,214 @@ from app.schemas.auth import (
     UserResponse, TokenResponse
 )
 from app.core.config import settings
-from app.core.security import verify_password, get_password_hash
+from app.core.hashing import get_password_hasher
+from app.core.deps import invalidate_principal
+from app.core.code_store import get_code_store
+from app.core.sms_dispatcher import get_sms_dispatcher
+from app.core.request_context import timed
+from app.core.metrics import track_outcome
 
 class AuthService:
     @staticmethod
-    def create_user(db: Session, register: RegisterRequest) -> User:
+    @track_outcome("register")
+    async def create_user(db: AsyncSession, register: RegisterRequest) -> User:
         # 验证验证码
-        if not AuthService.verify_code(db, register.phone, register.code, 1):
+        if not await AuthService.verify_code(db, register.phone, register.code, 1):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="验证码无效"
             )
-        
+
         # 检查手机号是否已注册
-        if AuthService.get_user_by_phone(db, register.phone):
+        if await AuthService.get_user_by_phone(db, register.phone):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="手机号已注册"
             )
-        
+
         # 创建用户
         db_user = User(
             phone=register.phone,
-            password_hash=get_password_hash(register.password)
+            password_hash=await get_password_hasher().hash(register.password)
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        
+        await db.commit()
+        await db.refresh(db_user)
+
         return db_user
 
     @staticmethod
-    def verify_code(db: Session, phone: str, code: str, type: int) -> bool:
-        """验证短信验证码"""
-        verification = db.query(VerificationCode).filter(
-            VerificationCode.phone == phone,
-            VerificationCode.type == type,
-            VerificationCode.is_used == False,
-            VerificationCode.expire_time > datetime.utcnow()
-        ).first()
-        
-        if not verification or verification.code != code:
+    async def verify_code(db: AsyncSession, phone: str, code: str, type: int) -> bool:
+        """验证短信验证码（校验成功即消费，不可重复使用）"""
+        if not await get_code_store().consume(phone, type, code):
             return False
-        
-        # 标记验证码为已使用
-        verification.is_used = True
-        db.commit()
-        
+
+        if settings.SMS_CODE_AUDIT_DB:
+            # 审计模式下同步标记数据库记录
+            await db.execute(
+                update(VerificationCode)
+                .where(
+                    VerificationCode.phone == phone,
+                    VerificationCode.type == type,
+                    VerificationCode.code == code,
+                    VerificationCode.is_used == False
+                )
+                .values(is_used=True)
+            )
+            await db.commit()
+
         return True
 
     @staticmethod
-    def create_verification_code(db: Session, phone: str, type: int) -> str:
+    @track_outcome("send_code")
+    async def create_verification_code(db: AsyncSession, phone: str, type: int) -> str:
         """生成并保存验证码"""
         # 生成6位随机验证码
         code = ''.join(random.choices('0123456789', k=6))
-        
-        # 保存验证码
-        verification = VerificationCode(
-            phone=phone,
-            code=code,
-            type=type,
-            expire_time=datetime.utcnow() + timedelta(minutes=5)
-        )
-        db.add(verification)
-        db.commit()
-        
-        # 发送短信验证码
-        AuthService.send_sms(phone, code, type)
-        
+
+        # 发送短信验证码：只入队，由后台worker发送。先入队再保存，
+        # 队列已满时直接拒绝，不覆盖用户手上仍然有效的上一个验证码
+        with timed("sms"):
+            submitted = get_sms_dispatcher().submit(phone, code, type)
+        if not submitted:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="短信发送繁忙，请稍后再试"
+            )
+
+        # 保存验证码，过期由存储自动处理
+        with timed("sms"):
+            await get_code_store().save(phone, type, code, settings.SMS_CODE_EXPIRE_SECONDS)
+
+        if settings.SMS_CODE_AUDIT_DB:
+            verification = VerificationCode(
+                phone=phone,
+                code=code,
+                type=type,
+                expire_time=datetime.utcnow() + timedelta(seconds=settings.SMS_CODE_EXPIRE_SECONDS)
+            )
+            db.add(verification)
+            await db.commit()
+
         return code
-        
-    @staticmethod
-    def send_sms(phone: str, code: str, sms_type: int) -> bool:
-        """发送短信验证码"""
-        from app.core.sms_service import SMSService
-        return SMSService.send_sms(phone, code, sms_type)
 
     @staticmethod
-    def authenticate_user(db: Session, phone: str, password: str) -> Optional[User]:
+    @track_outcome("login_password")
+    async def authenticate_user(db: AsyncSession, phone: str, password: str) -> Optional[User]:
         """通过密码验证用户"""
-        user = AuthService.get_user_by_phone(db, phone)
-        if not user or not verify_password(password, user.password_hash):
+        user = await AuthService.get_user_by_phone(db, phone)
+        if not user:
+            return None
+        ok, new_hash = await get_password_hasher().verify_and_update(password, user.password_hash)
+        if not ok:
             return None
+        if new_hash:
+            # bcrypt参数变化后透明升级哈希，由调用方随登录时间一起提交
+            user.password_hash = new_hash
+            invalidate_principal(user.id)
         return user
 
     @staticmethod
-    def authenticate_user_by_code(db: Session, phone: str, code: str) -> Optional[User]:
+    @track_outcome("login_code")
+    async def authenticate_user_by_code(db: AsyncSession, phone: str, code: str) -> Optional[User]:
         """通过验证码验证用户"""
         # 验证验证码是否正确
-        if not AuthService.verify_code(db, phone, code, 2):
+        if not await AuthService.verify_code(db, phone, code, 2):
             return None
-        
+
         # 获取用户
-        user = AuthService.get_user_by_phone(db, phone)
-        
+        user = await AuthService.get_user_by_phone(db, phone)
+
         # 如果用户不存在，则自动创建用户
         if not user:
             # 创建一个随机密码 (可选，如果系统要求用户必须有密码)
             random_password = ''.join(random.choices('0123456789abcdefghijklmnopqrstuvwxyz', k=10))
-            
+
             # 创建用户
             user = User(
                 phone=phone,
-                password_hash=get_password_hash(random_password),
+                password_hash=await get_password_hasher().hash(random_password),
                 is_active=True,
                 register_time=datetime.utcnow(),
                 last_login_time=datetime.utcnow()
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
-            
+            await db.commit()
+            await db.refresh(user)
+
             # 创建默认的用户资料
             default_profile = UserProfile(user_id=user.id)
             db.add(default_profile)
-            db.commit()
-        
+            await db.commit()
+
         return user
 
     @staticmethod
-    def get_user_by_phone(db: Session, phone: str) -> Optional[User]:
-        return db.query(User).filter(User.phone == phone).first()
+    async def get_user_by_phone(db: AsyncSession, phone: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.phone == phone))
+        return result.scalars().first()
 
     @staticmethod
-    def create_access_token(user_id: int) -> TokenResponse:
-        """创建访问令牌"""
+    def create_access_token(user_id: int, role: Optional[str] = None) -> TokenResponse:
+        """创建访问令牌，医生令牌带role=doctor（sub为医生ID）"""
         expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         expire = datetime.utcnow() + expires_delta
-        
+
         to_encode = {
             "sub": str(user_id),
             "exp": expire
         }
+        if role is not None:
+            to_encode["role"] = role
         encoded_jwt = jwt.encode(
             to_encode,
             settings.SECRET_KEY,
             algorithm=settings.ALGORITHM
         )
-        
+
         return TokenResponse(
             access_token=encoded_jwt,
             expires_in=int(expires_delta.total_seconds())
         )
 
     @staticmethod
-    def update_user_profile(
-        db: Session,
+    async def get_user_profile(db: AsyncSession, user: User) -> Optional[UserProfile]:
+        """获取用户资料（异步会话中不能懒加载关联，需显式加载）"""
+        await db.refresh(user, attribute_names=["profile"])
+        return user.profile
+
+    @staticmethod
+    async def update_user_profile(
+        db: AsyncSession,
         user: User,
         profile_data: UserProfileCreate
     ) -> UserProfile:
         """更新用户资料"""
-        if not user.profile:
+        if not await AuthService.get_user_profile(db, user):
             profile = UserProfile(**profile_data.dict(), user_id=user.id)
             db.add(profile)
         else:
             for key, value in profile_data.dict(exclude_unset=True).items():
                 setattr(user.profile, key, value)
-        
-        db.commit()
-        db.refresh(user)
-        return user.profile
+
+        await db.commit()
+        return await AuthService.get_user_profile(db, user)
 
     @staticmethod
-    def register_device(
-        db: Session,
+    async def register_device(
+        db: AsyncSession,
         user: User,
         device_data: UserDeviceCreate
     ) -> UserDevice:
         """注册用户设备"""
-        device = db.query(UserDevice).filter(
-            UserDevice.user_id == user.id,
-            UserDevice.device_token == device_data.device_token
-        ).first()
-        
+        result = await db.execute(
+            select(UserDevice).where(
+                UserDevice.user_id == user.id,
+                UserDevice.device_token == device_data.device_token
+            )
+        )
+        device = result.scalars().first()
+
         if device:
             # 更新现有设备信息
             for key, value in device_data.dict(exclude_unset=True).items():
@@ -200,61 +236,77 @@ class AuthService:
                 last_active_time=datetime.utcnow()
             )
             db.add(device)
-        
-        db.commit()
-        db.refresh(device)
+
+        await db.commit()
+        await db.refresh(device)
         return device
 
     @staticmethod
-    def change_password(
-        db: Session,
+    @track_outcome("change_password")
+    async def change_password(
+        db: AsyncSession,
         user: User,
         old_password: str,
         new_password: str
     ) -> bool:
         """修改密码"""
-        if not verify_password(old_password, user.password_hash):
+        # 当前用户可能来自认证缓存（不含密码哈希），且其他worker可能刚修改过密码，原密码按库中的哈希校验
+        stored = (await db.execute(select(User.password_hash).where(User.id == user.id))).scalar()
+        if stored is None or not await get_password_hasher().verify(old_password, stored):
             return False
-        
-        user.password_hash = get_password_hash(new_password)
-        db.commit()
+
+        user.password_hash = await get_password_hasher().hash(new_password)
+        await db.commit()
+        invalidate_principal(user.id)
         return True
 
     @staticmethod
-    def reset_password(
-        db: Session,
+    @track_outcome("reset_password")
+    async def reset_password(
+        db: AsyncSession,
         phone: str,
         code: str,
         new_password: str
     ) -> bool:
         """重置密码"""
-        if not AuthService.verify_code(db, phone, code, 3):
+        if not await AuthService.verify_code(db, phone, code, 3):
             return False
-        
-        user = AuthService.get_user_by_phone(db, phone)
+
+        user = await AuthService.get_user_by_phone(db, phone)
         if not user:
             return False
-        
-        user.password_hash = get_password_hash(new_password)
-        db.commit()
+
+        user.password_hash = await get_password_hasher().hash(new_password)
+        await db.commit()
+        invalidate_principal(user.id)
         return True
 
     @staticmethod
-    def change_phone(
-        db: Session,
+    @track_outcome("change_phone")
+    async def change_phone(
+        db: AsyncSession,
         user: User,
         new_phone: str,
         code: str
     ) -> bool:
         """修改手机号"""
         # 验证验证码
-        if not AuthService.verify_code(db, new_phone, code, 4):
+        if not await AuthService.verify_code(db, new_phone, code, 4):
             return False
-        
+
         # 检查新手机号是否已被使用
-        if AuthService.get_user_by_phone(db, new_phone):
+        if await AuthService.get_user_by_phone(db, new_phone):
             return False
-        
+
         user.phone = new_phone
-        db.commit()
+        await db.commit()
+        invalidate_principal(user.id)
         return True
+
+    @staticmethod
+    async def update_user_status(db: AsyncSession, user: User, user_status: int) -> User:
+        """修改用户状态: 0-禁用, 1-正常"""
+        user.status = user_status
+        await db.commit()
+        invalidate_principal(user.id)
+        return user
@@ -0,0 +1,165 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.points_ledger import RECORD_DIET, RECORD_EXERCISE
+from app.core.timeseries import DAILY
+from app.db.upsert import build_upsert
+from app.models.exercise import ExerciseStatistic
+from app.models.nutrition import NutritionRecord
+from app.models.reminders import Notification, Task, TaskCompletion
+from app.models.social import PointRecord, UserPoint
+
+# 每日小结通知和达标奖励的关联类型，reference_id为日期(YYYYMMDD)
+SUMMARY_REFERENCE = "daily_summary"
+PROTEIN_BONUS_REFERENCE = "daily_protein_bonus"
+EXERCISE_BONUS_REFERENCE = "daily_exercise_bonus"
+
+
+def day_key(day: date) -> int:
+    """日期转为YYYYMMDD整数，作为关联ID"""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+class DailySummaryService:
+    @staticmethod
+    def _load(db: Session, day: date, user_ids: Sequence[int]) -> Dict[str, Any]:
+        """按唯一索引批量读取一块用户当天的各模块数据（每张表一次查询）"""
+        nutrition = db.execute(
+            select(NutritionRecord.user_id, NutritionRecord.total_protein, NutritionRecord.protein_target,
+                   NutritionRecord.achievement_rate)
+            .where(NutritionRecord.user_id.in_(user_ids), NutritionRecord.record_date == day)
+        ).all()
+        exercise = db.execute(
+            select(ExerciseStatistic.user_id, ExerciseStatistic.total_duration, ExerciseStatistic.achievement_rate)
+            .where(
+                ExerciseStatistic.user_id.in_(user_ids),
+                ExerciseStatistic.statistic_date == day,
+                ExerciseStatistic.statistic_type == DAILY
+            )
+        ).all()
+        completions = db.execute(
+            select(TaskCompletion.user_id, func.count(), func.coalesce(func.sum(TaskCompletion.points_earned), 0))
+            .where(TaskCompletion.user_id.in_(user_ids), TaskCompletion.completion_date == day)
+            .group_by(TaskCompletion.user_id)
+        ).all()
+        tasks = db.execute(
+            select(Task.user_id, func.count())
+            .where(
+                Task.user_id.in_(user_ids),
+                Task.start_date <= day,
+                (Task.end_date.is_(None)) | (Task.end_date >= day)
+            )
+            .group_by(Task.user_id)
+        ).all()
+        done = db.execute(
+            select(Notification.user_id).where(
+                Notification.reference_id == day_key(day),
+                Notification.reference_type == SUMMARY_REFERENCE,
+                Notification.user_id.in_(user_ids)
+            )
+        ).all()
+        return {
+            "nutrition": {row[0]: tuple(row[1:]) for row in nutrition},
+            "exercise": {row[0]: tuple(row[1:]) for row in exercise},
+            "completions": {row[0]: tuple(row[1:]) for row in completions},
+            "tasks": {row[0]: tuple(row[1:]) for row in tasks},
+            "done": {row[0] for row in done},
+        }
+
+    @staticmethod
+    def summarize_users(db: Session, day: date, user_ids: Sequence[int]) -> Dict[str, int]:
+        """
+        生成一块用户某天的每日小结（夜间批处理的处理函数）
+
+        每张表一次批量读取；给当天有记录或有任务的用户写一条小结通知，蛋白质/运动达标的
+        发放奖励积分（积分记录批量插入，user_points批量累加）。一块一个事务，已写过
+        小结通知的用户跳过，重复执行不会重复发放。
+
+        返回:
+            dict: users-用户数, summaries-生成小结数, skipped-已处理过跳过数, bonus_points-发放积分合计
+        """
+        data = DailySummaryService._load(db, day, user_ids)
+        key = day_key(day)
+        now = datetime.utcnow()
+        notifications: List[dict] = []
+        point_records: List[dict] = []
+        awards: Dict[int, int] = {}
+
+        for user_id in user_ids:
+            if user_id in data["done"]:
+                continue
+            nutrition = data["nutrition"].get(user_id)
+            exercise = data["exercise"].get(user_id)
+            completed, task_points = data["completions"].get(user_id, (0, 0))
+            (total_tasks,) = data["tasks"].get(user_id, (0,))
+            if nutrition is None and exercise is None and not completed and not total_tasks:
+                continue
+
+            lines = [f"完成任务{completed}/{max(total_tasks, completed)}个，获得{int(task_points)}积分"]
+            if nutrition is not None:
+                protein, target, _ = nutrition
+                lines.append(f"蛋白质{float(protein):g}g/{float(target):g}g")
+            if exercise is not None:
+                lines.append(f"运动{int(exercise[0]) // 60}分钟")
+
+            bonus = 0
+            if nutrition is not None and float(nutrition[2]) >= 100 and settings.DAILY_PROTEIN_BONUS_POINTS:
+                bonus += settings.DAILY_PROTEIN_BONUS_POINTS
+                point_records.append({
+                    "user_id": user_id, "points": settings.DAILY_PROTEIN_BONUS_POINTS,
+                    "record_type": RECORD_DIET, "description": "蛋白质摄入达标奖励",
+                    "reference_id": key, "reference_type": PROTEIN_BONUS_REFERENCE, "created_at": now,
+                })
+            if exercise is not None and float(exercise[1]) >= 100 and settings.DAILY_EXERCISE_BONUS_POINTS:
+                bonus += settings.DAILY_EXERCISE_BONUS_POINTS
+                point_records.append({
+                    "user_id": user_id, "points": settings.DAILY_EXERCISE_BONUS_POINTS,
+                    "record_type": RECORD_EXERCISE, "description": "运动时长达标奖励",
+                    "reference_id": key, "reference_type": EXERCISE_BONUS_REFERENCE, "created_at": now,
+                })
+            if bonus:
+                awards[user_id] = bonus
+                lines.append(f"达标奖励{bonus}积分")
+
+            notifications.append({
+                "user_id": user_id,
+                "title": "今日小结",
+                "content": "；".join(lines) + "。",
+                "notification_type": "task",
+                "reference_id": key,
+                "reference_type": SUMMARY_REFERENCE,
+                "is_read": 0,
+                "created_at": now,
+            })
+
+        if notifications:
+            db.execute(insert(Notification), notifications)
+        if point_records:
+            db.execute(insert(PointRecord), point_records)
+        if awards:
+            c = UserPoint.__table__.c
+            db.execute(build_upsert(
+                db.bind.dialect.name, UserPoint.__table__,
+                [
+                    {"user_id": user_id, "total_points": points, "available_points": points,
+                     "created_at": now, "updated_at": now}
+                    for user_id, points in awards.items()
+                ],
+                ["user_id"],
+                lambda inserted: [
+                    ("total_points", c.total_points + inserted.total_points),
+                    ("available_points", c.available_points + inserted.available_points),
+                    ("updated_at", inserted.updated_at),
+                ]
+            ))
+        db.commit()
+        return {
+            "users": len(user_ids),
+            "summaries": len(notifications),
+            "skipped": len(data["done"]),
+            "bonus_points": sum(awards.values()),
+        }
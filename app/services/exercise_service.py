@@ -1 +1,179 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
 
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.counters import VIDEO_VIEWS, get_counters
+from app.core.points_ledger import RECORD_EXERCISE, get_points_ledger
+from app.core.timeseries import DAILY, MONTHLY, WEEKLY, bucket_days, bucket_start, bucket_starts, columnar
+from app.db.upsert import build_upsert
+from app.models.exercise import ExerciseRecord, ExerciseStatistic, ExerciseVideo
+from app.schemas.exercise import ExerciseRecordCreate
+from app.services.nutrition_service import achievement_rate
+
+
+def target_duration(day: date, period: str) -> int:
+    """统计桶的目标时长(秒)：每日目标 × 桶内天数"""
+    return settings.EXERCISE_DAILY_TARGET * bucket_days(bucket_start(day, period), period)
+
+
+class ExerciseService:
+    @staticmethod
+    async def create_record(db: AsyncSession, user_id: int, record_in: ExerciseRecordCreate) -> ExerciseRecord:
+        """记录一次运动，并在同一事务中更新日/周/月统计"""
+        duration = int((record_in.end_time - record_in.start_time).total_seconds())
+        record = ExerciseRecord(
+            user_id=user_id,
+            exercise_date=record_in.start_time.date(),
+            duration=duration,
+            **record_in.model_dump()
+        )
+        db.add(record)
+        await db.flush()
+        await ExerciseService.apply_duration_delta(db, user_id, record.exercise_date, duration)
+        await db.commit()
+        await get_points_ledger().award(
+            user_id, settings.POINTS_EXERCISE_RECORD, RECORD_EXERCISE, "完成运动", "exercise_record", record.id
+        )
+        return record
+
+    @staticmethod
+    async def view_video(db: AsyncSession, video_id: int) -> Optional[Dict[str, Any]]:
+        """获取运动视频并累加观看次数（计数经缓冲批量写库，返回值已合并未写库的增量）"""
+        video = await db.get(ExerciseVideo, video_id)
+        if video is None:
+            return None
+        counters = get_counters()
+        await counters.incr(VIDEO_VIEWS, video_id)
+        item = {column.name: getattr(video, column.name) for column in ExerciseVideo.__table__.columns}
+        (item,) = await counters.merge([item], {VIDEO_VIEWS: "view_count"})
+        return item
+
+    @staticmethod
+    async def delete_record(db: AsyncSession, user_id: int, record_id: int) -> bool:
+        """删除运动记录，扣减对应的统计并撤销记录时发放的积分"""
+        record = await ExerciseService.get_record(db, user_id, record_id)
+        if record is None:
+            return False
+        await db.execute(delete(ExerciseRecord).where(ExerciseRecord.id == record.id))
+        await ExerciseService.apply_duration_delta(db, user_id, record.exercise_date, -record.duration)
+        await db.commit()
+        await get_points_ledger().revoke(user_id, RECORD_EXERCISE, "删除运动记录", "exercise_record", record.id)
+        return True
+
+    @staticmethod
+    async def get_record(db: AsyncSession, user_id: int, record_id: int) -> Optional[ExerciseRecord]:
+        """获取用户的运动记录"""
+        result = await db.execute(
+            select(ExerciseRecord).where(ExerciseRecord.id == record_id, ExerciseRecord.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def list_records(db: AsyncSession, user_id: int, day: date) -> List[ExerciseRecord]:
+        """获取用户某天的运动记录"""
+        result = await db.execute(
+            select(ExerciseRecord)
+            .where(ExerciseRecord.user_id == user_id, ExerciseRecord.exercise_date == day)
+            .order_by(ExerciseRecord.start_time)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def apply_duration_delta(db: AsyncSession, user_id: int, day: date, seconds: int) -> None:
+        """
+        增量更新运动统计（与业务写入同一事务，由调用方提交）
+
+        先upsert当天的daily行，再读回当天总时长判断"运动天数"是否变化，
+        最后用一条多行upsert更新周、月统计。
+        """
+        if not seconds:
+            return
+        table = ExerciseStatistic.__table__
+        c = table.c
+        dialect = db.bind.dialect.name
+        conflict = ["user_id", "statistic_date", "statistic_type"]
+
+        def rate(total):
+            return case((total >= c.target_duration, 100), else_=func.round(total * 100.0 / c.target_duration, 2))
+
+        new_total = c.total_duration + seconds
+        target = target_duration(day, DAILY)
+        await db.execute(build_upsert(
+            dialect, table,
+            {
+                "user_id": user_id,
+                "statistic_date": day,
+                "statistic_type": DAILY,
+                "total_duration": seconds,
+                "exercise_days": 1 if seconds > 0 else 0,
+                "target_duration": target,
+                "achievement_rate": achievement_rate(seconds, target),
+            },
+            conflict,
+            # 引用旧total_duration的列排在total_duration之前
+            lambda inserted: [
+                ("achievement_rate", rate(new_total)),
+                ("exercise_days", case((new_total > 0, 1), else_=0)),
+                ("total_duration", new_total),
+            ]
+        ))
+
+        result = await db.execute(
+            select(ExerciseStatistic.total_duration).where(
+                ExerciseStatistic.user_id == user_id,
+                ExerciseStatistic.statistic_date == day,
+                ExerciseStatistic.statistic_type == DAILY
+            )
+        )
+        after = result.scalar_one()
+        day_change = int(after > 0) - int(after - seconds > 0)
+
+        values = []
+        for period in (WEEKLY, MONTHLY):
+            target = target_duration(day, period)
+            values.append({
+                "user_id": user_id,
+                "statistic_date": bucket_start(day, period),
+                "statistic_type": period,
+                "total_duration": seconds,
+                "exercise_days": day_change,
+                "target_duration": target,
+                "achievement_rate": achievement_rate(seconds, target),
+            })
+        await db.execute(build_upsert(
+            dialect, table, values, conflict,
+            lambda inserted: [
+                ("achievement_rate", rate(c.total_duration + inserted.total_duration)),
+                ("exercise_days", c.exercise_days + inserted.exercise_days),
+                ("total_duration", c.total_duration + inserted.total_duration),
+            ]
+        ))
+
+    @staticmethod
+    async def get_trend(db: AsyncSession, user_id: int, period: str, start_day: date, end_day: date) -> Dict[str, Any]:
+        """
+        获取运动时长趋势（列式数组，缺失的周期补0），一次唯一索引范围读取
+
+        参数:
+            period (str): daily/weekly/monthly
+            start_day, end_day: 日期范围，start_day会对齐到周期起始日
+        """
+        starts = bucket_starts(start_day, end_day, period)
+        result = await db.execute(
+            select(
+                ExerciseStatistic.statistic_date, ExerciseStatistic.total_duration,
+                ExerciseStatistic.exercise_days, ExerciseStatistic.achievement_rate
+            ).where(
+                ExerciseStatistic.user_id == user_id,
+                ExerciseStatistic.statistic_date >= starts[0],
+                ExerciseStatistic.statistic_date <= end_day,
+                ExerciseStatistic.statistic_type == period
+            )
+        )
+        rows = {day: values for day, *values in result.all()}
+        data = columnar(starts, rows, ("duration", "exercise_days", "achievement_rate"))
+        data["period"] = period
+        return data
@@ -1 +1,135 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
 
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.hashing import get_password_hasher
+from app.core.inbox import get_inbox
+from app.core.messaging import DOCTOR, USER, Participant
+from app.core.security import decode_token
+from app.models.auth import User, UserProfile
+from app.models.medical import Conversation, Doctor, DoctorAccount, Message
+
+
+class MedicalService:
+    @staticmethod
+    async def authenticate_doctor(db: AsyncSession, username: str, password: str) -> Optional[Doctor]:
+        """医生账号密码登录，成功时更新最后登录时间并返回医生（已禁用的医生不能登录）"""
+        row = (await db.execute(
+            select(DoctorAccount, Doctor)
+            .join(Doctor, Doctor.id == DoctorAccount.doctor_id)
+            .where(DoctorAccount.username == username)
+        )).first()
+        if row is None:
+            return None
+        account, doctor = row
+        ok, new_hash = await get_password_hasher().verify_and_update(password, account.password_hash)
+        if not ok or doctor.status != 1:
+            return None
+        if new_hash:
+            account.password_hash = new_hash
+        account.last_login_time = datetime.utcnow()
+        await db.commit()
+        return doctor
+
+    @staticmethod
+    async def socket_participant(db: AsyncSession, token: str) -> Optional[Participant]:
+        """
+        解析WebSocket连接的令牌：用户令牌为用户，带role=doctor的令牌（authenticate_doctor登录后签发）为医生
+
+        令牌无效或账号已禁用时返回None。
+        """
+        payload = decode_token(token)
+        if payload is None:
+            return None
+        try:
+            participant_id = int(payload["sub"])
+        except (TypeError, ValueError):
+            return None
+        role = payload.get("role", USER)
+        if role == USER:
+            stmt = select(User.status).where(User.id == participant_id)
+        elif role == DOCTOR:
+            stmt = select(Doctor.status).where(Doctor.id == participant_id)
+        else:
+            return None
+        if (await db.execute(stmt)).scalar() != 1:
+            return None
+        return Participant(role, participant_id)
+
+    @staticmethod
+    async def get_messages(
+        db: AsyncSession, reader: Participant, conversation_id: int, before: Optional[int] = None, limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        按消息ID倒序分页读取会话历史（idx_conversation_id范围扫描），reader为会话中的用户或医生
+
+        用于打开会话和断线重连后补齐；刚发送、尚未写库的消息（至多IM_FLUSH_INTERVAL秒）
+        已经通过WebSocket送达，不在历史中。
+        """
+        conversation = await db.get(Conversation, conversation_id)
+        member = None
+        if conversation is not None:
+            member = conversation.user_id if reader.type == USER else conversation.doctor_id
+        if member != reader.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="会话不存在")
+        stmt = select(Message).where(Message.conversation_id == conversation_id)
+        if before is not None:
+            stmt = stmt.where(Message.id < before)
+        rows = (await db.execute(stmt.order_by(Message.id.desc()).limit(limit + 1))).scalars().all()
+        items = rows[:limit]
+        return {"items": items, "next_before": items[-1].id if len(rows) > limit else None}
+
+    @staticmethod
+    async def list_conversations(
+        db: AsyncSession, user_id: int, before: Optional[int] = None, limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        用户的会话列表，按最后消息倒序，带未读数
+
+        顺序、未读数和最后消息来自会话列表缓存（app.core.inbox），不查消息表；
+        医生信息按本页会话ID一次读取，与历史消息数量无关。
+        """
+        page = await get_inbox().list(USER, user_id, before, limit)
+        conversation_ids = [item["conversation_id"] for item in page["items"]]
+        doctors = {}
+        if conversation_ids:
+            rows = (await db.execute(
+                select(Conversation.id, Doctor)
+                .join(Doctor, Doctor.id == Conversation.doctor_id)
+                .where(Conversation.id.in_(conversation_ids))
+            )).all()
+            doctors = {conversation_id: doctor for conversation_id, doctor in rows}
+        page["items"] = [
+            dict(item, doctor=doctors.get(item["conversation_id"])) for item in page["items"]
+        ]
+        return page
+
+    @staticmethod
+    async def list_doctor_conversations(
+        db: AsyncSession, doctor_id: int, before: Optional[int] = None, limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        医生的会话列表，按最后消息倒序，带未读数
+
+        与list_conversations相同由会话列表缓存提供，患者信息按本页会话ID一次读取。
+        """
+        page = await get_inbox().list(DOCTOR, doctor_id, before, limit)
+        conversation_ids = [item["conversation_id"] for item in page["items"]]
+        patients = {}
+        if conversation_ids:
+            rows = (await db.execute(
+                select(Conversation.id, Conversation.user_id, UserProfile.name, UserProfile.avatar)
+                .outerjoin(UserProfile, UserProfile.user_id == Conversation.user_id)
+                .where(Conversation.id.in_(conversation_ids))
+            )).all()
+            patients = {
+                conversation_id: {"id": user_id, "name": name, "avatar": avatar}
+                for conversation_id, user_id, name, avatar in rows
+            }
+        page["items"] = [
+            dict(item, patient=patients.get(item["conversation_id"])) for item in page["items"]
+        ]
+        return page
@@ -1 +1,712 @@
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.food_catalog import NUTRIENTS, UnknownFoodError, get_food_catalog
+from app.core.logger import get_logger
+from app.core.points_ledger import RECORD_DIET, RECORD_SUPPLEMENT, get_points_ledger
+from app.core.recommendation import NO_PREFERENCES, Preferences, get_recommendation_engine, render_content
+from app.core.timeseries import DAILY, MONTHLY, WEEKLY, bucket_start, bucket_starts, columnar
+from app.db.upsert import build_insert_ignore, build_upsert
+from app.models.auth import User
+from app.models.nutrition import (
+    DietRecommendation, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, ProteinSupplement, UserFoodPreference
+)
+from app.schemas.nutrition import FoodPreferenceUpdate, MealCreate, MealFoodItemCreate, SupplementCreate
+
+_PROTEIN = NUTRIENTS.index("protein")
+_CALORIES = NUTRIENTS.index("calories")
+
+logger = get_logger("health777.nutrition")
+
+# 每日汇总的变化量: (日期, 蛋白质, 热量)
+DailyAmount = Tuple[date, float, float]
+
+def achievement_rate(protein: float, target: float) -> float:
+    """蛋白质达标率(%)，最高100"""
+    if target <= 0:
+        return 0.0
+    return round(min(100.0, protein * 100 / target), 2)
+
+class NutritionService:
+    @staticmethod
+    async def _lookup(db: AsyncSession, food_ids: Sequence[int], grams: Sequence[float]) -> Tuple[List[str], np.ndarray]:
+        """从食物目录批量查询名称并计算每行营养，食物不存在时返回400"""
+        catalog = await get_food_catalog().get(db)
+        try:
+            lines, _ = catalog.compute(food_ids, grams)
+        except UnknownFoodError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"食物不存在: {e.food_ids}"
+            )
+        return [catalog.names[pos] for pos in catalog.positions(food_ids)], lines
+
+    @staticmethod
+    async def compute_items(db: AsyncSession, items: Sequence[MealFoodItemCreate]) -> List[dict]:
+        """
+        计算餐食明细的营养含量
+
+        食物库中的食物通过内存目录一次性批量计算，不逐条查询数据库；
+        手动填写的食物直接使用提交的数值。
+
+        返回:
+            list: 可直接批量插入meal_food_items的字典（不含meal_id）
+        """
+        rows = [
+            {
+                "food_item_id": item.food_item_id,
+                "food_name": item.food_name,
+                "quantity": round(item.quantity, 2),
+                "protein": item.protein,
+                "calories": item.calories,
+            }
+            for item in items
+        ]
+
+        indexed = [i for i, item in enumerate(items) if item.food_item_id is not None]
+        if indexed:
+            names, lines = await NutritionService._lookup(
+                db,
+                [items[i].food_item_id for i in indexed],
+                [items[i].quantity for i in indexed]
+            )
+            for i, name, line in zip(indexed, names, lines):
+                row = rows[i]
+                row["protein"] = round(float(line[_PROTEIN]), 2)
+                row["calories"] = round(float(line[_CALORIES]), 2)
+                row["food_name"] = row["food_name"] or name
+
+        return rows
+
+    @staticmethod
+    def sum_items(rows: Sequence[dict]) -> Tuple[float, float]:
+        """合计餐食的蛋白质和热量"""
+        return (
+            round(sum(float(row["protein"]) for row in rows), 2),
+            round(sum(float(row["calories"]) for row in rows), 2)
+        )
+
+    @staticmethod
+    async def create_meal(db: AsyncSession, user_id: int, meal_in: MealCreate) -> Meal:
+        """创建餐食记录，明细一次批量插入"""
+        rows = await NutritionService.compute_items(db, meal_in.items)
+        total_protein, total_calories = NutritionService.sum_items(rows)
+
+        meal = Meal(
+            user_id=user_id,
+            meal_type=meal_in.meal_type,
+            meal_time=meal_in.meal_time,
+            image_url=meal_in.image_url,
+            ai_recognized=1 if meal_in.ai_recognized else 0,
+            total_protein=total_protein,
+            total_calories=total_calories,
+            notes=meal_in.notes
+        )
+        db.add(meal)
+        await db.flush()
+
+        for row in rows:
+            row["meal_id"] = meal.id
+        await NutritionService.apply_daily_change(
+            db, user_id, None, (meal_in.meal_time.date(), total_protein, total_calories)
+        )
+        # 使用Core插入：ORM批量插入会按是否为NULL拆分成多条INSERT(手动填写的食物没有food_item_id)
+        await db.execute(insert(MealFoodItem.__table__), rows)
+        await db.commit()
+
+        await get_points_ledger().award(
+            user_id, settings.POINTS_MEAL_RECORD, RECORD_DIET, "记录饮食", "meal", meal.id
+        )
+        await db.refresh(meal, attribute_names=["items"])
+        return meal
+
+    @staticmethod
+    async def recompute_meal(db: AsyncSession, meal: Meal) -> Meal:
+        """
+        按最新的食物数据重新计算餐食营养（食物库数据修正后使用）
+
+        明细一次读取、一次批量更新，与食材数量无关。
+        """
+        # 只查列不加载ORM对象，批量更新后会话中不会残留旧值
+        result = await db.execute(
+            select(
+                MealFoodItem.id, MealFoodItem.food_item_id, MealFoodItem.quantity,
+                MealFoodItem.protein, MealFoodItem.calories
+            ).where(MealFoodItem.meal_id == meal.id)
+        )
+        items = result.all()
+
+        rows = [{"id": item.id, "protein": item.protein, "calories": item.calories} for item in items]
+        indexed = [i for i, item in enumerate(items) if item.food_item_id is not None]
+        if indexed:
+            _, lines = await NutritionService._lookup(
+                db,
+                [items[i].food_item_id for i in indexed],
+                [float(items[i].quantity) for i in indexed]
+            )
+            for i, line in zip(indexed, lines):
+                rows[i]["protein"] = round(float(line[_PROTEIN]), 2)
+                rows[i]["calories"] = round(float(line[_CALORIES]), 2)
+            # 按主键批量更新（executemany），不修改ORM对象以免提交时逐行flush
+            await db.execute(update(MealFoodItem), [rows[i] for i in indexed])
+
+        total_protein, total_calories = NutritionService.sum_items(rows)
+        await NutritionService.apply_daily_change(
+            db, meal.user_id, NutritionService._meal_amount(meal),
+            (meal.meal_time.date(), total_protein, total_calories)
+        )
+        meal.total_protein = total_protein
+        meal.total_calories = total_calories
+        await db.commit()
+        return meal
+
+    @staticmethod
+    async def update_meal(db: AsyncSession, user_id: int, meal_id: int, meal_in: MealCreate) -> Optional[Meal]:
+        """修改餐食记录，明细整体替换"""
+        result = await db.execute(select(Meal).where(Meal.id == meal_id, Meal.user_id == user_id))
+        meal = result.scalar_one_or_none()
+        if meal is None:
+            return None
+
+        old_amount = NutritionService._meal_amount(meal)
+        rows = await NutritionService.compute_items(db, meal_in.items)
+        total_protein, total_calories = NutritionService.sum_items(rows)
+
+        meal.meal_type = meal_in.meal_type
+        meal.meal_time = meal_in.meal_time
+        meal.image_url = meal_in.image_url
+        meal.ai_recognized = 1 if meal_in.ai_recognized else 0
+        meal.notes = meal_in.notes
+        meal.total_protein = total_protein
+        meal.total_calories = total_calories
+
+        for row in rows:
+            row["meal_id"] = meal.id
+        await db.execute(delete(MealFoodItem).where(MealFoodItem.meal_id == meal.id))
+        await db.execute(insert(MealFoodItem.__table__), rows)
+        await NutritionService.apply_daily_change(
+            db, user_id, old_amount, (meal_in.meal_time.date(), total_protein, total_calories)
+        )
+        await db.commit()
+
+        await db.refresh(meal, attribute_names=["items"])
+        return meal
+
+    @staticmethod
+    async def delete_meal(db: AsyncSession, user_id: int, meal_id: int) -> bool:
+        """删除餐食记录，并撤销记录时发放的积分"""
+        result = await db.execute(select(Meal).where(Meal.id == meal_id, Meal.user_id == user_id))
+        meal = result.scalar_one_or_none()
+        if meal is None:
+            return False
+
+        await NutritionService.apply_daily_change(db, user_id, NutritionService._meal_amount(meal), None)
+        await db.execute(delete(MealFoodItem).where(MealFoodItem.meal_id == meal.id))
+        await db.execute(delete(Meal).where(Meal.id == meal.id))
+        await db.commit()
+        await get_points_ledger().revoke(user_id, RECORD_DIET, "删除饮食记录", "meal", meal.id)
+        return True
+
+    @staticmethod
+    def _meal_amount(meal: Meal) -> DailyAmount:
+        return meal.meal_time.date(), float(meal.total_protein or 0), float(meal.total_calories or 0)
+
+    @staticmethod
+    async def get_meal(db: AsyncSession, user_id: int, meal_id: int) -> Optional[Meal]:
+        """获取用户的餐食记录（含明细）"""
+        result = await db.execute(
+            select(Meal)
+            .options(selectinload(Meal.items))
+            .where(Meal.id == meal_id, Meal.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def list_meals(db: AsyncSession, user_id: int, day: date) -> List[Meal]:
+        """获取用户某天的餐食记录（含明细）"""
+        start = datetime.combine(day, time.min)
+        result = await db.execute(
+            select(Meal)
+            .options(selectinload(Meal.items))
+            .where(Meal.user_id == user_id, Meal.meal_time >= start, Meal.meal_time < start + timedelta(days=1))
+            .order_by(Meal.meal_time)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def create_supplement(db: AsyncSession, user_id: int, supplement_in: SupplementCreate) -> ProteinSupplement:
+        """记录蛋白补充剂"""
+        supplement = ProteinSupplement(user_id=user_id, **supplement_in.model_dump())
+        db.add(supplement)
+        await NutritionService.apply_daily_change(
+            db, user_id, None, NutritionService._supplement_amount(supplement)
+        )
+        await db.commit()
+        await get_points_ledger().award(
+            user_id, settings.POINTS_SUPPLEMENT_RECORD, RECORD_SUPPLEMENT, "记录蛋白补充剂",
+            "supplement", supplement.id
+        )
+        return supplement
+
+    @staticmethod
+    async def update_supplement(
+        db: AsyncSession, user_id: int, supplement_id: int, supplement_in: SupplementCreate
+    ) -> Optional[ProteinSupplement]:
+        """修改蛋白补充剂记录"""
+        supplement = await NutritionService._get_supplement(db, user_id, supplement_id)
+        if supplement is None:
+            return None
+
+        old_amount = NutritionService._supplement_amount(supplement)
+        for key, value in supplement_in.model_dump().items():
+            setattr(supplement, key, value)
+        await NutritionService.apply_daily_change(
+            db, user_id, old_amount, NutritionService._supplement_amount(supplement)
+        )
+        await db.commit()
+        return supplement
+
+    @staticmethod
+    async def delete_supplement(db: AsyncSession, user_id: int, supplement_id: int) -> bool:
+        """删除蛋白补充剂记录，并撤销记录时发放的积分"""
+        supplement = await NutritionService._get_supplement(db, user_id, supplement_id)
+        if supplement is None:
+            return False
+
+        await NutritionService.apply_daily_change(
+            db, user_id, NutritionService._supplement_amount(supplement), None
+        )
+        await db.execute(delete(ProteinSupplement).where(ProteinSupplement.id == supplement.id))
+        await db.commit()
+        await get_points_ledger().revoke(
+            user_id, RECORD_SUPPLEMENT, "删除蛋白补充剂记录", "supplement", supplement.id
+        )
+        return True
+
+    @staticmethod
+    async def list_supplements(db: AsyncSession, user_id: int, day: date) -> List[ProteinSupplement]:
+        """获取用户某天的蛋白补充剂记录"""
+        start = datetime.combine(day, time.min)
+        result = await db.execute(
+            select(ProteinSupplement)
+            .where(
+                ProteinSupplement.user_id == user_id,
+                ProteinSupplement.supplement_time >= start,
+                ProteinSupplement.supplement_time < start + timedelta(days=1)
+            )
+            .order_by(ProteinSupplement.supplement_time)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def _get_supplement(db: AsyncSession, user_id: int, supplement_id: int) -> Optional[ProteinSupplement]:
+        result = await db.execute(
+            select(ProteinSupplement)
+            .where(ProteinSupplement.id == supplement_id, ProteinSupplement.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    def _supplement_amount(supplement: ProteinSupplement) -> DailyAmount:
+        return supplement.supplement_time.date(), float(supplement.protein_amount), 0.0
+
+    @staticmethod
+    async def apply_daily_change(
+        db: AsyncSession, user_id: int, old: Optional[DailyAmount], new: Optional[DailyAmount]
+    ) -> None:
+        """
+        把一条餐食/补充剂记录的变化计入每日汇总（与业务写入同一事务，由调用方提交）
+
+        参数:
+            old: 修改前的(日期, 蛋白质, 热量)，新增时为None
+            new: 修改后的(日期, 蛋白质, 热量)，删除时为None
+        """
+        deltas: Dict[date, List[float]] = {}
+        for amount, sign in ((old, -1), (new, 1)):
+            if amount is None:
+                continue
+            day, protein, calories = amount
+            delta = deltas.setdefault(day, [0.0, 0.0])
+            delta[0] += sign * protein
+            delta[1] += sign * calories
+        for day, (protein, calories) in deltas.items():
+            await NutritionService.apply_daily_delta(db, user_id, day, protein, calories)
+
+    @staticmethod
+    async def apply_daily_delta(db: AsyncSession, user_id: int, day: date, protein: float, calories: float) -> None:
+        """
+        增量更新每日汇总：一条INSERT ... ON DUPLICATE KEY UPDATE，不重新汇总当天的记录
+        """
+        protein, calories = round(protein, 2), round(calories, 2)
+        if not protein and not calories:
+            return
+
+        table = NutritionRecord.__table__
+        c = table.c
+        new_protein = c.total_protein + protein
+        values = {
+            "user_id": user_id,
+            "record_date": day,
+            "total_protein": protein,
+            "total_calories": calories,
+            "protein_target": settings.NUTRITION_PROTEIN_TARGET,
+            "calories_target": settings.NUTRITION_CALORIES_TARGET,
+            "achievement_rate": achievement_rate(protein, settings.NUTRITION_PROTEIN_TARGET),
+        }
+        stmt = build_upsert(
+            db.bind.dialect.name, table, values, ["user_id", "record_date"],
+            # 达标率引用的是旧的total_protein，必须排在total_protein之前
+            lambda inserted: [
+                ("achievement_rate", case(
+                    (new_protein >= c.protein_target, 100),
+                    else_=func.round(new_protein * 100 / c.protein_target, 2)
+                )),
+                ("total_protein", new_protein),
+                ("total_calories", c.total_calories + calories),
+            ]
+        )
+        await db.execute(stmt)
+        await NutritionService.apply_period_delta(db, user_id, day, protein, calories)
+
+    @staticmethod
+    async def apply_period_delta(db: AsyncSession, user_id: int, day: date, protein: float, calories: float) -> None:
+        """增量更新日期所在的周、月汇总，两个统计桶合并为一条多行upsert"""
+        table = NutritionStatistic.__table__
+        c = table.c
+        values = [
+            {
+                "user_id": user_id,
+                "statistic_date": bucket_start(day, period),
+                "statistic_type": period,
+                "total_protein": protein,
+                "total_calories": calories,
+            }
+            for period in (WEEKLY, MONTHLY)
+        ]
+        stmt = build_upsert(
+            db.bind.dialect.name, table, values, ["user_id", "statistic_type", "statistic_date"],
+            lambda inserted: [
+                ("total_protein", c.total_protein + inserted.total_protein),
+                ("total_calories", c.total_calories + inserted.total_calories),
+            ]
+        )
+        await db.execute(stmt)
+
+    @staticmethod
+    async def get_trend(db: AsyncSession, user_id: int, period: str, start_day: date, end_day: date) -> Dict[str, Any]:
+        """
+        获取蛋白质和热量趋势（列式数组，缺失的周期补0）
+
+        按天读取nutrition_records，按周/月读取nutrition_statistics，都是一次唯一索引范围读取。
+
+        参数:
+            period (str): daily/weekly/monthly
+            start_day, end_day: 日期范围，start_day会对齐到周期起始日
+        """
+        starts = bucket_starts(start_day, end_day, period)
+        if period == DAILY:
+            stmt = select(NutritionRecord.record_date, NutritionRecord.total_protein, NutritionRecord.total_calories).where(
+                NutritionRecord.user_id == user_id,
+                NutritionRecord.record_date >= starts[0],
+                NutritionRecord.record_date <= end_day
+            )
+        else:
+            stmt = select(
+                NutritionStatistic.statistic_date, NutritionStatistic.total_protein, NutritionStatistic.total_calories
+            ).where(
+                NutritionStatistic.user_id == user_id,
+                NutritionStatistic.statistic_type == period,
+                NutritionStatistic.statistic_date >= starts[0],
+                NutritionStatistic.statistic_date <= end_day
+            )
+        result = await db.execute(stmt)
+        rows = {day: values for day, *values in result.all()}
+        data = columnar(starts, rows, ("protein", "calories"))
+        data["period"] = period
+        data["protein_target"] = settings.NUTRITION_PROTEIN_TARGET
+        return data
+
+    @staticmethod
+    async def get_daily_record(db: AsyncSession, user_id: int, day: date) -> Dict[str, Any]:
+        """获取每日营养汇总（单行主键读取），当天没有记录时返回目标值和0"""
+        result = await db.execute(
+            select(NutritionRecord).where(NutritionRecord.user_id == user_id, NutritionRecord.record_date == day)
+        )
+        record = result.scalar_one_or_none()
+        if record is None:
+            return {
+                "record_date": day,
+                "total_protein": 0.0,
+                "total_calories": 0.0,
+                "protein_target": settings.NUTRITION_PROTEIN_TARGET,
+                "calories_target": settings.NUTRITION_CALORIES_TARGET,
+                "achievement_rate": 0.0,
+            }
+        return {
+            "record_date": record.record_date,
+            "total_protein": float(record.total_protein),
+            "total_calories": float(record.total_calories),
+            "protein_target": float(record.protein_target),
+            "calories_target": float(record.calories_target),
+            "achievement_rate": float(record.achievement_rate),
+        }
+
+    @staticmethod
+    async def reconcile_daily_records(db: AsyncSession, start_day: date, end_day: date) -> Dict[str, int]:
+        """
+        校对指定日期范围内的每日汇总，修复增量更新产生的偏差
+
+        先读汇总再按天GROUP BY求和；修复时以读到的旧值作为条件(比较后更新)，
+        期间有新的增量写入则跳过该行，留给下次校对，避免覆盖并发写入。
+
+        返回:
+            dict: checked-检查行数, fixed-修复行数, skipped-因并发跳过行数, created-补建行数
+        """
+        start = datetime.combine(start_day, time.min)
+        end = datetime.combine(end_day, time.min) + timedelta(days=1)
+
+        result = await db.execute(
+            select(
+                NutritionRecord.id, NutritionRecord.user_id, NutritionRecord.record_date,
+                NutritionRecord.total_protein, NutritionRecord.total_calories, NutritionRecord.protein_target
+            ).where(NutritionRecord.record_date >= start_day, NutritionRecord.record_date <= end_day)
+        )
+        records = result.all()
+
+        expected: Dict[Tuple[int, date], List[float]] = {}
+        for model, time_column, columns in (
+            (Meal, Meal.meal_time, (func.sum(Meal.total_protein), func.sum(Meal.total_calories))),
+            (ProteinSupplement, ProteinSupplement.supplement_time, (func.sum(ProteinSupplement.protein_amount),)),
+        ):
+            day_column = func.date(time_column)
+            result = await db.execute(
+                select(model.user_id, day_column, *columns)
+                .where(time_column >= start, time_column < end)
+                .group_by(model.user_id, day_column)
+            )
+            for user_id, day, protein, *calories in result.all():
+                if isinstance(day, str):  # SQLite的DATE()返回字符串
+                    day = date.fromisoformat(day)
+                totals = expected.setdefault((user_id, day), [0.0, 0.0])
+                totals[0] += float(protein or 0)
+                totals[1] += float(calories[0] or 0) if calories else 0.0
+
+        stats = {"checked": len(records), "fixed": 0, "skipped": 0, "created": 0}
+        for record in records:
+            protein, calories = expected.pop((record.user_id, record.record_date), (0.0, 0.0))
+            protein, calories = round(protein, 2), round(calories, 2)
+            if abs(float(record.total_protein) - protein) < 0.005 and abs(float(record.total_calories) - calories) < 0.005:
+                continue
+            result = await db.execute(
+                update(NutritionRecord)
+                .where(
+                    NutritionRecord.id == record.id,
+                    NutritionRecord.total_protein == record.total_protein,
+                    NutritionRecord.total_calories == record.total_calories
+                )
+                .values(
+                    total_protein=protein,
+                    total_calories=calories,
+                    achievement_rate=achievement_rate(protein, float(record.protein_target))
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                stats["fixed"] += 1
+                # 周/月汇总补上同样的差值
+                await NutritionService.apply_period_delta(
+                    db, record.user_id, record.record_date,
+                    round(protein - float(record.total_protein), 2), round(calories - float(record.total_calories), 2)
+                )
+            else:
+                stats["skipped"] += 1
+
+        missing = [
+            {
+                "user_id": user_id,
+                "record_date": day,
+                "total_protein": round(protein, 2),
+                "total_calories": round(calories, 2),
+                "protein_target": settings.NUTRITION_PROTEIN_TARGET,
+                "calories_target": settings.NUTRITION_CALORIES_TARGET,
+                "achievement_rate": achievement_rate(protein, settings.NUTRITION_PROTEIN_TARGET),
+            }
+            for (user_id, day), (protein, calories) in expected.items()
+            if round(protein, 2) or round(calories, 2)
+        ]
+        for values in missing:
+            # 逐行插入（缺失行很少），并发写入已建行的忽略，留给下次校对
+            result = await db.execute(build_insert_ignore(
+                db.bind.dialect.name, NutritionRecord.__table__, values, ["user_id", "record_date"]
+            ))
+            if result.rowcount:
+                stats["created"] += 1
+                await NutritionService.apply_period_delta(
+                    db, values["user_id"], values["record_date"], values["total_protein"], values["total_calories"]
+                )
+
+        await db.commit()
+        if stats["fixed"] or stats["created"]:
+            logger.warning(f"每日营养汇总已校对: {start_day}~{end_day} {stats}")
+        return stats
+
+    @staticmethod
+    async def reconcile_recent_days() -> Dict[str, int]:
+        """校对最近NUTRITION_RECONCILE_DAYS天的每日汇总（定时任务入口）"""
+        from app.db.session import AsyncSessionLocal
+
+        today = date.today()
+        async with AsyncSessionLocal() as db:
+            return await NutritionService.reconcile_daily_records(
+                db, today - timedelta(days=settings.NUTRITION_RECONCILE_DAYS - 1), today
+            )
+
+    @staticmethod
+    def _to_preferences(row: Optional[UserFoodPreference]) -> Preferences:
+        if row is None:
+            return NO_PREFERENCES
+        return Preferences(
+            _split(row.excluded_categories),
+            (int(food_id) for food_id in _split(row.excluded_foods)),
+            _split(row.preferred_categories)
+        )
+
+    @staticmethod
+    async def _load_preferences(db: AsyncSession, user_ids: Sequence[int]) -> Dict[int, Preferences]:
+        """批量读取用户偏好（一次IN查询），没有设置偏好的用户不在结果中"""
+        result = await db.execute(select(UserFoodPreference).where(UserFoodPreference.user_id.in_(user_ids)))
+        return {row.user_id: NutritionService._to_preferences(row) for row in result.scalars().all()}
+
+    @staticmethod
+    async def get_preferences(db: AsyncSession, user_id: int) -> Dict[str, List]:
+        """获取用户食物偏好，未设置时返回空列表"""
+        preferences = (await NutritionService._load_preferences(db, [user_id])).get(user_id, NO_PREFERENCES)
+        return {
+            "excluded_categories": sorted(preferences.excluded_categories),
+            "excluded_foods": sorted(preferences.excluded_foods),
+            "preferred_categories": sorted(preferences.preferred_categories),
+        }
+
+    @staticmethod
+    async def update_preferences(db: AsyncSession, user_id: int, preference_in: FoodPreferenceUpdate) -> Dict[str, List]:
+        """保存用户食物偏好（整体覆盖）"""
+        now = datetime.utcnow()
+        await db.execute(build_upsert(
+            db.bind.dialect.name, UserFoodPreference.__table__,
+            {
+                "user_id": user_id,
+                "excluded_categories": ",".join(preference_in.excluded_categories),
+                "excluded_foods": ",".join(str(food_id) for food_id in preference_in.excluded_foods),
+                "preferred_categories": ",".join(preference_in.preferred_categories),
+                "created_at": now,
+                "updated_at": now,
+            },
+            ["user_id"],
+            lambda inserted: [
+                ("excluded_categories", inserted.excluded_categories),
+                ("excluded_foods", inserted.excluded_foods),
+                ("preferred_categories", inserted.preferred_categories),
+                ("updated_at", inserted.updated_at),
+            ]
+        ))
+        await db.commit()
+        return await NutritionService.get_preferences(db, user_id)
+
+    @staticmethod
+    async def recommend(db: AsyncSession, user_id: int, day: date) -> Dict[str, Any]:
+        """按当天的蛋白质缺口和用户偏好推荐补充食物"""
+        record = await NutritionService.get_daily_record(db, user_id, day)
+        gap = round(max(0.0, record["protein_target"] - record["total_protein"]), 2)
+        engine = get_recommendation_engine(await get_food_catalog().get(db))
+        preferences = (await NutritionService._load_preferences(db, [user_id])).get(user_id, NO_PREFERENCES)
+        result = engine.recommend(gap, preferences)
+        return {
+            "record_date": day,
+            "protein_gap": gap,
+            "items": result["items"],
+            "total_protein": result["total_protein"],
+            "total_calories": result["total_calories"],
+            "content": render_content(result, gap),
+        }
+
+    @staticmethod
+    async def generate_daily_recommendations(
+        db: AsyncSession, day: date, batch_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        为所有正常用户生成某天的饮食建议（夜间批处理），已达标的用户不生成
+
+        按用户ID键集分页，每页一次查询取出用户和当天汇总、一次查询取出偏好；
+        相同(缺口档位, 偏好)的用户共用推荐引擎的缓存结果。每页先删后插，重复执行结果不变。
+
+        返回:
+            dict: users-处理用户数, recommendations-生成建议数, solves-实际求解次数, elapsed-耗时(秒)
+        """
+        batch_size = batch_size or settings.NUTRITION_RECOMMENDATION_BATCH_SIZE
+        engine = get_recommendation_engine(await get_food_catalog().get(db))
+        solves = engine.solves
+        started = perf_counter()
+        stats: Dict[str, Any] = {"users": 0, "recommendations": 0}
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(User.id, NutritionRecord.total_protein, NutritionRecord.protein_target)
+                .outerjoin(
+                    NutritionRecord,
+                    (NutritionRecord.user_id == User.id) & (NutritionRecord.record_date == day)
+                )
+                .where(User.status == 1, User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            user_ids = [row[0] for row in rows]
+            last_id = user_ids[-1]
+            preferences = await NutritionService._load_preferences(db, user_ids)
+
+            values = []
+            for user_id, protein, target in rows:
+                target = float(target) if target is not None else settings.NUTRITION_PROTEIN_TARGET
+                gap = round(max(0.0, target - float(protein or 0)), 2)
+                if gap <= 0:
+                    continue
+                recommendation = engine.recommend(gap, preferences.get(user_id, NO_PREFERENCES))
+                values.append({
+                    "user_id": user_id,
+                    "recommendation_date": day,
+                    "protein_gap": gap,
+                    "recommendation_content": render_content(recommendation, gap),
+                    "is_read": 0,
+                    "created_at": datetime.utcnow(),
+                })
+
+            await db.execute(
+                delete(DietRecommendation)
+                .where(DietRecommendation.user_id.in_(user_ids), DietRecommendation.recommendation_date == day)
+                .execution_options(synchronize_session=False)
+            )
+            if values:
+                await db.execute(insert(DietRecommendation), values)
+            await db.commit()
+            stats["users"] += len(rows)
+            stats["recommendations"] += len(values)
+
+        stats["solves"] = engine.solves - solves
+        stats["elapsed"] = round(perf_counter() - started, 3)
+        logger.info(f"饮食建议已生成: {day} {stats}")
+        return stats
+
+
+def _split(value: Optional[str]) -> List[str]:
+    """拆分逗号分隔的偏好字段"""
+    return [item for item in (value or "").split(",") if item]
@@ -1 +1,472 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional, Sequence, Tuple
 
+from fastapi import HTTPException, status
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.counters import POST_COMMENTS, POST_LIKES, POST_VIEWS, TOPIC_POSTS, get_counters
+from app.core.dataloader import DataLoader
+from app.core.feed import (
+    LATEST, FeedHead, FeedKey, InvalidCursorError, decode_cursor, encode_cursor, feed_key, get_feed_cache, hot_score
+)
+from app.core.leaderboard import ALL_TIME, BOARD_PERIODS, Entry, get_leaderboard, local_midnight_utc
+from app.core.logger import get_logger
+from app.core.points_ledger import RECORD_COMMUNITY, get_points_ledger
+from app.core.timeseries import bucket_days, bucket_start
+from app.db.upsert import build_insert_ignore
+from app.models.auth import UserProfile
+from app.models.social import Comment, Like, PointRecord, Post, PostImage, Topic, UserPoint
+from app.schemas.social import CommentCreate, PostCreate
+
+logger = get_logger("health777.social")
+
+# 帖子状态
+POST_DELETED = 0
+POST_NORMAL = 1
+POST_PINNED = 2
+
+# 评论状态
+COMMENT_DELETED = 0
+COMMENT_NORMAL = 1
+
+# 点赞目标类型
+LIKE_POST = "post"
+LIKE_COMMENT = "comment"
+
+# 信息流条目中合并未写库增量的计数器
+_POST_COUNTERS = {POST_VIEWS: "view_count", POST_LIKES: "like_count", POST_COMMENTS: "comment_count"}
+
+_FEED_COLUMNS = (
+    Post.id, Post.user_id, Post.topic_id, Post.title, Post.content, Post.view_count, Post.like_count,
+    Post.comment_count, Post.hot_score, Post.status, Post.created_at
+)
+
+_COMMENT_COLUMNS = (
+    Comment.id, Comment.post_id, Comment.user_id, Comment.parent_id, Comment.content, Comment.like_count,
+    Comment.created_at
+)
+
+
+def build_comment_tree(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    按parent_id把评论组装成树，同层保持传入的顺序
+
+    父评论已删除（不在列表中）的回复提升为一级评论。
+    """
+    nodes = {comment["id"]: dict(comment, replies=[]) for comment in comments}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        (parent["replies"] if parent is not None else roots).append(node)
+    return roots
+
+
+class SocialLoaders:
+    """
+    一次请求内的社区批量加载器
+
+    帖子图片、评论、作者资料、点赞状态各一个DataLoader，一次响应中同一关系的key
+    合并为一条IN查询，不随帖子数/评论数增加查询次数。加载器共用一把锁，
+    因为同一个AsyncSession不能并发执行查询。
+    """
+
+    def __init__(self, db: AsyncSession, user_id: Optional[int] = None):
+        """
+        参数:
+            db (AsyncSession): 当前请求的数据库会话
+            user_id (int): 当前用户ID，为None时不查询点赞状态
+        """
+        self.db = db
+        self.user_id = user_id
+        lock = asyncio.Lock()
+        self.images = DataLoader(self._load_images, default=list, lock=lock)
+        self.comments = DataLoader(self._load_comments, default=list, lock=lock)
+        self.authors = DataLoader(self._load_authors, lock=lock)
+        self.liked = DataLoader(self._load_liked, default=bool, lock=lock)
+
+    async def _load_images(self, post_ids: List[int]) -> Dict[int, List[str]]:
+        """帖子ID -> 按sort_order排列的图片URL（idx_post_sort）"""
+        result = await self.db.execute(
+            select(PostImage.post_id, PostImage.image_url)
+            .where(PostImage.post_id.in_(post_ids))
+            .order_by(PostImage.post_id, PostImage.sort_order, PostImage.id)
+        )
+        images = defaultdict(list)
+        for post_id, url in result.all():
+            images[post_id].append(url)
+        return images
+
+    async def _load_comments(self, post_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """帖子ID -> 按发表时间排列的正常评论（平铺，idx_post_status_created）"""
+        result = await self.db.execute(
+            select(*_COMMENT_COLUMNS)
+            .where(Comment.post_id.in_(post_ids), Comment.status == COMMENT_NORMAL)
+            .order_by(Comment.post_id, Comment.created_at, Comment.id)
+        )
+        comments = defaultdict(list)
+        for row in result.all():
+            comments[row.post_id].append(dict(row._mapping))
+        return comments
+
+    async def _load_authors(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """用户ID -> 昵称和头像"""
+        result = await self.db.execute(
+            select(UserProfile.user_id, UserProfile.name, UserProfile.avatar).where(UserProfile.user_id.in_(user_ids))
+        )
+        return {row[0]: {"name": row[1], "avatar": row[2]} for row in result.all()}
+
+    async def _load_liked(self, targets: List[Tuple[str, int]]) -> Dict[Hashable, bool]:
+        """(目标类型, 目标ID) -> 当前用户是否已点赞（idx_user_target前缀查询）"""
+        if self.user_id is None:
+            return {}
+        result = await self.db.execute(
+            select(Like.target_type, Like.target_id).where(
+                Like.user_id == self.user_id,
+                Like.target_type.in_({target_type for target_type, _ in targets}),
+                Like.target_id.in_({target_id for _, target_id in targets})
+            )
+        )
+        return {(target_type, target_id): True for target_type, target_id in result.all()}
+
+    async def attach_posts(
+        self, items: List[Dict[str, Any]], images: bool = True, authors: bool = True, liked: bool = True
+    ) -> List[Dict[str, Any]]:
+        """给帖子条目补充图片、作者和点赞状态，返回新的条目（不修改传入的字典）"""
+        items = [dict(item) for item in items]
+        loads = {}
+        if images:
+            loads["images"] = self.images.load_many([item["id"] for item in items])
+        if authors:
+            loads["author"] = self.authors.load_many([item["user_id"] for item in items])
+        if liked:
+            loads["liked"] = self.liked.load_many([(LIKE_POST, item["id"]) for item in items])
+        for field, values in zip(loads, await asyncio.gather(*loads.values())):
+            for item, value in zip(items, values):
+                item[field] = value
+        return items
+
+    async def comment_tree(self, post_id: int) -> List[Dict[str, Any]]:
+        """读取帖子的评论并补充作者和点赞状态，组装成树"""
+        comments = await self.comments.load(post_id)
+        authors, liked = await asyncio.gather(
+            self.authors.load_many([comment["user_id"] for comment in comments]),
+            self.liked.load_many([(LIKE_COMMENT, comment["id"]) for comment in comments])
+        )
+        comments = [
+            dict(comment, author=author, liked=is_liked)
+            for comment, author, is_liked in zip(comments, authors, liked)
+        ]
+        return build_comment_tree(comments)
+
+
+class SocialService:
+    @staticmethod
+    async def get_leaderboard(
+        db: AsyncSession, period: str, user_id: int, limit: int = 20, offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        获取排行榜：前N名和当前用户的名次都从排行榜读取（O(log n)），
+        只有上榜用户的昵称头像查一次数据库
+        """
+        leaderboard = get_leaderboard()
+        items = await leaderboard.top(period, limit, offset)
+        me = await leaderboard.rank(period, user_id)
+
+        user_ids = {item["user_id"] for item in items}
+        if me is not None:
+            user_ids.add(user_id)
+        profiles = {}
+        if user_ids:
+            result = await db.execute(
+                select(UserProfile.user_id, UserProfile.name, UserProfile.avatar).where(UserProfile.user_id.in_(user_ids))
+            )
+            profiles = {row[0]: {"name": row[1], "avatar": row[2]} for row in result.all()}
+        for entry in items + ([me] if me else []):
+            entry.update(profiles.get(entry["user_id"], {}))
+        return {"period": period, "items": items, "me": me}
+
+    @staticmethod
+    async def _all_time_pages(db: AsyncSession, page_size: int) -> AsyncIterator[List[Entry]]:
+        """按主键键集分页读取user_points"""
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(UserPoint.id, UserPoint.user_id, UserPoint.total_points)
+                .where(UserPoint.id > last_id, UserPoint.total_points > 0)
+                .order_by(UserPoint.id)
+                .limit(page_size)
+            )
+            rows = result.all()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [(user_id, points) for _, user_id, points in rows]
+
+    @staticmethod
+    async def _period_pages(db: AsyncSession, period: str, day: date, page_size: int) -> AsyncIterator[List[Entry]]:
+        """按created_at范围汇总周期内的积分记录（一次范围查询，分段交给排行榜；周期按本地日期，created_at为UTC）"""
+        start = bucket_start(day, period)
+        end = start + timedelta(days=bucket_days(start, period))
+        total = func.sum(PointRecord.points)
+        result = await db.execute(
+            select(PointRecord.user_id, total)
+            .where(
+                PointRecord.created_at >= local_midnight_utc(start),
+                PointRecord.created_at < local_midnight_utc(end)
+            )
+            .group_by(PointRecord.user_id)
+            .having(total > 0)
+        )
+        rows = [(user_id, int(points)) for user_id, points in result.all()]
+        for i in range(0, len(rows), page_size):
+            yield rows[i:i + page_size]
+
+    @staticmethod
+    async def rebuild_leaderboard(
+        db: AsyncSession, period: str, day: Optional[date] = None, page_size: Optional[int] = None
+    ) -> int:
+        """
+        从数据库重建排行榜：总榜读user_points，日榜/周榜汇总point_records
+
+        新榜单建好后整体替换，重建期间仍可读取旧榜单；重建过程中发生的积分变化可能丢失，
+        应在低峰期执行。返回上榜人数。
+        """
+        day = day or date.today()
+        page_size = page_size or settings.LEADERBOARD_REBUILD_PAGE_SIZE
+        if period == ALL_TIME:
+            pages = SocialService._all_time_pages(db, page_size)
+        else:
+            pages = SocialService._period_pages(db, period, day, page_size)
+        count = await get_leaderboard().rebuild(period, pages, day)
+        logger.info(f"排行榜已重建: {period} {day} {count}人")
+        return count
+
+    @staticmethod
+    async def rebuild_leaderboards(
+        db: AsyncSession, day: Optional[date] = None, periods: Sequence[str] = BOARD_PERIODS
+    ) -> Dict[str, int]:
+        """重建多个排行榜，返回各榜上榜人数"""
+        return {period: await SocialService.rebuild_leaderboard(db, period, day) for period in periods}
+
+    @staticmethod
+    async def rebuild_all_leaderboards(day: Optional[date] = None) -> Dict[str, int]:
+        """重建日榜/周榜/总榜（命令行和进程内排行榜启动时的入口）"""
+        from app.db.session import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            return await SocialService.rebuild_leaderboards(db, day)
+
+    @staticmethod
+    async def list_topics(db: AsyncSession) -> List[Dict[str, Any]]:
+        """获取正常状态的话题，按帖子数倒序（帖子数合并未写库的增量）"""
+        result = await db.execute(
+            select(Topic.id, Topic.name, Topic.description, Topic.icon_url, Topic.post_count)
+            .where(Topic.status == 1)
+            .order_by(Topic.post_count.desc(), Topic.id)
+        )
+        topics = [dict(row._mapping) for row in result.all()]
+        return await get_counters().merge(topics, {TOPIC_POSTS: "post_count"})
+
+    @staticmethod
+    async def create_post(db: AsyncSession, user_id: int, post_in: PostCreate) -> Post:
+        """发帖：帖子和图片在一个事务中写入，提交后累加话题帖子数、失效信息流缓存并登记积分"""
+        if post_in.topic_id is not None:
+            topic = await db.get(Topic, post_in.topic_id)
+            if topic is None or topic.status != 1:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="话题不存在")
+
+        # 与MySQL DATETIME精度一致，游标中的时间才能与库中的值精确比较
+        now = datetime.utcnow().replace(microsecond=0)
+        post = Post(
+            user_id=user_id,
+            topic_id=post_in.topic_id,
+            title=post_in.title,
+            content=post_in.content,
+            hot_score=hot_score(0, 0, 0, now),
+            status=POST_NORMAL,
+            created_at=now,
+            updated_at=now
+        )
+        db.add(post)
+        await db.flush()
+        if post_in.images:
+            await db.execute(insert(PostImage.__table__), [
+                {"post_id": post.id, "image_url": url, "sort_order": index, "created_at": now}
+                for index, url in enumerate(post_in.images)
+            ])
+        await db.commit()
+
+        if post.topic_id is not None:
+            await get_counters().incr(TOPIC_POSTS, post.topic_id)
+        get_feed_cache().invalidate(post.topic_id)
+        await get_points_ledger().award(
+            user_id, settings.POINTS_COMMUNITY_ACTION, RECORD_COMMUNITY, "发布帖子", "post", post.id
+        )
+        return post
+
+    @staticmethod
+    async def _query_feed(
+        db: AsyncSession, topic_id: Optional[int], sort: str, after: Optional[FeedKey], limit: int,
+        post_status: int = POST_NORMAL
+    ) -> List[Dict[str, Any]]:
+        """
+        键集分页读取信息流：(话题, 状态)等值过滤后按(排序值, ID)倒序，
+        由idx_topic_status_created/idx_topic_status_hot（全站为idx_status_*）直接按序扫描
+        """
+        column = Post.created_at if sort == LATEST else Post.hot_score
+        stmt = select(*_FEED_COLUMNS).where(Post.status == post_status)
+        if topic_id is not None:
+            stmt = stmt.where(Post.topic_id == topic_id)
+        if after is not None:
+            value, post_id = after
+            stmt = stmt.where(or_(column < value, and_(column == value, Post.id < post_id)))
+        result = await db.execute(stmt.order_by(column.desc(), Post.id.desc()).limit(limit))
+        items = []
+        for row in result.all():
+            item = dict(row._mapping)
+            item["pinned"] = item["status"] == POST_PINNED
+            items.append(item)
+        return items
+
+    @staticmethod
+    async def _load_feed_head(db: AsyncSession, topic_id: Optional[int], sort: str) -> FeedHead:
+        """读取信息流前若干条和置顶帖（含图片和作者），放入缓存"""
+        cache = get_feed_cache()
+        items = await SocialService._query_feed(db, topic_id, sort, None, cache.head_size)
+        pinned = await SocialService._query_feed(
+            db, topic_id, LATEST, None, settings.FEED_PAGE_SIZE, post_status=POST_PINNED
+        )
+        # 图片和作者随头部一起缓存，点赞状态因人而异，每次请求再查
+        loaders = SocialLoaders(db)
+        both = await loaders.attach_posts(items + pinned, liked=False)
+        items, pinned = both[:len(items)], both[len(items):]
+        head = FeedHead(items, sort, complete=len(items) < cache.head_size, pinned=pinned)
+        cache.set(topic_id, sort, head)
+        return head
+
+    @staticmethod
+    async def get_feed(
+        db: AsyncSession, topic_id: Optional[int], sort: str, cursor: Optional[str] = None,
+        limit: Optional[int] = None, user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        获取信息流（topic_id为None时为全站）
+
+        前几页从本worker的头部缓存返回，超出缓存范围的按游标查库；
+        置顶帖只随第一页返回。图片、作者和当前用户的点赞状态每种一条IN查询，
+        缓存命中时只查点赞状态。
+        """
+        limit = limit or settings.FEED_PAGE_SIZE
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor, sort)
+            except InvalidCursorError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+
+        loaders = SocialLoaders(db, user_id)
+        head = get_feed_cache().get(topic_id, sort)
+        if head is None and after is None:
+            head = await SocialService._load_feed_head(db, topic_id, sort)
+        page = head.page(after, limit) if head is not None else None
+        if page is None:
+            rows = await SocialService._query_feed(db, topic_id, sort, after, limit + 1)
+            items, more = await loaders.attach_posts(rows[:limit], liked=False), len(rows) > limit
+        else:
+            items, more = page
+        pinned = head.pinned if head is not None and after is None else []
+        both = await loaders.attach_posts(items + pinned, images=False, authors=False)
+        items, pinned = both[:len(items)], both[len(items):]
+
+        counters = get_counters()
+        return {
+            "items": await counters.merge(items, _POST_COUNTERS),
+            "pinned": await counters.merge(pinned, _POST_COUNTERS),
+            "next_cursor": encode_cursor(feed_key(items[-1], sort)) if more and items else None,
+        }
+
+    @staticmethod
+    async def _get_visible_post(db: AsyncSession, post_id: int) -> Post:
+        post = await db.get(Post, post_id)
+        if post is None or post.status == POST_DELETED:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="帖子不存在")
+        return post
+
+    @staticmethod
+    async def view_post(db: AsyncSession, post_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        查看帖子详情并累加浏览次数（计数经缓冲批量写库，返回值已合并未写库的增量）
+
+        评论按楼中楼组装成树；图片、评论、作者、点赞状态各一条查询，与评论数无关。
+        """
+        post = await SocialService._get_visible_post(db, post_id)
+        counters = get_counters()
+        await counters.incr(POST_VIEWS, post_id)
+        item = {column.key: getattr(post, column.key) for column in _FEED_COLUMNS}
+        item["pinned"] = post.status == POST_PINNED
+
+        loaders = SocialLoaders(db, user_id)
+        # 先取评论，帖子与评论的作者、点赞状态再各合并为一条查询
+        await loaders.comments.load(post_id)
+        (item,), comments = await asyncio.gather(loaders.attach_posts([item]), loaders.comment_tree(post_id))
+        item["comments"] = comments
+        (item,) = await counters.merge([item], _POST_COUNTERS)
+        return item
+
+    @staticmethod
+    async def create_comment(db: AsyncSession, user_id: int, post_id: int, comment_in: CommentCreate) -> Dict[str, Any]:
+        """发表评论或回复，提交后经计数器累加帖子评论数并登记积分"""
+        await SocialService._get_visible_post(db, post_id)
+        if comment_in.parent_id is not None:
+            parent = await db.get(Comment, comment_in.parent_id)
+            if parent is None or parent.post_id != post_id or parent.status != COMMENT_NORMAL:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="回复的评论不存在")
+
+        comment = Comment(
+            post_id=post_id,
+            user_id=user_id,
+            parent_id=comment_in.parent_id,
+            content=comment_in.content,
+            status=COMMENT_NORMAL,
+            created_at=datetime.utcnow()
+        )
+        db.add(comment)
+        await db.commit()
+
+        await get_counters().incr(POST_COMMENTS, post_id)
+        await get_points_ledger().award(
+            user_id, settings.POINTS_COMMUNITY_ACTION, RECORD_COMMUNITY, "发表评论", "comment", comment.id
+        )
+        item = {column.key: getattr(comment, column.key) for column in _COMMENT_COLUMNS}
+        item["author"] = await SocialLoaders(db).authors.load(user_id)
+        return item
+
+    @staticmethod
+    async def like_post(db: AsyncSession, user_id: int, post_id: int, liked: bool = True) -> Dict[str, Any]:
+        """
+        点赞/取消点赞帖子，重复操作不重复计数
+
+        点赞记录直接写库（唯一索引idx_user_target去重），点赞数经计数器缓冲累加。
+        """
+        post = await SocialService._get_visible_post(db, post_id)
+        if liked:
+            result = await db.execute(build_insert_ignore(
+                db.bind.dialect.name, Like.__table__,
+                {"user_id": user_id, "target_id": post_id, "target_type": LIKE_POST, "created_at": datetime.utcnow()},
+                ["user_id", "target_id", "target_type"]
+            ))
+        else:
+            result = await db.execute(delete(Like).where(
+                Like.user_id == user_id, Like.target_id == post_id, Like.target_type == LIKE_POST
+            ))
+        await db.commit()
+
+        counters = get_counters()
+        if result.rowcount == 1:
+            await counters.incr(POST_LIKES, post_id, 1 if liked else -1)
+        pending = await counters.pending(POST_LIKES, [post_id])
+        return {"liked": liked, "like_count": max(post.like_count + pending.get(post_id, 0), 0)}
@@ -78,9 +78,11 @@ chmod 440 /etc/sudoers.d/health777
 echo "正在安装系统服务..."
 cp health777_api.service /etc/systemd/system/
 cp webhook.service /etc/systemd/system/
+cp health777_nightly.service health777_nightly.timer /etc/systemd/system/
 systemctl daemon-reload
 systemctl enable health777_api.service
 systemctl enable webhook.service
+systemctl enable --now health777_nightly.timer
 
 # 启动服务
 echo "正在启动服务..."
@@ -93,6 +95,23 @@ cat > /etc/nginx/sites-available/health777_api << NGINX_CONF
 server {
     listen 80;
     server_name 8.148.65.62;  # 使用服务器IP
+    client_max_body_size 12m;
+
+    # 上传的图片由Nginx直接提供
+    location /media/ {
+        alias $APP_DIR/media/;
+        expires 30d;
+    }
+
+    # 图片上传不在Nginx缓冲，直接流式转发给应用
+    location ~ ^/api/(uploads/|nutrition/recognitions\$) {
+        proxy_pass http://127.0.0.1:8000;
+        proxy_request_buffering off;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+    }
 
     location / {
         proxy_pass http://127.0.0.1:8000;
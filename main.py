@@ -1,11 +1,34 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+import os
 import time
-from app.core.logger import app_logger, log_request
+import uuid
+from app.core.logger import app_logger, log_access, log_request, shutdown_logging
+from app.core.request_context import begin_request
+from app.core.metrics import HTTP_IN_PROGRESS, generate_metrics, mark_process_dead, record_request
 from app.api import auth
 import uvicorn
 from app.core.config import settings
+from app.core.deps import principal_cache
+from app.db.session import get_pool_stats
+from app.core.code_store import close_code_store
+from app.core.sms_dispatcher import get_sms_dispatcher
+from app.core.rate_limit import close_rate_limiter
+from app.core.hashing import get_password_hasher
+from app.core.food_catalog import get_food_catalog
+from app.core.recognition import get_recognition_pipeline
+from app.core.uploads import get_thumbnailer
+from app.core.leaderboard import close_leaderboard
+from app.core.points_ledger import get_points_ledger
+from app.core.feed import get_feed_cache
+from app.core.counters import close_counters, get_counters
+from app.core.inbox import close_inbox, get_inbox
+from app.core.messaging import close_message_gateway, get_message_gateway
+from app.core.periodic import PeriodicTask
+from app.services.nutrition_service import NutritionService
+from app.services.social_service import SocialService
 
 # 创建FastAPI应用实例
 app = FastAPI(
@@ -28,51 +51,119 @@ app.add_middleware(
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """记录所有HTTP请求的中间件"""
-    start_time = time.time()
-    
-    # 记录请求开始
-    app_logger.info(f"开始处理请求: {request.method} {request.url}")
+    # 使用单调时钟计时，不受系统时间调整影响
+    start_time = time.perf_counter()
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    timings = begin_request(request_id)
+    json_format = settings.ACCESS_LOG_FORMAT == "json"
+    in_progress = HTTP_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+
+    if not json_format:
+        # 记录请求开始
+        app_logger.info(f"开始处理请求: {request.method} {request.url}")
     
     try:
         # 处理请求
         response = await call_next(request)
         
         # 计算处理时间
-        process_time = time.time() - start_time
+        process_time = time.perf_counter() - start_time
+        response.headers["X-Request-ID"] = request_id
+        route = request.scope.get("route")
+        record_request(request.method, getattr(route, "path", None), response.status_code, process_time)
         
         # 记录请求结束
-        log_request(request, response)
-        app_logger.info(f"请求处理完成: {request.method} {request.url} - 状态码: {response.status_code} - 耗时: {process_time:.4f}秒")
+        if json_format:
+            content_length = response.headers.get("content-length")
+            log_access(request, response.status_code, process_time, request_id, timings,
+                       response_bytes=int(content_length) if content_length else None)
+        else:
+            log_request(request, response)
+            app_logger.info(f"请求处理完成: {request.method} {request.url} - 状态码: {response.status_code} - 耗时: {process_time:.4f}秒")
         
         return response
     except Exception as e:
         # 记录异常
-        process_time = time.time() - start_time
-        app_logger.error(f"请求处理异常: {request.method} {request.url} - 耗时: {process_time:.4f}秒 - 错误: {str(e)}")
-        log_request(request, error=e)
+        process_time = time.perf_counter() - start_time
+        route = request.scope.get("route")
+        record_request(request.method, getattr(route, "path", None), 500, process_time)
+        if json_format:
+            log_access(request, 500, process_time, request_id, timings, error=e)
+        else:
+            app_logger.error(f"请求处理异常: {request.method} {request.url} - 耗时: {process_time:.4f}秒 - 错误: {str(e)}")
+            log_request(request, error=e)
         
         # 返回错误响应
         return JSONResponse(
             status_code=500,
-            content={"detail": "服务器内部错误", "message": str(e)}
+            content={"detail": "服务器内部错误", "message": str(e)},
+            headers={"X-Request-ID": request_id}
         )
+    finally:
+        in_progress.dec()
 
 # 导入各模块路由
 from app.api.auth import router as auth_router
-# from app.api.nutrition import router as nutrition_router
-# from app.api.exercise import router as exercise_router
-# from app.api.social import router as social_router
-# from app.api.medical import router as medical_router
+from app.api.nutrition import router as nutrition_router
+from app.api.exercise import router as exercise_router
+from app.api.uploads import router as uploads_router
+from app.api.social import router as social_router
+from app.api.medical import router as medical_router
 # from app.api.reminders import router as reminders_router
 
 # 注册路由
 app.include_router(auth_router, tags=["认证"])
-# app.include_router(nutrition_router, prefix="/api/nutrition", tags=["营养管理"])
-# app.include_router(exercise_router, prefix="/api/exercise", tags=["运动管理"])
-# app.include_router(social_router, prefix="/api/social", tags=["社交功能"])
-# app.include_router(medical_router, prefix="/api/medical", tags=["医患互动"])
+app.include_router(nutrition_router, prefix="/api/nutrition", tags=["营养管理"])
+app.include_router(exercise_router, prefix="/api/exercise", tags=["运动管理"])
+app.include_router(uploads_router, prefix="/api/uploads", tags=["文件上传"])
+app.include_router(social_router, prefix="/api/social", tags=["社交功能"])
+app.include_router(medical_router, prefix="/api/medical", tags=["医患互动"])
 # app.include_router(reminders_router, prefix="/api/reminders", tags=["提醒系统"])
 
+# 本地存储的上传文件，生产环境由Nginx直接提供
+if settings.MEDIA_STORAGE_BACKEND == "local":
+    app.mount(settings.MEDIA_URL, StaticFiles(directory=settings.MEDIA_ROOT, check_dir=False), name="media")
+
+# 后台定时任务
+nutrition_reconciler = PeriodicTask(
+    "nutrition_reconcile", settings.NUTRITION_RECONCILE_INTERVAL, NutritionService.reconcile_recent_days
+)
+
+@app.on_event("startup")
+async def startup_event():
+    """应用启动时启动后台任务"""
+    await get_sms_dispatcher().start()
+    await get_recognition_pipeline().start()
+    await get_points_ledger().start()
+    await get_counters().start()
+    await get_message_gateway().start()
+    await nutrition_reconciler.start()
+    if settings.LEADERBOARD_BACKEND == "memory":
+        # 进程内排行榜（仅单进程部署）启动时从数据库加载
+        try:
+            await SocialService.rebuild_all_leaderboards()
+        except Exception as e:
+            app_logger.warning(f"排行榜加载失败: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放资源"""
+    await nutrition_reconciler.stop()
+    await close_message_gateway()
+    await close_inbox()
+    await get_recognition_pipeline().stop()
+    await get_thumbnailer().shutdown()
+    await get_sms_dispatcher().stop()
+    await get_points_ledger().stop()
+    await close_counters()
+    await close_code_store()
+    await close_leaderboard()
+    await close_rate_limiter()
+    get_password_hasher().shutdown()
+    mark_process_dead()
+    shutdown_logging()
+
 @app.get("/hello")
 async def root():
     """
@@ -93,8 +184,30 @@ async def health_check():
     app_logger.info("执行健康检查")
     return {
         "status": "ok",
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "pid": os.getpid(),
+        "principal_cache": principal_cache.stats(),
+        "db_pool": get_pool_stats(),
+        "sms": get_sms_dispatcher().stats(),
+        "password_hash": get_password_hasher().stats(),
+        "food_catalog": get_food_catalog().stats(),
+        "recognition": get_recognition_pipeline().stats(),
+        "thumbnails": get_thumbnailer().stats(),
+        "points": get_points_ledger().stats(),
+        "feed_cache": get_feed_cache().stats(),
+        "counters": get_counters().stats(),
+        "messaging": get_message_gateway().stats(),
+        "inbox": get_inbox().stats(),
+        "nutrition_reconcile": nutrition_reconciler.stats()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus指标接口，多worker时汇总所有worker的数据
+    """
+    content, content_type = generate_metrics()
+    return Response(content=content, media_type=content_type)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
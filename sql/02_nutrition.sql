@@ -69,6 +69,20 @@ CREATE TABLE IF NOT EXISTS `nutrition_records` (
   KEY `idx_achievement_rate` (`achievement_rate`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='营养摄入记录表';
 
+-- 营养统计表（周/月汇总，随餐食和补充剂写入增量更新）
+CREATE TABLE IF NOT EXISTS `nutrition_statistics` (
+  `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '统计ID',
+  `user_id` INT UNSIGNED NOT NULL COMMENT '用户ID',
+  `statistic_date` DATE NOT NULL COMMENT '统计周期起始日期(周一/每月1号)',
+  `statistic_type` VARCHAR(20) NOT NULL COMMENT '统计类型: weekly, monthly',
+  `total_protein` DECIMAL(10,2) NOT NULL DEFAULT 0 COMMENT '总蛋白质摄入量(g)',
+  `total_calories` DECIMAL(10,2) NOT NULL DEFAULT 0 COMMENT '总热量摄入量(kcal)',
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `idx_user_type_date` (`user_id`, `statistic_type`, `statistic_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='营养统计表';
+
 -- 乳清蛋白摄入记录表
 CREATE TABLE IF NOT EXISTS `protein_supplements` (
   `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '记录ID',
@@ -97,3 +111,16 @@ CREATE TABLE IF NOT EXISTS `diet_recommendations` (
   KEY `idx_user_id_date` (`user_id`, `recommendation_date`),
   KEY `idx_is_read` (`is_read`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='饮食建议表';
+
+-- 用户食物偏好表
+CREATE TABLE IF NOT EXISTS `user_food_preferences` (
+  `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '偏好ID',
+  `user_id` INT UNSIGNED NOT NULL COMMENT '用户ID',
+  `excluded_categories` VARCHAR(255) COMMENT '不吃的食物类别，逗号分隔',
+  `excluded_foods` VARCHAR(1000) COMMENT '不吃的食物ID，逗号分隔',
+  `preferred_categories` VARCHAR(255) COMMENT '偏好的食物类别，逗号分隔',
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `idx_user_id` (`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户食物偏好表';
@@ -23,6 +23,7 @@ CREATE TABLE IF NOT EXISTS `point_records` (
   `reference_type` VARCHAR(50) COMMENT '关联类型',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   PRIMARY KEY (`id`),
+  UNIQUE KEY `idx_reference` (`reference_type`, `reference_id`, `user_id`),
   KEY `idx_user_id` (`user_id`),
   KEY `idx_record_type` (`record_type`),
   KEY `idx_created_at` (`created_at`)
@@ -83,16 +84,17 @@ CREATE TABLE IF NOT EXISTS `posts` (
   `view_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '浏览次数',
   `like_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '点赞次数',
   `comment_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '评论次数',
+  `hot_score` DOUBLE NOT NULL DEFAULT 0 COMMENT '热度分数(互动量按时间衰减，见app.core.feed)',
   `status` TINYINT NOT NULL DEFAULT 1 COMMENT '状态: 0-删除, 1-正常, 2-置顶',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
   KEY `idx_user_id` (`user_id`),
-  KEY `idx_topic_id` (`topic_id`),
-  KEY `idx_status` (`status`),
-  KEY `idx_created_at` (`created_at`),
-  KEY `idx_view_count` (`view_count`),
-  KEY `idx_like_count` (`like_count`)
+  -- 信息流键集分页：等值过滤(话题, 状态)后按(排序值, ID)倒序扫描
+  KEY `idx_topic_status_created` (`topic_id`, `status`, `created_at`, `id`),
+  KEY `idx_topic_status_hot` (`topic_id`, `status`, `hot_score`, `id`),
+  KEY `idx_status_created` (`status`, `created_at`, `id`),
+  KEY `idx_status_hot` (`status`, `hot_score`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='社区帖子表';
 
 -- 帖子图片表
@@ -103,8 +105,7 @@ CREATE TABLE IF NOT EXISTS `post_images` (
   `sort_order` INT NOT NULL DEFAULT 0 COMMENT '排序顺序',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   PRIMARY KEY (`id`),
-  KEY `idx_post_id` (`post_id`),
-  KEY `idx_sort_order` (`sort_order`)
+  KEY `idx_post_sort` (`post_id`, `sort_order`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='帖子图片表';
 
 -- 评论表
@@ -119,11 +120,9 @@ CREATE TABLE IF NOT EXISTS `comments` (
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
-  KEY `idx_post_id` (`post_id`),
+  KEY `idx_post_status_created` (`post_id`, `status`, `created_at`, `id`),
   KEY `idx_user_id` (`user_id`),
-  KEY `idx_parent_id` (`parent_id`),
-  KEY `idx_status` (`status`),
-  KEY `idx_created_at` (`created_at`)
+  KEY `idx_parent_id` (`parent_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='评论表';
 
 -- 点赞表
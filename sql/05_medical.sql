@@ -55,8 +55,10 @@ CREATE TABLE IF NOT EXISTS `user_doctor_relations` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户-医生关系表';
 
 -- 消息表
+-- 消息ID由消息网关预先分配(app.core.messaging)，批量写入时显式指定
 CREATE TABLE IF NOT EXISTS `messages` (
   `id` INT UNSIGNED NOT NULL AUTO_INCREMENT COMMENT '消息ID',
+  `conversation_id` INT UNSIGNED NOT NULL COMMENT '会话ID',
   `sender_id` INT UNSIGNED NOT NULL COMMENT '发送者ID',
   `sender_type` VARCHAR(10) NOT NULL COMMENT '发送者类型: user, doctor',
   `receiver_id` INT UNSIGNED NOT NULL COMMENT '接收者ID',
@@ -70,9 +72,8 @@ CREATE TABLE IF NOT EXISTS `messages` (
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   PRIMARY KEY (`id`),
   KEY `idx_sender` (`sender_id`, `sender_type`),
-  KEY `idx_receiver` (`receiver_id`, `receiver_type`),
-  KEY `idx_conversation` (`sender_id`, `sender_type`, `receiver_id`, `receiver_type`),
-  KEY `idx_is_read` (`is_read`),
+  KEY `idx_receiver` (`receiver_id`, `receiver_type`, `is_read`),
+  KEY `idx_conversation_id` (`conversation_id`, `id`),
   KEY `idx_created_at` (`created_at`),
   KEY `idx_message_type` (`message_type`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='消息表';
@@ -85,11 +86,14 @@ CREATE TABLE IF NOT EXISTS `conversations` (
   `last_message_id` INT UNSIGNED COMMENT '最后消息ID',
   `unread_count_user` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '用户未读数',
   `unread_count_doctor` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '医生未读数',
+  `last_read_id_user` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '用户已读到的消息ID',
+  `last_read_id_doctor` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '医生已读到的消息ID',
   `status` TINYINT NOT NULL DEFAULT 1 COMMENT '状态: 0-关闭, 1-正常',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
   UNIQUE KEY `idx_user_doctor` (`user_id`, `doctor_id`),
+  KEY `idx_doctor_id` (`doctor_id`),
   KEY `idx_last_message` (`last_message_id`),
   KEY `idx_status` (`status`),
   KEY `idx_updated_at` (`updated_at`)
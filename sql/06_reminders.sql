@@ -68,7 +68,7 @@ CREATE TABLE IF NOT EXISTS `task_completions` (
   `notes` TEXT COMMENT '备注',
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   PRIMARY KEY (`id`),
-  KEY `idx_user_id` (`user_id`),
+  KEY `idx_user_date` (`user_id`, `completion_date`),
   KEY `idx_task_id` (`task_id`),
   KEY `idx_completion_date` (`completion_date`),
   KEY `idx_points_earned` (`points_earned`)
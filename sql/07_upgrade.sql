@@ -0,0 +1,96 @@
+-- 已有数据库升级脚本
+-- 01~06中的CREATE TABLE IF NOT EXISTS不会修改已存在的表，按旧版建表的数据库执行一次本脚本，
+-- 补上新增的列和索引并回填数据。新表(nutrition_statistics、user_food_preferences)重新执行01~06即可创建。
+-- 执行前请备份；脚本不可重复执行（重复执行时ADD COLUMN/ADD KEY会报已存在）。
+
+-- 积分记录：按(关联类型, 关联ID, 用户)去重发放(app.core.points_ledger)
+-- 添加唯一键前先确认没有重复记录，有则需人工核对后删除多余记录并修正user_points：
+--   SELECT reference_type, reference_id, user_id, COUNT(*) FROM point_records
+--   WHERE reference_type IS NOT NULL GROUP BY reference_type, reference_id, user_id HAVING COUNT(*) > 1;
+ALTER TABLE `point_records`
+  ADD UNIQUE KEY `idx_reference` (`reference_type`, `reference_id`, `user_id`);
+
+-- 社区帖子：热度分数和信息流索引(app.core.feed)
+ALTER TABLE `posts`
+  ADD COLUMN `hot_score` DOUBLE NOT NULL DEFAULT 0 COMMENT '热度分数(互动量按时间衰减，见app.core.feed)' AFTER `comment_count`;
+
+-- 按默认配置回填热度分数：log2(1 + 点赞 + 评论*2 + 浏览*0.05) + 发帖时间距2024-01-01的秒数 / 半衰期(12小时)
+-- 修改过FEED_HOT_*配置时请相应调整权重和半衰期
+UPDATE `posts`
+SET `hot_score` = ROUND(
+  LOG2(1 + `like_count` * 1.0 + `comment_count` * 2.0 + `view_count` * 0.05)
+  + TIMESTAMPDIFF(SECOND, '2024-01-01 00:00:00', `created_at`) / (12 * 3600),
+  6
+);
+
+ALTER TABLE `posts`
+  DROP KEY `idx_topic_id`,
+  DROP KEY `idx_status`,
+  DROP KEY `idx_created_at`,
+  DROP KEY `idx_view_count`,
+  DROP KEY `idx_like_count`,
+  ADD KEY `idx_topic_status_created` (`topic_id`, `status`, `created_at`, `id`),
+  ADD KEY `idx_topic_status_hot` (`topic_id`, `status`, `hot_score`, `id`),
+  ADD KEY `idx_status_created` (`status`, `created_at`, `id`),
+  ADD KEY `idx_status_hot` (`status`, `hot_score`, `id`);
+
+ALTER TABLE `post_images`
+  DROP KEY `idx_post_id`,
+  DROP KEY `idx_sort_order`,
+  ADD KEY `idx_post_sort` (`post_id`, `sort_order`);
+
+ALTER TABLE `comments`
+  DROP KEY `idx_post_id`,
+  DROP KEY `idx_status`,
+  DROP KEY `idx_created_at`,
+  ADD KEY `idx_post_status_created` (`post_id`, `status`, `created_at`, `id`);
+
+-- 会话：已读线(app.core.messaging)
+ALTER TABLE `conversations`
+  ADD COLUMN `last_read_id_user` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '用户已读到的消息ID' AFTER `unread_count_doctor`,
+  ADD COLUMN `last_read_id_doctor` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '医生已读到的消息ID' AFTER `last_read_id_user`,
+  ADD KEY `idx_doctor_id` (`doctor_id`);
+
+-- 消息：所属会话
+ALTER TABLE `messages`
+  ADD COLUMN `conversation_id` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '会话ID' AFTER `id`;
+
+-- 补建只有消息、没有会话记录的医患会话
+INSERT IGNORE INTO `conversations` (`user_id`, `doctor_id`)
+SELECT DISTINCT
+  IF(`sender_type` = 'user', `sender_id`, `receiver_id`),
+  IF(`sender_type` = 'user', `receiver_id`, `sender_id`)
+FROM `messages`;
+
+-- 按医患双方回填会话ID
+UPDATE `messages` m
+JOIN `conversations` c
+  ON c.`user_id` = IF(m.`sender_type` = 'user', m.`sender_id`, m.`receiver_id`)
+ AND c.`doctor_id` = IF(m.`sender_type` = 'user', m.`receiver_id`, m.`sender_id`)
+SET m.`conversation_id` = c.`id`;
+
+-- 回填会话的最后消息和双方未读数
+UPDATE `conversations` c
+SET
+  c.`last_message_id` = (SELECT MAX(m.`id`) FROM `messages` m WHERE m.`conversation_id` = c.`id`),
+  c.`unread_count_user` = (
+    SELECT COUNT(*) FROM `messages` m
+    WHERE m.`conversation_id` = c.`id` AND m.`receiver_type` = 'user' AND m.`is_read` = 0
+  ),
+  c.`unread_count_doctor` = (
+    SELECT COUNT(*) FROM `messages` m
+    WHERE m.`conversation_id` = c.`id` AND m.`receiver_type` = 'doctor' AND m.`is_read` = 0
+  );
+
+ALTER TABLE `messages`
+  ALTER COLUMN `conversation_id` DROP DEFAULT,
+  DROP KEY `idx_receiver`,
+  DROP KEY `idx_conversation`,
+  DROP KEY `idx_is_read`,
+  ADD KEY `idx_receiver` (`receiver_id`, `receiver_type`, `is_read`),
+  ADD KEY `idx_conversation_id` (`conversation_id`, `id`);
+
+-- 任务完成记录：按用户和日期查询
+ALTER TABLE `task_completions`
+  DROP KEY `idx_user_id`,
+  ADD KEY `idx_user_date` (`user_id`, `completion_date`);
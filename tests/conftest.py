@@ -0,0 +1,96 @@
+"""
+测试公共夹具
+
+    clock     - 可手动推进的时钟，传给各组件的timer参数
+    database  - 内存数据库工厂：database(模型, ..., seed=初始数据) 建表并返回DatabaseEnv，
+                测试场景与数据库共用一个事件循环
+
+会话结束时关闭日志管道，在测试框架收回输出流之前写出剩余日志
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.logger import shutdown_logging
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_pipeline():
+    yield
+    shutdown_logging()
+
+
+class FakeClock:
+    """手动推进的时钟：修改now即可模拟时间流逝"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+class DatabaseEnv:
+    """一个内存SQLite数据库及其事件循环，记录执行的SQL"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, engine, factory):
+        self.loop = loop
+        self.engine = engine
+        self.factory = factory
+        self.queries = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: self.queries.append(args[2]))
+
+    def run(self, coro: Awaitable) -> Any:
+        """在数据库的事件循环中执行协程"""
+        return self.loop.run_until_complete(coro)
+
+    def __call__(self, scenario: Callable[[Any], Awaitable]) -> Any:
+        """在一个会话中执行scenario(db)"""
+        async def wrapped():
+            async with self.factory() as db:
+                return await scenario(db)
+        return self.run(wrapped())
+
+    async def rows(self, model, *columns) -> Dict[Any, tuple]:
+        """按主键读取表中的指定列"""
+        async with self.factory() as db:
+            return {row[0]: tuple(row[1:]) for row in await db.execute(select(model.id, *columns))}
+
+
+@pytest.fixture
+def database():
+    """内存数据库工厂，测试结束时释放连接并关闭事件循环"""
+    pytest.importorskip("aiosqlite")
+    loop = asyncio.new_event_loop()
+    envs = []
+
+    def create(*models, seed: Optional[Callable[[Any], Awaitable]] = None) -> DatabaseEnv:
+        engine = create_async_engine("sqlite+aiosqlite://")
+
+        async def setup():
+            async with engine.begin() as conn:
+                for model in models:
+                    await conn.run_sync(model.__table__.create)
+            factory = async_sessionmaker(engine, expire_on_commit=False)
+            if seed is not None:
+                async with factory() as db:
+                    await seed(db)
+                    await db.commit()
+            return factory
+
+        env = DatabaseEnv(loop, engine, loop.run_until_complete(setup()))
+        envs.append(env)
+        return env
+
+    yield create
+    for env in envs:
+        loop.run_until_complete(env.engine.dispose())
+    loop.close()
@@ -0,0 +1,51 @@
+"""
+SQL查询计数 - 断言一段代码执行的查询条数，防止N+1查询回归
+
+用法:
+    with assert_queries(engine, 3):
+        await SocialService.view_post(db, 1)
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """记录引擎在上下文中执行的SQL（支持同步和异步引擎）"""
+
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements: List[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def report(self) -> str:
+        return "\n".join(f"  {i}. {' '.join(sql.split())}" for i, sql in enumerate(self.statements, 1))
+
+
+@contextmanager
+def assert_queries(engine, expected: int) -> Iterator[QueryCounter]:
+    """断言上下文中恰好执行expected条查询，不符时列出全部SQL"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    assert len(counter) == expected, f"期望{expected}条查询，实际{len(counter)}条:\n{counter.report()}"
+
+
+@contextmanager
+def assert_max_queries(engine, limit: int) -> Iterator[QueryCounter]:
+    """断言上下文中最多执行limit条查询"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    assert len(counter) <= limit, f"期望最多{limit}条查询，实际{len(counter)}条:\n{counter.report()}"
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import app.core.logger as logger_module
+from app.core.request_context import begin_request, install_db_timing, record_timing, timed
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def capture_access_log(monkeypatch):
+    handler = ListHandler()
+    capture = logging.getLogger("test.access")
+    capture.handlers = [handler]
+    capture.setLevel(logging.INFO)
+    capture.propagate = False
+    monkeypatch.setattr(logger_module, "access_logger", capture)
+    return handler
+
+
+class TestRequestContext:
+    def test_record_outside_request_ignored(self):
+        """测试不在请求中时记录耗时不报错"""
+        asyncio.run(asyncio.sleep(0))  # 新的上下文中没有请求
+        record_timing("db", 0.1)
+
+    def test_timed_accumulates(self):
+        """测试同一阶段多次计时会累加并计数"""
+        async def handler():
+            timings = begin_request("req-1")
+            with timed("sms"):
+                pass
+            with timed("sms"):
+                pass
+            return timings
+
+        timings = asyncio.run(handler())
+        assert timings["sms_count"] == 2
+        assert timings["sms"] >= 0
+
+    def test_thread_pool_timing_visible(self):
+        """测试在线程池中记录的耗时对请求可见"""
+        async def handler():
+            timings = begin_request("req-2")
+            await asyncio.to_thread(record_timing, "hash", 0.25)
+            return timings
+
+        timings = asyncio.run(handler())
+        assert timings["hash"] == 0.25
+
+    def test_db_timing(self):
+        """测试SQL执行耗时计入db"""
+        engine = create_engine("sqlite://")
+        install_db_timing(engine)
+
+        async def handler():
+            timings = begin_request("req-3")
+            with engine.connect() as conn:
+                conn.execute(text("select 1"))
+                conn.execute(text("select 2"))
+            return timings
+
+        timings = asyncio.run(handler())
+        engine.dispose()
+        assert timings["db_count"] == 2
+        assert timings["db"] > 0
+
+
+class TestAccessLog:
+    def test_json_line_per_request(self, monkeypatch):
+        """测试每个请求输出一行包含路由模板和请求ID的JSON"""
+        import main
+
+        monkeypatch.setattr(main.settings, "ACCESS_LOG_FORMAT", "json")
+        handler = capture_access_log(monkeypatch)
+        client = TestClient(main.app)
+
+        response = client.get("/hello", headers={"X-Request-ID": "abc123"})
+        assert response.status_code == 200
+        assert response.headers["X-Request-ID"] == "abc123"
+
+        assert len(handler.lines) == 1
+        entry = json.loads(handler.lines[0])
+        assert entry["request_id"] == "abc123"
+        assert entry["method"] == "GET"
+        assert entry["route"] == "/hello"
+        assert entry["status"] == 200
+        assert entry["duration_ms"] >= 0
+        assert entry["response_bytes"] == len(response.content)
+
+    def test_generated_request_id_and_unmatched_route(self, monkeypatch):
+        """测试未带请求ID时自动生成，未匹配的路径没有路由模板"""
+        import main
+
+        monkeypatch.setattr(main.settings, "ACCESS_LOG_FORMAT", "json")
+        handler = capture_access_log(monkeypatch)
+        client = TestClient(main.app)
+
+        response = client.get("/no-such-path")
+        assert response.status_code == 404
+        entry = json.loads(handler.lines[0])
+        assert entry["request_id"] == response.headers["X-Request-ID"]
+        assert entry["route"] is None
+        assert entry["path"] == "/no-such-path"
+
+    def test_timings_in_log(self, monkeypatch):
+        """测试耗时明细以毫秒输出"""
+        handler = capture_access_log(monkeypatch)
+
+        class FakeRequest:
+            scope = {}
+            method = "POST"
+            client = None
+
+            class url:
+                path = "/api/auth/sms/send"
+
+        entry = logger_module.log_access(FakeRequest(), 200, 0.05, "r", {"sms": 0.002, "sms_count": 1})
+        assert entry["sms_ms"] == 2.0
+        assert entry["sms_count"] == 1
+        assert json.loads(handler.lines[0])["duration_ms"] == 50.0
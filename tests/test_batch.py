@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from datetime import date, time as dt_time
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.batch import BatchRunner, Checkpoint
+from app.models.auth import User
+from app.models.exercise import ExerciseStatistic
+from app.models.nutrition import NutritionRecord
+from app.models.reminders import Notification, Task, TaskCompletion
+from app.models.social import PointRecord, UserPoint
+from app.services.daily_summary_service import DailySummaryService
+
+DAY = date(2024, 3, 1)
+
+
+def fetch_range(total):
+    """模拟按ID键集分页的用户表"""
+    def fetch(after, limit):
+        return list(range(after + 1, min(after + limit, total) + 1))
+    return fetch
+
+
+def sum_chunk(keys, factor):
+    """进程池测试用的处理函数（需为模块级函数）"""
+    return {"sum": sum(keys) * factor}
+
+
+class TestCheckpoint:
+    def test_atomic_save(self, tmp_path):
+        """测试断点写入后可读取，目录中不残留临时文件"""
+        checkpoint = Checkpoint(str(tmp_path / "sub" / "job.json"))
+        assert checkpoint.load() is None
+        checkpoint.save({"last_key": 10})
+        checkpoint.save({"last_key": 20})
+        assert checkpoint.load() == {"last_key": 20}
+        assert [p.name for p in (tmp_path / "sub").iterdir()] == ["job.json"]
+
+    def test_corrupted(self, tmp_path):
+        """测试断点文件损坏时视为没有断点"""
+        path = tmp_path / "job.json"
+        path.write_text("{\"last_key\": ")
+        assert Checkpoint(str(path)).load() is None
+
+
+class TestBatchRunner:
+    def test_inline(self, tmp_path):
+        """测试按块处理全部key，计数合计并记录吞吐量"""
+        chunks = []
+
+        def process(keys, factor):
+            chunks.append(list(keys))
+            return {"sum": sum(keys) * factor}
+
+        runner = BatchRunner("sum", process, chunk_size=3, executor="inline")
+        state = runner.run(fetch_range(10), 2)
+        assert chunks == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+        assert state["counts"] == {"sum": 110}
+        assert state["keys"] == 10 and state["chunks"] == 4 and state["finished"]
+        assert state["keys_per_second"] > 0
+
+    def test_process_pool(self):
+        """测试在进程池中处理"""
+        runner = BatchRunner("sum", sum_chunk, workers=2, chunk_size=100, executor="process")
+        state = runner.run(fetch_range(1000), 1)
+        assert state["counts"] == {"sum": 500500}
+        assert state["chunks"] == 10
+
+    def test_checkpoint_only_advances_over_completed_prefix(self, tmp_path):
+        """测试后提交的块先完成时，断点仍停在连续完成的位置"""
+        release = threading.Event()
+        saved = []
+
+        class RecordingCheckpoint(Checkpoint):
+            def save(self, state):
+                saved.append(state["last_key"])
+                super().save(state)
+
+        def process(keys):
+            if keys[0] == 1:
+                release.wait(5)
+            else:
+                time.sleep(0.01)
+                release.set()
+            return {"n": len(keys)}
+
+        runner = BatchRunner(
+            "order", process, workers=2, chunk_size=2, executor="thread",
+            checkpoint=RecordingCheckpoint(str(tmp_path / "order.json"))
+        )
+        runner.run(fetch_range(6))
+        assert saved == sorted(saved)
+        assert saved[0] == 2
+
+    def test_resume_after_failure(self, tmp_path):
+        """测试中途失败后从断点继续，断点之前的块不再执行"""
+        path = str(tmp_path / "job.json")
+        processed = []
+        fail_at = {7}
+
+        def process(keys, day):
+            if fail_at & set(keys):
+                raise RuntimeError("database gone")
+            processed.extend(keys)
+            return {"n": len(keys)}
+
+        runner = BatchRunner("job", process, chunk_size=3, executor="inline", checkpoint=Checkpoint(path))
+        with pytest.raises(RuntimeError):
+            runner.run(fetch_range(10), "2024-03-01")
+        with open(path) as f:
+            state = json.load(f)
+        assert state["last_key"] == 6 and not state["finished"]
+
+        fail_at.clear()
+        state = runner.run(fetch_range(10), "2024-03-01")
+        # 断点之前的块只执行一次，之后已提交的块会重做
+        assert [key for key in processed if key <= 6] == [1, 2, 3, 4, 5, 6]
+        assert set(processed) == set(range(1, 11))
+        assert state["counts"] == {"n": 10} and state["finished"]
+
+        # 同一批次已完成时直接返回；参数不同时重新开始
+        count = len(processed)
+        assert runner.run(fetch_range(10), "2024-03-01")["keys"] == 10
+        assert len(processed) == count
+        runner.run(fetch_range(10), "2024-03-02")
+        assert len(processed) == count + 10
+
+
+@pytest.fixture
+def db():
+    """内存SQLite同步会话，记录执行的SQL"""
+    engine = create_engine("sqlite://")
+    for model in (User, NutritionRecord, ExerciseStatistic, Task, TaskCompletion, Notification, UserPoint, PointRecord):
+        model.__table__.create(engine)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    session = sessionmaker(bind=engine)()
+    for user_id in range(1, 6):
+        session.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+    # 用户1: 蛋白质和运动都达标，完成1个任务；用户2: 只有未达标的营养记录；用户3: 只有任务；用户4/5: 无数据
+    session.add(NutritionRecord(
+        user_id=1, record_date=DAY, total_protein=65, total_calories=1500,
+        protein_target=60, calories_target=1800, achievement_rate=100
+    ))
+    session.add(NutritionRecord(
+        user_id=2, record_date=DAY, total_protein=30, total_calories=900,
+        protein_target=60, calories_target=1800, achievement_rate=50
+    ))
+    session.add(ExerciseStatistic(
+        user_id=1, statistic_date=DAY, statistic_type="daily", total_duration=2400,
+        exercise_days=1, target_duration=1800, achievement_rate=100
+    ))
+    session.add(Task(id=1, user_id=1, task_type="exercise", task_name="晨跑", points=10, start_date=DAY))
+    session.add(Task(id=2, user_id=3, task_type="meal_record", task_name="记录早餐", points=5, start_date=DAY))
+    session.add(TaskCompletion(user_id=1, task_id=1, completion_date=DAY, completion_time=dt_time(7), points_earned=10))
+    session.add(UserPoint(user_id=1, total_points=100, available_points=40))
+    session.commit()
+    session.queries = queries
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestDailySummary:
+    def test_summarize_chunk(self, db):
+        """测试一块用户批量读取、写入小结和达标积分，查询数与用户数无关"""
+        db.queries.clear()
+        result = DailySummaryService.summarize_users(db, DAY, [1, 2, 3, 4, 5])
+        assert result == {"users": 5, "summaries": 3, "skipped": 0, "bonus_points": 10}
+        selects = [sql for sql in db.queries if sql.lstrip().upper().startswith("SELECT")]
+        assert len(selects) == 5
+
+        notifications = {n.user_id: n.content for n in db.execute(select(Notification)).scalars()}
+        assert set(notifications) == {1, 2, 3}
+        assert "完成任务1/1个" in notifications[1] and "达标奖励10积分" in notifications[1]
+        assert "蛋白质30g/60g" in notifications[2]
+        assert "完成任务0/1个" in notifications[3]
+
+        point = db.execute(select(UserPoint).where(UserPoint.user_id == 1)).scalar_one()
+        assert (point.total_points, point.available_points) == (110, 50)
+        assert len(db.execute(select(PointRecord)).all()) == 2
+
+    def test_idempotent(self, db):
+        """测试重复处理同一块（断点之后已完成的块会被重做）不会重复发放"""
+        DailySummaryService.summarize_users(db, DAY, [1, 2, 3, 4, 5])
+        again = DailySummaryService.summarize_users(db, DAY, [1, 2, 3, 4, 5])
+        assert again["summaries"] == 0 and again["skipped"] == 3 and again["bonus_points"] == 0
+        assert len(db.execute(select(Notification)).all()) == 3
+        db.expire_all()
+        assert db.execute(select(UserPoint.total_points).where(UserPoint.user_id == 1)).scalar_one() == 110
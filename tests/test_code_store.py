@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.core.code_store import MemoryCodeStore, RedisCodeStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestMemoryCodeStore:
+    def test_consume_once(self):
+        """测试验证码只能使用一次"""
+        store = MemoryCodeStore()
+        run(store.save("13800138000", 1, "123456", 300))
+        assert run(store.consume("13800138000", 1, "000000")) is False
+        assert run(store.consume("13800138000", 1, "123456")) is True
+        assert run(store.consume("13800138000", 1, "123456")) is False
+
+    def test_expired_code_rejected(self, clock):
+        """测试过期验证码不可用"""
+        store = MemoryCodeStore(timer=clock)
+        run(store.save("13800138000", 2, "123456", 300))
+        clock.now += 301
+        assert run(store.consume("13800138000", 2, "123456")) is False
+        assert len(store) == 0
+
+    def test_new_code_replaces_old(self):
+        """测试重新发送后旧验证码失效"""
+        store = MemoryCodeStore()
+        run(store.save("13800138000", 1, "111111", 300))
+        run(store.save("13800138000", 1, "222222", 300))
+        assert run(store.consume("13800138000", 1, "111111")) is False
+        assert run(store.consume("13800138000", 1, "222222")) is True
+
+
+class TestRedisCodeStore:
+    @pytest.fixture
+    def store(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        return RedisCodeStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    def test_consume_is_atomic(self, store):
+        """测试并发消费同一验证码只有一次成功"""
+        async def scenario():
+            await store.save("13800138000", 2, "654321", 300)
+            results = await asyncio.gather(*[
+                store.consume("13800138000", 2, "654321") for _ in range(5)
+            ])
+            return results
+
+        assert sorted(run(scenario())) == [False] * 4 + [True]
+
+    def test_wrong_code_keeps_key(self, store):
+        """测试错误验证码不会消费正确验证码"""
+        async def scenario():
+            await store.save("13800138000", 3, "654321", 300)
+            wrong = await store.consume("13800138000", 3, "000000")
+            right = await store.consume("13800138000", 3, "654321")
+            ttl_gone = await store._client.exists("sms_code:3:13800138000")
+            return wrong, right, ttl_gone
+
+        assert run(scenario()) == (False, True, 0)
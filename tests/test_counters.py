@@ -0,0 +1,290 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.counters import (
+    POST_LIKES, POST_VIEWS, TOPIC_POSTS, VIDEO_VIEWS, Counters, MemoryCounterStore, RedisCounterStore, set_counters
+)
+from app.core.feed import hot_score
+from app.models.auth import User, UserProfile
+from app.models.exercise import ExerciseVideo
+from app.models.social import Comment, Like, Post, PostImage, Topic
+from app.services.exercise_service import ExerciseService
+from app.services.social_service import SocialService
+
+CREATED = datetime(2024, 3, 6, 12)
+
+
+@pytest.fixture
+def env(database):
+    """内存数据库：一个话题下三个帖子和一个运动视频"""
+    async def seed(db):
+        db.add(User(id=1, phone="13800138001", password_hash="x", status=1))
+        db.add(Topic(id=1, name="康复锻炼", post_count=3, status=1))
+        for post_id in (1, 2, 3):
+            db.add(Post(
+                id=post_id, user_id=1, topic_id=1, title="帖子", content="内容", view_count=10, like_count=1,
+                hot_score=hot_score(1, 0, 10, CREATED), created_at=CREATED
+            ))
+        db.add(ExerciseVideo(
+            id=1, title="坐姿抬腿", difficulty_level=1, duration=300, video_url="/v/1.mp4", category="力量",
+            view_count=100
+        ))
+
+    yield database(User, UserProfile, Topic, Post, PostImage, Comment, Like, ExerciseVideo, seed=seed)
+    set_counters(None)
+
+
+class TestMemoryCounterStore:
+    def test_take_and_retry(self):
+        """测试取出增量后写库失败时保留，下次与新增量合并"""
+        store = MemoryCounterStore()
+
+        async def scenario():
+            await store.incr(POST_VIEWS, 1, 1)
+            await store.incr(POST_VIEWS, 1, 1)
+            await store.incr(POST_LIKES, 2, 1)
+            await store.incr(POST_LIKES, 2, -1)
+            first = await store.take()
+            await store.rollback()
+            await store.incr(POST_VIEWS, 1, 3)
+            pending = await store.pending(POST_VIEWS, [1, 2])
+            second = await store.take()
+            await store.commit()
+            return first, pending, second, await store.take()
+
+        first, pending, second, empty = asyncio.run(scenario())
+        assert first == {POST_VIEWS: {1: 2}, POST_LIKES: {}}
+        assert pending == {1: 5}
+        assert second[POST_VIEWS] == {1: 5}
+        assert not any(empty.values())
+
+
+class TestRedisCounterStore:
+    def test_shared_between_workers(self):
+        """测试多worker的增量汇总到Redis，同一时间只有一个worker写库，失败的一批下次重试"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        worker_a = RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        worker_b = RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+        async def scenario():
+            await worker_a.incr(POST_VIEWS, 1, 1)
+            await worker_b.incr(POST_VIEWS, 1, 2)
+            await worker_b.incr(TOPIC_POSTS, 5, 1)
+            taken = await worker_a.take()
+            locked = await worker_b.take()
+            # 写库期间的新增量进入新的pending，读取时与正在写的一批合并
+            await worker_b.incr(POST_VIEWS, 1, 4)
+            pending = await worker_b.pending(POST_VIEWS, [1, 9])
+            await worker_a.rollback()
+
+            retried = await worker_b.take()
+            await worker_b.commit()
+            rest = await worker_a.take()
+            await worker_a.commit()
+            return taken, locked, pending, retried, rest, await worker_a.take()
+
+        taken, locked, pending, retried, rest, empty = asyncio.run(scenario())
+        assert taken == {POST_VIEWS: {1: 3}, TOPIC_POSTS: {5: 1}}
+        assert locked == {}
+        assert pending == {1: 7}
+        assert retried == taken
+        assert rest == {POST_VIEWS: {1: 4}}
+        assert empty == {}
+
+    def test_expired_lock_taken_over(self):
+        """测试写库锁过期被其他worker接手后，原worker续期失败且不会清除接手的增量"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        worker_a = RedisCounterStore(client)
+        worker_b = RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+        async def scenario():
+            await worker_a.incr(POST_VIEWS, 1, 3)
+            await worker_a.take()
+            held = await worker_a.hold()
+            await client.delete("counters:lock")  # 模拟锁过期
+            taken = await worker_b.take()
+            lost = await worker_a.hold()
+            await worker_a.commit()
+            pending = await worker_b.pending(POST_VIEWS, [1])
+            await worker_b.commit()
+            return held, taken, lost, pending, await worker_b.pending(POST_VIEWS, [1])
+
+        held, taken, lost, pending, after = asyncio.run(scenario())
+        assert held and not lost
+        assert taken == {POST_VIEWS: {1: 3}}
+        assert pending == {1: 3}
+        assert after == {}
+
+
+class TestCounters:
+    def test_batched_flush(self, env):
+        """测试多次增量合并为每个计数器一条UPDATE，读取合并未写库的增量，写库后重算热度"""
+        counters = Counters(MemoryCounterStore(), env.factory, flush_interval=60)
+
+        async def scenario():
+            await counters.start()
+            for _ in range(50):
+                await counters.incr(POST_VIEWS, 1)
+            for post_id in (1, 2, 3):
+                await counters.incr(POST_LIKES, post_id)
+            await counters.incr(POST_LIKES, 3, -5)
+            await counters.incr(VIDEO_VIEWS, 1, 7)
+            merged = await counters.merge(
+                [{"id": 1, "view_count": 10, "like_count": 1}, {"id": 3, "view_count": 10, "like_count": 1}],
+                {POST_VIEWS: "view_count", POST_LIKES: "like_count"}
+            )
+            env.queries.clear()
+            rows = await counters.flush()
+            queries = list(env.queries)
+            after = await counters.pending(POST_VIEWS, [1])
+            await counters.stop()
+            return merged, rows, queries, after
+
+        merged, rows, queries, after = env.run(scenario())
+        assert merged == [{"id": 1, "view_count": 60, "like_count": 2}, {"id": 3, "view_count": 10, "like_count": 0}]
+        assert rows == 5
+        # 浏览数、点赞数、视频观看数各一条UPDATE，热度一次读取一条UPDATE
+        assert [sql.split()[0].upper() for sql in queries] == ["UPDATE", "UPDATE", "UPDATE", "SELECT", "UPDATE"]
+        assert after == {}
+
+        posts = env.run(env.rows(Post, Post.view_count, Post.like_count, Post.hot_score))
+        assert posts[1][:2] == (60, 2) and posts[2][:2] == (10, 2) and posts[3][:2] == (10, 0)
+        assert posts[1][2] == pytest.approx(hot_score(2, 0, 60, CREATED))
+        assert env.run(env.rows(ExerciseVideo, ExerciseVideo.view_count)) == {1: (107,)}
+
+    def test_bounded_loss(self, env):
+        """测试按间隔写库，累计增量达到上限时提前写库，关闭时写完剩余增量"""
+        counters = Counters(MemoryCounterStore(), env.factory, flush_interval=0.05, max_pending=5)
+
+        async def scenario():
+            await counters.start()
+            await counters.incr(POST_VIEWS, 1)
+            await asyncio.sleep(0.3)
+            by_interval = counters.stats()["flushes"]
+
+            counters.flush_interval = 60
+            await asyncio.sleep(0.1)
+            for _ in range(5):
+                await counters.incr(POST_VIEWS, 2)
+            await asyncio.sleep(0.1)
+            by_size = counters.stats()["flushes"]
+
+            await counters.incr(POST_VIEWS, 3)
+            await counters.stop()
+            return by_interval, by_size
+
+        by_interval, by_size = env.run(scenario())
+        assert by_interval == 1 and by_size == 2
+        views = env.run(env.rows(Post, Post.view_count))
+        assert views == {1: (11,), 2: (15,), 3: (11,)}
+
+    def test_retry_after_failure(self, env):
+        """测试写库失败时增量保留，下次写入不丢失也不重复"""
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("database gone")
+            return env.factory()
+
+        counters = Counters(MemoryCounterStore(), flaky_factory, flush_interval=60)
+
+        async def scenario():
+            await counters.start()
+            await counters.incr(POST_VIEWS, 1, 3)
+            with pytest.raises(ConnectionError):
+                await counters.flush()
+            pending = await counters.pending(POST_VIEWS, [1])
+            await counters.incr(POST_VIEWS, 1, 1)
+            await counters.flush()
+            await counters.stop()
+            return pending
+
+        assert env.run(scenario()) == {1: 3}
+        assert env.run(env.rows(Post, Post.view_count))[1] == (14,)
+        assert counters.stats()["failures"] == 1
+
+    def test_slow_write_not_committed_twice(self, env):
+        """测试写库超过锁的有效期时放弃提交，由接手的worker写入，增量只计一次"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        lock = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+        def slow_factory():
+            # 模拟写库期间锁过期
+            lock.delete("counters:lock")
+            return env.factory()
+
+        worker_a = Counters(
+            RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True)), slow_factory,
+            flush_interval=60
+        )
+        worker_b = Counters(
+            RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True)), env.factory,
+            flush_interval=60
+        )
+
+        async def scenario():
+            await worker_a.start()
+            await worker_b.start()
+            await worker_a.incr(POST_VIEWS, 1, 3)
+            abandoned = await worker_a.flush()
+            written = await worker_b.flush()
+            await worker_a.stop()
+            await worker_b.stop()
+            return abandoned, written
+
+        assert env.run(scenario()) == (0, 1)
+        assert env.run(env.rows(Post, Post.view_count))[1] == (13,)
+        assert worker_a.stats()["failures"] == 1
+
+
+class TestCounterServices:
+    def test_views_and_likes(self, env):
+        """测试查看帖子和视频累加浏览数，重复点赞/取消点赞不重复计数"""
+        counters = Counters(MemoryCounterStore(), env.factory, flush_interval=60)
+        set_counters(counters)
+
+        async def scenario():
+            await counters.start()
+            async with env.factory() as db:
+                await SocialService.view_post(db, 1)
+                viewed = await SocialService.view_post(db, 1)
+                video = await ExerciseService.view_video(db, 1)
+                liked = await SocialService.like_post(db, 1, 2)
+                again = await SocialService.like_post(db, 1, 2)
+                await counters.flush()
+                unliked = await SocialService.like_post(db, 1, 2, liked=False)
+                unliked_again = await SocialService.like_post(db, 1, 2, liked=False)
+                missing = await ExerciseService.view_video(db, 99)
+            await counters.stop()
+            return viewed, video, liked, again, unliked, unliked_again, missing
+
+        viewed, video, liked, again, unliked, unliked_again, missing = env.run(scenario())
+        assert viewed["view_count"] == 12
+        assert video["view_count"] == 101
+        assert liked == again == {"liked": True, "like_count": 2}
+        assert unliked == unliked_again == {"liked": False, "like_count": 1}
+        assert missing is None
+        posts = env.run(env.rows(Post, Post.view_count, Post.like_count))
+        assert posts[1] == (12, 1) and posts[2] == (10, 1)
+
+    def test_like_insert_distinguishes_duplicates_on_mysql(self):
+        """测试点赞使用INSERT IGNORE：MySQL驱动开启CLIENT_FOUND_ROWS时，ON DUPLICATE KEY UPDATE无法区分新旧行"""
+        from sqlalchemy.dialects import mysql
+
+        from app.db.upsert import build_insert_ignore
+
+        stmt = build_insert_ignore(
+            "mysql", Like.__table__,
+            {"user_id": 1, "target_id": 1, "target_type": "post", "created_at": CREATED},
+            ["user_id", "target_id", "target_type"]
+        )
+        sql = str(stmt.compile(dialect=mysql.dialect()))
+        assert sql.startswith("INSERT IGNORE INTO likes") and "ON DUPLICATE KEY" not in sql
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.config import settings
+from app.db.pool import PoolStats, instrument_engine, pool_options
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    engines = []
+
+    def factory(**overrides):
+        for key, value in overrides.items():
+            monkeypatch.setattr(settings, key, value)
+        stats = PoolStats("test")
+        engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **pool_options(stats))
+        instrument_engine(engine, stats)
+        engines.append(engine)
+        return engine, stats
+
+    yield factory
+    for engine in engines:
+        engine.dispose()
+
+
+class TestPoolInstrumentation:
+    def test_checkout_and_overflow_counted(self, make_engine):
+        """测试检出次数与溢出连接统计"""
+        engine, stats = make_engine(DB_POOL_SIZE=1, DB_MAX_OVERFLOW=2, DB_POOL_PING_STRATEGY="none")
+        first = engine.connect()
+        second = engine.connect()
+        snapshot = stats.snapshot()
+        assert snapshot["checked_out"] == 2
+        assert snapshot["overflow_events"] == 1
+        first.close()
+        second.close()
+        snapshot = stats.snapshot()
+        assert snapshot["checkouts"] == 2
+        assert snapshot["checkins"] == 2
+        assert snapshot["wait_max_ms"] >= 0
+
+    def test_timeout_counted(self, make_engine):
+        """测试连接池耗尽时记录超时"""
+        engine, stats = make_engine(DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=0.05,
+                                    DB_POOL_PING_STRATEGY="none")
+        conn = engine.connect()
+        with pytest.raises(Exception):
+            engine.connect()
+        conn.close()
+        assert stats.snapshot()["timeouts"] == 1
+
+    def test_idle_strategy_pings_only_idle_connections(self, make_engine):
+        """测试idle策略只对空闲超时的连接执行ping"""
+        engine, stats = make_engine(DB_POOL_PING_STRATEGY="idle", DB_POOL_PING_IDLE_SECONDS=0.05)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert stats.snapshot()["pings"] == 0
+        time.sleep(0.1)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert stats.snapshot()["pings"] == 1
+
+    def test_invalid_strategy_rejected(self, monkeypatch):
+        """测试非法ping策略"""
+        monkeypatch.setattr(settings, "DB_POOL_PING_STRATEGY", "sometimes")
+        with pytest.raises(ValueError):
+            pool_options(PoolStats("test"))
@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.counters import Counters, MemoryCounterStore, set_counters
+from app.core.feed import (
+    HOT, LATEST, FeedCache, FeedHead, InvalidCursorError, decode_cursor, encode_cursor, feed_key, hot_score,
+    set_feed_cache
+)
+from app.models.auth import User, UserProfile
+from app.models.social import Like, Post, PostImage, Topic
+from app.schemas.social import PostCreate
+from app.services.social_service import POST_PINNED, SocialService
+from tests.query_count import assert_queries
+
+NOW = datetime(2024, 3, 6, 12)
+
+
+class TestHotScore:
+    def test_decay(self):
+        """测试互动量翻倍相当于晚发一个半衰期，排序与指数衰减后的互动量一致"""
+        half_life = timedelta(hours=settings.FEED_HOT_HALF_LIFE_HOURS)
+        like = 1 / settings.FEED_HOT_LIKE_WEIGHT
+        older = hot_score(int(3 * like), 0, 0, NOW)
+        newer = hot_score(int(1 * like), 0, 0, NOW + half_life)
+        assert older == pytest.approx(newer)
+        # 新帖没有互动时，仍排在同时期互动多的帖子之后
+        assert hot_score(0, 0, 0, NOW + timedelta(hours=1)) < hot_score(10, 2, 0, NOW)
+        assert hot_score(0, 0, 0, NOW + half_life * 10) > hot_score(10, 2, 0, NOW)
+
+
+class TestCursor:
+    def test_roundtrip(self):
+        """测试游标编码解码"""
+        assert decode_cursor(encode_cursor((NOW.isoformat(), 42)), LATEST) == (NOW, 42)
+        assert decode_cursor(encode_cursor((1234.5, 7)), HOT) == (1234.5, 7)
+
+    @pytest.mark.parametrize("cursor", ["@@@", encode_cursor(("x", 1)), encode_cursor((1.5, "a")), "e30"])
+    def test_invalid(self, cursor):
+        """测试无法解析的游标"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, LATEST)
+
+
+class TestFeedHead:
+    def test_page(self):
+        """测试从头部缓存按游标取页，超出缓存范围时返回None"""
+        items = [{"id": i, "created_at": NOW - timedelta(minutes=i // 2)} for i in range(10)]
+        items.sort(key=lambda item: (item["created_at"], item["id"]), reverse=True)
+        head = FeedHead(items, LATEST, complete=False)
+
+        first, more = head.page(None, 4)
+        assert first == items[:4] and more
+        second, _ = head.page(decode_cursor(encode_cursor(feed_key(first[-1], LATEST)), LATEST), 4)
+        assert second == items[4:8]
+        assert head.page(feed_key(second[-1], LATEST), 4) is None
+
+        complete = FeedHead(items, LATEST, complete=True)
+        last, more = complete.page(feed_key(second[-1], LATEST), 4)
+        assert last == items[8:] and not more
+
+
+@pytest.fixture
+def run(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        db.add(User(id=1, phone="13800138001", password_hash="x", status=1))
+        db.add(UserProfile(user_id=1, name="老王", avatar="/media/wang.jpg"))
+        db.add(Like(user_id=1, target_id=2, target_type="post"))
+        db.add(PostImage(post_id=2, image_url="/media/2b.jpg", sort_order=1))
+        db.add(PostImage(post_id=2, image_url="/media/2a.jpg", sort_order=0))
+        db.add(Topic(id=1, name="康复锻炼", post_count=0, status=1))
+        db.add(Topic(id=2, name="营养食谱", post_count=0, status=1))
+        for i in range(30):
+            # 每两帖同一时间，检验复合键中ID的作用
+            created = NOW - timedelta(hours=i // 2)
+            likes = (i * 7) % 11
+            db.add(Post(
+                id=i + 1, user_id=1, topic_id=1 if i % 3 else 2, title=f"帖子{i + 1}", content="内容",
+                like_count=likes, hot_score=hot_score(likes, 0, 0, created), created_at=created,
+                status=POST_PINNED if i == 29 else 1
+            ))
+
+    env = database(User, UserProfile, Topic, Post, PostImage, Like, seed=seed)
+    set_feed_cache(FeedCache(head_size=10))
+    yield env
+    set_feed_cache(None)
+
+
+async def read_all(db, topic_id, sort, limit):
+    pages = []
+    cursor = None
+    while True:
+        page = await SocialService.get_feed(db, topic_id, sort, cursor, limit)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+class TestSocialFeed:
+    @pytest.mark.parametrize("sort", [LATEST, HOT])
+    @pytest.mark.parametrize("topic_id", [None, 1])
+    def test_paginate(self, run, sort, topic_id):
+        """测试逐页读取与一次排序结果一致，不重复不遗漏，置顶帖只在第一页"""
+        async def scenario(db):
+            pages = await read_all(db, topic_id, sort, 4)
+            stmt = select(Post).where(Post.status == 1)
+            if topic_id is not None:
+                stmt = stmt.where(Post.topic_id == topic_id)
+            posts = (await db.execute(stmt)).scalars().all()
+            return pages, posts
+
+        pages, posts = run(scenario)
+        column = "created_at" if sort == LATEST else "hot_score"
+        expected = [p.id for p in sorted(posts, key=lambda p: (getattr(p, column), p.id), reverse=True)]
+        assert [item["id"] for page in pages for item in page["items"]] == expected
+        assert [item["id"] for item in pages[0]["pinned"]] == [30]
+        assert all(not page["pinned"] for page in pages[1:])
+
+    def test_head_served_from_memory(self, run):
+        """测试前几页从缓存返回只查点赞状态，超出缓存范围时帖子、图片、作者、点赞状态各一次查询"""
+        async def scenario(db):
+            # 信息流头部 + 置顶帖 + 图片 + 作者 + 点赞状态
+            with assert_queries(run.engine, 5):
+                first = await SocialService.get_feed(db, 1, LATEST, None, 4, user_id=1)
+            with assert_queries(run.engine, 2):
+                second = await SocialService.get_feed(db, 1, LATEST, first["next_cursor"], 4, user_id=1)
+                again = await SocialService.get_feed(db, 1, LATEST, None, 4, user_id=1)
+            with assert_queries(run.engine, 4):
+                third = await SocialService.get_feed(db, 1, LATEST, second["next_cursor"], 4, user_id=1)
+            return first, again, third
+
+        first, again, third = run(scenario)
+        assert again == first and len(third["items"]) == 4
+        post = next(item for item in first["items"] if item["id"] == 2)
+        assert post["images"] == ["/media/2a.jpg", "/media/2b.jpg"] and post["liked"]
+        assert post["author"] == {"name": "老王", "avatar": "/media/wang.jpg"}
+        assert not any(item["liked"] or item["images"] for item in first["items"] if item["id"] != 2)
+
+    def test_new_post_invalidates(self, run):
+        """测试发帖后本worker的话题和全站信息流立即可见，图片一并写入，话题帖子数经计数器累加"""
+        async def scenario(db):
+            counters = Counters(MemoryCounterStore(), run.factory)
+            set_counters(counters)
+            await counters.start()
+            await SocialService.get_feed(db, 2, LATEST)
+            await SocialService.get_feed(db, None, LATEST)
+            post = await SocialService.create_post(db, 1, PostCreate(
+                topic_id=2, title="新帖", content="今天练了二十分钟", images=["/media/a.jpg", "/media/b.jpg"]
+            ))
+            topic_feed = await SocialService.get_feed(db, 2, LATEST)
+            all_feed = await SocialService.get_feed(db, None, LATEST)
+            topics = {topic["id"]: topic["post_count"] for topic in await SocialService.list_topics(db)}
+            await counters.stop()
+            topic = await db.get(Topic, 2)
+            await db.refresh(topic)
+            images = (await db.execute(
+                select(PostImage.image_url).where(PostImage.post_id == post.id).order_by(PostImage.sort_order)
+            )).scalars().all()
+            return post, topic_feed, all_feed, topics, topic.post_count, images
+
+        try:
+            post, topic_feed, all_feed, topics, post_count, images = run(scenario)
+        finally:
+            set_counters(None)
+        assert topic_feed["items"][0]["id"] == post.id
+        assert all_feed["items"][0]["id"] == post.id
+        assert topics == {1: 0, 2: 1}
+        assert post_count == 1
+        assert images == ["/media/a.jpg", "/media/b.jpg"]
+
+    def test_invalid(self, run):
+        """测试无效游标和不存在的话题"""
+        async def scenario(db):
+            with pytest.raises(HTTPException) as cursor_error:
+                await SocialService.get_feed(db, None, HOT, "not-a-cursor")
+            with pytest.raises(HTTPException) as topic_error:
+                await SocialService.create_post(db, 1, PostCreate(topic_id=99, title="x", content="y"))
+            return cursor_error.value.status_code, topic_error.value.status_code
+
+        assert run(scenario) == (400, 404)
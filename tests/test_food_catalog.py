@@ -0,0 +1,165 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.core.food_catalog import CatalogSnapshot, FoodCatalog, UnknownFoodError, set_food_catalog
+from app.models.auth import User
+from app.models.nutrition import FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic
+from app.schemas.nutrition import MealCreate
+from app.services.nutrition_service import NutritionService
+
+ROWS = [
+    # id, name, category, protein, calories, fat, carbs, fiber
+    (7, "鸡蛋", "蛋类", 13.3, 144, 8.8, 2.8, None),
+    (2, "牛奶", "乳类", 3.0, 54, 3.2, 3.4, 0),
+    (15, "鸡胸肉", "肉类", 19.4, 133, 5.0, 2.5, 0),
+]
+
+
+class TestCatalogSnapshot:
+    def test_compute_batch(self):
+        """测试按(食物ID, 克数)批量计算每行营养和合计"""
+        snapshot = CatalogSnapshot(ROWS)
+        lines, totals = snapshot.compute([15, 7, 2], [150, 50, 250])
+        assert lines.shape == (3, 5)
+        assert lines[0][0] == pytest.approx(29.1)
+        assert lines[1][1] == pytest.approx(72)
+        assert totals[0] == pytest.approx(29.1 + 6.65 + 7.5)
+        # NULL按0处理
+        assert lines[1][4] == 0
+
+    def test_unknown_food(self):
+        """测试目录中不存在的ID全部报告出来"""
+        snapshot = CatalogSnapshot(ROWS)
+        with pytest.raises(UnknownFoodError) as exc:
+            snapshot.compute([7, 3, 100], [10, 10, 10])
+        assert exc.value.food_ids == [3, 100]
+
+        with pytest.raises(UnknownFoodError):
+            CatalogSnapshot([]).positions([1])
+
+    def test_get(self):
+        """测试按ID获取食物"""
+        snapshot = CatalogSnapshot(ROWS)
+        assert snapshot.get(2)["name"] == "牛奶"
+        assert snapshot.get(3) is None
+        assert np.all(np.diff(snapshot.ids) > 0)
+
+
+@pytest.fixture
+def env(database):
+    async def seed(db):
+        db.add(User(id=1, phone="13800138000", password_hash="x", status=1))
+        for row in ROWS:
+            db.add(FoodItem(
+                id=row[0], name=row[1], category=row[2], protein_per_100g=row[3],
+                calories_per_100g=row[4], fat_per_100g=row[5], carbs_per_100g=row[6],
+                fiber_per_100g=row[7], updated_at=datetime(2024, 1, 1)
+            ))
+
+    yield database(User, FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, seed=seed)
+    set_food_catalog(None)
+
+
+class TestFoodCatalogRefresh:
+    def test_version_polling(self, env, clock):
+        """测试检查间隔内不查库，版本不变不重新加载，数据变化后重新加载"""
+        catalog = FoodCatalog(refresh_interval=60, timer=clock)
+
+        async def scenario():
+            async with env.factory() as db:
+                snapshot = await catalog.get(db)
+                assert len(snapshot) == 3
+                assert catalog.loads == 1
+
+                env.queries.clear()
+                await catalog.get(db)
+                assert env.queries == []
+
+                clock.now += 61
+                await catalog.get(db)
+                assert catalog.loads == 1
+                assert catalog.version_checks == 2
+
+                await db.execute(
+                    update(FoodItem).where(FoodItem.id == 2)
+                    .values(protein_per_100g=3.5, updated_at=datetime(2024, 2, 1))
+                )
+                await db.commit()
+                clock.now += 61
+                snapshot = await catalog.get(db)
+                assert catalog.loads == 2
+                assert snapshot.get(2)["protein_per_100g"] == 3.5
+
+        env.run(scenario())
+
+
+class TestCreateMeal:
+    def test_bulk_insert(self, env):
+        """测试保存餐食时明细一次批量插入，不逐条查询食物"""
+        set_food_catalog(FoodCatalog())
+        meal_in = MealCreate(
+            meal_type=2,
+            meal_time=datetime(2024, 3, 1, 12, 0),
+            items=[
+                {"food_item_id": 15, "quantity": 150},
+                {"food_item_id": 7, "quantity": 50},
+                {"food_name": "自制豆浆", "quantity": 200, "protein": 6, "calories": 62},
+            ]
+        )
+
+        async def scenario():
+            async with env.factory() as db:
+                env.queries.clear()
+                meal = await NutritionService.create_meal(db, 1, meal_in)
+                return meal, list(env.queries)
+
+        meal, queries = env.run(scenario())
+        assert float(meal.total_protein) == pytest.approx(29.1 + 6.65 + 6)
+        assert [item.food_name for item in meal.items] == ["鸡胸肉", "鸡蛋", "自制豆浆"]
+        item_inserts = [q for q in queries if q.startswith("INSERT INTO meal_food_items")]
+        assert len(item_inserts) == 1
+        food_selects = [q for q in queries if "FROM food_items" in q]
+        # 仅首次加载目录：版本检查 + 整表加载
+        assert len(food_selects) == 2
+
+    def test_unknown_food(self, env):
+        """测试包含不存在的食物时返回400"""
+        set_food_catalog(FoodCatalog())
+        meal_in = MealCreate(meal_type=1, meal_time=datetime(2024, 3, 1, 8, 0),
+                             items=[{"food_item_id": 999, "quantity": 100}])
+
+        async def scenario():
+            async with env.factory() as db:
+                with pytest.raises(HTTPException) as exc:
+                    await NutritionService.create_meal(db, 1, meal_in)
+                return exc.value.status_code
+
+        assert env.run(scenario()) == 400
+
+    def test_recompute(self, env, clock):
+        """测试食物数据修正后重新计算餐食"""
+        catalog = FoodCatalog(timer=clock)
+        set_food_catalog(catalog)
+        meal_in = MealCreate(meal_type=3, meal_time=datetime(2024, 3, 1, 18, 0),
+                             items=[{"food_item_id": 2, "quantity": 200}, {"food_item_id": 7, "quantity": 100}])
+
+        async def scenario():
+            async with env.factory() as db:
+                meal = await NutritionService.create_meal(db, 1, meal_in)
+                await db.execute(
+                    update(FoodItem).where(FoodItem.id == 2)
+                    .values(protein_per_100g=4.0, updated_at=datetime(2024, 2, 1))
+                )
+                await db.commit()
+                clock.now += 61
+                meal = await NutritionService.recompute_meal(db, meal)
+            async with env.factory() as db:
+                return meal, await NutritionService.get_meal(db, 1, meal.id)
+
+        meal, reloaded = env.run(scenario())
+        assert float(meal.total_protein) == pytest.approx(8 + 13.3)
+        assert float(reloaded.items[0].protein) == pytest.approx(8)
@@ -0,0 +1,86 @@
+import pytest
+
+from app.core.food_catalog import CatalogSnapshot
+from app.core.food_search import FoodSearchIndex
+
+FOODS = ["鸡蛋", "鸡胸肉", "牛奶", "脱脂牛奶", "AD钙奶", "鸡蛋羹", "鸭蛋", "西红柿炒鸡蛋", "燕麦片"]
+
+
+@pytest.fixture
+def index():
+    index = FoodSearchIndex()
+    for food_id, name in enumerate(FOODS, start=1):
+        index.add(food_id, name, "测试")
+    return index
+
+
+def names(results):
+    return [r["name"] for r in results]
+
+
+class TestFoodSearchIndex:
+    def test_exact_and_prefix(self, index):
+        """测试完全匹配排在前缀匹配之前，包含该词的排在后面"""
+        results = index.search("鸡蛋")
+        assert names(results)[:3] == ["鸡蛋", "鸡蛋羹", "西红柿炒鸡蛋"]
+        assert results[0]["score"] > results[1]["score"] > results[2]["score"]
+
+    def test_single_char(self, index):
+        """测试单字查询匹配包含该字的食物"""
+        assert set(names(index.search("奶"))) == {"牛奶", "脱脂牛奶", "AD钙奶"}
+
+    def test_pinyin_and_initials(self, index):
+        """测试全拼、首字母前缀和大小写全角"""
+        pytest.importorskip("pypinyin")
+        assert names(index.search("niunai"))[0] == "牛奶"
+        assert names(index.search("jd"))[:2] == ["鸡蛋", "鸡蛋羹"]
+        assert names(index.search("ＹＡＮＭＡＩ")) == ["燕麦片"]
+        assert names(index.search("ad"))[0] == "AD钙奶"
+
+    def test_typo_tolerance(self, index):
+        """测试错字、同音字仍能找到"""
+        pytest.importorskip("pypinyin")
+        assert names(index.search("西红市炒鸡蛋"))[0] == "西红柿炒鸡蛋"
+        assert names(index.search("鸡旦"))[0] == "鸡蛋"
+        assert "鸡蛋" in names(index.search("jidna"))
+
+    def test_no_match(self, index):
+        """测试无结果和空查询"""
+        assert index.search("榴莲") == []
+        assert index.search("  ") == []
+
+    def test_limit(self, index):
+        """测试返回条数限制"""
+        assert len(index.search("鸡", limit=2)) == 2
+
+
+class TestIncrementalUpdate:
+    def test_add_remove(self, index):
+        """测试增删后索引立即生效"""
+        index.add(100, "鸡蛋白", "蛋类")
+        assert "鸡蛋白" in names(index.search("鸡蛋"))
+        index.remove(1)
+        assert "鸡蛋" not in names(index.search("鸡蛋"))
+        assert 1 not in index
+        # 删除不存在的ID不报错
+        index.remove(999)
+
+    def test_rename(self, index):
+        """测试重复添加同一ID视为改名"""
+        index.add(3, "纯牛奶", "乳类")
+        results = index.search("纯牛奶")
+        assert results[0]["id"] == 3
+        assert "牛奶" not in names(index.search("牛奶"))
+        assert len(index) == len(FOODS)
+
+    def test_sync_with_catalog(self):
+        """测试与目录快照同步时只更新有变化的食物"""
+        index = FoodSearchIndex()
+        rows = [(1, "鸡蛋", "蛋类", 13, 144, 0, 0, 0), (2, "牛奶", "乳类", 3, 54, 0, 0, 0)]
+        snapshot = CatalogSnapshot(rows)
+        assert index.sync(snapshot) == (2, 0)
+        assert index.sync(snapshot) == (0, 0)
+
+        rows = [(1, "鸡蛋", "蛋类", 13, 144, 0, 0, 0), (3, "酸奶", "乳类", 3, 72, 0, 0, 0)]
+        assert index.sync(CatalogSnapshot(rows)) == (1, 1)
+        assert names(index.search("奶")) == ["酸奶"]
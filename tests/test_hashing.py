@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.hashing import PasswordHasher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestPasswordHasher:
+    def test_process_pool_hash_and_verify(self):
+        """测试在进程池中计算和验证哈希"""
+        hasher = PasswordHasher(rounds=4, executor="process", workers=1)
+        try:
+            async def scenario():
+                hashed = await hasher.hash("secret123")
+                return hashed, await hasher.verify("secret123", hashed), await hasher.verify("wrong", hashed)
+
+            hashed, ok, wrong = run(scenario())
+        finally:
+            hasher.shutdown()
+        assert hashed.startswith("$2b$04$")
+        assert ok is True and wrong is False
+        assert hasher.stats()["completed"] == 3
+
+    def test_rehash_when_cost_changes(self):
+        """测试cost变化后登录时返回新哈希"""
+        old = PasswordHasher(rounds=4, executor="inline")
+        new = PasswordHasher(rounds=5, executor="inline")
+        hashed = run(old.hash("secret123"))
+        ok, new_hash = run(new.verify_and_update("secret123", hashed))
+        assert ok is True
+        assert new_hash.startswith("$2b$05$")
+        assert run(new.verify_and_update("secret123", new_hash)) == (True, None)
+        assert new.stats()["rehashed"] == 1
+
+    def test_legacy_hash_rejected(self):
+        """测试非bcrypt格式的历史哈希验证失败而不是抛异常"""
+        hasher = PasswordHasher(rounds=4, executor="inline")
+        assert run(hasher.verify("123456", "e10adc3949ba59abbe56e057f20f883e")) is False
+
+    def test_reject_when_queue_full(self):
+        """测试排队数超过上限时返回503"""
+        hasher = PasswordHasher(rounds=10, executor="thread", workers=1, max_pending=1)
+
+        async def scenario():
+            first = asyncio.ensure_future(hasher.hash("secret123"))
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as exc:
+                await hasher.hash("secret456")
+            await first
+            return exc.value.status_code
+
+        try:
+            assert run(scenario()) == 503
+        finally:
+            hasher.shutdown()
+        assert hasher.stats()["rejected"] == 1
@@ -0,0 +1,229 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import inbox as inbox_module
+from app.core.inbox import Inbox, MemoryInboxStore, RedisInboxStore
+from app.core.messaging import (
+    DOCTOR, USER, MemoryBroker, MemoryIdAllocator, MemoryPresence, MessageGateway, MessageWriter, Participant
+)
+from app.models.auth import User, UserProfile
+from app.models.medical import Conversation, Doctor, Message, UserDoctorRelation
+from app.schemas.medical import ConversationList, MessageSend
+from app.services.medical_service import MedicalService
+from tests.query_count import assert_queries
+
+PATIENT_1 = Participant(USER, 1)
+PATIENT_2 = Participant(USER, 2)
+DOCTOR_1 = Participant(DOCTOR, 1)
+
+
+def redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisInboxStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store_factory(request):
+    if request.param == "memory":
+        return MemoryInboxStore
+    return redis_store
+
+
+class TestInboxStore:
+    def test_order_and_unread(self, store_factory):
+        """测试会话按最后消息倒序翻页，未读数随消息和已读线变化，重复登记不重复计数"""
+        async def scenario():
+            store = store_factory()
+            for conversation_id, message_id in ((1, 1), (2, 2), (1, 3), (3, 4), (1, 5)):
+                await store.record("doctor:1", conversation_id, message_id, True)
+            # 从数据库重建时会再次登记已有的消息
+            await store.record("doctor:1", 1, 3, True)
+            await store.record("doctor:1", 2, 1, False)
+            first = await store.page("doctor:1", None, 2)
+            second = await store.page("doctor:1", first[-1][1], 2)
+            total = await store.total_unread("doctor:1")
+
+            remaining = await store.read("doctor:1", 1, 3)
+            # 已读线以下的消息不会重新计为未读
+            await store.record("doctor:1", 1, 2, True)
+            after = await store.page("doctor:1", None, 10)
+            total_after = await store.total_unread("doctor:1")
+            await store.close()
+            return first, second, total, remaining, after, total_after
+
+        first, second, total, remaining, after, total_after = asyncio.run(scenario())
+        assert first == [(1, 5, 3), (3, 4, 1)]
+        assert second == [(2, 2, 1)]
+        assert total == 5
+        assert remaining == 1
+        assert after == [(1, 5, 1), (3, 4, 1), (2, 2, 1)]
+        assert total_after == 3
+
+    def test_last_message(self, store_factory):
+        """测试最后消息只保留ID更大的"""
+        async def scenario():
+            store = store_factory()
+            await store.set_last_message(1, {"id": 5, "content": "新"})
+            await store.set_last_message(1, {"id": 3, "content": "旧"})
+            result = await store.last_messages([1, 2])
+            await store.close()
+            return result
+
+        assert asyncio.run(scenario()) == {1: {"id": 5, "content": "新"}}
+
+    def test_redis_keys_expire(self):
+        """测试Redis的key都带过期时间；已加载标记先过期，重新加载时按现存未读重算未读总数"""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        store = RedisInboxStore(client, ttl=100)
+
+        async def scenario():
+            await store.record("doctor:1", 1, 1, True)
+            await store.record("doctor:1", 2, 2, True)
+            await store.set_loaded("doctor:1")
+            await store.set_last_message(1, {"id": 1, "content": "医生好"})
+            ttls = {key: await client.ttl(key) for key in await client.keys("im:inbox:*")}
+
+            # 模拟部分未读已过期而未读总数还在
+            await client.delete("im:inbox:doctor:1:unread:2", "im:inbox:doctor:1:loaded")
+            loaded = await store.is_loaded("doctor:1")
+            await store.set_loaded("doctor:1")
+            total = await store.total_unread("doctor:1")
+            await store.close()
+            return ttls, loaded, total
+
+        ttls, loaded, total = asyncio.run(scenario())
+        assert len(ttls) == 6 and all(0 < ttl <= 100 for ttl in ttls.values())
+        assert not loaded
+        assert total == 1
+
+
+@pytest.fixture
+def env(database):
+    """内存数据库 + 带会话列表的消息网关"""
+    async def seed(db):
+        for user_id in (1, 2):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+        db.add(Doctor(id=1, name="李医生", title="主任医师", department="老年科", hospital="市一院", status=1))
+        db.add(Doctor(id=2, name="王医生", title="主治医师", department="心内科", hospital="市一院", status=1))
+        for user_id, doctor_id in ((1, 1), (2, 1), (1, 2)):
+            db.add(UserDoctorRelation(user_id=user_id, doctor_id=doctor_id, relation_type=1, status=1))
+
+        db.add(UserProfile(user_id=1, name="张大爷"))
+
+    env = database(User, UserProfile, Doctor, UserDoctorRelation, Conversation, Message, seed=seed)
+    env.inbox = Inbox(MemoryInboxStore(), env.factory)
+    env.gateway = MessageGateway(
+        env.factory, MemoryBroker(), MemoryPresence(), MemoryIdAllocator(),
+        MessageWriter(env.factory, flush_interval=60), inbox=env.inbox
+    )
+    inbox_module.set_inbox(env.inbox)
+    yield env
+    inbox_module.set_inbox(None)
+
+
+async def send(gateway, sender, to, content):
+    return await gateway.send_message(sender, MessageSend(to=to, content=content))
+
+
+class TestInbox:
+    def test_send_and_read(self, env):
+        """测试发消息和标记已读时维护双方的会话列表，读取列表不查库"""
+        async def scenario():
+            await env.gateway.start()
+            await send(env.gateway, PATIENT_1, 1, "医生好")
+            await send(env.gateway, PATIENT_2, 1, "请问血压偏高怎么办")
+            await send(env.gateway, PATIENT_1, 1, "最近睡不好")
+            reply = await send(env.gateway, DOCTOR_1, 1, "您好，多久了？")
+            await send(env.gateway, PATIENT_1, 2, "王医生好")
+            await env.gateway.writer.flush()
+            await env.inbox.store.set_loaded("doctor:1")
+            await env.inbox.store.set_loaded("user:1")
+
+            with assert_queries(env.engine, 0):
+                doctor = await env.inbox.list(DOCTOR, 1)
+                patient = await env.inbox.list(USER, 1, limit=1)
+            await env.gateway.mark_read(DOCTOR_1, 1, reply["id"])
+            after = await env.inbox.list(DOCTOR, 1)
+            await env.gateway.stop()
+            return doctor, patient, after
+
+        doctor, patient, after = env.run(scenario())
+        assert [(item["conversation_id"], item["unread_count"]) for item in doctor["items"]] == [(1, 2), (2, 1)]
+        assert doctor["items"][0]["last_message"]["content"] == "您好，多久了？"
+        assert doctor["total_unread"] == 3 and doctor["next_before"] is None
+        # 患者1: 与王医生的会话最新，与李医生的会话有医生回复的1条未读
+        assert [item["conversation_id"] for item in patient["items"]] == [3]
+        assert patient["total_unread"] == 1 and patient["next_before"] == 5
+        assert [(item["conversation_id"], item["unread_count"]) for item in after["items"]] == [(1, 0), (2, 1)]
+        assert after["total_unread"] == 1
+
+    def test_rebuild_from_database(self, env):
+        """测试缓存为空时从数据库加载一次：与增量维护的结果一致，之后不再查库"""
+        async def scenario():
+            await env.gateway.start()
+            first = await send(env.gateway, PATIENT_1, 1, "医生好")
+            await send(env.gateway, PATIENT_1, 1, "最近睡不好")
+            await send(env.gateway, PATIENT_2, 1, "请问血压偏高怎么办")
+            await env.gateway.mark_read(DOCTOR_1, 1, first["id"])
+            await env.gateway.writer.flush()
+            await env.gateway.stop()
+
+            cold = Inbox(MemoryInboxStore(), env.factory)
+            with assert_queries(env.engine, 3):  # 会话 + 未读消息 + 最后消息
+                loaded = await cold.list(DOCTOR, 1)
+            with assert_queries(env.engine, 0):
+                again = await cold.list(DOCTOR, 1)
+            return loaded, again, cold.stats()
+
+        loaded, again, stats = env.run(scenario())
+        assert [(item["conversation_id"], item["unread_count"]) for item in loaded["items"]] == [(2, 1), (1, 1)]
+        assert loaded["items"][1]["last_message"]["content"] == "最近睡不好"
+        assert loaded["total_unread"] == 2
+        assert again == loaded
+        assert stats == {"rebuilds": 1}
+
+    def test_list_conversations(self, env):
+        """测试用户会话列表接口：带医生信息，一页只查一次库"""
+        async def scenario():
+            await env.gateway.start()
+            await send(env.gateway, PATIENT_1, 1, "医生好")
+            await send(env.gateway, PATIENT_1, 2, "王医生好")
+            await env.inbox.store.set_loaded("user:1")
+            async with env.factory() as db:
+                with assert_queries(env.engine, 1):
+                    page = await MedicalService.list_conversations(db, 1)
+            await env.gateway.stop()
+            return ConversationList.model_validate(page)
+
+        page = env.run(scenario())
+        assert [(item.doctor.name, item.unread_count) for item in page.items] == [("王医生", 0), ("李医生", 0)]
+        assert page.items[0].last_message.content == "王医生好"
+
+    def test_doctor_conversations_and_history(self, env):
+        """测试医生端会话列表带患者信息、一页只查一次库，医生只能读取自己的会话历史"""
+        async def scenario():
+            await env.gateway.start()
+            await send(env.gateway, PATIENT_1, 1, "医生好")
+            await send(env.gateway, PATIENT_2, 1, "请问血压偏高怎么办")
+            await send(env.gateway, PATIENT_1, 2, "王医生好")
+            await env.gateway.writer.flush()
+            await env.inbox.store.set_loaded("doctor:1")
+            async with env.factory() as db:
+                with assert_queries(env.engine, 1):
+                    page = await MedicalService.list_doctor_conversations(db, 1)
+                history = await MedicalService.get_messages(db, DOCTOR_1, 1)
+                with pytest.raises(HTTPException) as denied:
+                    await MedicalService.get_messages(db, DOCTOR_1, 3)
+            await env.gateway.stop()
+            return ConversationList.model_validate(page), history, denied.value.status_code
+
+        page, history, denied = env.run(scenario())
+        assert [(item.patient.id, item.patient.name, item.unread_count) for item in page.items] == [
+            (2, None, 1), (1, "张大爷", 1)
+        ]
+        assert page.total_unread == 2
+        assert [message.content for message in history["items"]] == ["医生好"]
+        assert denied == 404
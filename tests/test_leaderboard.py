@@ -0,0 +1,207 @@
+import asyncio
+import os
+import random
+import time
+from datetime import date, datetime
+
+import pytest
+
+from app.core.leaderboard import (
+    ALL_TIME, Leaderboard, MemoryLeaderboardStore, RedisLeaderboardStore, SkipList, board_name, board_ttl,
+    local_day, local_midnight_utc, set_leaderboard
+)
+from app.core.timeseries import DAILY, WEEKLY
+from app.models.auth import User, UserProfile
+from app.models.social import PointRecord, UserPoint
+from app.services.social_service import SocialService
+
+DAY = date(2024, 3, 6)  # 周三
+
+
+@pytest.fixture
+def utc_plus_8():
+    """服务器时区为UTC+8（数据库时间为UTC）"""
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Shanghai"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+async def pages(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestSkipList:
+    def test_matches_sorted_list(self):
+        """测试随机插入删除后名次和区间读取与有序列表一致"""
+        rng = random.Random(7)
+        skiplist = SkipList()
+        expected = []
+        for _ in range(3000):
+            key = (rng.randint(0, 200), rng.randint(0, 50))
+            if key in expected:
+                assert skiplist.remove(key)
+                expected.remove(key)
+            else:
+                skiplist.insert(key)
+                expected.append(key)
+        expected.sort()
+        assert len(skiplist) == len(expected)
+        for index in range(0, len(expected), 37):
+            assert skiplist.rank(expected[index]) == index + 1
+        assert skiplist.rank((999, 999)) is None
+        assert not skiplist.remove((999, 999))
+        assert skiplist.slice(0, len(expected)) == expected
+        assert skiplist.slice(100, 10) == expected[100:110]
+        assert skiplist.slice(len(expected), 10) == []
+
+
+class TestMemoryLeaderboardStore:
+    def test_rank_and_top(self):
+        """测试累加积分后名次变化，同分按用户ID排序"""
+        store = MemoryLeaderboardStore()
+
+        async def scenario():
+            await store.incr("all", {1: 10, 2: 30, 3: 20})
+            await store.incr("all", {1: 25})
+            return await store.top("all", 0, 10), await store.rank("all", 3), await store.rank("all", 9)
+
+        top, rank, missing = asyncio.run(scenario())
+        assert top == [(1, 35), (2, 30), (3, 20)]
+        assert rank == (3, 20)
+        assert missing is None
+
+    def test_replace_and_expire(self):
+        """测试重建整体替换榜单，周期榜过期后清空"""
+        today = [DAY]
+        store = MemoryLeaderboardStore(today=lambda: today[0])
+
+        async def scenario():
+            await store.incr("daily:x", {1: 5}, ttl=86400)
+            count = await store.replace("daily:x", pages([(2, 8), (3, 9)], [(4, 1)]), ttl=86400)
+            top = await store.top("daily:x", 0, 10)
+            today[0] = date(2024, 3, 8)
+            return count, top, await store.size("daily:x")
+
+        count, top, size = asyncio.run(scenario())
+        assert count == 3
+        assert top == [(3, 9), (2, 8), (4, 1)]
+        assert size == 0
+
+
+class TestRedisLeaderboardStore:
+    def test_shared_between_workers(self):
+        """测试榜单通过Redis在worker间共享，重建用RENAME原子替换"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        worker_a = RedisLeaderboardStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        worker_b = RedisLeaderboardStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+        async def scenario():
+            await worker_a.incr("all", {1: 10, 2: 30}, ttl=60)
+            await worker_b.incr("all", {1: 25})
+            before = await worker_b.top("all", 0, 10), await worker_a.rank("all", 2)
+            await worker_a.replace("all", pages([(5, 1), (6, 2)]))
+            after = await worker_b.top("all", 0, 10), await worker_b.size("all")
+            await worker_a.replace("all", pages([]))
+            return before, after, await worker_b.size("all")
+
+        (top, rank), (rebuilt, size), empty = asyncio.run(scenario())
+        assert top == [(1, 35.0), (2, 30.0)]
+        assert rank == (2, 30.0)
+        assert rebuilt == [(6, 2.0), (5, 1.0)] and size == 2
+        assert empty == 0
+
+
+class TestLeaderboard:
+    def test_boards(self):
+        """测试积分同时计入日榜、周榜和总榜，周期榜按周期起始日命名"""
+        assert board_name(DAILY, DAY) == "daily:2024-03-06"
+        assert board_name(WEEKLY, DAY) == "weekly:2024-03-04"
+        assert board_name(ALL_TIME, DAY) == "all"
+        assert board_ttl(WEEKLY, DAY) == 5 * 86400 + 2 * 86400
+        assert board_ttl(ALL_TIME, DAY) is None
+
+        leaderboard = Leaderboard(MemoryLeaderboardStore(), today=lambda: DAY)
+
+        async def scenario():
+            await leaderboard.record({1: 5, 2: 3})
+            await leaderboard.record({2: 4}, day=date(2024, 3, 7))
+            return (
+                await leaderboard.top(DAILY, 10),
+                await leaderboard.top(WEEKLY, 10),
+                await leaderboard.rank(ALL_TIME, 2),
+                await leaderboard.top(ALL_TIME, 1, offset=1),
+            )
+
+        daily, weekly, rank, second = asyncio.run(scenario())
+        assert daily == [{"rank": 1, "user_id": 1, "points": 5}, {"rank": 2, "user_id": 2, "points": 3}]
+        assert [entry["user_id"] for entry in weekly] == [2, 1]
+        assert rank == {"rank": 1, "user_id": 2, "points": 7}
+        assert second == [{"rank": 2, "user_id": 1, "points": 5}]
+
+
+@pytest.fixture
+def run(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        for user_id, total in ((1, 120), (2, 300), (3, 0), (4, 80)):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+            db.add(UserPoint(user_id=user_id, total_points=total, available_points=total))
+        db.add(UserProfile(user_id=2, name="张阿姨"))
+        for user_id, points, day in ((1, 10, 6), (1, 5, 6), (4, 20, 6), (2, 50, 4), (2, 7, 1)):
+            db.add(PointRecord(
+                user_id=user_id, points=points, record_type=1, description="x",
+                created_at=datetime(2024, 3, day, 12)
+            ))
+
+    env = database(User, UserProfile, UserPoint, PointRecord, seed=seed)
+    set_leaderboard(Leaderboard(MemoryLeaderboardStore(), today=lambda: DAY))
+    yield env
+    set_leaderboard(None)
+
+
+class TestSocialService:
+    def test_rebuild_and_read(self, run):
+        """测试从数据库重建三个榜单，读取时附带昵称和自己的名次"""
+        async def scenario(db):
+            counts = await SocialService.rebuild_leaderboards(db, DAY)
+            for period in (DAILY, WEEKLY, ALL_TIME):
+                await SocialService.rebuild_leaderboard(db, period, DAY, page_size=1)
+            return (
+                counts,
+                await SocialService.get_leaderboard(db, ALL_TIME, 1),
+                await SocialService.get_leaderboard(db, DAILY, 3),
+                await SocialService.get_leaderboard(db, WEEKLY, 4),
+            )
+
+        counts, all_time, daily, weekly = run(scenario)
+        assert counts == {DAILY: 2, WEEKLY: 3, ALL_TIME: 3}
+        assert [(e["user_id"], e["points"]) for e in all_time["items"]] == [(2, 300), (1, 120), (4, 80)]
+        assert all_time["items"][0]["name"] == "张阿姨"
+        assert all_time["me"]["rank"] == 2
+        assert [(e["user_id"], e["points"]) for e in daily["items"]] == [(4, 20), (1, 15)]
+        assert daily["me"] is None
+        assert [e["user_id"] for e in weekly["items"]] == [2, 4, 1]
+        assert weekly["me"]["rank"] == 2
+
+    def test_rebuild_uses_local_days(self, run, utc_plus_8):
+        """测试UTC+8下本地凌晨（UTC前一天）的积分在重建后仍在本地当天的日榜上，与增量记入的日期一致"""
+        early = datetime(2024, 3, 5, 17)  # 本地2024-03-06 01:00
+        assert local_day(early) == DAY
+        assert local_midnight_utc(DAY) == datetime(2024, 3, 5, 16)
+
+        async def scenario(db):
+            db.add(PointRecord(user_id=3, points=9, record_type=1, description="x", created_at=early))
+            await db.commit()
+            await SocialService.rebuild_leaderboard(db, DAILY, DAY)
+            return await SocialService.get_leaderboard(db, DAILY, 3)
+
+        daily = run(scenario)
+        assert [(e["user_id"], e["points"]) for e in daily["items"]] == [(4, 20), (1, 15), (3, 9)]
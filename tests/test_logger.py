@@ -0,0 +1,97 @@
+import io
+import logging
+import threading
+
+from app.core.logger import LogPipeline, QueueingHandler, setup_logger
+
+
+class BlockingHandler(logging.Handler):
+    """模拟慢速磁盘：在放行前阻塞写入"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.gate.wait(5)
+        self.messages.append(record.getMessage())
+
+
+def make_logger(name, pipeline, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = [QueueingHandler(pipeline, [handler])]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+class TestLogPipeline:
+    def test_batched_file_write(self, tmp_path):
+        """测试日志经管道批量写入文件，关闭时全部写出"""
+        log_file = tmp_path / "batch.log"
+        logger = setup_logger("test.pipeline.file", log_file=str(log_file), format_str="%(message)s",
+                              async_mode=False)
+        file_handler = logger.handlers[1]
+        logger.handlers = []
+        pipeline = LogPipeline(batch_size=50, flush_interval=0.01)
+        logger.addHandler(QueueingHandler(pipeline, [file_handler]))
+        for i in range(120):
+            logger.info("line %d", i)
+        pipeline.stop()
+        lines = log_file.read_text(encoding="utf-8").splitlines()
+        assert lines == [f"line {i}" for i in range(120)]
+        assert pipeline.stats()["written"] == 120
+
+    def test_drop_new_when_full(self):
+        """测试缓冲区满时丢弃新日志且不阻塞调用方"""
+        handler = BlockingHandler()
+        pipeline = LogPipeline(capacity=2, overflow_policy="drop_new", batch_size=1, flush_interval=0.01)
+        logger = make_logger("test.pipeline.drop_new", pipeline, handler)
+        for i in range(10):
+            logger.info("msg %d", i)
+        handler.gate.set()
+        pipeline.stop()
+        stats = pipeline.stats()
+        assert stats["dropped"] > 0
+        assert stats["written"] + stats["dropped"] == 10
+        assert handler.messages[0] == "msg 0"
+
+    def test_drop_old_keeps_latest(self):
+        """测试drop_old策略保留最新的日志"""
+        handler = BlockingHandler()
+        pipeline = LogPipeline(capacity=3, overflow_policy="drop_old", batch_size=1, flush_interval=0.01)
+        logger = make_logger("test.pipeline.drop_old", pipeline, handler)
+        for i in range(10):
+            logger.info("msg %d", i)
+        handler.gate.set()
+        pipeline.stop()
+        assert handler.messages[-1] == "msg 9"
+
+    def test_args_merged_at_call_time(self):
+        """测试日志参数在调用时合并，后续修改不影响输出"""
+        handler = BlockingHandler()
+        handler.gate.set()
+        pipeline = LogPipeline(flush_interval=0.01)
+        logger = make_logger("test.pipeline.args", pipeline, handler)
+        data = {"status": 200}
+        logger.info("data %s", data)
+        data["status"] = 500
+        pipeline.stop()
+        assert handler.messages == ["data {'status': 200}"]
+
+    def test_closed_stream_skipped(self):
+        """测试输出流已关闭时（如退出阶段）跳过该处理器，不逐条报错"""
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        errors = []
+        handler.handleError = errors.append
+        pipeline = LogPipeline(flush_interval=0.01)
+        logger = make_logger("test.pipeline.closed", pipeline, handler)
+        logger.info("before")
+        pipeline.stop()
+        written = stream.getvalue()
+        stream.close()
+        logger.info("after")
+        assert written == "before\n"
+        assert errors == []
@@ -0,0 +1,444 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from jose import jwt
+from sqlalchemy import select
+from fastapi import WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.deps import get_async_current_doctor
+from app.core.hashing import PasswordHasher, set_password_hasher
+from app.core.messaging import (
+    CLOSE_SLOW_CONSUMER, DOCTOR, USER, MemoryBroker, MemoryIdAllocator, MemoryPresence, MessageGateway,
+    MessageWriter, MessagingError, Participant, RedisBroker, RedisIdAllocator, RedisPresence
+)
+from app.core.security import verify_token
+from app.models.auth import User
+from app.models.medical import Conversation, Doctor, DoctorAccount, Message, UserDoctorRelation
+from app.services.auth_service import AuthService
+from app.services.medical_service import MedicalService
+from tests.query_count import assert_queries
+
+PATIENT = Participant(USER, 1)
+DOCTOR_1 = Participant(DOCTOR, 1)
+
+
+class FakeSocket:
+    """模拟WebSocket：inbox中为客户端发来的事件（None表示断开），sent记录服务端发出的事件"""
+
+    def __init__(self, stalled: bool = False):
+        self.inbox = asyncio.Queue()
+        self.sent = []
+        self.stalled = stalled
+        self.close_code = None
+
+    async def receive_json(self):
+        data = await self.inbox.get()
+        if data is None:
+            raise WebSocketDisconnect(1000)
+        return data
+
+    async def send_json(self, data):
+        if self.stalled:
+            # 客户端不再读取，发送一直阻塞
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+    def events(self, kind):
+        return [event for event in self.sent if event["type"] == kind]
+
+
+async def until(predicate, timeout: float = 2.0):
+    """等待条件成立（事件经队列和发送协程异步送达）"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def env(database):
+    """内存数据库；两个网关共享代理、在线状态和ID分配器，模拟两个worker"""
+    async def seed(db):
+        for user_id in (1, 2):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+        db.add(Doctor(id=1, name="李医生", title="主任医师", department="老年科", hospital="市一院", status=1))
+        db.add(Doctor(id=2, name="王医生", title="主治医师", department="老年科", hospital="市一院", status=0))
+        db.add(Doctor(id=3, name="张医生", title="主治医师", department="心内科", hospital="市一院", status=1))
+        for user_id, doctor_id in ((1, 1), (2, 1), (1, 2)):
+            db.add(UserDoctorRelation(user_id=user_id, doctor_id=doctor_id, relation_type=1, status=1))
+
+    env = database(User, Doctor, UserDoctorRelation, Conversation, Message, seed=seed)
+    broker, presence, ids = MemoryBroker(), MemoryPresence(), MemoryIdAllocator()
+
+    def gateway(queue_size: int = 100) -> MessageGateway:
+        return MessageGateway(
+            env.factory, broker, presence, ids, MessageWriter(env.factory, flush_interval=60), queue_size=queue_size
+        )
+
+    env.presence = presence
+    env.gateway = gateway
+    return env
+
+
+class TestMessageGateway:
+    def test_fan_out_across_workers(self, env):
+        """测试不同worker上的医患互发消息、多端同步、已读回执，消息和会话变更一批写库"""
+        worker_a, worker_b = env.gateway(), env.gateway()
+
+        async def scenario():
+            await worker_a.start()
+            await worker_b.start()
+            phone, tablet, doctor = FakeSocket(), FakeSocket(), FakeSocket()
+            tasks = [
+                asyncio.create_task(worker_a.serve(phone, PATIENT)),
+                asyncio.create_task(worker_b.serve(tablet, PATIENT)),
+                asyncio.create_task(worker_b.serve(doctor, DOCTOR_1)),
+            ]
+            await until(lambda: worker_b.is_connected(DOCTOR_1) and worker_a.is_connected(PATIENT))
+
+            for i in range(3):
+                await phone.inbox.put({"type": "message", "to": 1, "content": f"医生好{i}", "client_id": f"c{i}"})
+            await until(lambda: len(doctor.events("message")) == 3 and len(phone.events("ack")) == 3)
+            await until(lambda: len(tablet.events("message")) == 3)
+            with assert_queries(env.engine, 3):  # 锁会话读已读线 + 一条多行INSERT + 一条会话UPDATE
+                written = await worker_a.writer.flush()
+            sent = await env.rows(Conversation, Conversation.last_message_id, Conversation.unread_count_doctor)
+
+            last_id = doctor.events("message")[-1]["message"]["id"]
+            await doctor.inbox.put({"type": "read", "conversation_id": 1, "up_to": last_id})
+            await doctor.inbox.put({"type": "message", "to": 1, "content": "您好，哪里不舒服？"})
+            await until(lambda: len(phone.events("message")) == 1 and phone.events("read"))
+            await until(lambda: len(tablet.events("message")) == 4)
+            await worker_b.writer.flush()
+            read = await env.rows(
+                Conversation, Conversation.last_message_id, Conversation.unread_count_user,
+                Conversation.unread_count_doctor
+            )
+            messages = await env.rows(Message, Message.sender_type, Message.is_read)
+
+            for socket in (phone, tablet, doctor):
+                await socket.inbox.put(None)
+            await asyncio.gather(*tasks)
+            await worker_a.stop()
+            await worker_b.stop()
+            return phone, tablet, doctor, written, sent, read, messages
+
+        phone, tablet, doctor, written, sent, read, messages = env.run(scenario())
+        acks = phone.events("ack")
+        assert [ack["client_id"] for ack in acks] == ["c0", "c1", "c2"]
+        ids = [ack["message"]["id"] for ack in acks]
+        assert ids == sorted(ids) and [m["message"]["id"] for m in doctor.events("message")] == ids
+        # 发送端自己的连接只收到ack，不重复收到消息
+        assert [m["message"]["sender_type"] for m in phone.events("message")] == [DOCTOR]
+        assert phone.events("read")[0]["up_to"] == ids[-1]
+
+        assert written == 3
+        assert sent == {1: (ids[-1], 3)}
+        reply_id = phone.events("message")[0]["message"]["id"]
+        assert read == {1: (reply_id, 1, 0)}
+        assert messages == {**{i: (USER, 1) for i in ids}, reply_id: (DOCTOR, 0)}
+
+    def test_slow_connection(self, env):
+        """测试不读取的连接发送队列写满后被断开，不影响发送方和同一用户的其他连接"""
+        gateway = env.gateway(queue_size=2)
+
+        async def scenario():
+            await gateway.start()
+            stalled, fast, doctor = FakeSocket(stalled=True), FakeSocket(), FakeSocket()
+            tasks = [
+                asyncio.create_task(gateway.serve(stalled, PATIENT)),
+                asyncio.create_task(gateway.serve(fast, PATIENT)),
+                asyncio.create_task(gateway.serve(doctor, DOCTOR_1)),
+            ]
+            await until(lambda: gateway.stats()["connections"] == 3)
+            for i in range(6):
+                await doctor.inbox.put({"type": "message", "to": 1, "content": f"第{i}条"})
+                await until(lambda: len(fast.events("message")) == i + 1)
+            await until(lambda: len(doctor.events("ack")) == 6)
+            await asyncio.wait_for(tasks[0], timeout=1)
+            stats = gateway.stats()
+            for socket in (fast, doctor):
+                await socket.inbox.put(None)
+            await asyncio.gather(*tasks[1:])
+            await gateway.stop()
+            return stalled, stats
+
+        stalled, stats = env.run(scenario())
+        assert stalled.close_code == CLOSE_SLOW_CONSUMER
+        assert stats["slow_closed"] == 1 and stats["connections"] == 2
+        assert stats["writer"]["pending"] == 6
+
+    def test_presence(self, env):
+        """测试医生在多个worker上有连接时，最后一个连接断开才更新为离线"""
+        worker_a, worker_b = env.gateway(), env.gateway()
+
+        async def online_status():
+            await worker_a.writer.flush()
+            await worker_b.writer.flush()
+            return (await env.rows(Doctor, Doctor.online_status))[1][0]
+
+        async def scenario():
+            await worker_a.start()
+            await worker_b.start()
+            first, second = FakeSocket(), FakeSocket()
+            task_a = asyncio.create_task(worker_a.serve(first, DOCTOR_1))
+            task_b = asyncio.create_task(worker_b.serve(second, DOCTOR_1))
+            await until(lambda: worker_a.is_connected(DOCTOR_1) and worker_b.is_connected(DOCTOR_1))
+            both = await online_status()
+            await first.inbox.put(None)
+            await task_a
+            one = await online_status()
+            await second.inbox.put(None)
+            await task_b
+            none = await online_status()
+            await worker_a.stop()
+            await worker_b.stop()
+            return both, one, none, await env.presence.online([DOCTOR_1.key])
+
+        assert env.run(scenario()) == (1, 1, 0, set())
+
+    def test_errors(self, env):
+        """测试无效消息、禁用的医生、没有医患关系、别人的会话返回error事件，连接保持可用"""
+        gateway = env.gateway()
+
+        async def scenario():
+            await gateway.start()
+            await gateway.send_message(Participant(USER, 2), _message(to=1))
+            socket = FakeSocket()
+            task = asyncio.create_task(gateway.serve(socket, PATIENT))
+            for event in (
+                {"type": "message", "to": 1, "content": " ", "client_id": "empty"},
+                {"type": "message", "to": 2, "content": "在吗", "client_id": "disabled"},
+                {"type": "message", "to": 3, "content": "在吗", "client_id": "stranger"},
+                {"type": "read", "conversation_id": 1, "up_to": 1},
+                {"type": "typing"},
+                {"type": "ping"},
+            ):
+                await socket.inbox.put(event)
+            await until(lambda: socket.events("pong"))
+            await socket.inbox.put(None)
+            await task
+            await gateway.stop()
+            return socket
+
+        socket = env.run(scenario())
+        errors = socket.events("error")
+        assert [error["client_id"] for error in errors] == ["empty", "disabled", "stranger", None, None]
+        assert errors[1]["detail"] == "医生不存在"
+        assert errors[2]["detail"] == "未建立医患关系"
+        assert errors[3]["detail"] == "会话不存在"
+
+
+def _message(to: int, content: str = "你好"):
+    from app.schemas.medical import MessageSend
+    return MessageSend(to=to, content=content)
+
+
+def _row(message_id: int, receiver_type: str = DOCTOR):
+    sender_type = USER if receiver_type == DOCTOR else DOCTOR
+    return {
+        "id": message_id, "conversation_id": 1, "sender_id": 1, "sender_type": sender_type,
+        "receiver_id": 1, "receiver_type": receiver_type, "content": "你好", "message_type": 1,
+        "media_url": None, "media_duration": None, "is_read": 0, "created_at": datetime(2024, 3, 6, 12)
+    }
+
+
+class TestMessageWriter:
+    def test_retry_and_ordering(self, env):
+        """测试写库失败时保留重试，已提交的消息重试时不重复计未读，最后消息只前进不后退"""
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 2:
+                raise ConnectionError("database gone")
+            return env.factory()
+
+        writer = MessageWriter(flaky_factory, flush_interval=60)
+
+        async def scenario():
+            async with env.factory() as db:
+                db.add(Conversation(id=1, user_id=1, doctor_id=1))
+                await db.commit()
+            await writer.start()
+            await writer.add(_row(6))
+            await writer.flush()
+            # 另一个worker较早分配的消息较晚提交
+            await writer.add(_row(5))
+            await writer.add(_row(4, receiver_type=USER))
+            with pytest.raises(ConnectionError):
+                await writer.flush()
+            pending = writer.pending
+            # 上次已提交但未确认的消息被再次提交
+            await writer.add(_row(6))
+            await writer.stop()
+            return pending
+
+        assert env.run(scenario()) == 2
+        conversation = env.run(env.rows(
+            Conversation, Conversation.last_message_id, Conversation.unread_count_doctor,
+            Conversation.unread_count_user
+        ))
+        assert conversation == {1: (6, 2, 1)}
+        stats = writer.stats()
+        assert stats["written"] == 3 and stats["duplicates"] == 1 and stats["failures"] == 1
+
+    def test_read_before_message_across_workers(self, env):
+        """测试已读先于它覆盖的消息写库（消息在另一个worker的缓冲中）：消息按已读写入，不计未读"""
+        worker_a = MessageWriter(env.factory, flush_interval=60)
+        worker_b = MessageWriter(env.factory, flush_interval=60)
+
+        async def scenario():
+            async with env.factory() as db:
+                db.add(Conversation(id=1, user_id=1, doctor_id=1))
+                await db.commit()
+            await worker_a.start()
+            await worker_b.start()
+            await worker_a.add(_row(4, receiver_type=USER))
+            await worker_a.add(_row(5))
+            await worker_a.add(_row(6, receiver_type=USER))
+            # 用户已读到消息5，已读由worker_b先写库
+            worker_b.mark_read(1, USER, 5)
+            await worker_b.flush()
+            await worker_a.flush()
+            # 较旧的已读线不会让已读线后退
+            worker_b.mark_read(1, USER, 3)
+            await worker_b.flush()
+            await worker_a.stop()
+            await worker_b.stop()
+
+        env.run(scenario())
+        conversation = env.run(env.rows(
+            Conversation, Conversation.last_read_id_user, Conversation.unread_count_user,
+            Conversation.unread_count_doctor
+        ))
+        assert conversation == {1: (5, 1, 1)}
+        messages = env.run(env.rows(Message, Message.is_read))
+        assert messages == {4: (True,), 5: (False,), 6: (False,)}
+
+
+    def test_full_buffer_rejects(self, env):
+        """测试缓冲区满且写库失败时拒绝登记新消息（不会先登记再报错，客户端重试不产生重复）"""
+        def broken_factory():
+            raise ConnectionError("database gone")
+
+        writer = MessageWriter(broken_factory, flush_interval=60, max_pending=1)
+        message = {"id": 1, "conversation_id": 1}
+
+        async def scenario():
+            await writer.start()
+            await writer.add(message)
+            with pytest.raises(MessagingError):
+                await writer.add(dict(message, id=2))
+            pending = writer.pending
+            await writer.stop()
+            return pending
+
+        assert env.run(scenario()) == 1
+
+
+class TestRedisBackends:
+    def test_shared_state(self):
+        """测试Redis分配的消息ID全局递增且不低于播种值，连接数在worker间汇总，事件经发布订阅转发"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+
+        def client():
+            return fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+        async def scenario():
+            ids_a, ids_b = RedisIdAllocator(client()), RedisIdAllocator(client())
+            await ids_a.seed(100)
+            await ids_b.seed(50)
+            allocated = [await ids_a.next(), await ids_b.next(), await ids_a.next()]
+
+            presence_a, presence_b = RedisPresence(client()), RedisPresence(client())
+            counts = [await presence_a.connect("doctor:1"), await presence_b.connect("doctor:1")]
+            counts.append(await presence_a.disconnect("doctor:1"))
+            online = await presence_b.online(["doctor:1", "doctor:2"])
+            counts.append(await presence_b.disconnect("doctor:1"))
+
+            received = []
+
+            async def handler(event):
+                received.append(event)
+
+            publisher, subscriber = RedisBroker(client()), RedisBroker(client())
+            await subscriber.subscribe(handler)
+            await publisher.publish({"targets": ["user:1"], "event": {"type": "message", "content": "你好"}})
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.02)
+            await subscriber.close()
+            await publisher.close()
+            return allocated, counts, online, received
+
+        allocated, counts, online, received = asyncio.run(scenario())
+        assert allocated == [101, 102, 103]
+        assert counts == [1, 2, 1, 0]
+        assert online == {"doctor:1"}
+        assert received == [{"targets": ["user:1"], "event": {"type": "message", "content": "你好"}}]
+
+
+class TestSocketAuth:
+    def test_tokens(self, env):
+        """测试用户令牌和带role=doctor的医生令牌，医生令牌不能当作用户令牌，禁用的医生不能连接"""
+        def token(sub, **claims):
+            return jwt.encode({"sub": str(sub), **claims}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+        async def scenario():
+            async with env.factory() as db:
+                return [
+                    await MedicalService.socket_participant(db, token(1)),
+                    await MedicalService.socket_participant(db, token(1, role=DOCTOR)),
+                    await MedicalService.socket_participant(db, token(2, role=DOCTOR)),
+                    await MedicalService.socket_participant(db, token(1, role="admin")),
+                    await MedicalService.socket_participant(db, "not-a-token"),
+                ]
+
+        assert env.run(scenario()) == [PATIENT, DOCTOR_1, None, None, None]
+        assert verify_token(token(1)) == "1"
+        assert verify_token(token(1, role=DOCTOR)) is None
+
+    def test_doctor_login(self, database):
+        """测试医生账号登录签发role=doctor的令牌，可用于医生端接口和WebSocket；密码错误或医生已禁用时登录失败"""
+        hasher = PasswordHasher(rounds=4, executor="inline")
+        set_password_hasher(hasher)
+
+        async def seed(db):
+            db.add(Doctor(id=1, name="李医生", title="主任医师", department="老年科", hospital="市一院", status=1))
+            db.add(Doctor(id=2, name="王医生", title="主治医师", department="老年科", hospital="市一院", status=0))
+            for doctor_id, username in ((1, "li"), (2, "wang")):
+                db.add(DoctorAccount(doctor_id=doctor_id, username=username, password_hash=await hasher.hash("secret")))
+
+        env = database(Doctor, DoctorAccount, seed=seed)
+
+        async def scenario():
+            async with env.factory() as db:
+                failed = [
+                    await MedicalService.authenticate_doctor(db, "li", "wrong-pass"),
+                    await MedicalService.authenticate_doctor(db, "wang", "secret"),
+                    await MedicalService.authenticate_doctor(db, "zhang", "secret"),
+                ]
+                doctor = await MedicalService.authenticate_doctor(db, "li", "secret")
+                token = AuthService.create_access_token(doctor.id, role=DOCTOR).access_token
+                current = await get_async_current_doctor(db=db, token=token)
+                participant = await MedicalService.socket_participant(db, token)
+                account = (await db.execute(select(DoctorAccount).where(DoctorAccount.doctor_id == 1))).scalar_one()
+                return failed, current.id, participant, account.last_login_time, verify_token(token)
+
+        try:
+            failed, current, participant, last_login, as_user = env.run(scenario())
+        finally:
+            set_password_hasher(None)
+        assert failed == [None, None, None]
+        assert current == 1 and participant == DOCTOR_1
+        assert last_login is not None
+        assert as_user is None
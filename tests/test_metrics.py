@@ -0,0 +1,79 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.metrics import generate_metrics, track_outcome
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestTrackOutcome:
+    def test_outcomes(self):
+        """测试成功、失败、业务拒绝和异常分别计数"""
+        @track_outcome("test_op")
+        async def op(result=None, error=None):
+            if error is not None:
+                raise error
+            return result
+
+        before = {o: sample("auth_operations_total", {"operation": "test_op", "outcome": o})
+                  for o in ("success", "failure", "http_400", "error")}
+
+        asyncio.run(op(result=object()))
+        asyncio.run(op(result=False))
+        with pytest.raises(HTTPException):
+            asyncio.run(op(error=HTTPException(status_code=400, detail="验证码无效")))
+        with pytest.raises(RuntimeError):
+            asyncio.run(op(error=RuntimeError("boom")))
+
+        for outcome in before:
+            after = sample("auth_operations_total", {"operation": "test_op", "outcome": outcome})
+            assert after - before[outcome] == 1
+
+
+class TestMetricsEndpoint:
+    def test_route_template_labels(self):
+        """测试请求按路由模板和状态码统计"""
+        import main
+
+        client = TestClient(main.app)
+        labels = {"method": "GET", "route": "/hello", "status": "200"}
+        before = sample("http_requests_total", labels)
+        client.get("/hello")
+        client.get("/no-such-path")
+        assert sample("http_requests_total", labels) - before == 1
+        assert sample("http_requests_total", {"method": "GET", "route": "unmatched", "status": "404"}) >= 1
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/hello",status="200"}' in body
+        assert "http_requests_in_progress" in body
+        assert "db_pool_size" in body
+
+    def test_multiprocess_aggregation(self, tmp_path):
+        """测试多个worker进程的指标写入共享目录后被汇总"""
+        script = (
+            "from app.core.metrics import record_request, HTTP_IN_PROGRESS\n"
+            "record_request('GET', '/hello', 200, 0.01)\n"
+            "HTTP_IN_PROGRESS.labels('GET').inc()\n"
+        )
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", script], env=env, cwd=root, check=True)
+
+        content, _ = generate_metrics(str(tmp_path))
+        text = content.decode()
+        assert 'http_requests_total{method="GET",route="/hello",status="200"} 2.0' in text
+        # 两个进程的在途请求之和
+        assert 'http_requests_in_progress{method="GET"} 2.0' in text
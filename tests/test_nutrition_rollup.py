@@ -0,0 +1,165 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.core.food_catalog import FoodCatalog, set_food_catalog
+from app.core.periodic import PeriodicTask
+from app.models.auth import User
+from app.models.nutrition import FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, ProteinSupplement
+from app.schemas.nutrition import MealCreate, SupplementCreate
+from app.services.nutrition_service import NutritionService
+
+DAY = date(2024, 3, 1)
+
+
+@pytest.fixture
+def run(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        db.add(User(id=1, phone="13800138000", password_hash="x", status=1))
+        db.add(FoodItem(id=1, name="鸡胸肉", category="肉类", protein_per_100g=20, calories_per_100g=130))
+
+    env = database(
+        User, FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, ProteinSupplement, seed=seed
+    )
+    set_food_catalog(FoodCatalog())
+    yield env
+    set_food_catalog(None)
+
+
+def meal(grams, hour=12, day=1):
+    return MealCreate(meal_type=2, meal_time=datetime(2024, 3, day, hour), items=[{"food_item_id": 1, "quantity": grams}])
+
+
+async def daily(db, day=DAY):
+    return await NutritionService.get_daily_record(db, 1, day)
+
+
+class TestDailyRollup:
+    def test_meal_lifecycle(self, run):
+        """测试餐食新增、修改、跨天移动和删除时汇总增量更新"""
+        async def scenario(db):
+            m1 = await NutritionService.create_meal(db, 1, meal(100))
+            await NutritionService.create_meal(db, 1, meal(200, hour=18))
+            assert (await daily(db))["total_protein"] == 60
+
+            await NutritionService.update_meal(db, 1, m1.id, meal(150))
+            record = await daily(db)
+            assert record["total_protein"] == 70
+            assert record["total_calories"] == pytest.approx(455)
+
+            # 改到第二天
+            await NutritionService.update_meal(db, 1, m1.id, meal(150, day=2))
+            assert (await daily(db))["total_protein"] == 40
+            assert (await daily(db, date(2024, 3, 2)))["total_protein"] == 30
+
+            assert await NutritionService.delete_meal(db, 1, m1.id)
+            assert (await daily(db, date(2024, 3, 2)))["total_protein"] == 0
+            assert not await NutritionService.delete_meal(db, 1, m1.id)
+
+        run(scenario)
+
+    def test_supplement_and_achievement(self, run):
+        """测试补充剂计入蛋白质，达标率封顶100"""
+        async def scenario(db):
+            supplement = await NutritionService.create_supplement(db, 1, SupplementCreate(
+                supplement_time=datetime(2024, 3, 1, 9), supplement_type="乳清蛋白", protein_amount=30
+            ))
+            record = await daily(db)
+            assert record["total_protein"] == 30
+            assert record["achievement_rate"] == 50
+
+            await NutritionService.create_meal(db, 1, meal(250))
+            record = await daily(db)
+            assert record["total_protein"] == 80
+            assert record["achievement_rate"] == 100
+
+            await NutritionService.update_supplement(db, 1, supplement.id, SupplementCreate(
+                supplement_time=datetime(2024, 3, 1, 9), supplement_type="乳清蛋白", protein_amount=5
+            ))
+            record = await daily(db)
+            assert record["total_protein"] == 55
+            assert record["achievement_rate"] == pytest.approx(91.67)
+
+            assert await NutritionService.delete_supplement(db, 1, supplement.id)
+            assert (await daily(db))["total_protein"] == 50
+
+        run(scenario)
+
+    def test_daily_read_is_single_query(self, run):
+        """测试每日状态只读一行，不汇总当天的餐食"""
+        async def scenario(db):
+            for hour in range(6, 20):
+                await NutritionService.create_meal(db, 1, meal(10, hour=hour))
+            run.queries.clear()
+            record = await daily(db)
+            return record
+
+        record = run(scenario)
+        assert record["total_protein"] == 28
+        assert len(run.queries) == 1
+        assert "FROM nutrition_records" in run.queries[0]
+
+    def test_empty_day(self, run):
+        """测试没有记录的日期返回目标值和0"""
+        record = run(daily)
+        assert record["total_protein"] == 0
+        assert record["protein_target"] > 0
+
+
+class TestReconcile:
+    def test_repair_drift(self, run):
+        """测试校对修复偏差、补建缺失行、清零无来源的行"""
+        async def scenario(db):
+            await NutritionService.create_meal(db, 1, meal(100))
+            await NutritionService.create_meal(db, 1, meal(100, day=2))
+            # 模拟偏差: 第1天被改错，第2天的行丢失，第3天有多余的行
+            await db.execute(update(NutritionRecord).where(NutritionRecord.record_date == DAY).values(total_protein=99))
+            await db.execute(NutritionRecord.__table__.delete().where(NutritionRecord.record_date == date(2024, 3, 2)))
+            db.add(NutritionRecord(user_id=1, record_date=date(2024, 3, 3), total_protein=5, total_calories=0,
+                                   protein_target=60, calories_target=1800, achievement_rate=0))
+            await db.commit()
+
+            stats = await NutritionService.reconcile_daily_records(db, DAY, date(2024, 3, 3))
+            assert stats == {"checked": 2, "fixed": 2, "skipped": 0, "created": 1}
+            assert (await daily(db))["total_protein"] == 20
+            assert (await daily(db, date(2024, 3, 2)))["total_protein"] == 20
+            assert (await daily(db, date(2024, 3, 3)))["total_protein"] == 0
+
+            stats = await NutritionService.reconcile_daily_records(db, DAY, date(2024, 3, 3))
+            assert stats["fixed"] == 0 and stats["created"] == 0
+
+        run(scenario)
+
+
+class TestPeriodicTask:
+    def test_run_once_stats(self):
+        """测试执行统计和失败计数"""
+        calls = []
+
+        async def job():
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            return {"fixed": 0}
+
+        task = PeriodicTask("test", 60, job)
+
+        async def scenario():
+            await task.run_once()
+            with pytest.raises(RuntimeError):
+                await task.run_once()
+
+        asyncio.run(scenario())
+        stats = task.stats()
+        assert stats["runs"] == 2
+        assert stats["failures"] == 1
+        assert stats["last_result"] == {"fixed": 0}
+
+    def test_disabled(self):
+        """测试间隔为0时不启动"""
+        task = PeriodicTask("test", 0, None)
+        asyncio.run(task.start())
+        assert not task.running
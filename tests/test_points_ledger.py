@@ -0,0 +1,261 @@
+import asyncio
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core.leaderboard import ALL_TIME, Leaderboard, MemoryLeaderboardStore
+from app.core.points_ledger import RECORD_DIET, RECORD_EXERCISE, PointsLedger
+from app.models.auth import User
+from app.models.social import PointRecord, UserPoint
+
+DAY = date(2024, 3, 6)
+
+
+@pytest.fixture
+def env(database):
+    """内存数据库，附带读取积分和积分记录的辅助函数"""
+    async def seed(db):
+        for user_id in (1, 2, 3):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+        db.add(UserPoint(user_id=1, total_points=100, available_points=40))
+
+    env = database(User, UserPoint, PointRecord, seed=seed)
+
+    async def points():
+        async with env.factory() as db:
+            rows = await db.execute(select(UserPoint.user_id, UserPoint.total_points, UserPoint.available_points))
+            return {row[0]: (row[1], row[2]) for row in rows}
+
+    async def records():
+        async with env.factory() as db:
+            return (await db.execute(select(PointRecord).order_by(PointRecord.id))).scalars().all()
+
+    env.points = points
+    env.records = records
+    return env
+
+
+class TestPointsLedger:
+    def test_batched_write(self, env):
+        """测试多个事件合并为锁积分行、一次查询、一条多行插入和一条汇总累加，并同步到排行榜"""
+        leaderboard = Leaderboard(MemoryLeaderboardStore(), today=lambda: DAY)
+        ledger = PointsLedger(env.factory, leaderboard=leaderboard, flush_interval=60)
+
+        async def scenario():
+            await ledger.start()
+            for meal_id in (1, 2, 3):
+                await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", meal_id)
+            await ledger.award(2, 5, RECORD_EXERCISE, "完成运动", "exercise_record", 1)
+            await ledger.award(3, 1, RECORD_DIET, "其他")
+            env.queries.clear()
+            written = await ledger.flush()
+            queries = list(env.queries)
+            await ledger.stop()
+            return written, queries, await leaderboard.top(ALL_TIME, 10)
+
+        written, queries, top = env.run(scenario())
+        assert written == 5
+        assert [sql.split()[0].upper() for sql in queries] == ["SELECT", "SELECT", "INSERT", "INSERT"]
+        assert env.run(env.points()) == {1: (106, 46), 2: (5, 5), 3: (1, 1)}
+        assert len(env.run(env.records())) == 5
+        assert [(entry["user_id"], entry["points"]) for entry in top] == [(1, 6), (2, 5), (3, 1)]
+        stats = ledger.stats()
+        assert stats["batches"] == 1 and stats["written"] == 5 and stats["pending"] == 0
+
+    def test_idempotent(self, env):
+        """测试同一关联事件在缓冲区中和写库后重复登记都只发放一次"""
+        ledger = PointsLedger(env.factory, flush_interval=60)
+
+        async def scenario():
+            await ledger.start()
+            first = await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 7)
+            again = await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 7)
+            await ledger.flush()
+            # 接口重试：事件已写库，再次登记会在写库前被过滤
+            retried = await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 7)
+            # 关联ID相同但属于其他用户的不是同一事件
+            await ledger.award(2, 2, RECORD_DIET, "记录饮食", "meal", 7)
+            written = await ledger.flush()
+            await ledger.stop()
+            return first, again, retried, written
+
+        first, again, retried, written = env.run(scenario())
+        assert (first, again, retried, written) == (True, False, True, 1)
+        assert env.run(env.points()) == {1: (102, 42), 2: (2, 2)}
+        stats = ledger.stats()
+        assert stats["deduplicated"] == 1 and stats["duplicates"] == 1
+
+    def test_revoke(self, env):
+        """测试删除记录时扣回原事件发放的积分：同批和已写库的都能撤销，只撤销一次，未发放的记0积分"""
+        ledger = PointsLedger(env.factory, flush_interval=60)
+
+        async def scenario():
+            await ledger.start()
+            await ledger.award(2, 5, RECORD_DIET, "记录饮食", "meal", 1)
+            await ledger.flush()
+            await ledger.revoke(2, RECORD_DIET, "删除饮食记录", "meal", 1)
+            # 同一批中先发放后撤销
+            await ledger.award(2, 3, RECORD_EXERCISE, "完成运动", "exercise_record", 1)
+            await ledger.revoke(2, RECORD_EXERCISE, "删除运动记录", "exercise_record", 1)
+            # 从未发放的不扣，只留下撤销记录
+            await ledger.revoke(2, RECORD_DIET, "删除饮食记录", "meal", 2)
+            await ledger.flush()
+            again = await ledger.revoke(2, RECORD_DIET, "删除饮食记录", "meal", 1)
+            await ledger.flush()
+            await ledger.stop()
+            return again
+
+        assert env.run(scenario()) is True
+        assert env.run(env.points()) == {1: (100, 40), 2: (0, 0)}
+        records = [(record.reference_type, record.points) for record in env.run(env.records())]
+        assert records == [
+            ("meal", 5), ("meal:revoke", -5), ("exercise_record", 3), ("exercise_record:revoke", -3),
+            ("meal:revoke", 0)
+        ]
+
+    def test_revoke_before_award_across_workers(self, env):
+        """测试发放和撤销分属两个worker、撤销先写库时，原事件写入后按0积分入账"""
+        leaderboard = Leaderboard(MemoryLeaderboardStore(), today=lambda: DAY)
+        worker_a = PointsLedger(env.factory, leaderboard=leaderboard, flush_interval=60)
+        worker_b = PointsLedger(env.factory, leaderboard=leaderboard, flush_interval=60)
+
+        async def scenario():
+            await worker_a.start()
+            await worker_b.start()
+            for meal_id in (1, 2):
+                await worker_a.award(2, 5, RECORD_DIET, "记录饮食", "meal", meal_id)
+                await worker_b.revoke(2, RECORD_DIET, "删除饮食记录", "meal", meal_id)
+            await worker_b.flush()
+            await worker_a.flush()
+            await worker_a.stop()
+            await worker_b.stop()
+            return await leaderboard.top(ALL_TIME, 10)
+
+        assert env.run(scenario()) == []
+        assert 2 not in env.run(env.points())
+        records = [(record.reference_type, record.points) for record in env.run(env.records())]
+        assert records == [("meal:revoke", 0), ("meal:revoke", 0), ("meal", 0), ("meal", 0)]
+
+    def test_bounded_lag(self, env):
+        """测试后台按间隔写入，攒满一批时立即写入，关闭时写完缓冲区"""
+        ledger = PointsLedger(env.factory, flush_interval=0.05, batch_size=3)
+
+        async def scenario():
+            await ledger.start()
+            await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)
+            await asyncio.sleep(0.3)
+            after_interval = ledger.stats()["written"]
+
+            ledger.flush_interval = 60
+            await asyncio.sleep(0.1)
+            for meal_id in (2, 3, 4):
+                await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", meal_id)
+            await asyncio.sleep(0.1)
+            after_full = ledger.stats()["written"]
+
+            await ledger.award(2, 5, RECORD_EXERCISE, "完成运动", "exercise_record", 1)
+            await ledger.stop()
+            return after_interval, after_full
+
+        after_interval, after_full = env.run(scenario())
+        assert after_interval == 1
+        assert after_full == 4
+        assert env.run(env.points()) == {1: (108, 48), 2: (5, 5)}
+        assert ledger.stats()["lag_max_ms"] > 0
+
+    def test_retry_after_failure(self, env):
+        """测试写库失败时事件留在缓冲区，下次写入不丢失也不重复"""
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("database gone")
+            return env.factory()
+
+        ledger = PointsLedger(flaky_factory, flush_interval=60)
+
+        async def scenario():
+            await ledger.start()
+            await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)
+            with pytest.raises(ConnectionError):
+                await ledger.flush()
+            pending = ledger.stats()["pending"]
+            duplicate = await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)
+            written = await ledger.flush()
+            await ledger.stop()
+            return pending, duplicate, written
+
+        assert env.run(scenario()) == (1, False, 1)
+        assert env.run(env.points())[1] == (102, 42)
+        assert ledger.stats()["failures"] == 1
+
+    def test_backpressure_failure(self, env):
+        """测试缓冲区满时写库失败不向调用方抛出（调用方的记录已提交），事件留待重试"""
+        calls = []
+
+        def flaky_factory():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("database gone")
+            return env.factory()
+
+        ledger = PointsLedger(flaky_factory, flush_interval=60, max_pending=2)
+
+        async def scenario():
+            await ledger.start()
+            await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)
+            accepted = await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 2)
+            pending = ledger.stats()["pending"]
+            written = await ledger.flush()
+            await ledger.stop()
+            return accepted, pending, written
+
+        assert env.run(scenario()) == (True, 2, 2)
+        assert env.run(env.points())[1] == (104, 44)
+
+    def test_concurrent_duplicate(self, tmp_path):
+        """测试其他worker在查询之后写入了同一事件时，唯一索引冲突的事件被忽略，其余照常发放"""
+        pytest.importorskip("aiosqlite")
+        path = str(tmp_path / "points.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        raced = []
+
+        def other_worker(conn, cursor, statement, *args):
+            if statement.startswith("SELECT") and "point_records" in statement and not raced:
+                raced.append(statement)
+                with sqlite3.connect(path) as other:
+                    other.execute(
+                        "INSERT INTO point_records (user_id, points, record_type, description, reference_id, "
+                        "reference_type) VALUES (1, 2, 1, '记录饮食', 1, 'meal')"
+                    )
+
+        async def scenario():
+            async with engine.begin() as conn:
+                for model in (User, UserPoint, PointRecord):
+                    await conn.run_sync(model.__table__.create)
+            factory = async_sessionmaker(engine, expire_on_commit=False)
+            event.listen(engine.sync_engine, "after_cursor_execute", other_worker)
+            ledger = PointsLedger(factory, flush_interval=60)
+            await ledger.start()
+            await ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)
+            await ledger.award(1, 3, RECORD_DIET, "记录饮食", "meal", 2)
+            await ledger.award(1, 1, RECORD_DIET, "其他")
+            written = await ledger.flush()
+            await ledger.stop()
+            async with factory() as db:
+                total = (await db.execute(select(UserPoint.total_points))).scalar_one()
+                count = len((await db.execute(select(PointRecord.id))).all())
+            await engine.dispose()
+            return written, total, count
+
+        assert asyncio.run(scenario()) == (2, 4, 3)
+
+    def test_not_started(self, env):
+        """测试未启动时不登记"""
+        ledger = PointsLedger(env.factory)
+        assert env.run(ledger.award(1, 2, RECORD_DIET, "记录饮食", "meal", 1)) is False
+        assert ledger.stats()["dropped"] == 1
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core.cache import TTLCache
+from app.core.deps import get_current_user, get_async_current_user, principal_cache
+from app.core.hashing import PasswordHasher, set_password_hasher
+from app.models.auth import User
+from app.services.auth_service import AuthService
+
+
+class TestTTLCache:
+    def test_expire_after_ttl(self, clock):
+        """测试条目过期"""
+        cache = TTLCache(maxsize=10, ttl=5, timer=clock)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        clock.now += 6
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, phone="13800138000", password_hash="x", status=1))
+    session.commit()
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    session.queries = queries
+    principal_cache.clear()
+    yield session
+    session.close()
+    principal_cache.clear()
+
+
+class TestCurrentUserCache:
+    def _token(self, user_id):
+        return AuthService.create_access_token(user_id).access_token
+
+    def test_second_request_hits_cache(self, db):
+        """测试第二次认证不再查询数据库"""
+        token = self._token(1)
+        user = get_current_user(db=db, token=token)
+        assert user.phone == "13800138000"
+        db.close()
+        db.queries.clear()
+
+        user = get_current_user(db=db, token=token)
+        assert user.phone == "13800138000"
+        assert db.queries == []
+        assert user in db
+
+    def test_status_change_invalidates(self):
+        """测试禁用用户后缓存失效（异步会话）"""
+        pytest.importorskip("aiosqlite")
+        token = self._token(1)
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            async with engine.begin() as conn:
+                await conn.run_sync(User.__table__.create)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            async with session_factory() as db:
+                db.add(User(id=1, phone="13800138000", password_hash="x", status=1))
+                await db.commit()
+            async with session_factory() as db:
+                user = await get_async_current_user(db=db, token=token)
+                assert 1 in principal_cache
+                await AuthService.update_user_status(db, user, 0)
+                assert 1 not in principal_cache
+            async with session_factory() as db:
+                with pytest.raises(HTTPException) as exc:
+                    await get_async_current_user(db=db, token=token)
+            await engine.dispose()
+            return exc.value.status_code
+
+        principal_cache.clear()
+        assert asyncio.run(scenario()) == 403
+
+    def test_change_password_checks_stored_hash(self):
+        """测试缓存中不含密码哈希，修改密码按库中最新的哈希校验原密码（其他worker重置过密码时旧密码无效）"""
+        pytest.importorskip("aiosqlite")
+        token = self._token(1)
+        hasher = PasswordHasher(rounds=4, executor="inline")
+        set_password_hasher(hasher)
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            async with engine.begin() as conn:
+                await conn.run_sync(User.__table__.create)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            async with session_factory() as db:
+                db.add(User(id=1, phone="13800138000", password_hash=await hasher.hash("old-pass"), status=1))
+                await db.commit()
+            async with session_factory() as db:
+                await get_async_current_user(db=db, token=token)
+            cached = dict(principal_cache.get(1))
+            # 模拟其他worker重置了密码（本worker的缓存未失效）
+            async with session_factory() as db:
+                user = await db.get(User, 1)
+                user.password_hash = await hasher.hash("reset-pass")
+                await db.commit()
+            results = []
+            for old, new in (("old-pass", "x-pass"), ("reset-pass", "new-pass")):
+                async with session_factory() as db:
+                    user = await get_async_current_user(db=db, token=token)
+                    results.append(await AuthService.change_password(db, user, old, new))
+            async with session_factory() as db:
+                stored = (await db.get(User, 1)).password_hash
+            await engine.dispose()
+            return cached, results, await hasher.verify("new-pass", stored)
+
+        principal_cache.clear()
+        try:
+            cached, results, changed = asyncio.run(scenario())
+        finally:
+            set_password_hasher(None)
+            principal_cache.clear()
+        assert "password_hash" not in cached
+        assert results == [False, True]
+        assert changed
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.rate_limit import (
+    MemoryRateLimitBackend, RateLimiter, RateLimitRule, RedisRateLimitBackend,
+    limit_by_ip, limit_by_phone, set_rate_limiter
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestRateLimitRule:
+    def test_parse_multiple_rules(self):
+        """测试解析多条规则"""
+        rules = RateLimitRule.parse("1/60, 10/86400")
+        assert [(r.limit, r.period) for r in rules] == [(1, 60), (10, 86400)]
+
+
+class TestMemoryBackend:
+    def test_bucket_refills(self, clock):
+        """测试令牌用尽后按速率补充"""
+        backend = MemoryRateLimitBackend(timer=clock)
+        rules = RateLimitRule.parse("2/60")
+        assert run(backend.hit("k", rules))[0] is True
+        assert run(backend.hit("k", rules))[0] is True
+        allowed, retry_after = run(backend.hit("k", rules))
+        assert allowed is False
+        assert retry_after == pytest.approx(30)
+        clock.now += 30
+        assert run(backend.hit("k", rules))[0] is True
+
+    def test_denied_request_consumes_nothing(self, clock):
+        """测试被拒绝的请求不扣减其他规则的令牌"""
+        backend = MemoryRateLimitBackend(timer=clock)
+        rules = RateLimitRule.parse("1/60,3/3600")
+        assert run(backend.hit("k", rules))[0] is True
+        for _ in range(5):
+            assert run(backend.hit("k", rules))[0] is False
+        clock.now += 60
+        assert run(backend.hit("k", rules))[0] is True
+
+
+class TestRedisBackend:
+    def test_shared_bucket(self, clock):
+        """测试Redis令牌桶在多个限流器实例间共享"""
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeServer()
+        rules = RateLimitRule.parse("2/60")
+
+        async def scenario():
+            worker_a = RedisRateLimitBackend(fakeredis.FakeAsyncRedis(server=server), timer=clock)
+            worker_b = RedisRateLimitBackend(fakeredis.FakeAsyncRedis(server=server), timer=clock)
+            results = [
+                (await worker_a.hit("k", rules))[0],
+                (await worker_b.hit("k", rules))[0],
+                await worker_a.hit("k", rules),
+            ]
+            clock.now += 30
+            results.append((await worker_b.hit("k", rules))[0])
+            return results
+
+        first, second, third, after_refill = run(scenario())
+        assert first is True and second is True
+        assert third[0] is False and third[1] == pytest.approx(30, abs=0.01)
+        assert after_refill is True
+
+
+class TestIpDependency:
+    def test_returns_429_with_retry_after(self):
+        """测试超限返回429和Retry-After"""
+        set_rate_limiter(RateLimiter(MemoryRateLimitBackend()))
+        app = FastAPI()
+
+        @app.post("/sms", dependencies=[Depends(limit_by_ip("sms", "2/60"))])
+        async def send():
+            return {"ok": True}
+
+        client = TestClient(app)
+        try:
+            assert client.post("/sms").status_code == 200
+            assert client.post("/sms").status_code == 200
+            response = client.post("/sms")
+            assert response.status_code == 429
+            assert int(response.headers["retry-after"]) == 30
+        finally:
+            set_rate_limiter(None)
+
+    def test_phone_limit_parses_once(self, monkeypatch):
+        """测试按手机号限流的规则只在生成时解析一次，不同手机号各自计数"""
+        set_rate_limiter(RateLimiter(MemoryRateLimitBackend()))
+        parsed = []
+        original = RateLimitRule.parse.__func__
+
+        def counting_parse(cls, spec):
+            parsed.append(spec)
+            return original(cls, spec)
+
+        monkeypatch.setattr(RateLimitRule, "parse", classmethod(counting_parse))
+        check = limit_by_phone("sms", "1/60")
+
+        async def scenario():
+            await check("13800138000")
+            await check("13800138001")
+            with pytest.raises(HTTPException) as exc:
+                await check("13800138000")
+            return exc.value.status_code
+
+        try:
+            assert run(scenario()) == 429
+            assert parsed == ["1/60"]
+        finally:
+            set_rate_limiter(None)
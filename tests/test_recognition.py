@@ -0,0 +1,230 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.recognition import (
+    DONE, FAILED, PENDING, FakeRecognizer, MemoryRecognitionStore, RecognitionPipeline,
+    Recognizer, RedisRecognitionStore
+)
+
+
+class GatedRecognizer(Recognizer):
+    """识别在gate打开前一直阻塞，用于构造排队和并发场景"""
+
+    def __init__(self, fail=False):
+        self.gate = asyncio.Event()
+        self.calls = 0
+        self.fail = fail
+
+    async def recognize(self, image):
+        self.calls += 1
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("service unavailable")
+        return [{"name": image.decode(), "confidence": 0.9, "calories_per_100g": None}]
+
+
+def make_pipeline(recognizer, **kwargs):
+    return RecognitionPipeline(recognizer, MemoryRecognitionStore(), **kwargs)
+
+
+class TestRecognitionPipeline:
+    def test_submit_returns_immediately(self):
+        """测试提交立即返回pending任务，完成后可查询到结果"""
+        recognizer = GatedRecognizer()
+        pipeline = make_pipeline(recognizer)
+
+        async def scenario():
+            await pipeline.start()
+            job = await pipeline.submit(1, "鸡蛋".encode())
+            assert job["status"] == PENDING
+            recognizer.gate.set()
+            done = await pipeline.wait(job["id"], timeout=1)
+            await pipeline.stop()
+            return done
+
+        done = asyncio.run(scenario())
+        assert done["status"] == DONE
+        assert done["result"][0]["name"] == "鸡蛋"
+        assert not done["cached"]
+
+    def test_cache_and_dedupe(self):
+        """测试相同图片只识别一次：并发重复挂在同一次识别上，之后的上传命中缓存"""
+        recognizer = GatedRecognizer()
+        pipeline = make_pipeline(recognizer)
+
+        async def scenario():
+            await pipeline.start()
+            first = await pipeline.submit(1, b"milk")
+            second = await pipeline.submit(2, b"milk")
+            recognizer.gate.set()
+            results = [await pipeline.wait(job["id"], timeout=1) for job in (first, second)]
+            third = await pipeline.submit(3, b"milk")
+            await pipeline.stop()
+            return results, third
+
+        results, third = asyncio.run(scenario())
+        assert recognizer.calls == 1
+        assert all(job["status"] == DONE for job in results)
+        assert third["status"] == DONE and third["cached"]
+        stats = pipeline.stats()
+        assert stats["deduplicated"] == 1
+        assert stats["cache_hits"] == 1
+        assert stats["recognized"] == 1
+
+    def test_queue_full(self):
+        """测试队列满时返回503"""
+        recognizer = GatedRecognizer()
+        pipeline = make_pipeline(recognizer, workers=1, queue_size=1)
+
+        async def scenario():
+            await pipeline.start()
+            await pipeline.submit(1, b"a")
+            await asyncio.sleep(0)  # 让worker取走第一张
+            await pipeline.submit(1, b"b")
+            with pytest.raises(HTTPException) as exc:
+                await pipeline.submit(1, b"c")
+            recognizer.gate.set()
+            await pipeline.stop()
+            return exc.value.status_code
+
+        assert asyncio.run(scenario()) == 503
+        assert pipeline.stats()["rejected"] == 1
+
+    def test_failure_not_cached(self):
+        """测试识别失败时任务标记failed，结果不缓存，可重新提交"""
+        recognizer = GatedRecognizer(fail=True)
+        pipeline = make_pipeline(recognizer)
+
+        async def scenario():
+            await pipeline.start()
+            recognizer.gate.set()
+            job = await pipeline.submit(1, b"x")
+            failed = await pipeline.wait(job["id"], timeout=1)
+            retry = await pipeline.submit(1, b"x")
+            assert retry["status"] == PENDING
+            await pipeline.wait(retry["id"], timeout=1)
+            await pipeline.stop()
+            return failed
+
+        failed = asyncio.run(scenario())
+        assert failed["status"] == FAILED and failed["error"]
+        assert recognizer.calls == 2
+
+    def test_lazy_image_source(self):
+        """测试传入读取函数时图片在worker中才读取，命中缓存时不读取"""
+        reads = []
+
+        async def load():
+            reads.append(1)
+            return b"rice"
+
+        pipeline = make_pipeline(FakeRecognizer())
+
+        async def scenario():
+            await pipeline.start()
+            job = await pipeline.submit(1, load, digest="d1", image_url="/media/meals/d1.jpg")
+            assert reads == []
+            done = await pipeline.wait(job["id"], timeout=1)
+            cached = await pipeline.submit(1, load, digest="d1")
+            await pipeline.stop()
+            return done, cached
+
+        done, cached = asyncio.run(scenario())
+        assert done["status"] == DONE and done["image_url"] == "/media/meals/d1.jpg"
+        assert cached["cached"]
+        assert reads == [1]
+        with pytest.raises(ValueError):
+            asyncio.run(pipeline.submit(1, load))
+
+    def test_stop_fails_pending_jobs(self):
+        """测试停止时未完成的任务标记为失败"""
+        pipeline = make_pipeline(GatedRecognizer())
+
+        async def scenario():
+            await pipeline.start()
+            job = await pipeline.submit(1, b"x")
+            await pipeline.stop()
+            return await pipeline.get(job["id"])
+
+        assert asyncio.run(scenario())["status"] == FAILED
+
+    def test_wait_timeout(self):
+        """测试长轮询超时返回当前状态"""
+        pipeline = make_pipeline(GatedRecognizer())
+
+        async def scenario():
+            await pipeline.start()
+            job = await pipeline.submit(1, b"x")
+            current = await pipeline.wait(job["id"], timeout=0.05)
+            missing = await pipeline.wait("missing", timeout=0.05)
+            await pipeline.stop()
+            return current, missing
+
+        current, missing = asyncio.run(scenario())
+        assert current["status"] == PENDING
+        assert missing is None
+
+
+class TestFakeRecognizer:
+    def test_deterministic(self):
+        """测试假识别器按图片内容返回确定的结果"""
+        recognizer = FakeRecognizer()
+        first = asyncio.run(recognizer.recognize(b"photo-1"))
+        assert first == asyncio.run(recognizer.recognize(b"photo-1"))
+        assert 1 <= len(first) <= 3
+        assert first[0]["name"] in FakeRecognizer.FOODS
+        assert [item["confidence"] for item in first] == sorted((item["confidence"] for item in first), reverse=True)
+
+
+class TestRedisRecognitionStore:
+    def test_shared_between_workers(self):
+        """测试任务和结果通过Redis在worker间共享"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        worker_a = RedisRecognitionStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        worker_b = RedisRecognitionStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+        async def scenario():
+            await worker_a.save_job({"id": "j1", "status": DONE, "result": [{"name": "鸡蛋"}]}, ttl=60)
+            await worker_a.save_result("abc", [{"name": "鸡蛋"}], ttl=60)
+            return await worker_b.get_job("j1"), await worker_b.get_result("abc"), await worker_b.get_job("j2")
+
+        job, result, missing = asyncio.run(scenario())
+        assert job["result"][0]["name"] == "鸡蛋"
+        assert result == [{"name": "鸡蛋"}]
+        assert missing is None
+
+
+class TestFoodMatching:
+    def test_cached_result_not_modified(self):
+        """测试匹配食物库时只修改返回的副本，缓存中的识别结果保持不变"""
+        from app.api.nutrition import _match_foods
+        from app.core.food_catalog import FoodCatalog, set_food_catalog
+        from app.core.food_search import set_food_search_index
+
+        catalog = FoodCatalog()
+        catalog.load([(7, "鸡蛋", "蛋类", 13.3, 144, 8.8, 2.8, 0)])
+        set_food_catalog(catalog)
+        set_food_search_index(None)
+        recognizer = GatedRecognizer()
+        pipeline = make_pipeline(recognizer)
+
+        async def scenario():
+            await pipeline.start()
+            job = await pipeline.submit(1, "鸡蛋".encode())
+            recognizer.gate.set()
+            done = await pipeline.wait(job["id"], timeout=1)
+            matched = await _match_foods(None, done)
+            stored = await pipeline.get(job["id"])
+            await pipeline.stop()
+            return matched, stored
+
+        try:
+            matched, stored = asyncio.run(scenario())
+        finally:
+            set_food_catalog(None)
+            set_food_search_index(None)
+        assert matched["result"][0]["food_item_id"] == 7
+        assert "food_item_id" not in stored["result"][0]
@@ -0,0 +1,178 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app.core.food_catalog import CatalogSnapshot, FoodCatalog, set_food_catalog
+from app.core.recommendation import (
+    Preferences, RecommendationEngine, gap_bucket, render_content, set_recommendation_engine
+)
+from app.models.auth import User
+from app.models.nutrition import (
+    DietRecommendation, FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, UserFoodPreference
+)
+from app.schemas.nutrition import FoodPreferenceUpdate
+from app.services.nutrition_service import NutritionService
+
+DAY = date(2024, 3, 1)
+
+# (id, 名称, 类别, 蛋白质, 热量)
+FOODS = [
+    (1, "鸡胸肉", "肉类", 24.6, 133),
+    (2, "牛腱子", "肉类", 20.2, 122),
+    (3, "猪里脊", "肉类", 19.6, 150),
+    (4, "鸡蛋", "蛋类", 13.3, 144),
+    (5, "豆腐干", "豆制品", 16.2, 140),
+    (6, "北豆腐", "豆制品", 12.2, 98),
+    (7, "虾仁", "水产", 18.6, 87),
+    (8, "米饭", "主食", 2.6, 116),
+]
+
+
+def snapshot(foods=FOODS, version=1):
+    rows = [(food_id, name, category, protein, calories, 0, 0, 0) for food_id, name, category, protein, calories in foods]
+    return CatalogSnapshot(rows, version)
+
+
+class TestRecommendationEngine:
+    def test_rankings(self):
+        """测试按类别预排蛋白质密度，低蛋白食物不进入候选"""
+        engine = RecommendationEngine(snapshot())
+        ranked = {
+            category: [int(engine.snapshot.ids[pos]) for pos in positions]
+            for category, positions in engine.rankings.items()
+        }
+        assert ranked["肉类"] == [1, 2, 3]
+        assert ranked["豆制品"] == [5, 6]
+        assert "主食" not in ranked
+
+    def test_covers_gap(self):
+        """测试推荐组合的蛋白质不少于缺口，份量为50g的整数倍"""
+        engine = RecommendationEngine(snapshot())
+        for gap in (3, 12.5, 37, 80, 150):
+            result = engine.recommend(gap)
+            assert result["total_protein"] >= gap
+            assert all(item["grams"] % 50 == 0 and item["grams"] <= 200 for item in result["items"])
+            assert len({item["food_item_id"] for item in result["items"]}) == len(result["items"])
+
+    def test_prefers_low_calorie_density(self):
+        """测试缺口较小时选蛋白质热量比最高的单一食物"""
+        result = RecommendationEngine(snapshot()).recommend(13)
+        assert [item["food_item_id"] for item in result["items"]] == [7]
+        assert result["items"][0]["grams"] == 100
+
+    def test_large_gap_greedy(self):
+        """测试超出背包范围的缺口用贪心补足"""
+        result = RecommendationEngine(snapshot()).recommend(220)
+        assert result["gap"] == 220
+        assert result["total_protein"] >= 220
+
+    def test_preferences(self):
+        """测试排除类别/食物后不再推荐，替换食材来自同类别"""
+        engine = RecommendationEngine(snapshot())
+        preferences = Preferences(excluded_categories=["水产"], excluded_foods=[1])
+        result = engine.recommend(40, preferences)
+        chosen = {item["food_item_id"] for item in result["items"]}
+        assert not chosen & {1, 7}
+        for item in result["items"]:
+            for alternative in item["alternatives"]:
+                assert alternative["category"] == item["category"]
+                assert alternative["food_item_id"] not in chosen | {1}
+                assert alternative["protein"] >= item["protein"] - 0.5
+
+        meat_only = engine.recommend(40, Preferences(excluded_categories=["水产", "豆制品", "蛋类"]))
+        assert {item["category"] for item in meat_only["items"]} == {"肉类"}
+
+    def test_memoized_by_bucket_and_preferences(self):
+        """测试同一缺口档位、同一偏好只求解一次"""
+        engine = RecommendationEngine(snapshot())
+        assert gap_bucket(21) == gap_bucket(25) == 25
+        first = engine.recommend(21)
+        assert engine.recommend(24.5) is first
+        engine.recommend(24.5, Preferences(excluded_categories=["肉类"]))
+        engine.recommend(24.5, Preferences(excluded_categories=["肉类"]))
+        assert engine.solves == 2
+
+    def test_no_candidates(self):
+        """测试没有可推荐的食物时返回空组合和通用建议"""
+        engine = RecommendationEngine(snapshot([(8, "米饭", "主食", 2.6, 116)]))
+        result = engine.recommend(30)
+        assert result["items"] == []
+        assert "还差约30g" in render_content(result, 30)
+        assert "已达标" in render_content(engine.recommend(0), 0)
+
+
+@pytest.fixture
+def run(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        for user_id in range(1, 8):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=0 if user_id == 7 else 1))
+        for food_id, name, category, protein, calories in FOODS:
+            db.add(FoodItem(
+                id=food_id, name=name, category=category, protein_per_100g=protein, calories_per_100g=calories
+            ))
+        # 用户1已达标，2/3缺口相同，4缺口相同但有偏好，5/6没有当天记录
+        for user_id, protein in ((1, 70), (2, 38), (3, 39), (4, 38)):
+            db.add(NutritionRecord(
+                user_id=user_id, record_date=DAY, total_protein=protein, total_calories=0,
+                protein_target=60, calories_target=1800, achievement_rate=0
+            ))
+
+    env = database(
+        User, FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic,
+        DietRecommendation, UserFoodPreference, seed=seed
+    )
+    set_food_catalog(FoodCatalog())
+    set_recommendation_engine(None)
+    yield env
+    set_food_catalog(None)
+    set_recommendation_engine(None)
+
+
+class TestRecommendationService:
+    def test_preferences_roundtrip(self, run):
+        """测试保存偏好后整体覆盖，推荐时生效"""
+        async def scenario(db):
+            assert (await NutritionService.get_preferences(db, 4))["excluded_categories"] == []
+            await NutritionService.update_preferences(db, 4, FoodPreferenceUpdate(excluded_categories=["肉类"]))
+            saved = await NutritionService.update_preferences(
+                db, 4, FoodPreferenceUpdate(excluded_categories=["水产"], excluded_foods=[4], preferred_categories=["豆制品"])
+            )
+            recommendation = await NutritionService.recommend(db, 4, DAY)
+            return saved, recommendation
+
+        saved, recommendation = run(scenario)
+        assert saved == {"excluded_categories": ["水产"], "excluded_foods": [4], "preferred_categories": ["豆制品"]}
+        assert recommendation["protein_gap"] == 22
+        assert recommendation["total_protein"] >= 22
+        assert not {item["food_item_id"] for item in recommendation["items"]} & {4, 7}
+        assert recommendation["content"].startswith("今日蛋白质还差约22g")
+
+    def test_category_validation(self):
+        """测试类别名不能包含逗号"""
+        with pytest.raises(ValueError):
+            FoodPreferenceUpdate(excluded_categories=["肉类,水产"])
+        assert FoodPreferenceUpdate(preferred_categories=[" 肉类", "肉类"]).preferred_categories == ["肉类"]
+
+    def test_generate_daily(self, run):
+        """测试批量生成：跳过已达标和禁用用户，相同情况只求解一次，重复执行不产生重复建议"""
+        async def scenario(db):
+            await NutritionService.update_preferences(db, 4, FoodPreferenceUpdate(excluded_categories=["水产"]))
+            run.queries.clear()
+            first = await NutritionService.generate_daily_recommendations(db, DAY, batch_size=2)
+            selects = len([sql for sql in run.queries if sql.lstrip().upper().startswith("SELECT")])
+            second = await NutritionService.generate_daily_recommendations(db, DAY, batch_size=4)
+            result = await db.execute(
+                select(DietRecommendation.user_id, DietRecommendation.protein_gap).order_by(DietRecommendation.user_id)
+            )
+            return first, second, selects, result.all()
+
+        first, second, selects, rows = run(scenario)
+        assert [(user_id, float(gap)) for user_id, gap in rows] == [(2, 22), (3, 21), (4, 22), (5, 60), (6, 60)]
+        assert first["users"] == 6 and first["recommendations"] == 5
+        # 2、3同一档位共用；4偏好不同；5、6缺口相同
+        assert first["solves"] == 3
+        assert second["solves"] == 0 and second["recommendations"] == 5
+        # 目录加载 + 每页(用户, 偏好)两次查询 + 结束时一次空页
+        assert selects <= 2 + 3 * 2 + 1
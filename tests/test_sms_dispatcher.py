@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.code_store import MemoryCodeStore, set_code_store
+from app.core.sms_dispatcher import SMSDispatcher, SMSTransport, set_sms_dispatcher
+from app.services.auth_service import AuthService
+
+
+class FakeGateway(SMSTransport):
+    """模拟短信网关：可配置前几次调用抛出临时错误"""
+
+    def __init__(self, transient_failures=0, reject=False, delay=0.0):
+        self.transient_failures = transient_failures
+        self.reject = reject
+        self.delay = delay
+        self.calls = []
+        self.delivered = []
+
+    async def send(self, phone, code, sms_type):
+        self.calls.append(phone)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.transient_failures > 0:
+            self.transient_failures -= 1
+            raise ConnectionError("gateway unavailable")
+        if self.reject:
+            return False
+        self.delivered.append((phone, code, sms_type))
+        return True
+
+
+def run_dispatcher(gateway, submissions, **kwargs):
+    async def scenario():
+        dispatcher = SMSDispatcher(gateway, backoff_base=0.001, backoff_max=0.01, **kwargs)
+        await dispatcher.start()
+        accepted = [dispatcher.submit(*item) for item in submissions]
+        await dispatcher.stop(drain_timeout=2)
+        return dispatcher, accepted
+
+    return asyncio.run(scenario())
+
+
+class TestSMSDispatcher:
+    def test_submit_returns_before_delivery(self):
+        """测试提交不等待网关返回"""
+        async def scenario():
+            gateway = FakeGateway(delay=0.05)
+            dispatcher = SMSDispatcher(gateway)
+            await dispatcher.start()
+            assert dispatcher.submit("13800138000", "123456", 1)
+            assert gateway.delivered == []
+            await dispatcher.stop()
+            return gateway
+
+        gateway = asyncio.run(scenario())
+        assert gateway.delivered == [("13800138000", "123456", 1)]
+
+    def test_retry_with_backoff(self):
+        """测试临时故障后重试成功"""
+        gateway = FakeGateway(transient_failures=2)
+        dispatcher, _ = run_dispatcher(gateway, [("13800138000", "123456", 2)], max_retries=3)
+        stats = dispatcher.stats()
+        assert stats["sent"] == 1
+        assert stats["retries"] == 2
+        assert len(gateway.calls) == 3
+
+    def test_give_up_after_max_retries(self):
+        """测试超过重试次数后记为失败"""
+        gateway = FakeGateway(transient_failures=10)
+        dispatcher, _ = run_dispatcher(gateway, [("13800138000", "123456", 2)], max_retries=2)
+        stats = dispatcher.stats()
+        assert stats["failed"] == 1
+        assert len(gateway.calls) == 3
+
+    def test_rejection_not_retried(self):
+        """测试网关拒绝不重试"""
+        gateway = FakeGateway(reject=True)
+        dispatcher, _ = run_dispatcher(gateway, [("13800138000", "123456", 1)])
+        assert dispatcher.stats()["rejected"] == 1
+        assert len(gateway.calls) == 1
+
+    def test_queue_full_drops(self):
+        """测试队列满时拒绝入队"""
+        gateway = FakeGateway()
+        submissions = [("1380013800%d" % i, "123456", 1) for i in range(5)]
+        dispatcher, accepted = run_dispatcher(gateway, submissions, queue_size=2, workers=1)
+        assert accepted == [True, True, False, False, False]
+        assert dispatcher.stats()["dropped"] == 3
+        assert len(gateway.delivered) == 2
+
+    def test_rejected_send_keeps_previous_code(self):
+        """测试短信队列已满时不保存新验证码，用户手上的上一个验证码仍然有效"""
+        store = MemoryCodeStore()
+        # 未启动的调度器拒绝所有提交
+        set_sms_dispatcher(SMSDispatcher(FakeGateway()))
+        set_code_store(store)
+
+        async def scenario():
+            await store.save("13800138000", 1, "111111", 300)
+            with pytest.raises(HTTPException) as exc:
+                await AuthService.create_verification_code(None, "13800138000", 1)
+            return exc.value.status_code, await store.consume("13800138000", 1, "111111")
+
+        try:
+            assert asyncio.run(scenario()) == (503, True)
+        finally:
+            set_sms_dispatcher(None)
+            set_code_store(None)
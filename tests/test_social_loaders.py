@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.counters import Counters, MemoryCounterStore, set_counters
+from app.core.dataloader import DataLoader
+from app.models.auth import User, UserProfile
+from app.models.social import Comment, Like, Post, PostImage
+from app.schemas.social import CommentCreate
+from app.services.social_service import SocialLoaders, SocialService, build_comment_tree
+from tests.query_count import assert_queries
+
+NOW = datetime(2024, 3, 6, 12)
+
+
+class TestDataLoader:
+    def test_batch_per_tick(self):
+        """测试同一轮的加载合并为一批，重复key走缓存，缺失key用默认值"""
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(sorted(keys))
+            return {key: key * 10 for key in keys if key != 3}
+
+        async def scenario():
+            loader = DataLoader(batch_fn, default=lambda: -1)
+            first = await asyncio.gather(loader.load(1), loader.load_many([2, 3]), loader.load(1))
+            second = await loader.load_many([1, 2, 4])
+            return first, second, await loader.load_many([])
+
+        first, second, empty = asyncio.run(scenario())
+        assert first == [10, [20, -1], 10]
+        assert second == [10, 20, 40]
+        assert empty == []
+        assert batches == [[1, 2, 3], [4]]
+
+    def test_split_and_failure(self):
+        """测试超过批量上限时分批，失败的key不缓存、可以重新加载"""
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(list(keys))
+            if len(batches) == 1:
+                raise ConnectionError("database gone")
+            return {key: str(key) for key in keys}
+
+        async def scenario():
+            loader = DataLoader(batch_fn, max_batch_size=2)
+            with pytest.raises(ConnectionError):
+                await loader.load_many([1, 2, 3])
+            return await loader.load_many([1, 2, 3])
+
+        assert asyncio.run(scenario()) == ["1", "2", "3"]
+        assert batches[0] == [1, 2] and [3] in batches and batches[-1] == [1, 2]
+
+
+class TestCommentTree:
+    def test_build(self):
+        """测试按parent_id组装评论树，同层保持顺序，父评论缺失的回复提升为一级评论"""
+        comments = [
+            {"id": 1, "parent_id": None}, {"id": 2, "parent_id": 1}, {"id": 3, "parent_id": None},
+            {"id": 4, "parent_id": 2}, {"id": 5, "parent_id": 1}, {"id": 6, "parent_id": 99},
+        ]
+        tree = build_comment_tree(comments)
+
+        def shape(nodes):
+            return [(node["id"], shape(node["replies"])) for node in nodes]
+
+        assert shape(tree) == [(1, [(2, [(4, [])]), (5, [])]), (3, []), (6, [])]
+        assert "replies" not in comments[0]
+
+
+@pytest.fixture
+def env(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        for user_id in (1, 2, 3):
+            db.add(User(id=user_id, phone=f"1380013800{user_id}", password_hash="x", status=1))
+            db.add(UserProfile(user_id=user_id, name=f"用户{user_id}", avatar=f"/media/{user_id}.jpg"))
+        for post_id, comment_count in ((1, 30), (2, 2)):
+            db.add(Post(
+                id=post_id, user_id=1, title="帖子", content="内容", comment_count=comment_count, created_at=NOW
+            ))
+            for order in (2, 0, 1):
+                db.add(PostImage(post_id=post_id, image_url=f"/media/p{post_id}-{order}.jpg", sort_order=order))
+        # 帖子1: 10条一级评论，每条两条回复，其中一条回复已删除
+        comment_id = 0
+        for i in range(10):
+            comment_id += 1
+            root = comment_id
+            db.add(Comment(
+                id=root, post_id=1, user_id=i % 3 + 1, content=f"评论{i}", status=1,
+                created_at=NOW + timedelta(minutes=i)
+            ))
+            for j in range(2):
+                comment_id += 1
+                db.add(Comment(
+                    id=comment_id, post_id=1, user_id=(i + j) % 3 + 1, parent_id=root, content=f"回复{i}-{j}",
+                    status=0 if (i, j) == (9, 1) else 1, created_at=NOW + timedelta(minutes=i, seconds=j + 1)
+                ))
+        db.add(Comment(id=100, post_id=2, user_id=2, content="沙发", status=1, created_at=NOW))
+        db.add(Comment(id=101, post_id=2, user_id=3, parent_id=100, content="板凳", status=1, created_at=NOW))
+        db.add(Like(user_id=2, target_id=1, target_type="post"))
+        db.add(Like(user_id=2, target_id=2, target_type="comment"))
+        db.add(Like(user_id=2, target_id=1, target_type="comment"))
+
+    yield database(User, UserProfile, Post, PostImage, Comment, Like, seed=seed)
+    set_counters(None)
+
+
+class TestPostDetail:
+    def test_constant_queries(self, env):
+        """测试帖子详情的查询条数与评论数无关：帖子、评论、图片、作者、点赞状态各一条"""
+        async def scenario(db):
+            with assert_queries(env.engine, 5):
+                busy = await SocialService.view_post(db, 1, user_id=2)
+            db.expunge_all()
+            with assert_queries(env.engine, 5):
+                quiet = await SocialService.view_post(db, 2, user_id=2)
+            return busy, quiet
+
+        busy, quiet = env(scenario)
+        assert busy["images"] == ["/media/p1-0.jpg", "/media/p1-1.jpg", "/media/p1-2.jpg"]
+        assert busy["author"] == {"name": "用户1", "avatar": "/media/1.jpg"} and busy["liked"]
+
+        comments = busy["comments"]
+        assert [comment["content"] for comment in comments] == [f"评论{i}" for i in range(10)]
+        assert [reply["content"] for reply in comments[0]["replies"]] == ["回复0-0", "回复0-1"]
+        assert [reply["content"] for reply in comments[9]["replies"]] == ["回复9-0"]
+        assert comments[0]["liked"] and comments[0]["replies"][0]["liked"]
+        assert not comments[1]["liked"]
+        assert comments[1]["author"] == {"name": "用户2", "avatar": "/media/2.jpg"}
+
+        assert not quiet["liked"]
+        assert [(c["content"], [r["content"] for r in c["replies"]]) for c in quiet["comments"]] == [("沙发", ["板凳"])]
+
+    def test_anonymous_skips_likes(self, env):
+        """测试没有当前用户时不查询点赞状态"""
+        async def scenario(db):
+            with assert_queries(env.engine, 4):
+                return await SocialService.view_post(db, 2)
+
+        post = env(scenario)
+        assert not post["liked"] and not post["comments"][0]["liked"]
+
+    def test_loaders_batch_across_posts(self, env):
+        """测试多条帖子的图片和评论各合并为一条查询"""
+        async def scenario(db):
+            loaders = SocialLoaders(db, user_id=2)
+            with assert_queries(env.engine, 2) as counter:
+                posts = await loaders.attach_posts(
+                    [{"id": 1, "user_id": 1}, {"id": 2, "user_id": 1}, {"id": 3, "user_id": 9}], authors=False
+                )
+            with assert_queries(env.engine, 1):
+                comments = await asyncio.gather(loaders.comments.load(1), loaders.comments.load(2))
+            return posts, comments, counter.statements
+
+        posts, comments, statements = env(scenario)
+        assert posts[2]["images"] == []
+        assert [post["liked"] for post in posts] == [True, False, False]
+        assert [len(rows) for rows in comments] == [29, 2]
+        assert all(" IN " in sql.upper() for sql in statements)
+
+
+class TestCreateComment:
+    def test_reply(self, env):
+        """测试回复出现在父评论下，评论数经计数器累加，回复其他帖子的评论返回404"""
+        counters = Counters(MemoryCounterStore(), env.factory, flush_interval=60)
+        set_counters(counters)
+
+        async def scenario(db):
+            await counters.start()
+            reply = await SocialService.create_comment(db, 3, 2, CommentCreate(content="地板", parent_id=100))
+            with pytest.raises(HTTPException) as error:
+                await SocialService.create_comment(db, 3, 2, CommentCreate(content="串楼", parent_id=1))
+            detail = await SocialService.view_post(db, 2, user_id=3)
+            await counters.stop()
+            return reply, error.value.status_code, detail
+
+        reply, status_code, detail = env(scenario)
+        assert reply["author"] == {"name": "用户3", "avatar": "/media/3.jpg"}
+        assert status_code == 404
+        assert detail["comment_count"] == 3
+        assert [r["content"] for r in detail["comments"][0]["replies"]] == ["板凳", "地板"]
@@ -0,0 +1,204 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from app.core.food_catalog import FoodCatalog, set_food_catalog
+from app.core.timeseries import (
+    DAILY, MONTHLY, WEEKLY, bucket_start, bucket_starts, columnar, next_bucket, resolve_range
+)
+from app.models.auth import User
+from app.models.exercise import ExerciseRecord, ExerciseStatistic, ExerciseVideo
+from app.models.nutrition import FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic, ProteinSupplement
+from app.schemas.exercise import ExerciseRecordCreate
+from app.schemas.nutrition import MealCreate
+from app.services.exercise_service import ExerciseService
+from app.services.nutrition_service import NutritionService
+
+
+class TestBuckets:
+    def test_bucket_start(self):
+        """测试周从周一开始、月从1号开始"""
+        day = date(2024, 3, 6)  # 周三
+        assert bucket_start(day, DAILY) == day
+        assert bucket_start(day, WEEKLY) == date(2024, 3, 4)
+        assert bucket_start(day, MONTHLY) == date(2024, 3, 1)
+        assert next_bucket(date(2024, 12, 1), MONTHLY) == date(2025, 1, 1)
+        assert next_bucket(date(2024, 1, 1), MONTHLY) == date(2024, 2, 1)
+
+    def test_bucket_starts(self):
+        """测试范围内的桶起始日，跨年的周按周一对齐"""
+        starts = bucket_starts(date(2023, 12, 27), date(2024, 1, 10), WEEKLY)
+        assert starts == [date(2023, 12, 25), date(2024, 1, 1), date(2024, 1, 8)]
+        assert len(bucket_starts(date(2024, 1, 1), date(2024, 3, 31), DAILY)) == 91
+
+    def test_resolve_range(self):
+        """测试默认范围和参数校验"""
+        today = date(2024, 3, 6)
+        assert resolve_range("day", today) == (DAILY, date(2024, 2, 6), today)
+        assert resolve_range("week", today) == (WEEKLY, date(2023, 12, 18), today)
+        assert resolve_range("month", today) == (MONTHLY, date(2023, 4, 1), today)
+        with pytest.raises(ValueError):
+            resolve_range("day", today, start=date(2024, 3, 7))
+        with pytest.raises(ValueError):
+            resolve_range("day", today, start=date(2020, 1, 1))
+        with pytest.raises(ValueError):
+            resolve_range("year", today)
+
+    def test_columnar(self):
+        """测试列式输出，缺失的桶补0"""
+        starts = [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)]
+        data = columnar(starts, {date(2024, 3, 2): (12.5, 300)}, ("protein", "calories"))
+        assert data == {
+            "dates": ["2024-03-01", "2024-03-02", "2024-03-03"],
+            "protein": [0, 12.5, 0],
+            "calories": [0, 300, 0],
+        }
+
+
+@pytest.fixture
+def run(database):
+    """测试场景在内存数据库的一个会话中执行"""
+    async def seed(db):
+        db.add(User(id=1, phone="13800138000", password_hash="x", status=1))
+        db.add(FoodItem(id=1, name="鸡胸肉", category="肉类", protein_per_100g=20, calories_per_100g=130))
+
+    env = database(
+        User, FoodItem, Meal, MealFoodItem, NutritionRecord, NutritionStatistic,
+        ProteinSupplement, ExerciseVideo, ExerciseRecord, ExerciseStatistic, seed=seed
+    )
+    set_food_catalog(FoodCatalog())
+    yield env
+    set_food_catalog(None)
+
+
+def meal(grams, day, month=3):
+    return MealCreate(meal_type=2, meal_time=datetime(2024, month, day, 12), items=[{"food_item_id": 1, "quantity": grams}])
+
+
+def exercise(minutes, day, hour=7, month=3):
+    start = datetime(2024, month, day, hour)
+    return ExerciseRecordCreate(
+        exercise_type="快走", start_time=start, end_time=start.replace(minute=minutes)
+    )
+
+
+async def statistic(db, model, period, day):
+    result = await db.execute(select(model).where(
+        model.user_id == 1, model.statistic_type == period, model.statistic_date == day
+    ))
+    return result.scalar_one_or_none()
+
+
+class TestNutritionTrend:
+    def test_period_buckets(self, run):
+        """测试餐食写入同时更新周、月汇总，修改跨月时两边都调整"""
+        async def scenario(db):
+            m1 = await NutritionService.create_meal(db, 1, meal(100, 4))
+            await NutritionService.create_meal(db, 1, meal(200, 6))
+            await NutritionService.create_meal(db, 1, meal(50, 11))
+            week = await statistic(db, NutritionStatistic, WEEKLY, date(2024, 3, 4))
+            month = await statistic(db, NutritionStatistic, MONTHLY, date(2024, 3, 1))
+            assert float(week.total_protein) == 60
+            assert float(month.total_protein) == 70
+            assert float(month.total_calories) == pytest.approx(455)
+
+            # 移到上个月
+            await NutritionService.update_meal(db, 1, m1.id, meal(100, 28, month=2))
+            await db.refresh(week)
+            await db.refresh(month)
+            assert float(week.total_protein) == 40
+            assert float(month.total_protein) == 50
+            feb = await statistic(db, NutritionStatistic, MONTHLY, date(2024, 2, 1))
+            assert float(feb.total_protein) == 20
+
+        run(scenario)
+
+    def test_trend_is_single_read(self, run):
+        """测试趋势图为一次范围读取，返回列式数组"""
+        async def scenario(db):
+            await NutritionService.create_meal(db, 1, meal(100, 4))
+            await NutritionService.create_meal(db, 1, meal(200, 12))
+            run.queries.clear()
+            weekly = await NutritionService.get_trend(db, 1, WEEKLY, date(2024, 2, 26), date(2024, 3, 17))
+            assert len(run.queries) == 1
+            assert "FROM nutrition_statistics" in run.queries[0]
+            daily = await NutritionService.get_trend(db, 1, DAILY, date(2024, 3, 3), date(2024, 3, 5))
+            return weekly, daily
+
+        weekly, daily = run(scenario)
+        assert weekly["dates"] == ["2024-02-26", "2024-03-04", "2024-03-11"]
+        assert weekly["protein"] == [0, 20, 40]
+        assert daily["protein"] == [0, 20, 0]
+        assert daily["period"] == DAILY
+
+    def test_reconcile_updates_buckets(self, run):
+        """测试校对修复每日汇总时周、月汇总同步修正"""
+        async def scenario(db):
+            await NutritionService.create_meal(db, 1, meal(100, 4))
+            await NutritionService.create_meal(db, 1, meal(100, 5))
+            # 模拟偏差: 每日汇总和周/月汇总一起多算了10g；第5天的行丢失（周/月仍计入）
+            await db.execute(update(NutritionRecord).where(NutritionRecord.record_date == date(2024, 3, 4))
+                             .values(total_protein=30))
+            await db.execute(update(NutritionStatistic).values(total_protein=NutritionStatistic.total_protein + 10))
+            await db.execute(NutritionRecord.__table__.delete().where(NutritionRecord.record_date == date(2024, 3, 5)))
+            await db.execute(update(NutritionStatistic).values(total_protein=NutritionStatistic.total_protein - 20))
+            await db.commit()
+
+            stats = await NutritionService.reconcile_daily_records(db, date(2024, 3, 4), date(2024, 3, 5))
+            assert stats["fixed"] == 1 and stats["created"] == 1
+            week = await statistic(db, NutritionStatistic, WEEKLY, date(2024, 3, 4))
+            return float(week.total_protein)
+
+        assert run(scenario) == 40
+
+
+class TestExerciseTrend:
+    def test_statistics_lifecycle(self, run):
+        """测试运动记录新增删除时日/周/月统计和运动天数增量更新"""
+        async def scenario(db):
+            r1 = await ExerciseService.create_record(db, 1, exercise(30, 4))
+            r2 = await ExerciseService.create_record(db, 1, exercise(15, 4, hour=19))
+            await ExerciseService.create_record(db, 1, exercise(20, 6))
+
+            daily = await statistic(db, ExerciseStatistic, DAILY, date(2024, 3, 4))
+            assert daily.total_duration == 2700
+            assert daily.exercise_days == 1
+            assert float(daily.achievement_rate) == 100
+            week = await statistic(db, ExerciseStatistic, WEEKLY, date(2024, 3, 4))
+            assert week.total_duration == 3900
+            assert week.exercise_days == 2
+            assert week.target_duration == 1800 * 7
+            month = await statistic(db, ExerciseStatistic, MONTHLY, date(2024, 3, 1))
+            assert month.target_duration == 1800 * 31
+
+            # 同一天还有其他记录，运动天数不变
+            assert await ExerciseService.delete_record(db, 1, r1.id)
+            await db.refresh(week)
+            assert (week.total_duration, week.exercise_days) == (2100, 2)
+
+            # 当天最后一条删除后，运动天数减1
+            assert await ExerciseService.delete_record(db, 1, r2.id)
+            await db.refresh(week)
+            await db.refresh(daily)
+            assert (week.total_duration, week.exercise_days) == (1200, 1)
+            assert (daily.total_duration, daily.exercise_days) == (0, 0)
+            assert float(week.achievement_rate) == pytest.approx(9.52)
+            assert not await ExerciseService.delete_record(db, 1, r2.id)
+
+        run(scenario)
+
+    def test_trend(self, run):
+        """测试按月的运动趋势"""
+        async def scenario(db):
+            await ExerciseService.create_record(db, 1, exercise(30, 4))
+            await ExerciseService.create_record(db, 1, exercise(10, 20, month=4))
+            run.queries.clear()
+            data = await ExerciseService.get_trend(db, 1, MONTHLY, date(2024, 2, 10), date(2024, 4, 30))
+            assert len(run.queries) == 1
+            return data
+
+        data = run(scenario)
+        assert data["dates"] == ["2024-02-01", "2024-03-01", "2024-04-01"]
+        assert data["duration"] == [0, 1800, 600]
+        assert data["exercise_days"] == [0, 1, 1]
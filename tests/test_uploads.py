@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import io
+import os
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core.storage import LocalStorage
+from app.core.uploads import Thumbnailer, detect_image_type, receive_image, set_thumbnailer
+
+JPEG_HEAD = b"\xff\xd8\xff\xe0" + b"\x00" * 12
+
+
+def make_request(chunks, content_type="image/jpeg", content_length=None):
+    """构造逐块发送请求体的Request，返回(request, 已读取的块数)"""
+    headers = [(b"content-type", content_type.encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": headers}
+    iterator = iter(chunks)
+    state = {"received": 0}
+
+    async def receive():
+        chunk = next(iterator, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        state["received"] += 1
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    return Request(scope, receive), state
+
+
+def jpeg_bytes(width=1000, height=800):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    thumbnailer = Thumbnailer(size=320, executor="inline")
+    set_thumbnailer(thumbnailer)
+    storage = LocalStorage(str(tmp_path), "/media")
+    storage.thumbnailer = thumbnailer
+    yield storage
+    set_thumbnailer(None)
+
+
+def tmp_files(storage):
+    return os.listdir(storage.tmp_dir)
+
+
+class TestDetectImageType:
+    def test_signatures(self):
+        """测试按文件头识别图片类型"""
+        assert detect_image_type(JPEG_HEAD) == ("jpg", "image/jpeg")
+        assert detect_image_type(b"\x89PNG\r\n\x1a\n\x00\x00\x00\x00")[0] == "png"
+        assert detect_image_type(b"RIFF\x00\x00\x00\x00WEBP")[0] == "webp"
+        assert detect_image_type(b"<html><body>") is None
+
+
+class TestReceiveImage:
+    def test_raw_stream(self, storage):
+        """测试原始请求体边接收边保存，哈希与内容一致，缩略图后台生成"""
+        data = jpeg_bytes()
+        request, _ = make_request(split(data, 4096))
+
+        async def scenario():
+            result = await receive_image(request, storage, "meals", 1024 * 1024, chunk_size=16 * 1024)
+            await storage.thumbnailer.join()
+            return result
+
+        result = asyncio.run(scenario())
+        digest = hashlib.sha256(data).hexdigest()
+        assert result["sha256"] == digest
+        assert result["key"] == f"meals/{digest[:2]}/{digest}.jpg"
+        assert result["url"] == f"/media/meals/{digest[:2]}/{digest}.jpg"
+        assert result["size"] == len(data)
+        assert not result["deduplicated"]
+        with open(storage.local_path(result["key"]), "rb") as f:
+            assert f.read() == data
+
+        from PIL import Image
+        with Image.open(storage.local_path(f"meals/{digest[:2]}/{digest}_thumb.jpg")) as thumb:
+            assert max(thumb.size) == 320
+        assert tmp_files(storage) == []
+
+    def test_multipart_and_dedupe(self, storage):
+        """测试multipart请求取出文件字段，相同图片第二次上传不重复保存"""
+        data = jpeg_bytes(200, 200)
+        boundary = "----health777boundary"
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\n午餐\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        content_type = f"multipart/form-data; boundary={boundary}"
+
+        async def upload(chunk_size):
+            request, _ = make_request(split(body, chunk_size), content_type, len(body))
+            return await receive_image(request, storage, "posts", 1024 * 1024)
+
+        first = asyncio.run(upload(7))
+        second = asyncio.run(upload(1000))
+        assert first["sha256"] == hashlib.sha256(data).hexdigest()
+        assert not first["deduplicated"]
+        assert second["deduplicated"]
+        assert second["key"] == first["key"]
+        assert tmp_files(storage) == []
+
+    def test_content_length_rejected_before_reading(self, storage):
+        """测试Content-Length超限时不读取请求体直接返回413"""
+        request, state = make_request([JPEG_HEAD], content_length=10 * 1024 * 1024)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_image(request, storage, "meals", 1024 * 1024))
+        assert exc.value.status_code == 413
+        assert state["received"] == 0
+
+    def test_stream_limit(self, storage):
+        """测试未声明长度时超限立即中止，临时文件被删除"""
+        chunks = [JPEG_HEAD] + [b"\x00" * 65536] * 100
+        request, state = make_request(chunks)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_image(request, storage, "meals", 256 * 1024))
+        assert exc.value.status_code == 413
+        assert state["received"] < 10
+        assert tmp_files(storage) == []
+
+    def test_not_an_image(self, storage):
+        """测试非图片内容在第一块就被拒绝"""
+        request, state = make_request([b"<html><body>hello</body></html>"] + [b"x" * 1024] * 10)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_image(request, storage, "meals", 1024 * 1024))
+        assert exc.value.status_code == 415
+        assert state["received"] == 1
+        assert tmp_files(storage) == []
+
+    def test_multipart_header_limit(self, storage):
+        """测试未声明长度的multipart请求中字段头部无限增长时立即中止"""
+        boundary = "----health777boundary"
+        chunks = [f"--{boundary}\r\nContent-Disposition: form-data; name=\"".encode()] + [b"x" * 1024] * 100
+        request, state = make_request(chunks, f"multipart/form-data; boundary={boundary}")
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(receive_image(request, storage, "meals", 1024 * 1024))
+        assert exc.value.status_code == 400
+        assert state["received"] < 12
+        assert tmp_files(storage) == []
+
+    def test_constant_memory(self, storage):
+        """测试峰值内存与图片大小无关（8MB图片只占用约一个写入块）"""
+        storage.thumbnailer.max_pending = 0
+        block = b"\x01" * 65536
+
+        def chunks():
+            yield JPEG_HEAD
+            for _ in range(128):
+                yield block
+
+        request, _ = make_request(chunks())
+        tracemalloc.start()
+        try:
+            result = asyncio.run(receive_image(request, storage, "meals", 16 * 1024 * 1024, chunk_size=256 * 1024))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert result["size"] == len(JPEG_HEAD) + 128 * 65536
+        assert peak < 2 * 1024 * 1024